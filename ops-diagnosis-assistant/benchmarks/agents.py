@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+智能体基准测试 - 用桩模型和桩检索器（benchmarks/stubs.py）对比 simple / rag / advanced 三个智能体
+
+每个智能体在独立的子进程中运行（峰值RSS互不影响），LLM与检索延迟按可配置的分布（固定种子）模拟，
+不需要Ollama和Elasticsearch。统计每轮诊断的 p50/p95/p99 延迟、LLM调用次数、token数，
+各并发度下的吞吐，以及进程峰值RSS。JSON输出可以保存下来与其他提交的结果对比（--baseline）。
+
+用法:
+    python benchmarks/agents.py
+    python benchmarks/agents.py --agents advanced --concurrency 1 8 32 --llm-latency lognormal:0.2:0.5
+    python benchmarks/agents.py --output bench-before.json
+    python benchmarks/agents.py --baseline bench-before.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.backend_overhead import _percentile
+
+AGENTS = ["simple", "rag", "advanced"]
+
+TEST_CASES = [
+    "服务器CPU使用率很高怎么办",
+    "内存不足出现OOM错误",
+    "磁盘空间满了无法写入文件",
+    "生产环境订单服务CPU使用率持续95%以上，接口大量超时",
+]
+
+# 与基线对比时显示的指标（越小越好的指标，吞吐单独处理）
+COMPARED_METRICS = ["p50_ms", "p95_ms", "p99_ms", "llm_calls_per_turn", "tokens_per_turn"]
+
+
+def _usage_counter():
+    """统计LLM调用次数与token用量的回调（多个并发诊断共享同一个桩模型）"""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class UsageCounter(BaseCallbackHandler):
+        def __init__(self):
+            self.calls = 0
+            self.tokens = 0
+            self._lock = threading.Lock()
+
+        def on_llm_end(self, response, **kwargs):
+            tokens = sum(
+                (getattr(getattr(generation, "message", None), "usage_metadata", None) or {}).get("total_tokens", 0)
+                for generations in response.generations for generation in generations
+            )
+            with self._lock:
+                self.calls += 1
+                self.tokens += tokens
+
+        def snapshot(self):
+            with self._lock:
+                return self.calls, self.tokens
+
+    return UsageCounter()
+
+
+def build_agent(name: str, llm, retriever):
+    if name == "simple":
+        from src.core.simple_agent import SimpleDiagnosisAgent
+
+        return SimpleDiagnosisAgent(llm=llm)
+    if name == "rag":
+        from src.core.rag_agent import RAGDiagnosisAgent
+
+        return RAGDiagnosisAgent(llm=llm, retriever=retriever)
+    from src.core.advanced_agent import AdvancedDiagnosisAgent
+
+    return AdvancedDiagnosisAgent(debug_mode=False, llm=llm, retriever=retriever)
+
+
+def _run_turn(name: str, agent, index: int):
+    user_input = TEST_CASES[index % len(TEST_CASES)]
+    if name == "advanced":
+        # 每轮使用新会话，测量的是完整的一轮诊断（症状收集 -> 方案 -> 确认）
+        return agent.diagnose(user_input, f"bench-{index}")
+    return agent.diagnose(user_input)
+
+
+def _run_level(name: str, agent, counter, concurrency: int, turns: int) -> Dict[str, Any]:
+    """以 concurrency 个并发执行 turns 轮诊断"""
+    latencies: List[float] = []
+
+    def timed_turn(index: int):
+        start = time.perf_counter()
+        _run_turn(name, agent, index)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    calls_before, tokens_before = counter.snapshot()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(timed_turn, i) for i in range(turns)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+    calls, tokens = counter.snapshot()
+    return {
+        "concurrency": concurrency,
+        "turns": turns,
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(_percentile(latencies, 95), 1),
+        "p99_ms": round(_percentile(latencies, 99), 1),
+        "throughput_per_s": round(turns / elapsed, 2),
+        "llm_calls_per_turn": round((calls - calls_before) / turns, 2),
+        "tokens_per_turn": round((tokens - tokens_before) / turns, 1),
+    }
+
+
+def _peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 单位为KB，macOS 为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_agent(name: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """在当前进程中测量一个智能体（由 --run-agent 子进程调用）"""
+    from benchmarks.stubs import LatencyDistribution, StubChatModel, StubRetriever
+
+    counter = _usage_counter()
+    llm = StubChatModel(latency=LatencyDistribution.parse(config["llm_latency"], config["seed"]), callbacks=[counter])
+    retriever = StubRetriever(latency=LatencyDistribution.parse(config["retrieval_latency"], config["seed"] + 1))
+
+    start = time.perf_counter()
+    agent = build_agent(name, llm, retriever)
+    init_ms = (time.perf_counter() - start) * 1000
+    for index in range(config["warmup"]):
+        _run_turn(name, agent, index)
+
+    runs = [_run_level(name, agent, counter, n, config["turns"]) for n in config["concurrency"]]
+    return {"agent": name, "init_ms": round(init_ms, 1), "peak_rss_mb": _peak_rss_mb(), "runs": runs}
+
+
+def measure_agent(name: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """在独立子进程中测量一个智能体"""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-agent", name, "--config", json.dumps(config)],
+        cwd=PROJECT_ROOT, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"智能体 {name} 基准失败:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """与基线结果逐项对比，返回各智能体/并发度下指标的变化百分比"""
+    base_runs = {
+        (agent["agent"], run["concurrency"]): run for agent in baseline["agents"] for run in agent["runs"]
+    }
+    rows = []
+    for agent in report["agents"]:
+        for run in agent["runs"]:
+            base = base_runs.get((agent["agent"], run["concurrency"]))
+            if base is None:
+                continue
+            for metric in COMPARED_METRICS + ["throughput_per_s"]:
+                before, after = base[metric], run[metric]
+                rows.append({
+                    "agent": agent["agent"], "concurrency": run["concurrency"], "metric": metric,
+                    "before": before, "after": after,
+                    "change_pct": round((after - before) / before * 100, 1) if before else None,
+                })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="simple / rag / advanced 智能体离线基准")
+    parser.add_argument("--agents", nargs="+", choices=AGENTS, default=AGENTS, help="测量的智能体")
+    parser.add_argument("--turns", type=int, default=40, help="每个并发度下执行的诊断轮数")
+    parser.add_argument("--warmup", type=int, default=2, help="不计入统计的预热轮数")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8], help="并发诊断数")
+    parser.add_argument("--llm-latency", default="lognormal:0.05:0.5", help="LLM调用耗时分布（秒），见 LatencyDistribution")
+    parser.add_argument("--retrieval-latency", default="uniform:0.005:0.015", help="检索耗时分布（秒）")
+    parser.add_argument("--seed", type=int, default=42, help="延迟分布的随机种子")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    parser.add_argument("--output", help="把JSON结果写入文件（用于和其他提交对比）")
+    parser.add_argument("--baseline", help="与之前保存的JSON结果对比")
+    parser.add_argument("--run-agent", choices=AGENTS, help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_agent:
+        print(json.dumps(run_agent(args.run_agent, json.loads(args.config))))
+        return
+
+    config = {
+        "turns": args.turns, "warmup": args.warmup, "concurrency": args.concurrency,
+        "llm_latency": args.llm_latency, "retrieval_latency": args.retrieval_latency, "seed": args.seed,
+    }
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "config": config,
+        "agents": [measure_agent(name, config) for name in args.agents],
+    }
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["comparison"] = {"baseline_commit": baseline.get("commit"), "rows": compare(report, baseline)}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, sort_keys=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False, sort_keys=True))
+        return
+
+    print("🤖 智能体离线基准")
+    print("=" * 90)
+    print(f"提交: {report['commit']}    LLM延迟: {args.llm_latency}    检索延迟: {args.retrieval_latency}\n")
+    print(
+        f"{'智能体':<10}{'并发':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'吞吐(/s)':>10}"
+        f"{'LLM调用/轮':>12}{'token/轮':>10}{'峰值RSS(MB)':>13}"
+    )
+    for agent in report["agents"]:
+        for run in agent["runs"]:
+            print(
+                f"{agent['agent']:<10}{run['concurrency']:>6}{run['p50_ms']:>10}{run['p95_ms']:>10}{run['p99_ms']:>10}"
+                f"{run['throughput_per_s']:>10}{run['llm_calls_per_turn']:>12}{run['tokens_per_turn']:>10}"
+                f"{agent['peak_rss_mb']:>13}"
+            )
+
+    if args.baseline:
+        print(f"\n与基线 {report['comparison']['baseline_commit']} 对比（变化超过10%的指标）:")
+        for row in report["comparison"]["rows"]:
+            if row["change_pct"] is not None and abs(row["change_pct"]) >= 10:
+                print(
+                    f"  {row['agent']:<10} 并发{row['concurrency']:<4} {row['metric']:<20}"
+                    f"{row['before']:>10} -> {row['after']:<10} ({row['change_pct']:+.1f}%)"
+                )
+
+
+if __name__ == "__main__":
+    main()
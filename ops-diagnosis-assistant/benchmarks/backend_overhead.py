@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+执行后端开销基准 - 比较 celery / embedded 两种执行后端下，一次诊断请求相对直接调用智能体多出的耗时
+
+每种后端分别启动一个API进程（celery模式另启动一个Worker进程），智能体替换为桩模型和桩检索器
+（benchmarks/stubs.py），不需要Ollama和Elasticsearch，但需要本地Redis。
+一次请求的耗时 = POST /diagnose/async → GET /tasks/{id}?wait= 长轮询到完成 → GET /sessions/{id}/turns 取回结果。
+
+用法:
+    python benchmarks/backend_overhead.py
+    python benchmarks/backend_overhead.py --backend embedded --requests 50 --llm-latency 0.02
+    python benchmarks/backend_overhead.py --json
+"""
+import io
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+from typing import Dict, Any, List
+
+import requests
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+USER_INPUT = "生产环境订单服务CPU使用率持续95%以上，接口大量超时"
+API_KEY = "backend-overhead-bench"
+BACKENDS = ["celery", "embedded"]
+
+
+def _use_stub_agent(llm_latency: float, retrieval_latency: float):
+    """把诊断任务使用的智能体替换为桩智能体（API进程与Worker进程都在启动前调用）"""
+    from benchmarks.concurrency import build_agent
+    from src.tasks import diagnosis_tasks
+
+    agent = build_agent(llm_latency, retrieval_latency)
+    diagnosis_tasks.get_diagnosis_agent = lambda: agent
+
+
+def serve_api(port: int, llm_latency: float, retrieval_latency: float):
+    import uvicorn
+
+    _use_stub_agent(llm_latency, retrieval_latency)
+    from src.api.advanced_main import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def serve_worker(llm_latency: float, retrieval_latency: float):
+    _use_stub_agent(llm_latency, retrieval_latency)
+    from src.celery_app import celery_app
+    celery_app.worker_main([
+        "worker", "-Q", "priority,llm", "-n", f"bench-{os.getpid()}@%h",
+        "--pool", "threads", "--concurrency", "4", "--loglevel", "warning",
+    ])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def measure_direct(n: int, llm_latency: float, retrieval_latency: float) -> List[float]:
+    """直接调用智能体的耗时（毫秒），作为基线"""
+    from benchmarks.concurrency import build_agent
+
+    agent = build_agent(llm_latency, retrieval_latency)
+    samples = []
+    with redirect_stdout(io.StringIO()):
+        for i in range(n):
+            start = time.perf_counter()
+            agent.diagnose(USER_INPUT, f"direct-{i}")
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _wait_until_healthy(base_url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"API在{timeout}s内未就绪: {base_url}")
+
+
+def measure_backend(backend: str, n: int, warmup: int, llm_latency: float, retrieval_latency: float) -> List[float]:
+    """启动指定后端的API（及Worker），返回每个请求端到端的耗时（毫秒）"""
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "EXECUTION_BACKEND": backend, "API_KEY": API_KEY, "WORKER_WARMUP": "false", "RATE_LIMIT_PER_MINUTE": "0"}
+    stub_args = ["--llm-latency", str(llm_latency), "--retrieval-latency", str(retrieval_latency)]
+    script = os.path.abspath(__file__)
+
+    processes = [subprocess.Popen(
+        [sys.executable, script, "--serve-api", str(port), *stub_args],
+        cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )]
+    if backend == "celery":
+        processes.append(subprocess.Popen(
+            [sys.executable, script, "--serve-worker", *stub_args],
+            cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+
+    headers = {"X-API-Key": API_KEY}
+    samples = []
+    try:
+        _wait_until_healthy(base_url)
+        with requests.Session() as http:
+            for i in range(warmup + n):
+                start = time.perf_counter()
+                submitted = http.post(
+                    f"{base_url}/diagnose/async", headers=headers,
+                    json={"message": USER_INPUT, "session_id": f"bench-{backend}-{time.time_ns()}"},
+                ).json()
+                status = http.get(f"{base_url}/tasks/{submitted['task_id']}", headers=headers, params={"wait": 30}).json()
+                if status["status"] != "SUCCESS":
+                    raise RuntimeError(f"任务未成功完成: {status}")
+                http.get(f"{base_url}/sessions/{submitted['session_id']}/turns", headers=headers, params={"since": 0})
+                if i >= warmup:
+                    samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="执行后端（celery / embedded）每请求开销基准")
+    parser.add_argument("--backend", choices=BACKENDS + ["all"], default="all", help="执行后端")
+    parser.add_argument("--requests", type=int, default=30, help="每种后端测量的请求数")
+    parser.add_argument("--warmup", type=int, default=3, help="不计入统计的预热请求数")
+    parser.add_argument("--llm-latency", type=float, default=0.01, help="每次LLM调用的模拟耗时（秒）")
+    parser.add_argument("--retrieval-latency", type=float, default=0.005, help="每次检索的模拟耗时（秒）")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    parser.add_argument("--serve-api", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    parser.add_argument("--serve-worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_api:
+        return serve_api(args.serve_api, args.llm_latency, args.retrieval_latency)
+    if args.serve_worker:
+        return serve_worker(args.llm_latency, args.retrieval_latency)
+
+    direct = measure_direct(args.requests, args.llm_latency, args.retrieval_latency)
+    direct_p50 = statistics.median(direct)
+    backends = BACKENDS if args.backend == "all" else [args.backend]
+    reports: List[Dict[str, Any]] = []
+    for backend in backends:
+        samples = measure_backend(backend, args.requests, args.warmup, args.llm_latency, args.retrieval_latency)
+        reports.append({
+            "backend": backend,
+            "requests": len(samples),
+            "p50_ms": round(statistics.median(samples), 1),
+            "p95_ms": round(_percentile(samples, 95), 1),
+            "overhead_p50_ms": round(statistics.median(samples) - direct_p50, 1),
+            "overhead_p95_ms": round(_percentile(samples, 95) - direct_p50, 1),
+        })
+
+    if args.json:
+        print(json.dumps({"direct_p50_ms": round(direct_p50, 1), "runs": reports}, indent=2, ensure_ascii=False))
+        return
+
+    print("⚙️ 执行后端开销基准")
+    print("=" * 60)
+    print(f"直接调用智能体: p50 {direct_p50:.1f} ms\n")
+    print(f"{'后端':<10}{'请求数':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'开销p50(ms)':>14}{'开销p95(ms)':>14}")
+    for r in reports:
+        print(
+            f"{r['backend']:<10}{r['requests']:>8}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+            f"{r['overhead_p50_ms']:>14}{r['overhead_p95_ms']:>14}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+并发诊断基准测试 - 同一个智能体实例在线程池 / asyncio 下并发执行诊断，统计吞吐与每个并发诊断的内存开销
+
+使用桩模型和桩检索器（benchmarks/stubs.py），LLM/ES延迟通过参数模拟，不需要Ollama和Elasticsearch。
+
+用法:
+    python benchmarks/concurrency.py
+    python benchmarks/concurrency.py --concurrency 1 8 32 --llm-latency 0.2
+    python benchmarks/concurrency.py --mode threads --json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+USER_INPUT = "生产环境订单服务CPU使用率持续95%以上，接口大量超时"
+
+
+def _current_rss_mb() -> float:
+    """当前进程常驻内存（Linux读取/proc，其他平台返回0）"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def build_agent(llm_latency: float, retrieval_latency: float):
+    from benchmarks.stubs import StubChatModel, StubRetriever
+    from src.core.advanced_agent import AdvancedDiagnosisAgent
+
+    return AdvancedDiagnosisAgent(
+        debug_mode=False,
+        llm=StubChatModel(latency=llm_latency),
+        retriever=StubRetriever(latency=retrieval_latency),
+    )
+
+
+def measure_agent_footprint(llm_latency: float, retrieval_latency: float) -> Dict[str, Any]:
+    """单个智能体实例的内存（prefork下每个子进程各持有一份，线程/asyncio下整个进程共享一份）"""
+    build_agent(llm_latency, retrieval_latency)  # 先完成惰性导入，只统计实例本身
+    tracemalloc.start()
+    agent = build_agent(llm_latency, retrieval_latency)
+    agent_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {"agent": agent, "agent_kb": round(agent_bytes / 1024, 1), "process_rss_mb": round(_current_rss_mb(), 1)}
+
+
+def _run_threads(agent, concurrency: int):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(agent.diagnose, USER_INPUT, f"bench-{i}") for i in range(concurrency)]
+        return [f.result() for f in futures]
+
+
+def _run_asyncio(agent, concurrency: int):
+    async def run_all():
+        # 同步节点由事件循环的默认线程池执行，线程数不足会限制并发
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+        return await asyncio.gather(*(agent.adiagnose(USER_INPUT, f"bench-{i}") for i in range(concurrency)))
+
+    return asyncio.run(run_all())
+
+
+RUNNERS = {"threads": _run_threads, "asyncio": _run_asyncio}
+
+
+def run_concurrent(agent, mode: str, concurrency: int) -> Dict[str, Any]:
+    """并发执行 concurrency 个诊断，返回耗时、吞吐与内存峰值"""
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    results = RUNNERS[mode](agent, concurrency)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    failed = sum(1 for response, state in results if state.get("diagnosis_stage") != "confirmation")
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(concurrency / elapsed, 2),
+        "peak_kb": round((peak - baseline) / 1024, 1),
+        "per_diagnosis_kb": round((peak - baseline) / 1024 / concurrency, 1),
+        "incomplete": failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发诊断吞吐与内存基准")
+    parser.add_argument("--mode", choices=["threads", "asyncio", "all"], default="all", help="并发方式")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="并发诊断数")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="每次LLM调用的模拟耗时（秒）")
+    parser.add_argument("--retrieval-latency", type=float, default=0.01, help="每次检索的模拟耗时（秒）")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    args = parser.parse_args()
+
+    footprint = measure_agent_footprint(args.llm_latency, args.retrieval_latency)
+    agent = footprint.pop("agent")
+    modes = list(RUNNERS) if args.mode == "all" else [args.mode]
+    reports = [run_concurrent(agent, mode, n) for mode in modes for n in args.concurrency]
+
+    if args.json:
+        print(json.dumps({"footprint": footprint, "runs": reports}, indent=2, ensure_ascii=False))
+        return
+
+    print("🧵 并发诊断基准")
+    print("=" * 60)
+    print(f"智能体实例: {footprint['agent_kb']} KB    进程RSS: {footprint['process_rss_mb']} MB")
+    print(f"（prefork 下 N 个并发需要 N 个子进程，约 N × {footprint['process_rss_mb']} MB）\n")
+    print(f"{'方式':<8}{'并发':>6}{'耗时(s)':>10}{'吞吐(/s)':>10}{'峰值(KB)':>12}{'每诊断(KB)':>12}{'未完成':>8}")
+    for r in reports:
+        print(
+            f"{r['mode']:<8}{r['concurrency']:>6}{r['elapsed_s']:>10}{r['throughput_per_s']:>10}"
+            f"{r['peak_kb']:>12}{r['per_diagnosis_kb']:>12}{r['incomplete']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
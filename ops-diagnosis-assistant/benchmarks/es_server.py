@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Elasticsearch 替身服务 - 只实现 KnowledgeRetriever 用到的接口（ping、_search、_msearch），
+故障案例保存在内存倒排索引中，整套服务把 ELASTICSEARCH_HOST/PORT 指向它即可离线压测。
+
+- multi_match: 查询按字（中文）/ 单词（英文、数字）切分，按字段权重（symptoms^3 等）与词的IDF累加得分，
+  minimum_should_match 为百分比时要求命中的查询词比例；fuzziness（AUTO 或编辑距离）扫描字段词表中长度相近的词，
+  每个查询词最多扩展50个相近词（扩展结果缓存）
+- term: 字段值完全相等（预热时按 frequency 取高频故障）
+- 每个请求的处理延迟: --latency，LatencyDistribution 格式
+- GET /stub/stats 返回案例数、索引词数、建索引耗时与进程峰值RSS
+
+用法:
+    python benchmarks/es_server.py --port 9201
+    python benchmarks/es_server.py --port 9201 --cases data/synthetic_cases.jsonl --latency lognormal:0.01:0.5
+    ELASTICSEARCH_HOST=127.0.0.1 ELASTICSEARCH_PORT=9201 python run_celery_worker.py llm
+"""
+import os
+import re
+import sys
+import json
+import math
+import heapq
+import time
+import asyncio
+import argparse
+import logging
+import resource
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+from benchmarks.stubs import LatencyDistribution, SAMPLE_CASES
+
+logger = logging.getLogger(__name__)
+
+# 中文按单字切分，英文/数字按单词切分（小写）
+_TOKEN_PATTERN = re.compile(r"[a-z0-9_]+|[一-鿿]")
+# 建立索引的字段（其余字段只保存在 _source 中）
+TEXT_FIELDS = ["fault_type", "symptoms", "root_cause", "solution", "combined_text"]
+# 与ES一致: 每个查询词的模糊扩展数上限（max_expansions）
+MAX_EXPANSIONS = 50
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(str(text).lower())
+
+
+def max_edits(fuzziness: Any, token: str) -> int:
+    """ES的 fuzziness: AUTO 时词长1-2不允许编辑、3-5允许1次、更长允许2次"""
+    if str(fuzziness).upper() == "AUTO":
+        return 0 if len(token) <= 2 else 1 if len(token) <= 5 else 2
+    return int(fuzziness)
+
+
+def within_edits(a: str, b: str, limit: int) -> bool:
+    """a、b 的编辑距离（Damerau，含相邻交换）是否不超过 limit"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return False
+    return current[-1] <= limit
+
+
+class InMemoryIndex:
+    """按字段的倒排索引: 字段 -> 词 -> 文档序号列表"""
+
+    def __init__(self, cases: Iterable[Dict[str, Any]]):
+        self.docs: List[Dict[str, Any]] = []
+        self.postings: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+        # 模糊匹配用: 字段 -> 词长 -> 词表（首次模糊查询时建立），以及查询词的扩展结果缓存
+        self._terms_by_length: Dict[str, Dict[int, List[str]]] = {}
+        self._expansions: Dict[tuple, List[str]] = {}
+        for case in cases:
+            self.add(case)
+
+    def add(self, case: Dict[str, Any]):
+        doc_id = len(self.docs)
+        source = dict(case)
+        source.setdefault("combined_text", " ".join(str(case.get(field, "")) for field in ("fault_type", "symptoms", "root_cause")))
+        self.docs.append(source)
+        self._terms_by_length.clear()
+        self._expansions.clear()
+        for field in TEXT_FIELDS:
+            for token in set(tokenize(source.get(field, ""))):
+                self.postings[field][token].append(doc_id)
+
+    def _idf(self, field: str, token: str) -> float:
+        df = len(self.postings[field].get(token, ()))
+        return math.log(1 + (len(self.docs) - df + 0.5) / (df + 0.5))
+
+    def _expand(self, field: str, token: str, fuzziness: Any) -> List[str]:
+        """查询词在字段词表中的模糊匹配（包括自身）"""
+        edits = max_edits(fuzziness, token) if fuzziness else 0
+        if not edits:
+            return [token]
+        key = (field, token, edits)
+        if key not in self._expansions:
+            if field not in self._terms_by_length:
+                by_length = defaultdict(list)
+                for term in self.postings[field]:
+                    by_length[len(term)].append(term)
+                self._terms_by_length[field] = by_length
+            terms = [token] if token in self.postings[field] else []
+            for length in range(len(token) - edits, len(token) + edits + 1):
+                for term in self._terms_by_length[field].get(length, ()):
+                    if len(terms) >= MAX_EXPANSIONS:
+                        break
+                    if term != token and within_edits(token, term, edits):
+                        terms.append(term)
+            self._expansions[key] = terms
+        return self._expansions[key]
+
+    def _multi_match(self, spec: Dict[str, Any]) -> Dict[int, float]:
+        tokens = list(dict.fromkeys(tokenize(spec.get("query", ""))))
+        fields = [(field, float(boost or 1)) for field, _, boost in
+                  (field_spec.partition("^") for field_spec in spec.get("fields") or TEXT_FIELDS)]
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, int] = defaultdict(int)
+        for token in tokens:
+            touched = set()
+            for field, boost in fields:
+                terms = self._expand(field, token, spec.get("fuzziness"))
+                if len(terms) == 1:
+                    postings = self.postings[field].get(terms[0], ())
+                    weight = boost * self._idf(field, terms[0])
+                    for doc_id in postings:
+                        scores[doc_id] += weight
+                    touched.update(postings)
+                    continue
+                # 同一查询词的多个模糊匹配词，每个文档只取得分最高的一个
+                best: Dict[int, float] = {}
+                for term in terms:
+                    weight = boost * self._idf(field, term)
+                    for doc_id in self.postings[field].get(term, ()):
+                        if weight > best.get(doc_id, 0):
+                            best[doc_id] = weight
+                for doc_id, weight in best.items():
+                    scores[doc_id] += weight
+                touched.update(best)
+            for doc_id in touched:
+                matched[doc_id] += 1
+
+        minimum = str(spec.get("minimum_should_match") or "")
+        if minimum and tokens:
+            # 与ES一致: 百分比向下取整
+            required = int(float(minimum[:-1]) / 100 * len(tokens)) if minimum.endswith("%") else int(minimum)
+            scores = {doc_id: score for doc_id, score in scores.items() if matched[doc_id] >= required}
+        return scores
+
+    def _term(self, spec: Dict[str, Any]) -> Dict[int, float]:
+        (field, value), = spec.items()
+        value = value.get("value") if isinstance(value, dict) else value
+        return {doc_id: 1.0 for doc_id, doc in enumerate(self.docs) if doc.get(field) == value}
+
+    def search(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        query = (body or {}).get("query") or {"match_all": {}}
+        if "multi_match" in query:
+            scores = self._multi_match(query["multi_match"])
+        elif "term" in query:
+            scores = self._term(query["term"])
+        else:
+            scores = {doc_id: 1.0 for doc_id in range(len(self.docs))}
+
+        size = int(body.get("size", 10))
+        top = heapq.nsmallest(size, scores.items(), key=lambda item: (-item[1], item[0]))
+        fields = body.get("_source")
+        hits = []
+        for doc_id, score in top:
+            doc = self.docs[doc_id]
+            source = {key: doc[key] for key in fields if key in doc} if isinstance(fields, list) else doc
+            hits.append({"_index": "fault_cases", "_id": str(doc.get("id", doc_id)), "_score": round(score, 4), "_source": source})
+        return {
+            "took": 0, "timed_out": False,
+            "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+            "hits": {"total": {"value": len(scores), "relation": "eq"}, "max_score": top[0][1] if top else None, "hits": hits},
+        }
+
+
+def load_cases(path: Optional[str]) -> List[Dict[str, Any]]:
+    """JSON列表或JSONL文件；未指定时使用桩检索器的示例案例"""
+    if not path:
+        return [dict(case) for case in SAMPLE_CASES]
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def create_app(index: InMemoryIndex, latency: LatencyDistribution, build_seconds: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Elasticsearch stand-in")
+
+    @app.middleware("http")
+    async def elastic_product_header(request: Request, call_next):
+        # elasticsearch-py 8 只接受带有该头部的响应
+        response = await call_next(request)
+        response.headers["X-Elastic-Product"] = "Elasticsearch"
+        return response
+
+    @app.head("/")
+    async def ping():
+        return Response(status_code=200)
+
+    @app.get("/")
+    async def info():
+        return {"name": "es-stand-in", "cluster_name": "stub", "version": {"number": "8.11.0"}, "tagline": "You Know, for Search"}
+
+    @app.post("/{index_name}/_search")
+    @app.get("/{index_name}/_search")
+    async def search(index_name: str, request: Request):
+        body = json.loads(await request.body() or b"{}")
+        await asyncio.sleep(latency.sample())
+        return JSONResponse(index.search(body))
+
+    @app.post("/{index_name}/_msearch")
+    async def msearch(index_name: str, request: Request):
+        lines = [json.loads(line) for line in (await request.body()).decode("utf-8").splitlines() if line.strip()]
+        await asyncio.sleep(latency.sample())
+        return JSONResponse({"took": 0, "responses": [{**index.search(body), "status": 200} for body in lines[1::2]]})
+
+    @app.get("/stub/stats")
+    async def stats():
+        # Linux 上 ru_maxrss 单位为KB
+        return {
+            "docs": len(index.docs), "terms": sum(len(terms) for terms in index.postings.values()),
+            "build_seconds": round(build_seconds, 2),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+    return app
+
+
+def main():
+    from src.core.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Elasticsearch 替身服务（内存倒排索引，用于离线压测）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9201)
+    parser.add_argument("--cases", help="故障案例文件（JSON列表或JSONL），默认使用桩检索器的示例案例")
+    parser.add_argument("--latency", default="0.002", help="每个请求的处理延迟分布（秒），见 LatencyDistribution")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    setup_logging()
+    start = time.perf_counter()
+    index = InMemoryIndex(load_cases(args.cases))
+    build_seconds = time.perf_counter() - start
+    logger.info(f"🔎 Elasticsearch替身服务: http://{args.host}:{args.port} ({len(index.docs)} 条案例，建索引 {build_seconds:.1f}s)")
+    app = create_app(index, LatencyDistribution.parse(args.latency, args.seed), build_seconds)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+启动耗时基准测试 - 基于 `python -X importtime` 统计各入口模块的冷导入耗时
+
+用法:
+    python benchmarks/import_time.py                     # 测量所有入口
+    python benchmarks/import_time.py src.api.advanced_main --top 15
+    python benchmarks/import_time.py --json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Dict, Any, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 需要测量的启动入口
+ENTRY_MODULES = [
+    "src.api.advanced_main",
+    "src.celery_app",
+    "src.tasks.diagnosis_tasks",
+    "src.core.advanced_agent",
+]
+
+# 入口模块不应在导入时就加载的重量级依赖
+HEAVY_MODULES = {
+    "langchain",
+    "langchain_core",
+    "langchain_ollama",
+    "langgraph",
+    "elasticsearch",
+}
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """解析 -X importtime 输出为 [{module, self_us, cumulative_us, depth}]"""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        self_us, cumulative_us, name = fields
+        records.append({
+            "module": name.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            # 缩进表示嵌套导入的深度
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+        })
+    return records
+
+
+def measure_import_time(module: str, repeat: int = 3) -> Dict[str, Any]:
+    """
+    在全新子进程中导入模块，返回冷导入耗时统计
+
+    Args:
+        module: 需要导入的模块路径
+        repeat: 重复次数（取中位数，降低抖动）
+
+    Returns:
+        包含中位数耗时、最慢模块和已加载的重量级依赖的统计结果
+    """
+    runs = []
+    records = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr[-2000:]}")
+        records = parse_importtime(proc.stderr)
+        target = [r for r in records if r["module"] == module]
+        runs.append(target[-1]["cumulative_us"] if target else sum(r["self_us"] for r in records))
+
+    loaded = {r["module"] for r in records}
+    heavy_loaded = sorted(
+        name for name in loaded
+        if name.split(".")[0] in HEAVY_MODULES
+    )
+    top_level_heavy = sorted({name.split(".")[0] for name in heavy_loaded})
+    slowest = sorted(records, key=lambda r: r["self_us"], reverse=True)
+
+    return {
+        "module": module,
+        "cumulative_ms": statistics.median(runs) / 1000,
+        "runs_ms": [r / 1000 for r in runs],
+        "module_count": len(records),
+        "heavy_modules": top_level_heavy,
+        "slowest": [
+            {"module": r["module"], "self_ms": r["self_us"] / 1000, "cumulative_ms": r["cumulative_us"] / 1000}
+            for r in slowest
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="入口模块冷导入耗时基准")
+    parser.add_argument("modules", nargs="*", default=ENTRY_MODULES, help="需要测量的模块")
+    parser.add_argument("--repeat", type=int, default=3, help="每个模块重复测量次数")
+    parser.add_argument("--top", type=int, default=10, help="展示自身耗时最高的N个模块")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    args = parser.parse_args()
+
+    reports = [measure_import_time(m, repeat=args.repeat) for m in args.modules]
+
+    if args.json:
+        for report in reports:
+            report["slowest"] = report["slowest"][:args.top]
+        print(json.dumps(reports, indent=2, ensure_ascii=False))
+        return
+
+    print("⏱️  入口模块冷导入耗时")
+    print("=" * 60)
+    for report in reports:
+        print(f"\n📦 {report['module']}")
+        print(f"   中位耗时: {report['cumulative_ms']:.1f} ms  (各次: {', '.join(f'{r:.1f}' for r in report['runs_ms'])})")
+        print(f"   加载模块数: {report['module_count']}")
+        if report["heavy_modules"]:
+            print(f"   ⚠️ 已加载重量级依赖: {', '.join(report['heavy_modules'])}")
+        else:
+            print("   ✅ 未加载重量级依赖")
+        for item in report["slowest"][:args.top]:
+            print(f"      {item['self_ms']:8.1f} ms  {item['module']}")
+
+
+if __name__ == "__main__":
+    main()
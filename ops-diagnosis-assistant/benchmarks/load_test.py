@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+诊断API端到端压测 - asyncio 开环负载：请求按泊松过程到达（不等待前面的请求完成），按阶梯提高到达率，
+找出吞吐不再随负载增长的拐点
+
+一次请求 = POST /diagnose/async → 等待任务完成（/ws/tasks/{id} 推送，或 /tasks/{id}?wait= 长轮询）
+→ GET /sessions/{id}/turns 取回结果。每个会话按脚本进行多轮对话，到达的请求按 --continue-ratio
+继续一个空闲会话的下一轮，否则开始新会话。
+
+统计每个阶段的到达率、成功吞吐、端到端延迟分位数与错误分类（429/503/其他HTTP错误/任务失败/超时/连接错误）。
+拐点: 第一个成功吞吐低于到达率90%、错误率超过5%，或 p95 超过第一阶段3倍的阶段。
+
+--spawn 在本机启动 Ollama替身（benchmarks/ollama_server.py）、ES替身（benchmarks/es_server.py）和API
+（embedded执行后端；--backend celery 时另启动Worker），只需要本地Redis。
+
+用法:
+    python benchmarks/load_test.py --spawn --stages 1:30 2:30 4:30 8:30
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8000 --api-key $API_KEY --stages 2:60 --completion poll
+    python benchmarks/load_test.py --spawn --stages 2:20 4:20 --output load.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import statistics
+import subprocess
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.backend_overhead import _percentile, _free_port
+
+API_KEY = "load-test"
+TERMINAL_STATUSES = {"SUCCESS", "FAILURE", "REVOKED"}
+
+# 每个会话的多轮对话脚本（最后一轮确认问题已解决）
+DEFAULT_SCRIPTS = [
+    ["生产环境订单服务CPU使用率持续95%以上，接口大量超时", "从今天早上9点开始，所有用户都受影响", "解决"],
+    ["服务器内存不足，频繁出现OOM错误", "Java应用，堆内存配置4G", "解决"],
+    ["磁盘空间满了，应用报错No space left on device", "解决"],
+    ["数据库连接池满了，无法获取新连接"],
+]
+
+
+def parse_stages(specs: List[str]) -> List[Dict[str, float]]:
+    """阶段 "到达率:秒数"，例如 ["1:30", "2:30"] -> 每秒1个请求持续30秒，再每秒2个请求持续30秒"""
+    stages = []
+    for spec in specs:
+        rate, duration = spec.split(":")
+        stages.append({"rate": float(rate), "duration": float(duration)})
+    return stages
+
+
+def arrival_times(stages: List[Dict[str, float]], seed: int) -> List[tuple]:
+    """泊松到达: 各阶段内请求间隔服从指数分布，返回 [(相对开始的秒数, 阶段序号), ...]"""
+    rng = random.Random(seed)
+    arrivals, stage_start = [], 0.0
+    for index, stage in enumerate(stages):
+        t = stage_start
+        while stage["rate"] > 0:
+            t += rng.expovariate(stage["rate"])
+            if t >= stage_start + stage["duration"]:
+                break
+            arrivals.append((t, index))
+        stage_start += stage["duration"]
+    return arrivals
+
+
+def classify_http_error(status_code: int) -> str:
+    if status_code in (429, 503):
+        return f"http_{status_code}"
+    return "http_5xx" if status_code >= 500 else "http_4xx"
+
+
+class SessionPool:
+    """空闲的进行中会话（上一轮已完成、脚本还有下一轮）"""
+
+    def __init__(self, scripts: List[List[str]], continue_ratio: float, rng: random.Random):
+        self.scripts = scripts
+        self.continue_ratio = continue_ratio
+        self.rng = rng
+        self.idle: List[Dict[str, Any]] = []
+        self.created = 0
+
+    def next_turn(self) -> Dict[str, Any]:
+        if self.idle and self.rng.random() < self.continue_ratio:
+            return self.idle.pop(self.rng.randrange(len(self.idle)))
+        self.created += 1
+        return {"session_id": f"load-{os.getpid()}-{self.created}", "script": self.rng.choice(self.scripts), "turn": 0}
+
+    def release(self, session: Dict[str, Any]):
+        session["turn"] += 1
+        if session["turn"] < len(session["script"]):
+            self.idle.append(session)
+
+
+class LoadGenerator:
+    def __init__(self, base_url: str, api_key: str, completion: str, timeout: float, sessions: SessionPool):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"X-API-Key": api_key}
+        self.api_key = api_key
+        self.completion = completion
+        self.timeout = timeout
+        self.sessions = sessions
+        self.records: List[Dict[str, Any]] = []
+
+    async def _wait_poll(self, http: httpx.AsyncClient, task_id: str) -> str:
+        while True:
+            status = (await http.get(f"/tasks/{task_id}", params={"wait": 30}, timeout=40)).json()
+            if status["status"] in TERMINAL_STATUSES:
+                return status["status"]
+
+    async def _wait_push(self, task_id: str) -> str:
+        import websockets
+
+        url = f"{self.base_url.replace('http', 'ws', 1)}/ws/tasks/{task_id}?api_key={self.api_key}"
+        async with websockets.connect(url) as ws:
+            async for raw in ws:
+                event = json.loads(raw)
+                if event["type"] == "snapshot" and event["status"] in TERMINAL_STATUSES:
+                    return event["status"]
+                if event["type"] in ("success", "failure"):
+                    return "SUCCESS" if event["type"] == "success" else "FAILURE"
+        # 服务端关闭连接但没有终态事件时改为长轮询
+        return None
+
+    async def run_request(self, http: httpx.AsyncClient, stage: int):
+        session = self.sessions.next_turn()
+        record = {"stage": stage, "turn": session["turn"], "continued": session["turn"] > 0}
+        start = time.perf_counter()
+        try:
+            response = await http.post("/diagnose/async", json={
+                "message": session["script"][session["turn"]], "session_id": session["session_id"]
+            })
+            record["submit_ms"] = (time.perf_counter() - start) * 1000
+            if response.status_code != 200:
+                record["outcome"] = classify_http_error(response.status_code)
+                return
+            task_id = response.json()["task_id"]
+
+            async def wait():
+                status = await self._wait_push(task_id) if self.completion == "ws" else None
+                return status or await self._wait_poll(http, task_id)
+
+            status = await asyncio.wait_for(wait(), self.timeout)
+            if status != "SUCCESS":
+                record["outcome"] = "task_failure"
+                return
+            await http.get(f"/sessions/{session['session_id']}/turns", params={"since": session["turn"]})
+            record["outcome"] = "ok"
+            record["e2e_ms"] = (time.perf_counter() - start) * 1000
+            self.sessions.release(session)
+        except asyncio.TimeoutError:
+            record["outcome"] = "timeout"
+        except (httpx.TransportError, OSError) as e:
+            record["outcome"] = "connection_error"
+            record["error"] = type(e).__name__
+        finally:
+            self.records.append(record)
+
+    async def run(self, stages: List[Dict[str, float]], seed: int) -> float:
+        """按到达时间发出请求（开环：不等待之前的请求），返回最后一个请求完成的时刻"""
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+        async with httpx.AsyncClient(base_url=self.base_url, headers=self.headers, limits=limits, timeout=30) as http:
+            start = time.perf_counter()
+            tasks = []
+            for at, stage in arrival_times(stages, seed):
+                delay = at - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self.run_request(http, stage)))
+            await asyncio.gather(*tasks)
+            return time.perf_counter() - start
+
+
+def summarize(records: List[Dict[str, Any]], stages: List[Dict[str, float]]) -> List[Dict[str, Any]]:
+    reports = []
+    for index, stage in enumerate(stages):
+        stage_records = [r for r in records if r["stage"] == index]
+        latencies = [r["e2e_ms"] for r in stage_records if r["outcome"] == "ok"]
+        errors = Counter(r["outcome"] for r in stage_records if r["outcome"] != "ok")
+        report = {
+            "stage": index, "rate": stage["rate"], "duration_s": stage["duration"],
+            "requests": len(stage_records), "ok": len(latencies),
+            "continued": sum(1 for r in stage_records if r["continued"]),
+            # 成功吞吐: 本阶段到达的请求中成功完成的个数 / 阶段时长
+            "goodput_per_s": round(len(latencies) / stage["duration"], 2),
+            "error_rate": round(sum(errors.values()) / len(stage_records), 3) if stage_records else 0.0,
+            "errors": dict(errors),
+        }
+        if latencies:
+            report.update({
+                "p50_ms": round(statistics.median(latencies), 1),
+                "p95_ms": round(_percentile(latencies, 95), 1),
+                "p99_ms": round(_percentile(latencies, 99), 1),
+            })
+        submits = [r["submit_ms"] for r in stage_records if "submit_ms" in r]
+        if submits:
+            report["submit_p50_ms"] = round(statistics.median(submits), 1)
+        reports.append(report)
+    return reports
+
+
+def find_knee(reports: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """第一个饱和的阶段: 成功吞吐 < 90%到达率、错误率 > 5%，或 p95 超过第一阶段的3倍"""
+    base_p95 = next((r["p95_ms"] for r in reports if "p95_ms" in r), None)
+    for report in reports:
+        reasons = []
+        if report["goodput_per_s"] < 0.9 * report["rate"]:
+            reasons.append("goodput")
+        if report["error_rate"] > 0.05:
+            reasons.append("errors")
+        if base_p95 and report.get("p95_ms", 0) > 3 * base_p95:
+            reasons.append("latency")
+        if reasons:
+            return {"stage": report["stage"], "rate": report["rate"], "reasons": reasons}
+    return None
+
+
+def spawn_stack(backend: str, ollama_args: List[str]) -> tuple:
+    """启动 Ollama替身、ES替身与API（及Worker），返回 (API地址, 进程列表)"""
+    ollama_port, es_port, api_port = _free_port(), _free_port(), _free_port()
+    env = {
+        **os.environ, "OLLAMA_BASE_URL": f"http://127.0.0.1:{ollama_port}",
+        "ELASTICSEARCH_HOST": "127.0.0.1", "ELASTICSEARCH_PORT": str(es_port),
+        "EXECUTION_BACKEND": backend, "API_KEY": API_KEY, "RATE_LIMIT_PER_MINUTE": "0",
+        "WORKER_WARMUP": "false", "LOG_LEVEL": "WARNING",
+    }
+    def start(*command):
+        return subprocess.Popen([sys.executable, *command], cwd=PROJECT_ROOT, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    processes = [
+        start("benchmarks/ollama_server.py", "--port", str(ollama_port), *ollama_args),
+        start("benchmarks/es_server.py", "--port", str(es_port)),
+        start("-m", "uvicorn", "src.api.advanced_main:app", "--host", "127.0.0.1", "--port", str(api_port), "--log-level", "warning"),
+    ]
+    if backend == "celery":
+        processes.append(start("-m", "celery", "-A", "src.celery_app", "worker", "-Q", "priority,llm",
+                               "-n", f"load-{os.getpid()}@%h", "--pool", "threads", "--concurrency", "8", "--loglevel", "warning"))
+    base_url = f"http://127.0.0.1:{api_port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return base_url, processes
+        except httpx.TransportError:
+            pass
+        time.sleep(0.3)
+    for process in processes:
+        process.terminate()
+    raise RuntimeError("API在60s内未就绪")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="诊断API端到端压测（开环泊松到达、阶梯加压）")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY", API_KEY))
+    parser.add_argument("--stages", nargs="+", default=["1:20", "2:20", "4:20"], help="阶段 到达率(每秒):秒数")
+    parser.add_argument("--continue-ratio", type=float, default=0.5, help="继续已有会话（而不是开始新会话）的请求比例")
+    parser.add_argument("--scripts", help="会话脚本文件（JSON: 每个会话的消息列表的列表）")
+    parser.add_argument("--completion", choices=["ws", "poll"], default="ws", help="等待任务完成的方式")
+    parser.add_argument("--timeout", type=float, default=120, help="单个请求等待完成的最长秒数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--spawn", action="store_true", help="在本机启动替身服务与API")
+    parser.add_argument("--backend", choices=["embedded", "celery"], default="embedded", help="--spawn 时API的执行后端")
+    parser.add_argument("--ollama-args", default="--ttft lognormal:0.2:0.3 --tokens-per-sec 200 --parallel 8",
+                        help="--spawn 时传给 ollama_server.py 的参数")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    parser.add_argument("--output", help="把JSON结果写入文件")
+    args = parser.parse_args()
+
+    scripts = DEFAULT_SCRIPTS
+    if args.scripts:
+        with open(args.scripts, encoding="utf-8") as f:
+            scripts = json.load(f)
+    stages = parse_stages(args.stages)
+
+    processes = []
+    base_url, api_key = args.base_url, args.api_key
+    if args.spawn:
+        base_url, processes = spawn_stack(args.backend, args.ollama_args.split())
+        api_key = API_KEY
+    try:
+        generator = LoadGenerator(base_url, api_key, args.completion, args.timeout,
+                                  SessionPool(scripts, args.continue_ratio, random.Random(args.seed)))
+        elapsed = asyncio.run(generator.run(stages, args.seed))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    reports = summarize(generator.records, stages)
+    result = {"stages": reports, "knee": find_knee(reports), "elapsed_s": round(elapsed, 1),
+              "config": {"stages": args.stages, "continue_ratio": args.continue_ratio, "completion": args.completion,
+                         "seed": args.seed, "backend": args.backend if args.spawn else None}}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return
+
+    print("📈 诊断API压测")
+    print("=" * 100)
+    print(f"{'到达率':>8}{'请求':>7}{'成功':>7}{'续会话':>8}{'吞吐(/s)':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'错误率':>8}  错误分类")
+    for r in reports:
+        print(
+            f"{r['rate']:>8}{r['requests']:>7}{r['ok']:>7}{r['continued']:>8}{r['goodput_per_s']:>10}"
+            f"{r.get('p50_ms', '-'):>10}{r.get('p95_ms', '-'):>10}{r.get('p99_ms', '-'):>10}{r['error_rate']:>8}  {r['errors'] or ''}"
+        )
+    knee = result["knee"]
+    print(f"\n拐点: 到达率 {knee['rate']}/s（{', '.join(knee['reasons'])}）" if knee else "\n拐点: 各阶段均未饱和")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Ollama 替身服务 - 实现 /api/chat 与 /api/generate（流式/非流式、format 为 "json" 或 JSON Schema），
+回复内容确定（按提示词返回诊断各节点的固定回复，或 --responses 文件中的规则），生成速度可配置，
+整套服务（API、Worker）把 OLLAMA_BASE_URL 指向它即可离线压测，不需要GPU和真实模型。
+
+- 首token延迟: --ttft，LatencyDistribution 格式（例如 lognormal:0.3:0.5），之后按 --tokens-per-sec 逐个输出
+- 并发: 同时生成 --parallel 个请求（对应 OLLAMA_NUM_PARALLEL），其余排队；排队超过 --max-queue 时返回503
+- 故障注入: 按 --error-rate 的比例返回500
+- 随机量（延迟、故障）使用 --seed 固定种子
+- GET /stub/stats 返回请求数、拒绝数、注入的错误数、并发峰值等统计
+
+用法:
+    python benchmarks/ollama_server.py --port 11435 --ttft lognormal:0.3:0.5 --tokens-per-sec 40
+    OLLAMA_BASE_URL=http://127.0.0.1:11435 python run_celery_worker.py llm
+
+--responses 文件为JSON列表，第一个 contains 命中提示词的规则生效（response 为对象时序列化为JSON）:
+    [{"contains": "提取关键症状", "response": {"symptoms": ["磁盘写满"], "problem_type": "disk_issue"}}]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from benchmarks.stubs import LatencyDistribution, canned_response
+
+logger = logging.getLogger(__name__)
+
+
+def _instance_from_schema(schema: Dict[str, Any]) -> Any:
+    """按JSON Schema生成一个最小的合法实例（format 为schema、回复又不是JSON时使用）"""
+    kind = schema.get("type")
+    if "enum" in schema:
+        return schema["enum"][0]
+    if kind == "object" or "properties" in schema:
+        return {name: _instance_from_schema(prop) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return []
+    if kind in ("number", "integer"):
+        return 0
+    if kind == "boolean":
+        return False
+    if kind == "null":
+        return None
+    return "示例"
+
+
+class OllamaStandIn:
+    def __init__(self, model: str, ttft: LatencyDistribution, tokens_per_sec: float, error_rate: float = 0.0,
+                 parallel: int = 4, max_queue: int = 512, chars_per_token: int = 2,
+                 rules: Optional[List[Dict[str, Any]]] = None, seed: int = 0):
+        self.model = model
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.parallel = parallel
+        self.max_queue = max_queue
+        self.chars_per_token = chars_per_token
+        self.rules = rules or []
+        self._random = random.Random(seed)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.stats = {"requests": 0, "completed": 0, "errors": 0, "rejected": 0, "queued": 0,
+                      "in_flight": 0, "max_in_flight": 0, "output_tokens": 0}
+
+    # ---- 回复内容 ----
+
+    def respond(self, prompt: str, format_spec: Any = None, options: Dict[str, Any] = None) -> str:
+        options = options or {}
+        text = next((rule["response"] for rule in self.rules if rule["contains"] in prompt), None)
+        if text is None:
+            text = canned_response(prompt)
+        elif not isinstance(text, str):
+            text = json.dumps(text, ensure_ascii=False)
+
+        if format_spec:
+            try:
+                json.loads(text)
+            except ValueError:
+                text = json.dumps(
+                    _instance_from_schema(format_spec) if isinstance(format_spec, dict) else {"response": text},
+                    ensure_ascii=False
+                )
+        for stop in options.get("stop") or []:
+            if stop and stop in text:
+                text = text[:text.index(stop)]
+        return text
+
+    def tokenize(self, text: str, num_predict: Optional[int] = None) -> List[str]:
+        tokens = [text[i:i + self.chars_per_token] for i in range(0, len(text), self.chars_per_token)]
+        return tokens[:num_predict] if num_predict and num_predict > 0 else tokens
+
+    def count_tokens(self, text: str) -> int:
+        return max(1, -(-len(text) // self.chars_per_token))
+
+    # ---- 调度 ----
+
+    def admit(self) -> Optional[JSONResponse]:
+        """排队已满时拒绝（与Ollama的 OLLAMA_MAX_QUEUE 行为一致），否则按 error_rate 注入故障"""
+        self.stats["requests"] += 1
+        if self.stats["queued"] >= self.max_queue:
+            self.stats["rejected"] += 1
+            return JSONResponse({"error": "server busy, please try again.  maximum pending requests exceeded"}, status_code=503)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return JSONResponse({"error": "stub: injected failure"}, status_code=500)
+        return None
+
+    async def generate(self, tokens: List[str]):
+        """占用一个生成槽位，等待首token延迟后按 tokens_per_sec 逐个产出token"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.parallel)
+        self.stats["queued"] += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.stats["queued"] -= 1
+        self.stats["in_flight"] += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+        try:
+            await asyncio.sleep(self.ttft.sample())
+            interval = 1 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0
+            for token in tokens:
+                yield token
+                if interval:
+                    await asyncio.sleep(interval)
+            self.stats["completed"] += 1
+            self.stats["output_tokens"] += len(tokens)
+        finally:
+            self.stats["in_flight"] -= 1
+            self._slots.release()
+
+    def final_chunk(self, started: float, prompt: str, tokens: List[str], truncated: bool) -> Dict[str, Any]:
+        total_ns = int((time.perf_counter() - started) * 1e9)
+        eval_ns = int(len(tokens) / self.tokens_per_sec * 1e9) if self.tokens_per_sec > 0 else 0
+        return {
+            "done": True, "done_reason": "length" if truncated else "stop",
+            "total_duration": total_ns, "load_duration": 0,
+            "prompt_eval_count": self.count_tokens(prompt), "prompt_eval_duration": max(0, total_ns - eval_ns),
+            "eval_count": len(tokens), "eval_duration": eval_ns,
+        }
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def create_app(stand_in: OllamaStandIn) -> FastAPI:
+    app = FastAPI(title="Ollama stand-in")
+
+    async def serve(body: Dict[str, Any], prompt: str, chunk_body):
+        """chunk_body(text) -> 该接口一个分片中的内容字段"""
+        rejected = stand_in.admit()
+        if rejected is not None:
+            return rejected
+        options = body.get("options") or {}
+        text = stand_in.respond(prompt, body.get("format"), options)
+        tokens = stand_in.tokenize(text, options.get("num_predict"))
+        truncated = len(tokens) < stand_in.count_tokens(text)
+        model = body.get("model") or stand_in.model
+        started = time.perf_counter()
+
+        if body.get("stream", True):
+            async def stream():
+                async for token in stand_in.generate(tokens):
+                    yield json.dumps({"model": model, "created_at": _now(), **chunk_body(token), "done": False},
+                                     ensure_ascii=False) + "\n"
+                yield json.dumps({"model": model, "created_at": _now(), **chunk_body(""),
+                                  **stand_in.final_chunk(started, prompt, tokens, truncated)}) + "\n"
+
+            return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+        async for _ in stand_in.generate(tokens):
+            pass
+        return {"model": model, "created_at": _now(), **chunk_body("".join(tokens)),
+                **stand_in.final_chunk(started, prompt, tokens, truncated)}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or []
+        prompt = str(messages[-1].get("content", "")) if messages else ""
+        return await serve(body, prompt, lambda text: {"message": {"role": "assistant", "content": text}})
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        return await serve(body, str(body.get("prompt", "")), lambda text: {"response": text})
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": stand_in.model, "model": stand_in.model, "modified_at": _now(), "size": 0,
+                            "details": {"family": "stub", "parameter_size": "0B", "quantization_level": "none"}}]}
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "0.0.0-stub"}
+
+    @app.get("/stub/stats")
+    async def stats():
+        return stand_in.stats
+
+    @app.get("/")
+    async def root():
+        return "Ollama is running"
+
+    return app
+
+
+def main():
+    from src.config import get_settings
+    from src.core.logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Ollama 替身服务（确定性回复，用于离线压测）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--model", default=get_settings().ollama_model, help="/api/tags 中列出的模型名")
+    parser.add_argument("--ttft", default="lognormal:0.2:0.3", help="首token延迟分布（秒），见 LatencyDistribution")
+    parser.add_argument("--tokens-per-sec", type=float, default=40, help="每个请求的生成速度（0表示不限速）")
+    parser.add_argument("--chars-per-token", type=int, default=2, help="按字符数切分token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的请求比例")
+    parser.add_argument("--parallel", type=int, default=4, help="同时生成的请求数（其余排队）")
+    parser.add_argument("--max-queue", type=int, default=512, help="排队请求数上限，超过返回503")
+    parser.add_argument("--responses", help="回复规则文件（JSON列表）")
+    parser.add_argument("--seed", type=int, default=42, help="延迟与故障注入的随机种子")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    setup_logging()
+    rules = None
+    if args.responses:
+        with open(args.responses, encoding="utf-8") as f:
+            rules = json.load(f)
+    stand_in = OllamaStandIn(
+        args.model, LatencyDistribution.parse(args.ttft, args.seed), args.tokens_per_sec, args.error_rate,
+        args.parallel, args.max_queue, args.chars_per_token, rules, args.seed + 1
+    )
+    logger.info(f"🦙 Ollama替身服务: http://{args.host}:{args.port} (ttft={args.ttft}, {args.tokens_per_sec} tokens/s, "
+                f"并发 {args.parallel}, 错误率 {args.error_rate})")
+    uvicorn.run(create_app(stand_in), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
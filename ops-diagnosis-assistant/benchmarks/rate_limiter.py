@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+限流器开销基准 - 测量每个请求调用一次 RateLimiter.acquire()（一次EVALSHA）的耗时，
+与同一连接上一次 Redis PING 的往返耗时对比，差值即Lua脚本本身的执行开销（需要本地Redis）
+
+用法:
+    python benchmarks/rate_limiter.py
+    python benchmarks/rate_limiter.py --requests 20000 --json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from typing import Dict, Any, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.backend_overhead import _percentile
+from src.core.rate_limiter import RateLimiter
+
+
+def _timed(func, n: int) -> List[float]:
+    """调用 n 次，返回每次的耗时（微秒）"""
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    return samples
+
+
+def _summary(name: str, samples: List[float]) -> Dict[str, Any]:
+    return {
+        "case": name,
+        "calls": len(samples),
+        "p50_us": round(statistics.median(samples), 1),
+        "p99_us": round(_percentile(samples, 99), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="限流器（Redis Lua令牌桶）的单次调用开销")
+    parser.add_argument("--requests", type=int, default=5000, help="每种情况的调用次数")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    args = parser.parse_args()
+
+    limiter = RateLimiter()
+    client_name = f"bench-{os.getpid()}"
+    # 放行：桶容量足够大，每次都通过并扣减令牌与预占token
+    allowed_client = {"name": client_name, "rate_per_minute": 6_000_000, "burst": 10_000_000, "daily_token_quota": 0}
+    # 拒绝：桶被耗尽，每次都在脚本内判定为超限
+    rejected_client = {"name": f"{client_name}-rejected", "rate_per_minute": 1, "burst": 1, "daily_token_quota": 0}
+
+    try:
+        # 预热连接并加载脚本（首次 EVALSHA 未命中时会回退为 SCRIPT LOAD）
+        for _ in range(100):
+            limiter.redis_client.ping()
+            limiter.acquire(allowed_client, 1, 3000)
+        limiter.acquire(rejected_client)
+        if limiter.acquire(rejected_client)["allowed"]:
+            raise RuntimeError("拒绝路径未生效")
+
+        reports = [
+            _summary("redis PING", _timed(limiter.redis_client.ping, args.requests)),
+            _summary("acquire 放行", _timed(lambda: limiter.acquire(allowed_client, 1, 3000), args.requests)),
+            _summary("acquire 拒绝", _timed(lambda: limiter.acquire(rejected_client), args.requests)),
+        ]
+    finally:
+        for client in (allowed_client, rejected_client):
+            limiter.redis_client.delete(f"{limiter.bucket_prefix}{client['name']}", limiter._quota_key(client["name"]))
+
+    ping_p50 = reports[0]["p50_us"]
+    for report in reports[1:]:
+        report["overhead_p50_us"] = round(report["p50_us"] - ping_p50, 1)
+
+    if args.json:
+        print(json.dumps({"runs": reports}, indent=2, ensure_ascii=False))
+        return
+
+    print("🚦 限流器开销基准")
+    print("=" * 60)
+    print(f"{'情况':<14}{'调用数':>8}{'p50(us)':>10}{'p99(us)':>10}{'比PING多(us)':>14}")
+    for r in reports:
+        print(f"{r['case']:<14}{r['calls']:>8}{r['p50_us']:>10}{r['p99_us']:>10}{r.get('overhead_p50_us', ''):>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+检索基准 - 在合成知识库（benchmarks/synthetic_kb.py）上测量 KnowledgeRetriever.search_fault_cases
+在不同规模、检索后端与查询配置下的延迟、召回率与内存，找出各方案在多大规模时不再可用
+
+检索后端:
+- memory: benchmarks/es_server.py 的内存倒排索引（子进程），内存为该进程的峰值RSS
+- es: 真实的Elasticsearch（--es-url），批量写入临时索引 fault_cases_bench，内存为索引的存储大小，结束后删除索引
+
+查询配置（multi_match 的字段权重、fuzziness、minimum_should_match，对应 RETRIEVAL_* 配置）见 QUERY_CONFIGS。
+召回率按查询的标注答案计算（recall@k: 答案出现在前k条结果中的查询比例），并按查询类别（exact/paraphrase/typo）分别统计。
+检索缓存在测量时关闭，每个查询都访问后端。
+
+用法:
+    python benchmarks/retrieval.py
+    python benchmarks/retrieval.py --sizes 10000 100000 1000000 --backends memory es --es-url http://localhost:9200
+    python benchmarks/retrieval.py --sizes 100000 --configs default no_fuzziness --output retrieval.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Any, Dict, List
+
+import httpx
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.backend_overhead import _percentile, _free_port
+from benchmarks.synthetic_kb import QUERY_KINDS, iter_cases, make_queries, write_jsonl
+
+DEFAULT_FIELDS = ["symptoms^3", "fault_type^2", "root_cause", "combined_text"]
+QUERY_CONFIGS = {
+    "default": {"fields": DEFAULT_FIELDS, "fuzziness": "AUTO", "minimum_should_match": "30%"},
+    "no_fuzziness": {"fields": DEFAULT_FIELDS, "fuzziness": None, "minimum_should_match": "30%"},
+    "flat_boosts": {"fields": ["symptoms", "fault_type", "root_cause", "combined_text"], "fuzziness": "AUTO",
+                    "minimum_should_match": "30%"},
+    "strict_msm": {"fields": DEFAULT_FIELDS, "fuzziness": "AUTO", "minimum_should_match": "75%"},
+    "no_msm": {"fields": DEFAULT_FIELDS, "fuzziness": "AUTO", "minimum_should_match": None},
+}
+BENCH_INDEX = "fault_cases_bench"
+
+# 与 data/es_sync.py 创建的 fault_cases 索引相同的映射（该脚本依赖psycopg2，不直接导入）
+ES_MAPPING = {
+    "properties": {
+        "id": {"type": "keyword"},
+        "fault_type": {"type": "text", "analyzer": "standard"},
+        "symptoms": {"type": "text", "analyzer": "standard"},
+        "root_cause": {"type": "text", "analyzer": "standard"},
+        "solution": {"type": "text", "analyzer": "standard"},
+        "severity": {"type": "keyword"},
+        "frequency": {"type": "keyword"},
+        "combined_text": {"type": "text", "analyzer": "standard"},
+    }
+}
+
+
+def _retriever(url: str, index: str):
+    """指向 url 的检索器（关闭检索缓存）"""
+    from src.config import get_settings
+    from src.core.knowledge_retriever import KnowledgeRetriever
+
+    host, _, port = url.split("://", 1)[-1].rpartition(":")
+    os.environ["ELASTICSEARCH_HOST"], os.environ["ELASTICSEARCH_PORT"] = host, port
+    get_settings.cache_clear()
+    retriever = KnowledgeRetriever()
+    retriever.es_index = index
+    retriever.cache_size = 0
+    return retriever
+
+
+def evaluate(retriever, queries: List[Dict[str, Any]], config: Dict[str, Any], top_ks: List[int]) -> Dict[str, Any]:
+    """按查询配置执行全部查询，返回延迟分位数与 recall@k（总体与按查询类别）"""
+    retriever.search_fields = config["fields"]
+    retriever.fuzziness = config["fuzziness"]
+    retriever.minimum_should_match = config["minimum_should_match"]
+    size = max(top_ks)
+    for query in queries[:5]:
+        retriever.search_fault_cases(query["query"], size)
+
+    latencies, ranks = [], []
+    for query in queries:
+        start = time.perf_counter()
+        cases = retriever.search_fault_cases(query["query"], size)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids = [case["id"] for case in cases]
+        ranks.append(next((i + 1 for i, case_id in enumerate(ids) if case_id in query["relevant"]), None))
+
+    def recall(k: int, kind: str = None) -> float:
+        selected = [rank for rank, query in zip(ranks, queries) if kind is None or query["kind"] == kind]
+        return round(sum(1 for rank in selected if rank and rank <= k) / len(selected), 3) if selected else 0.0
+
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+        "recall": {f"@{k}": recall(k) for k in top_ks},
+        "recall_by_kind": {kind: {f"@{k}": recall(k, kind) for k in top_ks} for kind in QUERY_KINDS},
+        "mrr": round(sum(1 / rank for rank in ranks if rank) / len(ranks), 3),
+    }
+
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"ES替身进程退出（退出码 {process.returncode}）")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"ES替身在{timeout:.0f}s内未建好索引")
+
+
+def run_memory_backend(cases_path: str, queries, configs: Dict[str, Dict], top_ks: List[int], timeout: float) -> Dict[str, Any]:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [sys.executable, "benchmarks/es_server.py", "--port", str(port), "--cases", cases_path, "--latency", "0"],
+        cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_ready(url, process, timeout)
+        retriever = _retriever(url, BENCH_INDEX)
+        results = {name: evaluate(retriever, queries, config, top_ks) for name, config in configs.items()}
+        # 查询期间的峰值（模糊扩展等产生的临时对象）也计入
+        stats = httpx.get(f"{url}/stub/stats").json()
+        return {"index_seconds": stats["build_seconds"], "memory_mb": stats["peak_rss_mb"], "configs": results}
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def run_es_backend(es_url: str, size: int, seed: int, queries, configs: Dict[str, Dict], top_ks: List[int]) -> Dict[str, Any]:
+    from elasticsearch import Elasticsearch
+    from elasticsearch.helpers import streaming_bulk
+
+    es = Elasticsearch(es_url, request_timeout=120)
+    es.indices.delete(index=BENCH_INDEX, ignore_unavailable=True)
+    es.indices.create(index=BENCH_INDEX, mappings=ES_MAPPING, settings={"number_of_replicas": 0, "refresh_interval": "-1"})
+    try:
+        start = time.perf_counter()
+        actions = ({"_index": BENCH_INDEX, "_id": case["id"], "_source": case} for case in iter_cases(size, seed))
+        for ok, item in streaming_bulk(es, actions, chunk_size=2000, raise_on_error=True):
+            pass
+        es.indices.refresh(index=BENCH_INDEX)
+        es.indices.forcemerge(index=BENCH_INDEX, max_num_segments=1)
+        index_seconds = time.perf_counter() - start
+        store = es.indices.stats(index=BENCH_INDEX, metric="store")["indices"][BENCH_INDEX]["total"]["store"]
+        retriever = _retriever(es_url, BENCH_INDEX)
+        results = {name: evaluate(retriever, queries, config, top_ks) for name, config in configs.items()}
+        return {"index_seconds": round(index_seconds, 2), "memory_mb": round(store["size_in_bytes"] / 1024 / 1024, 1),
+                "configs": results}
+    finally:
+        es.indices.delete(index=BENCH_INDEX, ignore_unavailable=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成知识库上的检索延迟、召回率与内存基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000], help="知识库规模（案例数）")
+    parser.add_argument("--queries", type=int, default=300, help="每个规模的查询数（三类查询各占三分之一）")
+    parser.add_argument("--backends", nargs="+", choices=["memory", "es"], default=["memory"])
+    parser.add_argument("--es-url", default="http://localhost:9200", help="es 后端的Elasticsearch地址")
+    parser.add_argument("--configs", nargs="+", choices=list(QUERY_CONFIGS), default=list(QUERY_CONFIGS), help="查询配置")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 3, 10], help="计算 recall@k 的k")
+    parser.add_argument("--data-dir", help="保存/复用合成案例文件的目录（默认使用临时目录）")
+    parser.add_argument("--build-timeout", type=float, default=1800, help="memory 后端建索引的最长秒数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    parser.add_argument("--output", help="把JSON结果写入文件")
+    args = parser.parse_args()
+
+    configs = {name: QUERY_CONFIGS[name] for name in args.configs}
+    report = {"config": vars(args), "results": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        os.makedirs(data_dir, exist_ok=True)
+        for size in args.sizes:
+            queries = make_queries(size, args.queries, args.seed)
+            cases_path = os.path.join(data_dir, f"cases-{size}-{args.seed}.jsonl")
+            if "memory" in args.backends and not os.path.exists(cases_path):
+                write_jsonl(cases_path, iter_cases(size, args.seed))
+            for backend in args.backends:
+                entry = {"size": size, "backend": backend}
+                try:
+                    if backend == "memory":
+                        entry.update(run_memory_backend(cases_path, queries, configs, args.top_k, args.build_timeout))
+                    else:
+                        entry.update(run_es_backend(args.es_url, size, args.seed, queries, configs, args.top_k))
+                except Exception as e:
+                    # 某个规模下后端失败（超时、内存不足）也是结果的一部分
+                    entry["error"] = f"{type(e).__name__}: {e}"
+                report["results"].append(entry)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    k_labels = [f"@{k}" for k in args.top_k]
+    print("🔍 检索基准（合成知识库）")
+    print("=" * 110)
+    print(f"{'规模':>9} {'后端':<7}{'配置':<14}{'建索引(s)':>10}{'内存(MB)':>10}{'p50(ms)':>9}{'p95(ms)':>9}"
+          + "".join(f"{'recall' + k:>11}" for k in k_labels) + f"{'typo' + k_labels[-1]:>10}")
+    for entry in report["results"]:
+        if "error" in entry:
+            print(f"{entry['size']:>9} {entry['backend']:<7}失败: {entry['error']}")
+            continue
+        for name, result in entry["configs"].items():
+            print(
+                f"{entry['size']:>9} {entry['backend']:<7}{name:<14}{entry['index_seconds']:>10}{entry['memory_mb']:>10}"
+                f"{result['p50_ms']:>9}{result['p95_ms']:>9}" + "".join(f"{result['recall'][k]:>11}" for k in k_labels)
+                + f"{result['recall_by_kind']['typo'][k_labels[-1]]:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+会话增长基准 - 用桩模型按脚本执行 10 / 50 / 200 轮的长对话，测量会话状态与每轮开销是否随轮数增长
+
+每一轮都按线上的方式保存并读回会话（serialize_state -> JSON -> deserialize_state，与 RedisSessionManager 相同），
+记录每轮的序列化字节数、消息数与症状数、发送给LLM的token数、耗时，以及进程RSS。
+
+增长指数: 累计开销对轮数的双对数斜率（取后80%的轮次），每轮开销恒定时约为1，每轮开销随轮数线性增长时约为2。
+tests/test_session_growth.py 要求状态字节与token的增长指数接近1。
+
+用法:
+    python benchmarks/session_growth.py
+    python benchmarks/session_growth.py --turns 10 50 200 --llm-latency 0.01 --json
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import statistics
+from typing import Any, Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.concurrency import _current_rss_mb
+
+# 用户在长对话中的输入，循环使用（包含追问的回答、确认解决与新问题）
+DEFAULT_SCRIPT = [
+    "生产环境订单服务CPU使用率持续95%以上，接口大量超时",
+    "从今天早上9点开始，所有用户都受影响",
+    "报错 RejectedExecutionException",
+    "还有问题，内存也在上涨",
+    "解决",
+]
+
+
+def growth_exponent(per_turn: List[float]) -> float:
+    """累计开销 C(t) 对 t 的双对数最小二乘斜率（跳过前20%的轮次）"""
+    cumulative, total = [], 0.0
+    for value in per_turn:
+        total += value
+        cumulative.append(total)
+    points = [(math.log(t), math.log(c)) for t, c in enumerate(cumulative, 1) if t > len(per_turn) // 5 and c > 0]
+    mean_x = statistics.fmean(x for x, _ in points)
+    mean_y = statistics.fmean(y for _, y in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / sum((x - mean_x) ** 2 for x, _ in points)
+
+
+def run_conversation(agent, counter, turns: int, script: List[str], session_id: str) -> Dict[str, Any]:
+    """执行 turns 轮对话，返回每轮的测量值"""
+    rows = []
+    stored = None
+    rss_before = _current_rss_mb()
+    for turn in range(turns):
+        _, tokens_before = counter.snapshot()
+        start = time.perf_counter()
+        session_state = agent.deserialize_state(json.loads(stored)) if stored else None
+        _, state = agent.diagnose(script[turn % len(script)], session_id, session_state)
+        stored = json.dumps(agent.serialize_state(state), default=str)
+        elapsed = (time.perf_counter() - start) * 1000
+        rows.append({
+            "turn": turn + 1,
+            "latency_ms": elapsed,
+            "state_bytes": len(stored.encode("utf-8")),
+            "messages": len(state["messages"]),
+            "symptoms": len(state["confirmed_symptoms"]),
+            "tokens": counter.snapshot()[1] - tokens_before,
+        })
+    return {"rows": rows, "rss_growth_mb": round(_current_rss_mb() - rss_before, 1)}
+
+
+def summarize(turns: int, run: Dict[str, Any]) -> Dict[str, Any]:
+    rows = run["rows"]
+    head, tail = rows[:max(1, turns // 10)], rows[-max(1, turns // 10):]
+    return {
+        "turns": turns,
+        "first_state_bytes": rows[0]["state_bytes"],
+        "last_state_bytes": rows[-1]["state_bytes"],
+        "max_messages": max(row["messages"] for row in rows),
+        "max_symptoms": max(row["symptoms"] for row in rows),
+        # 前后各10%轮次的每轮中位数，比较长对话末尾与开头的开销
+        "head_latency_ms": round(statistics.median(row["latency_ms"] for row in head), 1),
+        "tail_latency_ms": round(statistics.median(row["latency_ms"] for row in tail), 1),
+        "head_tokens": round(statistics.median(row["tokens"] for row in head)),
+        "tail_tokens": round(statistics.median(row["tokens"] for row in tail)),
+        "bytes_exponent": round(growth_exponent([row["state_bytes"] for row in rows]), 2),
+        "tokens_exponent": round(growth_exponent([row["tokens"] for row in rows]), 2),
+        "latency_exponent": round(growth_exponent([row["latency_ms"] for row in rows]), 2),
+        "rss_growth_mb": run["rss_growth_mb"],
+    }
+
+
+def main():
+    from benchmarks.agents import _usage_counter
+    from benchmarks.stubs import LatencyDistribution, StubChatModel, StubRetriever
+    from src.core.advanced_agent import AdvancedDiagnosisAgent
+
+    parser = argparse.ArgumentParser(description="长对话中会话状态与每轮开销的增长")
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 200], help="对话轮数")
+    parser.add_argument("--llm-latency", default="0", help="LLM调用耗时分布（秒），见 LatencyDistribution")
+    parser.add_argument("--retrieval-latency", default="0", help="检索耗时分布（秒）")
+    parser.add_argument("--script", help="用户输入脚本（JSON字符串列表），循环使用")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    parser.add_argument("--output", help="把JSON结果（含每轮明细）写入文件")
+    args = parser.parse_args()
+
+    script = DEFAULT_SCRIPT
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            script = json.load(f)
+
+    counter = _usage_counter()
+    agent = AdvancedDiagnosisAgent(
+        llm=StubChatModel(latency=LatencyDistribution.parse(args.llm_latency, args.seed), callbacks=[counter]),
+        retriever=StubRetriever(latency=LatencyDistribution.parse(args.retrieval_latency, args.seed + 1)),
+    )
+    # 预热一轮，首轮的惰性导入不计入
+    agent.diagnose(script[0], "warmup")
+
+    runs = {turns: run_conversation(agent, counter, turns, script, f"growth-{turns}") for turns in args.turns}
+    report = {
+        "config": {"turns": args.turns, "llm_latency": args.llm_latency, "retrieval_latency": args.retrieval_latency,
+                   "max_messages": getattr(agent, "max_messages", None), "max_symptoms": getattr(agent, "max_symptoms", None)},
+        "rss_mb": round(_current_rss_mb(), 1),
+        "results": [summarize(turns, run) for turns, run in runs.items()],
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({**report, "rows": {turns: run["rows"] for turns, run in runs.items()}}, f, indent=2, ensure_ascii=False)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    print("🧵 会话增长基准（桩模型）")
+    print("=" * 110)
+    print(f"消息上限: {report['config']['max_messages']}    症状上限: {report['config']['max_symptoms']}    进程RSS: {report['rss_mb']}MB\n")
+    print(f"{'轮数':>6}{'首轮字节':>10}{'末轮字节':>10}{'消息数':>8}{'症状数':>8}{'首段ms':>9}{'末段ms':>9}"
+          f"{'首段token':>11}{'末段token':>11}{'字节指数':>10}{'token指数':>11}{'RSS增长MB':>11}")
+    for r in report["results"]:
+        print(
+            f"{r['turns']:>6}{r['first_state_bytes']:>10}{r['last_state_bytes']:>10}{r['max_messages']:>8}{r['max_symptoms']:>8}"
+            f"{r['head_latency_ms']:>9}{r['tail_latency_ms']:>9}{r['head_tokens']:>11}{r['tail_tokens']:>11}"
+            f"{r['bytes_exponent']:>10}{r['tokens_exponent']:>11}{r['rss_growth_mb']:>11}"
+        )
+    print("\n增长指数: 每轮开销恒定时约为1，随轮数线性增长时约为2")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+基准测试用的桩模型与桩检索器：按提示词返回固定内容并模拟延迟，不依赖Ollama和Elasticsearch
+
+桩模型根据提示词判断当前节点（不按调用顺序），因此可以被多个并发诊断共享。
+延迟可以是固定秒数，也可以是 LatencyDistribution（例如 lognormal:0.2:0.5，模拟LLM生成耗时的长尾）。
+"""
+import json
+import math
+import time
+import random
+import asyncio
+from typing import Any, Dict, List, Optional, Union
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.core.knowledge_retriever import KnowledgeRetriever
+
+SYMPTOM_ANALYSIS = {
+    "symptoms": ["CPU使用率持续高于90%", "系统响应缓慢"],
+    "error_messages": ["load average: 32.5", "请求超时"],
+    "time_pattern": "今天早上9点开始，持续至今",
+    "impact_scope": "所有用户",
+    "problem_type": "cpu_high",
+}
+
+ROOT_CAUSE_ANALYSIS = {
+    "affected_components": ["order-service", "MySQL"],
+    "verification_steps": ["top -H -p <pid>", "jstack <pid>", "查看慢查询日志"],
+    "root_cause": "订单查询缺少索引导致全表扫描，大量线程阻塞在数据库查询上",
+}
+
+SOLUTION = "\n".join(
+    f"{i}. 执行 `top -H -p <pid>` 定位占用CPU最高的线程，并结合 jstack 输出确认热点代码路径。"
+    for i in range(1, 21)
+)
+
+SAMPLE_CASES = [
+    {
+        "id": str(i),
+        "fault_type": fault_type,
+        "symptoms": f"{fault_type} 的典型症状描述",
+        "root_cause": f"{fault_type} 的常见根本原因",
+        "solution": f"{fault_type} 的处理步骤",
+        "severity": "high",
+        "score": 10.0 - i,
+    }
+    for i, fault_type in enumerate(["high_cpu_usage", "slow_database_query", "memory_leak"])
+]
+
+
+def canned_response(prompt: str) -> str:
+    """按提示词判断诊断节点，返回该节点的固定回复（桩模型与 benchmarks/ollama_server.py 共用）"""
+    if "提取关键症状" in prompt:
+        return json.dumps(SYMPTOM_ANALYSIS, ensure_ascii=False)
+    if "分析以下故障的根本原因" in prompt:
+        return json.dumps(ROOT_CAUSE_ANALYSIS, ensure_ascii=False)
+    if "生成具体的解决方案" in prompt:
+        return SOLUTION
+    if "问题是否已经解决" in prompt:
+        return "请问问题是否已经解决？如果还需要帮助请告诉我。"
+    return "请问问题是从什么时候开始出现的？"
+
+
+class LatencyDistribution:
+    """
+    模拟延迟的分布（秒），spec 格式:
+        const:0.05                固定值
+        uniform:0.02:0.08         均匀分布 [下限, 上限]
+        normal:0.05:0.01          正态分布（均值, 标准差），截断到0以上
+        lognormal:0.2:0.5         对数正态分布（中位数, sigma），sigma 越大长尾越重
+    """
+
+    KINDS = {"const": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+
+    def __init__(self, kind: str, *params: float, seed: Optional[int] = None):
+        if kind not in self.KINDS or len(params) != self.KINDS[kind]:
+            raise ValueError(f"无效的延迟分布: {kind}:{':'.join(map(str, params))}")
+        self.kind = kind
+        self.params = params
+        self._random = random.Random(seed)
+
+    @classmethod
+    def parse(cls, spec: Union[str, float], seed: Optional[int] = None) -> "LatencyDistribution":
+        """解析 spec；纯数字等价于 const"""
+        kind, *params = str(spec).split(":")
+        if not params:
+            return cls("const", float(kind), seed=seed)
+        return cls(kind, *map(float, params), seed=seed)
+
+    def sample(self) -> float:
+        if self.kind == "const":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self._random.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, self._random.gauss(*self.params))
+        median, sigma = self.params
+        return self._random.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+    def __str__(self) -> str:
+        return ":".join([self.kind, *(f"{param:g}" for param in self.params)])
+
+
+def sample_latency(latency: Union[float, LatencyDistribution]) -> float:
+    return latency.sample() if isinstance(latency, LatencyDistribution) else latency
+
+
+class StubChatModel(BaseChatModel):
+    """按提示词内容返回固定回复的聊天模型，latency 模拟每次生成的耗时（秒或 LatencyDistribution）"""
+
+    latency: Any = 0.05
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    @staticmethod
+    def _respond(messages: List[BaseMessage]) -> str:
+        return canned_response(messages[-1].content if messages else "")
+
+    @classmethod
+    def _message(cls, messages: List[BaseMessage]) -> AIMessage:
+        content = cls._respond(messages)
+        # 粗略按字符数估算token用量，供配额结算等统计使用
+        input_tokens = sum(len(str(message.content)) for message in messages)
+        return AIMessage(content=content, response_metadata={"model_name": "stub"}, usage_metadata={
+            "input_tokens": input_tokens, "output_tokens": len(content), "total_tokens": input_tokens + len(content)
+        })
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(sample_latency(self.latency))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(sample_latency(self.latency))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+
+class StubRetriever:
+    """返回固定案例的检索器，latency 模拟一次ES查询的耗时（秒或 LatencyDistribution）"""
+
+    format_knowledge = staticmethod(KnowledgeRetriever.format_knowledge)
+
+    def __init__(self, cases: Optional[List[Dict[str, Any]]] = None, latency: Union[float, LatencyDistribution] = 0.01):
+        self.cases = cases if cases is not None else SAMPLE_CASES
+        self.latency = latency
+
+    def search_fault_cases(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        time.sleep(sample_latency(self.latency))
+        return [dict(case) for case in self.cases[:top_k]]
+
+    def get_related_knowledge(self, user_input: str) -> str:
+        return self.format_knowledge(self.search_fault_cases(user_input))
+
+    def msearch_fault_cases(self, queries: List[str], top_k: int = 3) -> List[List[Dict[str, Any]]]:
+        # 一次 _msearch 请求只有一次往返
+        time.sleep(sample_latency(self.latency))
+        return [[dict(case) for case in self.cases[:top_k]] for _ in queries]
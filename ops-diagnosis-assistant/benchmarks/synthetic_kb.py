@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+合成故障知识库 - 按模板生成任意规模（1万、10万、100万条）的故障案例，以及带标注答案的检索查询
+
+每条案例由故障类别模板、服务名、主机、指标数值与报错信息组合而成，字段与 data/es_sync.py 同步到ES的文档一致。
+第 i 条案例只由 (种子, i) 决定，生成查询时按序号重新生成案例，不需要把整个知识库放在内存中。
+(故障类别, 服务名) 在同一知识库中唯一，因此每个查询的标注答案就是生成它的那一条案例。
+
+查询分三类:
+- exact: 服务名 + 案例症状的前两句（用户直接粘贴告警）
+- paraphrase: 同上，但常见说法替换为同义说法（"使用率" -> "占用率" 等）
+- typo: 同上，并在服务名或报错信息的英文单词中引入一处拼写错误（模糊匹配是否有效）
+
+用法:
+    python benchmarks/synthetic_kb.py --cases 100000 --queries 500 --output-dir data/synthetic
+"""
+import os
+import re
+import sys
+import json
+import random
+import argparse
+from typing import Any, Dict, Iterator, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+QUERY_KINDS = ["exact", "paraphrase", "typo"]
+
+SERVICES = [
+    "order-service", "payment-gateway", "user-center", "inventory-api", "search-indexer", "message-push",
+    "risk-engine", "report-worker", "coupon-service", "logistics-tracker", "auth-proxy", "billing-job",
+]
+ZONES = ["bj", "sh", "gz", "sz", "hz"]
+
+# 故障类别模板: {service}、{host}、{value}、{error} 在生成时替换
+FAMILIES: List[Dict[str, Any]] = [
+    {
+        "fault_type": "high_cpu_usage", "severity": "high", "frequency": "frequent",
+        "symptoms": [
+            "{service} 所在服务器 {host} CPU使用率持续{value}%以上，接口响应超时，top显示java进程占用大量CPU",
+            "{host} 上的 {service} CPU使用率飙升到{value}%，负载远高于核数，请求排队，日志出现 {error}",
+        ],
+        "errors": ["RejectedExecutionException", "GC overhead limit exceeded", "ThreadPool exhausted"],
+        "root_causes": ["频繁Full GC", "死循环代码", "正则回溯导致CPU打满", "慢查询没有索引导致全表扫描"],
+        "solutions": ["使用top -Hp定位热点线程，jstack分析线程栈", "回滚最近发布的版本并扩容实例"],
+    },
+    {
+        "fault_type": "memory_leak", "severity": "high", "frequency": "occasional",
+        "symptoms": [
+            "{service} 内存使用率不断上升到{value}%，最终触发OOM Killer，日志出现 {error}",
+            "{host} 上 {service} 堆内存持续增长，Full GC 后无法回收，进程被系统杀死，报错 {error}",
+        ],
+        "errors": ["OutOfMemoryError", "java.lang.OutOfMemoryError: Java heap space", "Cannot allocate memory"],
+        "root_causes": ["缓存没有淘汰策略", "监听器注册后未注销", "大对象在静态集合中累积"],
+        "solutions": ["jmap导出heap dump并用MAT分析", "为本地缓存设置容量上限与过期时间"],
+    },
+    {
+        "fault_type": "disk_space_full", "severity": "critical", "frequency": "frequent",
+        "symptoms": [
+            "{host} 磁盘使用率{value}%，{service} 无法写入新文件，报错 {error}",
+            "{service} 日志无法滚动，{host} 数据盘已满，应用报错 {error}",
+        ],
+        "errors": ["No space left on device", "IOException: disk quota exceeded", "write failed ENOSPC"],
+        "root_causes": ["日志文件没有轮转", "临时文件未清理", "Docker镜像和容器缓存占满磁盘"],
+        "solutions": ["du -sh查找大目录并清理旧日志", "配置logrotate与磁盘使用率告警"],
+    },
+    {
+        "fault_type": "network_latency", "severity": "medium", "frequency": "occasional",
+        "symptoms": [
+            "{service} 调用下游延迟升高到{value}ms，TCP重传率高，偶发 {error}",
+            "从 {host} 访问 {service} ping延迟{value}ms，丢包明显，客户端报 {error}",
+        ],
+        "errors": ["SocketTimeoutException", "Connection reset by peer", "read timeout"],
+        "root_causes": ["专线带宽打满", "交换机端口故障", "DNS解析慢"],
+        "solutions": ["使用mtr定位丢包的网络节点", "切换备用链路并联系运营商"],
+    },
+    {
+        "fault_type": "database_connection_pool_full", "severity": "high", "frequency": "occasional",
+        "symptoms": [
+            "{service} 数据库连接池满，活跃连接{value}个，报错 {error}",
+            "{service} 获取数据库连接超时，连接池耗尽，{host} 上大量线程阻塞在 {error}",
+        ],
+        "errors": ["Cannot get a connection, pool error Timeout waiting for idle object", "HikariPool connection is not available",
+                   "Too many connections"],
+        "root_causes": ["连接未在finally中释放", "慢查询长时间占用连接", "连接池最大连接数过小"],
+        "solutions": ["检查连接泄漏并开启泄漏检测", "优化慢查询并调整连接池上限"],
+    },
+    {
+        "fault_type": "service_crash", "severity": "critical", "frequency": "rare",
+        "symptoms": [
+            "{service} 进程突然崩溃退出，{host} 系统日志显示 {error}，服务不可用",
+            "{service} 在 {host} 上反复重启，退出码{value}，崩溃前日志 {error}",
+        ],
+        "errors": ["Segmentation fault", "core dumped", "fatal error: runtime: out of memory"],
+        "root_causes": ["本地库内存越界", "依赖服务不可用导致启动失败", "配置错误导致进程退出"],
+        "solutions": ["分析core dump定位崩溃栈", "配置进程守护并回滚配置"],
+    },
+    {
+        "fault_type": "slow_database_query", "severity": "medium", "frequency": "frequent",
+        "symptoms": [
+            "{service} 数据库查询耗时{value}ms，慢查询日志激增，接口超时 {error}",
+            "{service} 报表查询很慢，数据库 {host} IO等待高，应用日志 {error}",
+        ],
+        "errors": ["QueryTimeoutException", "Lock wait timeout exceeded", "statement timeout"],
+        "root_causes": ["缺少合适的索引", "统计信息过时导致错误的执行计划", "大事务持有行锁"],
+        "solutions": ["使用EXPLAIN分析执行计划并补充索引", "拆分大事务并更新统计信息"],
+    },
+    {
+        "fault_type": "file_descriptor_exhausted", "severity": "high", "frequency": "occasional",
+        "symptoms": [
+            "{service} 无法建立新连接，{host} 上打开的文件数达到{value}，报错 {error}",
+            "{service} 打开文件失败，lsof显示大量CLOSE_WAIT连接，报错 {error}",
+        ],
+        "errors": ["Too many open files", "accept4 EMFILE", "socket: too many open files"],
+        "root_causes": ["ulimit设置过低", "HTTP客户端连接未关闭", "文件句柄泄漏"],
+        "solutions": ["调高ulimit -n并修复句柄泄漏", "复用HTTP连接池并设置空闲超时"],
+    },
+    {
+        "fault_type": "ssl_certificate_expired", "severity": "high", "frequency": "rare",
+        "symptoms": [
+            "访问 {service} 的HTTPS请求全部失败，客户端报错 {error}",
+            "{service} 调用第三方接口握手失败，{host} 日志 {error}",
+        ],
+        "errors": ["certificate has expired", "SSLHandshakeException", "x509: certificate signed by unknown authority"],
+        "root_causes": ["证书过期未续签", "中间证书缺失", "系统时间漂移"],
+        "solutions": ["续签证书并配置到期告警", "补全证书链并校准NTP时间"],
+    },
+    {
+        "fault_type": "message_queue_backlog", "severity": "medium", "frequency": "frequent",
+        "symptoms": [
+            "{service} 消费kafka消息积压{value}万条，消费延迟持续上升，日志 {error}",
+            "{service} 消费者频繁rebalance，{host} 上消费速度跟不上生产速度，报错 {error}",
+        ],
+        "errors": ["CommitFailedException", "consumer poll timeout", "RebalanceInProgressException"],
+        "root_causes": ["单条消息处理过慢", "消费者数量少于分区数", "max.poll.interval.ms 设置过小"],
+        "solutions": ["增加消费者并发并异步处理耗时逻辑", "调大max.poll.interval.ms并减少单次拉取数量"],
+    },
+]
+
+# paraphrase 查询中的同义替换
+SYNONYMS = {
+    "使用率": "占用率", "超时": "没有响应", "崩溃": "挂掉", "报错": "提示错误", "延迟": "耗时",
+    "积压": "堆积", "无法": "不能", "持续": "一直", "数据库": "DB", "服务器": "机器",
+}
+
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+
+
+def service_name(ordinal: int) -> str:
+    """第 ordinal 个服务名（order-service、payment-gateway... 之后是 order-service-1 ...）"""
+    base = SERVICES[ordinal % len(SERVICES)]
+    generation = ordinal // len(SERVICES)
+    return f"{base}-{generation}" if generation else base
+
+
+def make_case(index: int, seed: int = 42) -> Dict[str, Any]:
+    """第 index 条案例（只由种子与序号决定）"""
+    rng = random.Random(seed * 1_000_003 + index)
+    family = FAMILIES[index % len(FAMILIES)]
+    # 同一类别内服务名不重复: (类别, 服务名) 唯一确定一条案例
+    service = service_name(index // len(FAMILIES))
+    slots = {
+        "service": service,
+        "host": f"prod-{rng.choice(ZONES)}-{rng.randrange(10000):04d}",
+        "value": rng.randrange(80, 100) if "%" in family["symptoms"][0] else rng.randrange(100, 5000),
+        "error": rng.choice(family["errors"]),
+    }
+    symptoms = rng.choice(family["symptoms"]).format(**slots)
+    root_cause = f"{service} {rng.choice(family['root_causes'])}"
+    case = {
+        "id": str(index),
+        "fault_type": family["fault_type"],
+        "symptoms": symptoms,
+        "root_cause": root_cause,
+        "solution": "\n".join(f"{i}. {step}" for i, step in enumerate(rng.sample(family["solutions"], 2), 1)),
+        "severity": family["severity"],
+        "frequency": family["frequency"],
+        "service": service,
+        "error": slots["error"],
+    }
+    # 与 data/es_sync.py 一致的组合字段
+    case["combined_text"] = f"{case['fault_type']} {symptoms} {root_cause} {case['solution']}"
+    return case
+
+
+def iter_cases(count: int, seed: int = 42) -> Iterator[Dict[str, Any]]:
+    for index in range(count):
+        yield make_case(index, seed)
+
+
+def _typo(word: str, rng: random.Random) -> str:
+    """在单词中引入一处编辑: 替换、删除、插入或相邻交换"""
+    position = rng.randrange(1, len(word) - 1)
+    edit = rng.choice(["replace", "delete", "insert", "swap"])
+    if edit == "replace":
+        return word[:position] + rng.choice(_ALPHABET.replace(word[position], "")) + word[position + 1:]
+    if edit == "delete":
+        return word[:position] + word[position + 1:]
+    if edit == "insert":
+        return word[:position] + rng.choice(_ALPHABET) + word[position:]
+    return word[:position - 1] + word[position] + word[position - 1] + word[position + 1:]
+
+
+def make_query(case: Dict[str, Any], kind: str, rng: random.Random) -> str:
+    clauses = case["symptoms"].split("，")
+    text = "，".join(clauses[:2])
+    if case["service"] not in text:
+        text = f"{case['service']} {text}"
+    if kind == "paraphrase":
+        for phrase, synonym in SYNONYMS.items():
+            text = text.replace(phrase, synonym)
+    elif kind == "typo":
+        # 只改6个字母以上的英文单词（AUTO 模糊匹配允许2次编辑）
+        words = sorted(set(re.findall(r"[A-Za-z]{6,}", text)))
+        if words:
+            word = rng.choice(words)
+            text = text.replace(word, _typo(word, rng), 1)
+    return text
+
+
+def make_queries(case_count: int, query_count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """随机抽取 query_count 条案例生成查询，三类查询轮流出现；relevant 为标注答案（案例ID列表）"""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(query_count):
+        case = make_case(rng.randrange(case_count), seed)
+        kind = QUERY_KINDS[i % len(QUERY_KINDS)]
+        queries.append({"query": make_query(case, kind, rng), "kind": kind, "relevant": [case["id"]]})
+    return queries
+
+
+def write_jsonl(path: str, rows) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成故障知识库与带标注答案的检索查询")
+    parser.add_argument("--cases", type=int, default=10000, help="案例数")
+    parser.add_argument("--queries", type=int, default=300, help="查询数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output-dir", default="data/synthetic", help="输出 cases.jsonl 与 queries.jsonl 的目录")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    cases = write_jsonl(os.path.join(args.output_dir, "cases.jsonl"), iter_cases(args.cases, args.seed))
+    queries = write_jsonl(os.path.join(args.output_dir, "queries.jsonl"), make_queries(args.cases, args.queries, args.seed))
+    print(f"✅ 生成 {cases} 条案例、{queries} 个查询 -> {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
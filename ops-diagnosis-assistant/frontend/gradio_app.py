@@ -3,12 +3,26 @@ import requests
 import json
 import time
 import uuid
+import logging
 from typing import List, Tuple, Dict, Any
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# 诊断节点完成时展示给用户的进度描述
+NODE_LABELS = {
+    "welcome": "初始化诊断会话",
+    "collect_symptoms": "症状分析完成",
+    "ask_clarifying_questions": "正在生成追问",
+    "retrieve_knowledge": "知识库检索完成",
+    "analyze_root_cause": "根因分析完成",
+    "generate_solution": "解决方案已生成",
+    "confirm_resolution": "正在确认解决情况",
+}
+
 class DiagnosisChatInterface:
     def __init__(self):
         self.api_base_url = os.getenv("API_BASE_URL", "http://localhost:8000")
@@ -30,15 +44,17 @@ class DiagnosisChatInterface:
             return False
     
     def _wait_for_task_completion(self, task_id: str, max_wait: int = 30) -> Dict[str, Any]:
-        """等待任务完成"""
+        """等待任务完成（长轮询：服务端在任务完成时立即返回，无需每秒轮询）"""
         start_time = time.time()
         
         while time.time() - start_time < max_wait:
             try:
+                wait = max(1, min(int(max_wait - (time.time() - start_time)), 25))
                 response = requests.get(
                     f"{self.api_base_url}/tasks/{task_id}",
                     headers=self.headers,
-                    timeout=5
+                    params={"wait": wait},
+                    timeout=wait + 5
                 )
                 
                 if response.status_code == 200:
@@ -46,7 +62,7 @@ class DiagnosisChatInterface:
 
                     
                     if status_data["status"] == "SUCCESS":
-                        return {"status": "success", "data": status_data.get("result").get("result")}
+                        return {"status": "success", "data": self._fetch_turn(status_data.get("result"))}
                     elif status_data["status"] == "FAILURE":
                         return {"status": "error", "message": status_data.get("error", "任务执行失败")}
                     # elif status_data["status"] == "PROGRESS":
@@ -54,8 +70,8 @@ class DiagnosisChatInterface:
                     #     yield {"status": "progress", "message": progress.get("status", "处理中...")}
                     # else:
                     #     yield {"status": "progress", "message": "任务排队中..."}
-                
-                time.sleep(1)
+                else:
+                    time.sleep(1)
                 
             except Exception as e:
                 return {"status": "error", "message": f"查询任务状态失败: {str(e)}"}
@@ -63,6 +79,78 @@ class DiagnosisChatInterface:
         
         return {"status": "error", "message": "任务执行超时"}
     
+    def _fetch_turn(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """任务结果只包含会话版本号引用，按版本号增量拉取该轮的回复正文"""
+        response = requests.get(
+            f"{self.api_base_url}/sessions/{result['session_id']}/turns",
+            headers=self.headers,
+            params={"since": result["version"] - 1},
+            timeout=10
+        )
+        response.raise_for_status()
+        turns = response.json()["turns"]
+        return turns[0] if turns else {}
+
+    def _describe_progress(self, event: Dict[str, Any]) -> str:
+        """把节点进度事件转换为一行可读的进度描述"""
+        node = event.get("node", "")
+        line = f"{NODE_LABELS.get(node, node)} ({event.get('elapsed_ms', 0) / 1000:.1f}s)"
+        if node == "collect_symptoms" and event.get("symptoms"):
+            line += f"：{', '.join(event['symptoms'])}"
+        elif node == "retrieve_knowledge" and event.get("cases"):
+            cases = ", ".join(f"{c['fault_type']}({c['score']})" for c in event["cases"])
+            line += f"：命中案例 {cases}"
+        elif node == "analyze_root_cause" and event.get("root_cause"):
+            line += f"：{event['root_cause']}"
+        return line
+
+    def _follow_task_events(self, task_id: str, max_wait: int = 30):
+        """
+        通过WebSocket订阅任务事件，逐条产出进度，最后产出成功/失败结果
+
+        WebSocket不可用时降级为长轮询（只返回最终结果）。
+        """
+        try:
+            from websockets.sync.client import connect
+
+            ws_url = self.api_base_url.replace("http://", "ws://").replace("https://", "wss://")
+            deadline = time.time() + max_wait
+            with connect(f"{ws_url}/ws/tasks/{task_id}?api_key={self.api_key}", open_timeout=5) as ws:
+                while time.time() < deadline:
+                    event = json.loads(ws.recv(timeout=max(deadline - time.time(), 0.1)))
+                    event_type = event.get("type")
+                    status = event.get("status")
+                    if event_type == "progress" and event.get("node"):
+                        yield {"status": "progress", "message": self._describe_progress(event)}
+                    elif event_type == "success" or status == "SUCCESS":
+                        yield {"status": "success", "data": self._fetch_turn(event.get("result"))}
+                        return
+                    elif event_type == "failure" or status == "FAILURE":
+                        yield {"status": "error", "message": event.get("error", "任务执行失败")}
+                        return
+            yield {"status": "error", "message": "任务执行超时"}
+        except TimeoutError:
+            yield {"status": "error", "message": "任务执行超时"}
+        except Exception as e:
+            logger.warning(f"⚠️ WebSocket订阅失败，改用长轮询: {e}")
+            yield self._wait_for_task_completion(task_id, max_wait)
+
+    def _submit_diagnosis(self, data: Dict[str, Any], retries: int = 2) -> requests.Response:
+        """提交诊断任务；超时或连接失败时用同一个 Idempotency-Key 重试，服务端不会重复执行诊断"""
+        headers = {**self.headers, "Idempotency-Key": str(uuid.uuid4())}
+        for attempt in range(retries + 1):
+            try:
+                return requests.post(
+                    f"{self.api_base_url}/diagnose/async",
+                    json=data,
+                    headers=headers,
+                    timeout=10
+                )
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                if attempt == retries:
+                    raise
+                time.sleep(1)
+
     def send_message(self, message: str, chat_history: List[Tuple[str, str]]) -> Tuple[str, List[Tuple[str, str]]]:
         """发送消息并获取回复"""
         if not message.strip():
@@ -79,33 +167,45 @@ class DiagnosisChatInterface:
             if self.session_id:
                 data["session_id"] = self.session_id
             
-            response = requests.post(
-                f"{self.api_base_url}/diagnose/async",
-                json=data,
-                headers=self.headers,
-                timeout=10
-            )
+            response = self._submit_diagnosis(data)
             
+            if response.status_code in (429, 503):
+                # 服务繁忙（队列积压或限流），提示用户稍后重试而不是提交后等到超时
+                retry_after = response.headers.get("Retry-After", "?")
+                error_msg = f"⏳ 服务繁忙：{response.json().get('detail', '')}，请约 {retry_after} 秒后重试"
+                chat_history[-1] = (message, error_msg)
+                yield "", chat_history
+                return
             if response.status_code != 200:
                 error_msg = f"❌ 请求失败: {response.text}"
                 chat_history[-1] = (message, error_msg)
-                return "", chat_history
+                yield "", chat_history
+                return
             
             task_info = response.json()
             self.current_task_id = task_info["task_id"]
             self.session_id = task_info["session_id"]
             
-            # 等待任务完成并流式更新
-            # for update in self._wait_for_task_completion(self.current_task_id):
-            #     if update["status"] == "progress":
-            #         chat_history[-1] = (message, f"⏳ {update['message']}...")
-            #         yield "", chat_history
-            #     elif update["status"] == "error":
-            #         chat_history[-1] = (message, f"❌ {update['message']}")
-            #         yield "", chat_history
-            #         return
+            # 等待任务完成并流式更新节点进度（检索到的案例等在方案生成前就能看到）
+            progress_lines = []
+            max_wait = 30
+            eta = task_info.get("eta_seconds")
+            if eta:
+                # 按服务端估算的ETA等待，队列较长时不会在任务开始执行前就判定超时
+                max_wait = max(max_wait, int(eta * 1.5) + 10)
+                progress_lines.append(f"⏳ 已进入诊断队列（前面 {task_info.get('queue_ahead', 0)} 个任务），预计 {eta:.0f} 秒内完成")
+                chat_history[-1] = (message, "\n".join(progress_lines))
+                yield "", chat_history
+            final_result = {"status": "error", "message": "任务执行超时"}
+            for update in self._follow_task_events(self.current_task_id, max_wait):
+                if update["status"] == "progress":
+                    progress_lines.append(f"⏳ {update['message']}")
+                    chat_history[-1] = (message, "\n".join(progress_lines))
+                    yield "", chat_history
+                else:
+                    final_result = update
+                    break
             
-            final_result = self._wait_for_task_completion(self.current_task_id)
             print(f"wx final_result {final_result}")
             if final_result["status"] == "success":
                 result_data = final_result["data"]
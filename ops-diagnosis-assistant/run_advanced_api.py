@@ -3,12 +3,11 @@
 运维诊断助手高级API启动脚本
 """
 import uvicorn
-import os
-from dotenv import load_dotenv
 
-load_dotenv()
+from src.config import get_settings
 
 if __name__ == "__main__":
+    settings = get_settings()
     print("🚀 启动运维智能诊断助手高级API...")
     print("📍 API文档地址: http://localhost:8000/docs")
     print("📍 健康检查: http://localhost:8000/health")
@@ -16,8 +15,8 @@ if __name__ == "__main__":
     
     uvicorn.run(
         "src.api.advanced_main:app",
-        host=os.getenv("API_HOST", "0.0.0.0"),
-        port=int(os.getenv("API_PORT", 8000)),
+        host=settings.api_host,
+        port=settings.api_port,
         reload=True,
         log_level="info",
         access_log=True
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+离线批量诊断脚本 - 对JSONL文件中的故障工单逐条运行诊断智能体（例如为已关闭的工单做复盘标注）
+
+    python run_bulk_diagnosis.py incidents.jsonl -o results.jsonl
+    python run_bulk_diagnosis.py incidents.jsonl -o results.jsonl --workers 4 --pool thread
+    python run_bulk_diagnosis.py incidents.jsonl -o results.jsonl --stub     # 桩模型试运行，无需Ollama/ES
+
+- 输入每行一个JSON对象，问题文本取 --text-field（默认 message），标识取 --id-field（默认 id，缺省为行号）
+- 相同的问题（空白字符规范化后）只诊断一次，重复的工单直接复用结果并标记 duplicate_of
+- 每个分片（--chunk-size 条）先用一次ES _msearch 取回全部知识，再逐条诊断
+- 结果按完成顺序逐行追加写入输出文件；中断后用同样的命令重新运行，已成功的工单会被跳过
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Tuple
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+@lru_cache(maxsize=1)
+def _build_agent(stub: bool):
+    """每个工作进程构建一个智能体（线程池下所有线程共享）"""
+    from src.core.advanced_agent import AdvancedDiagnosisAgent
+
+    if stub:
+        from benchmarks.stubs import StubChatModel, StubRetriever
+        return AdvancedDiagnosisAgent(debug_mode=False, llm=StubChatModel(), retriever=StubRetriever())
+    return AdvancedDiagnosisAgent(debug_mode=False)
+
+
+def diagnose_chunk(messages: List[str], stub: bool = False) -> List[Dict[str, Any]]:
+    """诊断一个分片：一次批量检索，然后逐条诊断（单条失败只记录错误）"""
+    agent = _build_agent(stub)
+    knowledge = agent.prefetch_knowledge(messages)
+    results = []
+    for message, cases in zip(messages, knowledge):
+        start = time.perf_counter()
+        try:
+            response, state = agent.diagnose(message, f"bulk-{time.time_ns()}", prefetched_cases=cases)
+            results.append({
+                "response": response,
+                "diagnosis_stage": state.get("diagnosis_stage"),
+                "problem_type": state.get("problem_type"),
+                "symptoms": state.get("confirmed_symptoms", []),
+                "root_cause": state.get("root_cause_analysis", ""),
+                "retrieved_cases": state.get("retrieved_cases", []),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+            })
+        except Exception as e:
+            results.append({"error": str(e), "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)})
+    return results
+
+
+def load_checkpoint(output_path: str) -> Tuple[set, Dict[str, Dict[str, Any]]]:
+    """
+    读取已写入的结果：返回 (已完成的工单标识, 规范化问题 -> 结果)
+
+    中断时最后一行可能只写了一半，截断到最后一个完整行后再继续追加。
+    """
+    done_ids, results_by_text = set(), {}
+    if not os.path.exists(output_path):
+        return done_ids, results_by_text
+
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        if len(complete) != len(data):
+            f.truncate(len(complete))
+    for line in complete.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        # 失败的工单重新运行时会重试
+        if "error" not in record:
+            done_ids.add(record["id"])
+            results_by_text.setdefault(_normalize(record["message"]), record)
+    return done_ids, results_by_text
+
+
+def read_incidents(input_path: str, text_field: str, id_field: str):
+    """逐行读取工单，产出 (工单标识, 问题文本)"""
+    with open(input_path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            message = record.get(text_field)
+            if not message:
+                print(f"⚠️ 第{line_no}行缺少字段 {text_field}，已跳过", file=sys.stderr)
+                continue
+            yield str(record.get(id_field, line_no)), message
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线批量诊断JSONL中的故障工单")
+    parser.add_argument("input", help="输入JSONL文件")
+    parser.add_argument("-o", "--output", required=True, help="输出JSONL文件（同时作为断点续跑的进度记录）")
+    parser.add_argument("--text-field", default="message", help="问题文本字段")
+    parser.add_argument("--id-field", default="id", help="工单标识字段（缺省为行号）")
+    parser.add_argument("--pool", choices=["process", "thread"], default="process", help="并行方式")
+    parser.add_argument("--workers", type=int, default=2, help="并行的进程/线程数")
+    parser.add_argument("--chunk-size", type=int, default=8, help="每个分片的问题数（一次批量检索）")
+    parser.add_argument("--stub", action="store_true", help="使用桩模型和桩检索器试运行")
+    args = parser.parse_args()
+
+    done_ids, results_by_text = load_checkpoint(args.output)
+    # 规范化问题 -> 等待该问题结果的工单标识（第一个为原始工单）
+    pending: Dict[str, List[str]] = {}
+    messages: Dict[str, str] = {}
+    total = reused = 0
+    with open(args.output, "a", encoding="utf-8") as out:
+        def write(record: Dict[str, Any]):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+
+        for incident_id, message in read_incidents(args.input, args.text_field, args.id_field):
+            total += 1
+            if incident_id in done_ids:
+                continue
+            key = _normalize(message)
+            if key in results_by_text:
+                # 与已完成的工单相同，直接复用结果
+                previous = results_by_text[key]
+                write({**previous, "id": incident_id, "message": message, "duplicate_of": previous.get("duplicate_of") or previous["id"]})
+                reused += 1
+                continue
+            pending.setdefault(key, []).append(incident_id)
+            messages.setdefault(key, message)
+
+        keys = list(pending)
+        chunks = [keys[i:i + args.chunk_size] for i in range(0, len(keys), args.chunk_size)]
+        print(
+            f"📦 工单 {total} 条：已完成 {len(done_ids)}，复用结果 {reused}，"
+            f"待诊断 {sum(len(ids) for ids in pending.values())}（去重后 {len(keys)}，{len(chunks)} 个分片）",
+            file=sys.stderr
+        )
+
+        executor_cls = ProcessPoolExecutor if args.pool == "process" else ThreadPoolExecutor
+        start = time.perf_counter()
+        diagnosed = 0
+        with executor_cls(max_workers=args.workers) as executor:
+            # 同时提交的分片数有上限，避免大文件一次性占用内存
+            in_flight = {}
+            next_chunk = 0
+            while next_chunk < len(chunks) or in_flight:
+                while next_chunk < len(chunks) and len(in_flight) < args.workers * 2:
+                    chunk = chunks[next_chunk]
+                    future = executor.submit(diagnose_chunk, [messages[key] for key in chunk], args.stub)
+                    in_flight[future] = chunk
+                    next_chunk += 1
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    chunk = in_flight.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        results = [{"error": str(e)}] * len(chunk)
+                    for key, result in zip(chunk, results):
+                        first_id = pending[key][0]
+                        for incident_id in pending[key]:
+                            record = {"id": incident_id, "message": messages[key], **result}
+                            if incident_id != first_id:
+                                record["duplicate_of"] = first_id
+                            write(record)
+                    diagnosed += len(chunk)
+                    print(f"⏳ 已诊断 {diagnosed}/{len(keys)}", file=sys.stderr)
+
+    print(f"✅ 批量诊断完成: {diagnosed} 个问题，耗时 {time.perf_counter() - start:.1f}s，结果: {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
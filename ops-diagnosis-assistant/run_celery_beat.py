@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Celery Beat启动脚本（定时调度会话增量清理等周期任务）
+"""
+import os
+
+from src.config import get_settings
+
+if __name__ == "__main__":
+    settings = get_settings()
+    print("⏰ 启动Celery Beat...")
+    print("📍 Broker: ", settings.celery_broker_url)
+    print(f"📍 会话清理间隔: {settings.session_cleanup_interval}s")
+    
+    os.system("celery -A src.celery_app beat --loglevel=info")
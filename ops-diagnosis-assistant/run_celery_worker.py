@@ -1,15 +1,80 @@
 #!/usr/bin/env python3
 """
 Celery Worker启动脚本
+
+每个队列启动一个独立的Worker（独立的进程池和预取设置），LLM长任务不会阻塞轻量任务：
+    python run_celery_worker.py                      # 启动所有队列的Worker
+    python run_celery_worker.py llm priority         # 只启动指定队列的Worker
+
+每个Worker在 WORKER_METRICS_PORT 起依次编号的端口上导出Prometheus指标（prefork子进程的指标经各自的
+PROMETHEUS_MULTIPROC_DIR 汇总到主进程）。
 """
 import os
-from dotenv import load_dotenv
+import sys
+import tempfile
+import subprocess
+
+from src.config import get_settings
+
+# Worker实际消费的队列：llm进程池空闲时也优先取priority队列的P0任务
+# （priority进程池为P0预留，llm进程池只是额外的消费者，不会与之争抢普通任务）
+CONSUMED_QUEUES = {
+    "llm": ["priority", "llm"],
+}
+
+
+def build_worker_env(queue: str, metrics_port: int) -> dict:
+    """Worker的环境变量：独立的指标端口与多进程指标目录（每次启动使用新目录，避免读到旧进程的数据）"""
+    env = dict(os.environ)
+    if metrics_port:
+        env["WORKER_METRICS_PORT"] = str(metrics_port)
+        env["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix=f"celery-metrics-{queue}-")
+    else:
+        env["WORKER_METRICS_PORT"] = "0"
+    return env
+
+
+def build_worker_command(queue: str, pool_config: dict) -> list:
+    """构造单个队列Worker的启动命令"""
+    return [
+        sys.executable, "-m", "celery", "-A", "src.celery_app", "worker",
+        "--loglevel=info",
+        "-Q", ",".join(CONSUMED_QUEUES.get(queue, [queue])),
+        "-n", f"{queue}@%h",
+        f"--pool={pool_config['pool']}",
+        f"--concurrency={pool_config['concurrency']}",
+        f"--prefetch-multiplier={pool_config['prefetch_multiplier']}",
+    ]
 
-load_dotenv()
 
 if __name__ == "__main__":
+    settings = get_settings()
+    queues = sys.argv[1:] or list(settings.worker_pools)
+
+    unknown = [queue for queue in queues if queue not in settings.worker_pools]
+    if unknown:
+        print(f"❌ 未知队列: {', '.join(unknown)}（可选: {', '.join(settings.worker_pools)}）")
+        sys.exit(1)
+
     print("👷 启动Celery Worker...")
-    print("📍 Broker: ", os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0"))
-    print("📍 并发数: 2")
-    
-    os.system("celery -A src.celery_app worker --loglevel=info --concurrency=2")
\ No newline at end of file
+    print("📍 Broker: ", settings.celery_broker_url)
+
+    processes = []
+    for index, queue in enumerate(queues):
+        pool_config = settings.worker_pools[queue]
+        metrics_port = settings.worker_metrics_port + index if settings.worker_metrics_port else 0
+        print(
+            f"📍 队列 {queue}: pool={pool_config['pool']} "
+            f"并发数={pool_config['concurrency']} 预取={pool_config['prefetch_multiplier']}"
+            + (f" 指标端口={metrics_port}" if metrics_port else "")
+        )
+        processes.append(subprocess.Popen(build_worker_command(queue, pool_config), env=build_worker_env(queue, metrics_port)))
+
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
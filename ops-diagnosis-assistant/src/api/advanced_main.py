@@ -1,29 +1,114 @@
-import os
+import math
 import uuid
 import time
-from typing import Dict, Any, Optional
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Header, Depends
+import logging
+from contextlib import suppress
+from typing import Dict, Any, List, Optional, Literal
+from fastapi import FastAPI, HTTPException, Header, Depends, Query, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
-import uvicorn
-from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
 
-from src.tasks.diagnosis_tasks import process_diagnosis_task, cleanup_old_sessions_task
-from src.core.session_manager import RedisSessionManager
+from src.config import get_settings
+from src.celery_app import SEVERITY_ROUTES, DEFAULT_SEVERITY
+from src.api.backends import get_execution_backend
+from src.core.session_manager import get_session_manager
+from src.core.queue_stats import get_queue_wait_stats
+from src.core.worker_registry import get_worker_registry
+from src.core.alert_clustering import alert_signature, get_alert_clusterer
+from src.core.idempotency import get_idempotency_store
+from src.core.rate_limiter import get_rate_limiter
+from src.core.admission import get_admission_controller
+from src.core import metrics, tracing
+from src.core.task_events import get_task_event_hub, EVENT_STATUS, TERMINAL_EVENTS
+from src.core.logging_config import setup_logging
+from src.core.profiling import ARTIFACTS, get_profile_store, start_cpu_profile
 
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+# 任务的终态（不会再变化）
+TERMINAL_STATES = {"SUCCESS", "FAILURE", "REVOKED"}
 
 # 请求和响应模型
 class DiagnosisRequest(BaseModel):
     message: str = Field(..., description="用户输入的诊断问题")
     session_id: Optional[str] = Field(None, description="会话ID（可选）")
+    severity: Optional[Literal["P0", "P1", "P2", "P3"]] = Field(
+        None, description="严重级别（可选）：P0生产事故优先调度，默认P2"
+    )
 
 class DiagnosisResponse(BaseModel):
     task_id: str = Field(..., description="任务ID")
     session_id: str = Field(..., description="会话ID")
     status: str = Field(..., description="任务状态")
     message: str = Field(..., description="状态消息")
+    severity: Optional[str] = Field(None, description="严重级别")
+    eta_seconds: Optional[float] = Field(None, description="预计完成时间（秒，按队列积压与历史节点耗时估算）")
+    queue_ahead: Optional[int] = Field(None, description="提交时排在前面的任务数")
+
+class BatchDiagnosisItem(BaseModel):
+    id: Optional[str] = Field(None, description="调用方的问题标识（可选，原样返回）")
+    message: str = Field(..., description="诊断问题")
+
+class BatchDiagnosisRequest(BaseModel):
+    items: List[BatchDiagnosisItem] = Field(..., min_length=1, description="批量诊断的问题列表")
+    severity: Optional[Literal["P0", "P1", "P2", "P3"]] = Field(None, description="严重级别（可选），默认P2")
+
+class BatchItemResponse(BaseModel):
+    index: int = Field(..., description="问题在请求中的序号")
+    id: Optional[str] = Field(None, description="调用方的问题标识")
+    task_id: str = Field(..., description="处理该问题的任务ID（任务结果的results中按session_id对应）")
+    session_id: str = Field(..., description="该问题的会话ID")
+    duplicate_of: Optional[int] = Field(None, description="与之前某个问题相同时，为该问题的序号（共用诊断结果）")
+
+class BatchDiagnosisResponse(BaseModel):
+    batch_size: int = Field(..., description="问题数")
+    unique: int = Field(..., description="去重后实际诊断的问题数")
+    task_ids: List[str] = Field(..., description="各分片的任务ID")
+    items: List[BatchItemResponse] = Field(..., description="各问题对应的任务与会话")
+    severity: str = Field(..., description="严重级别")
+    eta_seconds: Optional[float] = Field(None, description="全部问题的预计完成时间（秒）")
+
+class AlertItem(BaseModel):
+    alert_id: Optional[str] = Field(None, description="告警ID（可选，缺省时自动生成）")
+    message: str = Field(..., description="告警内容")
+    source: Optional[str] = Field(None, description="告警来源/服务名（可选，不同来源的同类告警分别聚类）")
+    severity: Optional[Literal["P0", "P1", "P2", "P3"]] = Field(None, description="严重级别（可选），默认P2")
+
+class AlertIngestRequest(BaseModel):
+    alerts: List[AlertItem] = Field(..., min_length=1, description="告警列表")
+
+class AlertAssignment(BaseModel):
+    alert_id: str = Field(..., description="告警ID")
+    cluster_id: str = Field(..., description="所属聚类ID")
+
+class AlertClusterSummary(BaseModel):
+    cluster_id: str = Field(..., description="聚类ID")
+    pattern: str = Field(..., description="告警模式（可变部分已屏蔽）")
+    size: int = Field(..., description="聚类当前的告警数")
+    created: bool = Field(..., description="是否为本次新建的聚类（新聚类会提交一次诊断）")
+    task_id: Optional[str] = Field(None, description="聚类的诊断任务ID")
+    session_id: Optional[str] = Field(None, description="聚类的诊断会话ID")
+
+class AlertIngestResponse(BaseModel):
+    ingested: int = Field(..., description="本次接收的告警数")
+    diagnoses_submitted: int = Field(..., description="本次提交的诊断数（新聚类数）")
+    alerts: List[AlertAssignment] = Field(..., description="各告警所属的聚类")
+    clusters: List[AlertClusterSummary] = Field(..., description="本次涉及的聚类")
+
+class AlertResultResponse(BaseModel):
+    alert_id: Optional[str] = Field(None, description="告警ID（按聚类查询时为空）")
+    cluster_id: str = Field(..., description="聚类ID")
+    pattern: str = Field(..., description="告警模式")
+    size: int = Field(..., description="聚类的告警数")
+    first_seen: Optional[float] = Field(None, description="聚类第一条告警的时间")
+    last_seen: Optional[float] = Field(None, description="聚类最近一条告警的时间")
+    task_id: Optional[str] = Field(None, description="聚类的诊断任务ID")
+    session_id: Optional[str] = Field(None, description="聚类的诊断会话ID")
+    status: str = Field(..., description="诊断任务状态（聚类的诊断提交失败时为 SUBMIT_FAILED）")
+    diagnosis: Optional[str] = Field(None, description="诊断结果（任务完成后）")
+    members: Optional[List[str]] = Field(None, description="成员告警ID")
 
 class TaskStatusResponse(BaseModel):
     task_id: str = Field(..., description="任务ID")
@@ -39,13 +124,70 @@ class SessionInfoResponse(BaseModel):
     message_count: int = Field(..., description="消息数量")
     history: Optional[list] = Field(None, description="对话历史")
 
-# API密钥验证（简单实现）
+class SessionTurnsResponse(BaseModel):
+    session_id: str = Field(..., description="会话ID")
+    version: int = Field(..., description="会话当前版本号（已完成的诊断轮数）")
+    turns: list = Field(..., description="版本号大于since的各轮诊断结果")
+
+# API密钥验证：API_KEY 与 API_KEYS 中配置的各客户端密钥
+def _is_valid_api_key(api_key: Optional[str]) -> bool:
+    return api_key is not None and api_key in get_settings().api_clients
+
 async def verify_api_key(x_api_key: str = Header(...)):
-    expected_key = os.getenv("API_KEY", "default_secret_key")
-    if x_api_key != expected_key:
+    if not _is_valid_api_key(x_api_key):
         raise HTTPException(status_code=401, detail="无效的API密钥")
     return x_api_key
 
+async def verify_profiling_access(api_key: str = Depends(verify_api_key)):
+    """剖析接口只对 PROFILING_CLIENTS 中的客户端开放；PROFILING_ENABLED=false 时不存在"""
+    settings = get_settings()
+    if not settings.profiling_enabled:
+        raise HTTPException(status_code=404, detail="性能剖析未启用")
+    if settings.api_clients[api_key]["name"] not in settings.profiling_clients:
+        raise HTTPException(status_code=403, detail="该客户端无权进行性能剖析")
+    return api_key
+
+def _evaluate_admission(severity: str, diagnoses: int = 1) -> Dict[str, Any]:
+    """按执行后端当前的队列积压估算ETA；读取队列失败时放行（不估算ETA）"""
+    try:
+        load = get_execution_backend().queue_load(severity)
+    except Exception as e:
+        logger.warning(f"⚠️ 读取队列积压失败，跳过准入控制: {e}")
+        return {"admitted": True, "eta_seconds": None, "ahead": None}
+    return get_admission_controller().evaluate(load, diagnoses)
+
+async def _admit(severity: str, diagnoses: int = 1) -> Dict[str, Any]:
+    """预计排队超过 ADMISSION_MAX_WAIT 时返回429，没有Worker消费该队列时返回503（Retry-After 为建议的重试秒数）"""
+    decision = await run_in_threadpool(_evaluate_admission, severity, diagnoses)
+    if not decision["admitted"]:
+        retry_after = str(max(1, math.ceil(decision["retry_after"])))
+        if decision["status_code"] == 503:
+            detail = f"当前没有可执行 {severity} 诊断的Worker，请稍后重试"
+        else:
+            detail = f"诊断队列积压，预计排队 {decision['queue_wait_seconds']:.1f} 秒，超过上限 {get_settings().admission_max_wait} 秒"
+        raise HTTPException(status_code=decision["status_code"], detail=detail, headers={"Retry-After": retry_after})
+    return decision
+
+async def _enforce_rate_limit(api_key: str, cost: int = 1, reserve_tokens: int = 0) -> Dict[str, Any]:
+    """按客户端的令牌桶与每日token配额放行请求，超限时返回429（Retry-After 为需等待的秒数）"""
+    client = get_settings().api_clients[api_key]
+    decision = await run_in_threadpool(get_rate_limiter().acquire, client, cost, reserve_tokens)
+    if not decision["allowed"]:
+        retry_after = max(1, math.ceil(decision["retry_after"]))
+        if decision["reason"] == "daily_token_quota":
+            detail = f"客户端 {client['name']} 今日的LLM token配额已用完"
+        else:
+            detail = f"客户端 {client['name']} 请求过于频繁，请 {retry_after} 秒后重试"
+        raise HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(retry_after)})
+    return client
+
+def _release_idempotency_key(client_name: str, idempotency_key: str):
+    """释放幂等键；释放失败只记录日志，不掩盖原本要返回的错误（登记在 IDEMPOTENCY_TTL 后过期）"""
+    try:
+        get_idempotency_store().release(client_name, idempotency_key)
+    except Exception as e:
+        logger.warning(f"⚠️ 释放幂等键失败: {e}")
+
 # 初始化FastAPI应用
 app = FastAPI(
     title="运维智能诊断助手 API - 高级版",
@@ -64,8 +206,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 全局组件
-session_manager = RedisSessionManager()
+@app.middleware("http")
+async def trace_requests(request, call_next):
+    """每个HTTP请求一个入口span（调用方带有traceparent时接到调用方的trace上），提交的任务继承该上下文"""
+    if not tracing.ENABLED:
+        return await call_next(request)
+    handle = tracing.start_server_span(f"{request.method} {request.url.path}", request.headers, **{"http.method": request.method})
+    try:
+        response = await call_next(request)
+    except Exception as e:
+        tracing.end_server_span(handle, error=e)
+        raise
+    # 按路由模板命名（路径中的任务ID/会话ID不进入span名）
+    route = request.scope.get("route")
+    tracing.end_server_span(
+        handle, name=f"{request.method} {route.path}" if route else None,
+        **{"http.route": getattr(route, "path", None), "http.status_code": response.status_code}
+    )
+    return response
+
+@app.on_event("startup")
+async def start_execution_backend():
+    setup_logging()
+    tracing.init_tracing(f"{get_settings().tracing_service_name}-api")
+    await get_execution_backend().start()
+    # 队列积压在抓取时从broker读取，由API进程统一导出
+    metrics.register_queue_depth_collector()
+
+@app.on_event("shutdown")
+async def stop_execution_backend():
+    await get_execution_backend().shutdown()
 
 # API路由
 @app.get("/")
@@ -77,15 +247,29 @@ async def root():
         "features": [
             "异步诊断任务处理",
             "Redis会话持久化", 
-            "任务状态查询",
+            "任务状态查询（长轮询/WebSocket推送）",
             "API密钥认证"
         ],
         "endpoints": {
             "health": "/health",
+            "metrics": "/metrics",
             "diagnose_async": "/diagnose/async (POST)",
-            "task_status": "/tasks/{task_id} (GET)",
+            "diagnose_batch": "/diagnose/batch (POST)",
+            "task_status": "/tasks/{task_id}?wait=30 (GET, 支持长轮询)",
+            "task_events": "/ws/tasks/{task_id} (WebSocket)",
             "session_info": "/sessions/{session_id} (GET)",
-            "sessions": "/sessions (GET)"
+            "session_turns": "/sessions/{session_id}/turns?since=0 (GET, 增量获取诊断结果)",
+            "sessions": "/sessions (GET)",
+            "queue_wait": "/stats/queue-wait (GET)",
+            "idempotency": "/stats/idempotency (GET)",
+            "usage": "/stats/usage (GET)",
+            "admission": "/stats/admission (GET)",
+            "alerts_ingest": "/alerts/ingest (POST)",
+            "alert_result": "/alerts/{alert_id} (GET)",
+            "alert_stats": "/stats/alerts (GET)",
+            "profile_cpu": "/debug/profile/cpu?seconds=10&target=api (POST, 需剖析权限)",
+            "profile_result": "/debug/profiles/{profile_id} (GET, 需剖析权限)",
+            "profile_download": "/debug/profiles/{profile_id}/download?format=speedscope (GET, 需剖析权限)"
         }
     }
 
@@ -94,96 +278,434 @@ async def health_check():
     """健康检查端点"""
     try:
         # 测试Redis连接
-        redis_health = session_manager.session_exists("health_check")
+        redis_health = await run_in_threadpool(get_session_manager().session_exists, "health_check")
         
         # 测试Celery连接（简单版本）
         celery_health = True
+
+        # 已登记的Worker进程按预热结果（就绪/降级）分别按队列统计
+        workers = await run_in_threadpool(get_worker_registry().get_workers)
+        ready_by_queue: Dict[str, int] = {}
+        degraded_by_queue: Dict[str, int] = {}
+        for worker in workers:
+            counts = ready_by_queue if worker.get("status", "ready") == "ready" else degraded_by_queue
+            for queue in worker.get("queues", []):
+                counts[queue] = counts.get(queue, 0) + 1
         
         return {
             "status": "healthy",
             "service": "ops-diagnosis-assistant-v2",
             "timestamp": time.time(),
             "redis": "connected" if redis_health is not False else "disconnected",
-            "celery": "connected" if celery_health else "disconnected"
+            "celery": "connected" if celery_health else "disconnected",
+            "execution_backend": get_execution_backend().name,
+            "workers_ready": ready_by_queue,
+            "workers_degraded": degraded_by_queue
         }
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"服务不健康: {str(e)}")
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus指标（未安装 prometheus-client 或 METRICS_ENABLED=false 时返回503）"""
+    rendered = await run_in_threadpool(metrics.render_latest)
+    if rendered is None:
+        raise HTTPException(status_code=503, detail="指标未启用（需要安装 prometheus-client 且 METRICS_ENABLED=true）")
+    body, content_type = rendered
+    return Response(content=body, media_type=content_type)
+
 @app.post("/diagnose/async", response_model=DiagnosisResponse)
 async def diagnose_async(
     request: DiagnosisRequest,
-    background_tasks: BackgroundTasks,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255, description="幂等键：超时重试时携带相同的值，返回首次提交的任务"),
+    x_debug_trace: Optional[str] = Header(None, description="为 1/true 时Worker输出本轮各节点的事件日志（不受采样率限制）"),
+    x_profile: Optional[str] = Header(None, description="为 1/true 时剖析本次诊断，结果通过 /debug/profiles/{task_id} 获取"),
     api_key: str = Depends(verify_api_key)
 ):
     """
     异步诊断接口 - 接收用户问题并返回任务ID
+
+    携带 Idempotency-Key 时，同一个key在 IDEMPOTENCY_TTL 内的重复请求直接返回首次提交的任务
+    （响应头 Idempotent-Replayed: true），不会再次执行诊断。
     """
+    # 生成或使用现有会话ID
+    session_id = request.session_id or str(uuid.uuid4())
+    severity = request.severity or DEFAULT_SEVERITY
+    task_id = str(uuid.uuid4())
+    profile = (x_profile or "").lower() in ("1", "true", "yes")
+    if profile:
+        await verify_profiling_access(api_key)
+
+    # 幂等键按客户端隔离，先确定客户端再登记
+    client_name = get_settings().api_clients[api_key]["name"]
+    if idempotency_key:
+        store = get_idempotency_store()
+        fingerprint = store.fingerprint(request.model_dump())
+        try:
+            original = await run_in_threadpool(store.reserve, client_name, idempotency_key, {
+                "task_id": task_id, "session_id": session_id, "severity": severity, "fingerprint": fingerprint
+            })
+        except Exception as e:
+            logger.error(f"❌ 登记幂等键失败: {e}")
+            raise HTTPException(status_code=500, detail=f"诊断任务提交失败: {str(e)}")
+        if original is not None:
+            if original["fingerprint"] != fingerprint:
+                raise HTTPException(status_code=409, detail="Idempotency-Key 已用于内容不同的请求")
+            logger.info("♻️ 重复的诊断请求（Idempotency-Key: %s），返回已提交的任务", idempotency_key, extra={"task_id": original["task_id"]})
+            response.headers["Idempotent-Replayed"] = "true"
+            status = await run_in_threadpool(_read_task_status, original["task_id"])
+            return DiagnosisResponse(
+                task_id=original["task_id"],
+                session_id=original["session_id"],
+                status=status["status"],
+                message="重复请求，返回已提交的诊断任务",
+                severity=original["severity"]
+            )
+
+    # 重复请求不经过准入控制和限流；被拒绝时释放幂等键，客户端等待后可用同一个key重试
     try:
-        # 生成或使用现有会话ID
-        session_id = request.session_id or str(uuid.uuid4())
-        
-        print(f"🎯 收到异步诊断请求: {request.message}, 会话: {session_id}")
+        admission = await _admit(severity)
+        client = await _enforce_rate_limit(api_key, reserve_tokens=get_settings().diagnosis_token_estimate)
+    except HTTPException:
+        if idempotency_key:
+            await run_in_threadpool(_release_idempotency_key, client_name, idempotency_key)
+        raise
+
+    try:
+        logger.info("🎯 收到异步诊断请求: %s", request.message, extra={"session_id": session_id, "task_id": task_id})
         
-        # 提交Celery任务
-        task = process_diagnosis_task.apply_async(
-            args=[request.message, session_id],
-            task_id=str(uuid.uuid4())
+        # 按严重级别提交任务（Celery队列或进程内执行，由 EXECUTION_BACKEND 决定）
+        debug = (x_debug_trace or "").lower() in ("1", "true", "yes")
+        task_id = await run_in_threadpool(
+            get_execution_backend().submit, request.message, session_id, severity, task_id, client["name"], debug, profile
         )
         
-        # 添加后台任务清理（可选）
-        background_tasks.add_task(cleanup_old_sessions_task)
-        
         return DiagnosisResponse(
-            task_id=task.id,
+            task_id=task_id,
             session_id=session_id,
             status="PENDING",
-            message="诊断任务已提交，请使用task_id查询状态"
+            message="诊断任务已提交，请使用task_id查询状态",
+            severity=severity,
+            eta_seconds=admission["eta_seconds"],
+            queue_ahead=admission["ahead"]
         )
         
     except Exception as e:
-        print(f"❌ 异步诊断请求失败: {e}")
+        logger.error(f"❌ 异步诊断请求失败: {e}")
+        if idempotency_key:
+            await run_in_threadpool(_release_idempotency_key, client_name, idempotency_key)
+        # 任务没有提交成功，退回预占的token
+        await run_in_threadpool(get_rate_limiter().charge_tokens, client["name"], -get_settings().diagnosis_token_estimate)
         raise HTTPException(status_code=500, detail=f"诊断任务提交失败: {str(e)}")
 
+@app.post("/diagnose/batch", response_model=BatchDiagnosisResponse)
+async def diagnose_batch(
+    request: BatchDiagnosisRequest,
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    批量诊断接口 - 相同的问题只诊断一次，去重后按分片提交任务（每个分片一次ES _msearch 检索）
+
+    每个问题使用独立的新会话，诊断回复通过 /sessions/{session_id}/turns 获取。
+    限流按去重后的问题数计算，一次批量请求相当于同样数量的单条诊断请求。
+    """
+    settings = get_settings()
+    if len(request.items) > settings.batch_max_items:
+        raise HTTPException(status_code=400, detail=f"批量诊断最多 {settings.batch_max_items} 条，实际 {len(request.items)} 条")
+
+    severity = request.severity or DEFAULT_SEVERITY
+    unique_count = len({" ".join(item.message.split()) for item in request.items})
+    admission = await _admit(severity, unique_count)
+    client = await _enforce_rate_limit(api_key, unique_count, settings.diagnosis_token_estimate * unique_count)
+    # 已提交的问题数：提交失败时只退回未提交部分预占的token
+    submitted = 0
+
+    try:
+        # 去重：空白字符规范化后相同的问题共用一个会话
+        first_index: Dict[str, int] = {}
+        unique_items = []
+        items = []
+        for index, item in enumerate(request.items):
+            key = " ".join(item.message.split())
+            # 任务ID在分片提交后按会话回填
+            if key in first_index:
+                items.append(BatchItemResponse(
+                    index=index, id=item.id, task_id="",
+                    session_id=items[first_index[key]].session_id, duplicate_of=first_index[key]
+                ))
+                continue
+            first_index[key] = index
+            unique_items.append({"message": item.message, "session_id": str(uuid.uuid4())})
+            items.append(BatchItemResponse(index=index, id=item.id, task_id="", session_id=unique_items[-1]["session_id"]))
+
+        logger.info(f"📦 收到批量诊断请求: {len(request.items)} 条，去重后 {len(unique_items)} 条")
+
+        backend = get_execution_backend()
+        task_of_session: Dict[str, str] = {}
+        task_ids = []
+        for start in range(0, len(unique_items), settings.batch_chunk_size):
+            chunk = unique_items[start:start + settings.batch_chunk_size]
+            task_id = await run_in_threadpool(backend.submit_batch, chunk, severity, str(uuid.uuid4()), client["name"])
+            submitted += len(chunk)
+            task_ids.append(task_id)
+            task_of_session.update((item["session_id"], task_id) for item in chunk)
+        for item in items:
+            item.task_id = task_of_session[item.session_id]
+
+        return BatchDiagnosisResponse(
+            batch_size=len(request.items),
+            unique=len(unique_items),
+            task_ids=task_ids,
+            items=items,
+            severity=severity,
+            eta_seconds=admission["eta_seconds"]
+        )
+
+    except Exception as e:
+        logger.error(f"❌ 批量诊断请求失败: {e}")
+        # 未提交的问题退回预占的token（已提交的分片照常执行，完成后按实际用量结算）
+        await run_in_threadpool(
+            get_rate_limiter().charge_tokens, client["name"], -settings.diagnosis_token_estimate * (unique_count - submitted)
+        )
+        raise HTTPException(status_code=500, detail=f"批量诊断任务提交失败（已提交 {submitted}/{unique_count} 个问题）: {str(e)}")
+
+@app.post("/alerts/ingest", response_model=AlertIngestResponse)
+async def ingest_alerts(
+    request: AlertIngestRequest,
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    告警接收接口 - 同类告警（屏蔽IP、主机名、数字等可变部分后相同）在滑动时间窗口内归为一个聚类，
+    每个聚类只提交一次诊断，成员告警通过 /alerts/{alert_id} 获取聚类的诊断结果
+    """
+    settings = get_settings()
+    if len(request.alerts) > settings.alert_ingest_max_items:
+        raise HTTPException(status_code=400, detail=f"单次最多接收 {settings.alert_ingest_max_items} 条告警，实际 {len(request.alerts)} 条")
+    # 告警推送按请求限流；新聚类提交的诊断在提交后计入当日token用量
+    client = await _enforce_rate_limit(api_key)
+
+    try:
+        # 先在本次请求内按签名分组，每个签名只访问一次Redis
+        groups: Dict[str, Dict[str, Any]] = {}
+        for alert in request.alerts:
+            signature, pattern = alert_signature(alert.message, alert.source or "")
+            group = groups.setdefault(signature, {"pattern": pattern, "alerts": []})
+            group["alerts"].append({
+                "alert_id": alert.alert_id or str(uuid.uuid4()),
+                "message": alert.message,
+                "severity": alert.severity or DEFAULT_SEVERITY,
+            })
+
+        clusterer = get_alert_clusterer()
+        clusters = await run_in_threadpool(lambda: [
+            clusterer.ingest(signature, group["pattern"], group["alerts"]) for signature, group in groups.items()
+        ])
+
+        # 新聚类提交一次诊断：以第一条告警为诊断问题，严重级别取组内最高
+        backend = get_execution_backend()
+        submitted, failed = [], []
+        for cluster, group in zip(clusters, groups.values()):
+            if not cluster["created"]:
+                continue
+            severity = min(alert["severity"] for alert in group["alerts"])
+            session_id = str(uuid.uuid4())
+            try:
+                cluster["task_id"] = await run_in_threadpool(
+                    backend.submit, cluster["sample"], session_id, severity, str(uuid.uuid4()), client["name"]
+                )
+            except Exception as e:
+                logger.error(f"❌ 聚类 {cluster['cluster_id']} 的诊断提交失败: {e}")
+                failed.append(cluster)
+                continue
+            cluster["session_id"] = session_id
+            submitted.append((cluster["cluster_id"], cluster["task_id"], session_id, severity))
+        # 已提交的诊断先登记到聚类，再处理提交失败的聚类
+        if submitted:
+            await run_in_threadpool(lambda: [clusterer.attach_task(*args) for args in submitted])
+            await run_in_threadpool(
+                get_rate_limiter().charge_tokens, client["name"], settings.diagnosis_token_estimate * len(submitted)
+            )
+        if failed:
+            # 关闭提交失败的聚类，告警重推时新建聚类并重新提交诊断
+            await run_in_threadpool(lambda: [clusterer.abandon(cluster["signature"], cluster["cluster_id"]) for cluster in failed])
+            raise HTTPException(
+                status_code=500,
+                detail=f"{len(failed)} 个告警聚类的诊断提交失败（已提交 {len(submitted)} 个），请重新推送告警"
+            )
+
+        logger.info(f"🚨 收到告警 {len(request.alerts)} 条: {len(clusters)} 个聚类，新提交诊断 {len(submitted)} 个")
+
+        return AlertIngestResponse(
+            ingested=len(request.alerts),
+            diagnoses_submitted=len(submitted),
+            alerts=[
+                AlertAssignment(alert_id=alert["alert_id"], cluster_id=cluster["cluster_id"])
+                for cluster, group in zip(clusters, groups.values())
+                for alert in group["alerts"]
+            ],
+            clusters=[
+                AlertClusterSummary(
+                    cluster_id=cluster["cluster_id"],
+                    pattern=cluster["pattern"],
+                    size=cluster["count"],
+                    created=cluster["created"],
+                    task_id=cluster.get("task_id"),
+                    session_id=cluster.get("session_id")
+                )
+                for cluster in clusters
+            ]
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ 告警接收失败: {e}")
+        raise HTTPException(status_code=500, detail=f"告警接收失败: {str(e)}")
+
+def _cluster_result(cluster: Dict[str, Any], alert_id: Optional[str] = None) -> AlertResultResponse:
+    """聚类信息 + 诊断任务状态，任务完成后附带诊断回复"""
+    status, diagnosis = "PENDING", None
+    if cluster.get("status") == "submit_failed":
+        # 诊断没有提交成功，重新推送的告警会新建聚类
+        status = "SUBMIT_FAILED"
+    elif cluster.get("task_id"):
+        status = _read_task_status(cluster["task_id"])["status"]
+        if status == "SUCCESS":
+            _, turns = get_session_manager().get_turns(cluster["session_id"], 0)
+            diagnosis = turns[-1]["response"] if turns else None
+    return AlertResultResponse(
+        alert_id=alert_id,
+        cluster_id=cluster["cluster_id"],
+        pattern=cluster["pattern"],
+        size=cluster["count"],
+        first_seen=cluster.get("first_seen"),
+        last_seen=cluster.get("last_seen"),
+        task_id=cluster.get("task_id"),
+        session_id=cluster.get("session_id"),
+        status=status,
+        diagnosis=diagnosis,
+        members=cluster.get("members")
+    )
+
+@app.get("/alerts/clusters/{cluster_id}", response_model=AlertResultResponse)
+async def get_alert_cluster(cluster_id: str, api_key: str = Depends(verify_api_key)):
+    """
+    获取告警聚类的成员与诊断结果
+    """
+    cluster = await run_in_threadpool(get_alert_clusterer().get_cluster, cluster_id, True)
+    if not cluster:
+        raise HTTPException(status_code=404, detail="聚类不存在或已过期")
+    return await run_in_threadpool(_cluster_result, cluster)
+
+@app.get("/alerts/{alert_id}", response_model=AlertResultResponse)
+async def get_alert_result(alert_id: str, api_key: str = Depends(verify_api_key)):
+    """
+    获取告警的诊断结果（即其所属聚类的诊断结果）
+    """
+    cluster = await run_in_threadpool(get_alert_clusterer().get_alert_cluster, alert_id)
+    if not cluster:
+        raise HTTPException(status_code=404, detail="告警不存在或已过期")
+    return await run_in_threadpool(_cluster_result, cluster, alert_id)
+
+def _read_task_status(task_id: str) -> Dict[str, Any]:
+    """从执行后端读取一次任务状态"""
+    return get_execution_backend().get_status(task_id)
+
+def _status_from_event(task_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+    """把推送事件转换为任务状态（无需再读取结果后端）"""
+    response_data = {"task_id": task_id, "status": EVENT_STATUS.get(event["type"], "PENDING")}
+    if event["type"] == "success":
+        response_data["result"] = event.get("result")
+    elif event["type"] == "failure":
+        response_data["error"] = event.get("error")
+    elif event["type"] == "progress":
+        response_data["progress"] = event
+    return response_data
+
 @app.get("/tasks/{task_id}", response_model=TaskStatusResponse)
-async def get_task_status(task_id: str, api_key: str = Depends(verify_api_key)):
+async def get_task_status(
+    task_id: str,
+    wait: int = Query(0, ge=0, description="长轮询：任务未结束时最多等待的秒数（0表示立即返回）"),
+    api_key: str = Depends(verify_api_key)
+):
     """
     查询任务状态
+
+    指定 wait 时为长轮询：任务完成/失败的事件一到达立即返回，否则在超时后返回当前状态。
     """
     try:
-        from src.celery_app import celery_app
-        
-        # 获取任务结果
-        task_result = celery_app.AsyncResult(task_id)
+        if wait <= 0:
+            return TaskStatusResponse(**await run_in_threadpool(_read_task_status, task_id))
 
-        print(f"wx task_result {task_result}")
-        
-        response_data = {
-            "task_id": task_id,
-            "status": task_result.status,
-            "result": task_result.result
-        }
+        hub = get_task_event_hub()
+        # 先订阅再读取状态，保证读取之后发生的完成事件不会丢失
+        subscription = await hub.subscribe(task_id)
+        try:
+            response_data = await run_in_threadpool(_read_task_status, task_id)
+            if response_data["status"] not in TERMINAL_STATES:
+                timeout = min(wait, get_settings().task_long_poll_max_wait)
+                event = await subscription.wait_for_terminal(timeout)
+                if event is not None:
+                    response_data = _status_from_event(task_id, event)
+                else:
+                    # 超时后再确认一次，防止订阅连接异常时错过完成事件
+                    response_data = await run_in_threadpool(_read_task_status, task_id)
+                    if response_data["status"] not in TERMINAL_STATES and subscription.last_progress:
+                        response_data = _status_from_event(task_id, subscription.last_progress)
+        finally:
+            hub.unsubscribe(subscription)
 
-        print(f"wx response_data {response_data}")
-        
-        if task_result.status == 'SUCCESS':
-            response_data["result"] = task_result.result
-        elif task_result.status == 'FAILURE':
-            response_data["error"] = str(task_result.result)
-        elif task_result.status == 'PROGRESS':
-            response_data["progress"] = task_result.result
-        
         return TaskStatusResponse(**response_data)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"查询任务状态失败: {str(e)}")
 
+@app.websocket("/ws/tasks/{task_id}")
+async def task_events_websocket(websocket: WebSocket, task_id: str):
+    """
+    订阅任务事件：连接后先推送一次当前状态快照，之后实时推送进度/完成事件，任务结束后关闭连接
+
+    浏览器无法设置自定义请求头，可通过 ?api_key= 传递API密钥。
+    """
+    api_key = websocket.headers.get("x-api-key") or websocket.query_params.get("api_key")
+    if not _is_valid_api_key(api_key):
+        await websocket.close(code=1008, reason="无效的API密钥")
+        return
+
+    await websocket.accept()
+    hub = get_task_event_hub()
+    subscription = await hub.subscribe(task_id)
+    try:
+        snapshot = await run_in_threadpool(_read_task_status, task_id)
+        await websocket.send_json({"type": "snapshot", **snapshot})
+        if snapshot["status"] in TERMINAL_STATES:
+            return
+
+        heartbeat_interval = get_settings().task_long_poll_max_wait
+        while True:
+            event = await subscription.next_event(heartbeat_interval)
+            if event is None:
+                # 心跳：保持连接并及时发现客户端断开
+                await websocket.send_json({"type": "heartbeat", "ts": time.time()})
+                continue
+            await websocket.send_json(event)
+            if event["type"] in TERMINAL_EVENTS:
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unsubscribe(subscription)
+        with suppress(Exception):
+            await websocket.close()
+
 @app.get("/sessions/{session_id}", response_model=SessionInfoResponse)
 async def get_session_info(session_id: str, api_key: str = Depends(verify_api_key)):
     """
     获取会话信息
     """
     try:
-        session_data = session_manager.load_session(session_id)
+        session_data = await run_in_threadpool(get_session_manager().load_session, session_id)
         
         if not session_data:
             raise HTTPException(status_code=404, detail="会话不存在")
@@ -204,13 +726,34 @@ async def get_session_info(session_id: str, api_key: str = Depends(verify_api_ke
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取会话信息失败: {str(e)}")
 
+@app.get("/sessions/{session_id}/turns", response_model=SessionTurnsResponse)
+async def get_session_turns(
+    session_id: str,
+    since: int = Query(0, ge=0, description="客户端已见过的版本号，只返回之后的各轮结果"),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    增量获取会话的诊断结果（任务结果中的 version 即对应轮次的版本号）
+    """
+    try:
+        version, turns = await run_in_threadpool(get_session_manager().get_turns, session_id, since)
+        if version == 0 and not await run_in_threadpool(get_session_manager().session_exists, session_id):
+            raise HTTPException(status_code=404, detail="会话不存在")
+        return SessionTurnsResponse(session_id=session_id, version=version, turns=turns)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取会话结果失败: {str(e)}")
+
 @app.get("/sessions")
 async def list_sessions(api_key: str = Depends(verify_api_key)):
     """
     列出所有活跃会话（仅用于调试）
     """
     try:
-        sessions = session_manager.get_all_sessions()
+        session_manager = get_session_manager()
+        sessions = await run_in_threadpool(session_manager.get_all_sessions)
+        last_activity = await run_in_threadpool(session_manager.get_last_activity, sessions.keys())
         
         session_list = []
         for session_id, session_data in sessions.items():
@@ -219,7 +762,7 @@ async def list_sessions(api_key: str = Depends(verify_api_key)):
                 "session_id": session_id,
                 "diagnosis_stage": session_data.get('diagnosis_stage'),
                 "message_count": len(messages) // 2,
-                "last_activity": "最近活动时间"  # 可以添加时间戳字段
+                "last_activity": last_activity.get(session_id)
             })
         
         return {
@@ -236,7 +779,7 @@ async def delete_session(session_id: str, api_key: str = Depends(verify_api_key)
     删除会话
     """
     try:
-        success = session_manager.delete_session(session_id)
+        success = await run_in_threadpool(get_session_manager().delete_session, session_id)
         
         if success:
             return {"message": f"会话 {session_id} 已删除"}
@@ -249,16 +792,146 @@ async def delete_session(session_id: str, api_key: str = Depends(verify_api_key)
         raise HTTPException(status_code=500, detail=f"删除会话失败: {str(e)}")
 
 @app.post("/cleanup/sessions")
-async def trigger_cleanup(background_tasks: BackgroundTasks, api_key: str = Depends(verify_api_key)):
+async def trigger_cleanup(api_key: str = Depends(verify_api_key)):
     """
-    手动触发会话清理
+    手动触发一轮增量会话清理（常规清理由Celery beat或嵌入式后端定时调度）
     """
     try:
-        background_tasks.add_task(cleanup_old_sessions_task)
-        return {"message": "会话清理任务已触发"}
+        task_id = await run_in_threadpool(get_execution_backend().trigger_cleanup)
+        return {"message": "会话清理任务已触发", "task_id": task_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"触发清理任务失败: {str(e)}")
 
+@app.get("/stats/queue-wait")
+async def queue_wait_stats(api_key: str = Depends(verify_api_key)):
+    """
+    各严重级别（及其他队列）任务从提交到开始执行的排队耗时分位数
+    """
+    try:
+        stats = await run_in_threadpool(get_queue_wait_stats().get_stats)
+        # 诊断的各严重级别即使暂无样本也返回，便于对比
+        for severity in SEVERITY_ROUTES:
+            stats.setdefault(severity, {"count": 0})
+        return {"queue_wait": stats}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取排队统计失败: {str(e)}")
+
+@app.get("/stats/idempotency")
+async def idempotency_stats(api_key: str = Depends(verify_api_key)):
+    """
+    幂等提交统计：携带 Idempotency-Key 的请求数、被抑制的重复提交数与key冲突数
+    """
+    try:
+        return {"idempotency": await run_in_threadpool(get_idempotency_store().get_stats)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取幂等统计失败: {str(e)}")
+
+@app.get("/stats/admission")
+async def admission_stats(api_key: str = Depends(verify_api_key)):
+    """
+    准入控制状态：各严重级别当前的队列积压、执行槽位与新任务的预计完成时间，以及各节点的历史平均耗时
+    """
+    try:
+        controller = get_admission_controller()
+        return {
+            "max_wait": controller.max_wait,
+            "severities": {
+                severity: await run_in_threadpool(_evaluate_admission, severity) for severity in SEVERITY_ROUTES
+            },
+            "node_latency": await run_in_threadpool(controller.get_node_latency),
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取准入控制状态失败: {str(e)}")
+
+@app.get("/stats/usage")
+async def usage_stats(api_key: str = Depends(verify_api_key)):
+    """
+    调用方自己的限流额度：令牌桶当前可用的请求数与当日LLM token用量/配额
+    """
+    try:
+        client = get_settings().api_clients[api_key]
+        return {"usage": await run_in_threadpool(get_rate_limiter().get_usage, client)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取用量统计失败: {str(e)}")
+
+@app.get("/stats/alerts")
+async def alert_stats(api_key: str = Depends(verify_api_key)):
+    """
+    告警聚类统计：接收的告警数、聚类数（即诊断数）、抑制比例与聚类规模分布
+    """
+    try:
+        return {"alerts": await run_in_threadpool(get_alert_clusterer().get_stats)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取告警统计失败: {str(e)}")
+
+@app.post("/debug/profile/cpu")
+async def profile_cpu(
+    seconds: float = Query(10, gt=0, description="采样秒数（不超过 PROFILE_MAX_SECONDS）"),
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000, description="采样间隔毫秒，默认 PROFILE_INTERVAL_MS"),
+    target: str = Query("api", description="api 为当前API进程，其余为Celery节点名（如 llm@hostname）"),
+    api_key: str = Depends(verify_profiling_access)
+):
+    """
+    对运行中的API进程或Worker进行N秒CPU采样，完成后通过 /debug/profiles/{profile_id}/download 下载 speedscope 文件
+
+    prefork Worker的每个子进程生成一份profile（profile_ids）
+    """
+    settings = get_settings()
+    seconds = min(seconds, settings.profile_max_seconds)
+    interval_ms = interval_ms or settings.profile_interval_ms
+    profile_id = str(uuid.uuid4())
+
+    if target == "api":
+        started = await run_in_threadpool(start_cpu_profile, profile_id, seconds, interval_ms, "api")
+        if not started:
+            raise HTTPException(status_code=409, detail="API进程已有CPU采样在运行")
+        profile_ids = [profile_id]
+    else:
+        from src.celery_app import celery_app
+
+        replies = await run_in_threadpool(
+            celery_app.control.broadcast, "profile_cpu",
+            arguments={"profile_id": profile_id, "seconds": seconds, "interval_ms": interval_ms},
+            destination=[target], reply=True, timeout=2
+        )
+        reply = next((item[target] for item in replies or [] if target in item), None)
+        if reply is None:
+            raise HTTPException(status_code=404, detail=f"Worker {target} 没有响应")
+        if "error" in reply:
+            raise HTTPException(status_code=409, detail=reply["error"])
+        profile_ids = reply["profiles"]
+
+    logger.info(f"🔬 开始CPU采样: {target} {seconds}s ({', '.join(profile_ids)})")
+    return {"profile_ids": profile_ids, "target": target, "seconds": seconds, "interval_ms": interval_ms}
+
+@app.get("/debug/profiles/{profile_id}")
+async def get_profile(profile_id: str, api_key: str = Depends(verify_profiling_access)):
+    """
+    剖析状态与摘要（诊断剖析的 profile_id 为任务ID，含各节点的内存分配）
+    """
+    meta = await run_in_threadpool(get_profile_store().get_meta, profile_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="剖析结果不存在或已过期")
+    return {"profile_id": profile_id, **meta}
+
+@app.get("/debug/profiles/{profile_id}/download")
+async def download_profile(
+    profile_id: str,
+    format: Literal["speedscope", "pstats", "tracemalloc"] = Query("speedscope", description="speedscope / pstats（仅诊断剖析）/ tracemalloc（仅诊断剖析）"),
+    api_key: str = Depends(verify_profiling_access)
+):
+    """
+    下载剖析文件：speedscope 可直接拖入 https://www.speedscope.app，pstats 用 python -m pstats 或 snakeviz 打开
+    """
+    data = await run_in_threadpool(get_profile_store().get_artifact, profile_id, format)
+    if data is None:
+        raise HTTPException(status_code=404, detail="剖析结果不存在、尚未完成或不包含该格式")
+    _, extension, media_type = ARTIFACTS[format]
+    return Response(
+        content=data, media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.{extension}"'}
+    )
+
 # 错误处理
 @app.exception_handler(500)
 async def internal_server_error_handler(request, exc):
@@ -276,10 +949,13 @@ async def not_found_handler(request, exc):
 
 # 启动应用
 if __name__ == "__main__":
+    import uvicorn
+
+    settings = get_settings()
     uvicorn.run(
         "advanced_main:app",
-        host=os.getenv("API_HOST", "0.0.0.0"),
-        port=int(os.getenv("API_PORT", 8000)),
+        host=settings.api_host,
+        port=settings.api_port,
         reload=True,
         log_level="info"
     )
\ No newline at end of file
@@ -0,0 +1,245 @@
+"""
+诊断执行后端：API对外的 /diagnose/async、/tasks/{task_id} 协议不变，由配置 EXECUTION_BACKEND 选择执行方式
+
+- celery: 任务发送到Broker，由Worker集群执行（可横向扩展，默认）
+- embedded: 在API进程内的有界线程池中执行，省去Broker往返、结果后端读写和Redis事件中转（单机部署）
+"""
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+import redis
+
+from src.config import get_settings
+from src.celery_app import celery_app, SEVERITY_ROUTES, DEFAULT_SEVERITY
+from src.tasks.diagnosis_tasks import (
+    run_diagnosis, run_batch_diagnosis, submit_diagnosis, submit_batch_diagnosis,
+    process_diagnosis_task, process_batch_diagnosis_task, cleanup_old_sessions_task
+)
+from src.core import metrics, tracing
+from src.core.queue_stats import get_queue_wait_stats
+from src.core.worker_registry import get_worker_registry
+from src.core.task_events import get_task_event_hub
+
+logger = logging.getLogger(__name__)
+
+
+class CeleryBackend:
+    """通过Celery提交任务，状态从结果后端读取，事件由Worker经Redis推送"""
+
+    name = "celery"
+
+    def __init__(self):
+        self.broker_client = redis.Redis.from_url(get_settings().celery_broker_url, decode_responses=True)
+        self.transport_options = celery_app.conf.broker_transport_options
+        # 就绪Worker与所有登记Worker（含降级）的执行槽位（按队列汇总），扫描登记键的开销较大，缓存一段时间
+        self._slots = (0.0, ({}, {}))
+
+    async def start(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def submit(self, message: str, session_id: str, severity: str, task_id: str, client: str = None, debug: bool = False,
+               profile: bool = False) -> str:
+        return submit_diagnosis(message, session_id, severity, task_id=task_id, client=client, debug=debug,
+                                profile=profile).id
+
+    def submit_batch(self, items: List[Dict[str, str]], severity: str, task_id: str, client: str = None) -> str:
+        return submit_batch_diagnosis(items, severity, task_id=task_id, client=client).id
+
+    def trigger_cleanup(self) -> str:
+        return cleanup_old_sessions_task.delay().id
+
+    def _queue_slots(self) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """(就绪Worker的槽位, 所有登记Worker的槽位)，均按队列汇总"""
+        expires_at, slots = self._slots
+        if time.time() < expires_at:
+            return slots
+        ready, consumers = {}, {}
+        for worker in get_worker_registry().get_workers():
+            for queue in worker.get("queues", []):
+                consumers[queue] = consumers.get(queue, 0) + worker.get("slots", 1)
+                if worker.get("status", "ready") == "ready":
+                    ready[queue] = ready.get(queue, 0) + worker.get("slots", 1)
+        slots = (ready, consumers)
+        self._slots = (time.time() + get_settings().admission_refresh_interval, slots)
+        return slots
+
+    def queue_load(self, severity: str = None) -> Dict[str, int]:
+        """
+        该严重级别的新任务前面排队的任务数（同队列中优先级不低于它的消息）与消费该队列的执行槽位数
+
+        按消息计数：一个批量分片消息包含最多 BATCH_CHUNK_SIZE 个诊断，批量积压时会低估排队时间。
+        """
+        route = SEVERITY_ROUTES[severity or DEFAULT_SEVERITY]
+        queue, sep = route['queue'], self.transport_options['sep']
+        # Redis传输为每个优先级档位使用一个列表：最高档位为队列名本身，其余为 "{队列}{sep}{档位}"
+        pipe = self.broker_client.pipeline(transaction=False)
+        for step in self.transport_options['priority_steps']:
+            if step <= route['priority']:
+                pipe.llen(f"{queue}{sep}{step}" if step else queue)
+        ready, consumers = self._queue_slots()
+        return {"ahead": sum(pipe.execute()), "slots": ready.get(queue, 0), "consumers": consumers.get(queue, 0)}
+
+    def get_status(self, task_id: str) -> Dict[str, Any]:
+        """从Celery结果后端读取一次任务状态"""
+        task_result = celery_app.AsyncResult(task_id)
+        status = task_result.status
+
+        response_data = {"task_id": task_id, "status": status}
+        if status == 'SUCCESS':
+            response_data["result"] = task_result.result
+        elif status == 'FAILURE':
+            response_data["error"] = str(task_result.result)
+        elif status == 'PROGRESS':
+            response_data["progress"] = task_result.result
+        return response_data
+
+
+class EmbeddedBackend:
+    """在API进程内执行诊断：有界线程池 + 内存中的任务状态，事件直接分发给本进程的订阅"""
+
+    name = "embedded"
+
+    def __init__(self, max_workers: int, result_ttl: int):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="diagnosis")
+        self.result_ttl = result_ttl
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._cleanup_loop: Optional[asyncio.Task] = None
+        # API的事件循环：任务事件在其中分发给订阅者
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self):
+        from src.tasks.worker_warmup import warm_up_worker
+
+        loop = self._loop = asyncio.get_running_loop()
+        if get_settings().worker_warmup_enabled:
+            # 预热占用一个执行线程：构建智能体、建立连接，之后的诊断直接使用已构建的智能体
+            loop.run_in_executor(self.executor, warm_up_worker, ["llm"])
+        # 没有Celery beat时由API进程定期触发会话清理
+        self._cleanup_loop = loop.create_task(self._run_periodic_cleanup())
+
+    async def shutdown(self):
+        if self._cleanup_loop is not None:
+            self._cleanup_loop.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _set_state(self, task_id: str, **fields):
+        with self._lock:
+            self._tasks.setdefault(task_id, {}).update(fields, updated_at=time.time())
+
+    def _prune_expired(self):
+        """移除已结束且超过保留时间的任务状态（对应Celery的 result_expires）"""
+        expire_before = time.time() - self.result_ttl
+        with self._lock:
+            expired = [
+                task_id for task_id, info in self._tasks.items()
+                if info["status"] in ("SUCCESS", "FAILURE") and info["updated_at"] < expire_before
+            ]
+            for task_id in expired:
+                del self._tasks[task_id]
+
+    def _publish(self, loop, task_id: str, event_type: str, **payload):
+        event = {"task_id": task_id, "type": event_type, "ts": time.time(), **payload}
+        try:
+            loop.call_soon_threadsafe(get_task_event_hub().dispatch, event)
+        except RuntimeError:
+            # API关闭后事件循环已停止，没有订阅者需要通知
+            pass
+
+    def _execute(self, loop, task_id: str, task_name: str, func):
+        """在执行线程中运行任务并维护状态，与Celery信号推送相同的 started/success/failure 事件"""
+        self._set_state(task_id, status="STARTED")
+        self._publish(loop, task_id, "started")
+        try:
+            with metrics.timed(metrics.TASK_DURATION, task=task_name):
+                result = func()
+            metrics.TASKS.labels(task=task_name, outcome="success").inc()
+            self._set_state(task_id, status="SUCCESS", result=result)
+            self._publish(loop, task_id, "success", result=result)
+        except Exception as e:
+            logger.error(f"❌ 嵌入式任务失败 {task_id}: {e}")
+            metrics.TASKS.labels(task=task_name, outcome="failure").inc()
+            self._set_state(task_id, status="FAILURE", error=str(e))
+            self._publish(loop, task_id, "failure", error=str(e))
+        finally:
+            self._prune_expired()
+
+    def _run_queued(self, loop, task_id: str, task_name: str, severity: str, enqueued_at: float, trace_headers: dict, run):
+        get_queue_wait_stats().record(severity, (time.time() - enqueued_at) * 1000)
+        publish = lambda event_type, **payload: self._publish(loop, task_id, event_type, **payload)
+        # 执行线程不继承提交请求的上下文，与Celery一样通过传播头部恢复trace
+        with tracing.task_span(task_name, task_id, trace_headers, enqueued_at):
+            self._execute(loop, task_id, task_name, lambda: run(publish))
+
+    def _enqueue(self, task_id: str, task_name: str, severity: str, run, diagnoses: int = 1) -> str:
+        # 线程池按提交顺序执行（不区分严重级别），并发数由 EMBEDDED_MAX_WORKERS 限制；
+        # 与Celery的提交一样可以在事件循环之外（run_in_threadpool）调用
+        self._set_state(task_id, status="PENDING", diagnoses=diagnoses)
+        self.executor.submit(
+            self._run_queued, self._loop, task_id, task_name, severity, time.time(), tracing.inject_headers(), run
+        )
+        return task_id
+
+    def submit(self, message: str, session_id: str, severity: str, task_id: str, client: str = None, debug: bool = False,
+               profile: bool = False) -> str:
+        return self._enqueue(
+            task_id, process_diagnosis_task.name, severity,
+            lambda publish: run_diagnosis(task_id, message, session_id, publish, client, debug, profile)
+        )
+
+    def submit_batch(self, items: List[Dict[str, str]], severity: str, task_id: str, client: str = None) -> str:
+        return self._enqueue(
+            task_id, process_batch_diagnosis_task.name, severity,
+            lambda publish: run_batch_diagnosis(task_id, items, publish, client), diagnoses=len(items)
+        )
+
+    def trigger_cleanup(self) -> str:
+        task_id = str(uuid.uuid4())
+        self._set_state(task_id, status="PENDING")
+        # 直接调用任务函数，在本进程内执行（与 _enqueue 一样可以在事件循环之外调用）
+        self.executor.submit(self._execute, self._loop, task_id, cleanup_old_sessions_task.name, cleanup_old_sessions_task)
+        return task_id
+
+    async def _run_periodic_cleanup(self):
+        interval = get_settings().session_cleanup_interval
+        while True:
+            await asyncio.sleep(interval)
+            self.trigger_cleanup()
+
+    def queue_load(self, severity: str = None) -> Dict[str, int]:
+        """线程池按提交顺序执行，所有尚未开始的任务都排在新任务前面（批量分片按其中的诊断数计）"""
+        with self._lock:
+            ahead = sum(info.get("diagnoses", 1) for info in self._tasks.values() if info["status"] == "PENDING")
+        return {"ahead": ahead, "slots": self.max_workers}
+
+    def get_status(self, task_id: str) -> Dict[str, Any]:
+        with self._lock:
+            info = dict(self._tasks.get(task_id, {}))
+        # 未知任务与Celery一致，视为 PENDING
+        response_data = {"task_id": task_id, "status": info.get("status", "PENDING")}
+        if "result" in info:
+            response_data["result"] = info["result"]
+        if "error" in info:
+            response_data["error"] = info["error"]
+        return response_data
+
+
+@lru_cache(maxsize=1)
+def get_execution_backend():
+    """按配置创建进程内唯一的执行后端"""
+    settings = get_settings()
+    if settings.execution_backend == "celery":
+        return CeleryBackend()
+    if settings.execution_backend == "embedded":
+        return EmbeddedBackend(settings.embedded_max_workers, settings.task_result_expires)
+    raise ValueError(f"未知的执行后端: {settings.execution_backend}（可选: celery, embedded）")
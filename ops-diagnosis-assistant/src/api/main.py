@@ -1,5 +1,6 @@
 import os
 import uuid
+import logging
 from typing import Dict, Any
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -7,10 +8,11 @@ from pydantic import BaseModel
 import uvicorn
 
 # 导入我们之前创建的智能体
-import sys
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from core.simple_agent import SimpleDiagnosisAgent
-from core.rag_agent import RAGDiagnosisAgent
+from src.core.simple_agent import SimpleDiagnosisAgent
+from src.core.rag_agent import RAGDiagnosisAgent
+from src.core.logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
 
 # 定义请求和响应模型
 class DiagnosisRequest(BaseModel):
@@ -38,6 +40,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def configure_logging():
+    setup_logging()
+
 # 全局变量（后续会用Redis替换）
 class SessionManager:
     def __init__(self):
@@ -95,7 +101,7 @@ async def diagnose(request: DiagnosisRequest):
     诊断接口 - 接收用户问题并返回诊断建议
     """
     try:
-        print(f"🎯 收到诊断请求: {request.message}")
+        logger.info("🎯 收到诊断请求: %s", request.message)
         
         # 获取或创建会话
         session_id, session_data = session_manager.get_or_create_session(request.session_id)
@@ -106,7 +112,7 @@ async def diagnose(request: DiagnosisRequest):
         # 保存到历史记录
         session_manager.add_to_history(session_id, request.message, diagnosis_response)
         
-        print(f"✅ 诊断完成，会话ID: {session_id}")
+        logger.info(f"✅ 诊断完成，会话ID: {session_id}")
         
         return DiagnosisResponse(
             response=diagnosis_response,
@@ -115,7 +121,7 @@ async def diagnose(request: DiagnosisRequest):
         )
         
     except Exception as e:
-        print(f"❌ 诊断过程出错: {e}")
+        logger.error(f"❌ 诊断过程出错: {e}")
         raise HTTPException(status_code=500, detail=f"诊断失败: {str(e)}")
 
 @app.get("/session/{session_id}")
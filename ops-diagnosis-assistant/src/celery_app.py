@@ -1,15 +1,21 @@
-import os
 from celery import Celery
-from dotenv import load_dotenv
+from kombu import Queue
+from src.config import get_settings
 
-load_dotenv()
+settings = get_settings()
 
 # Celery配置
 celery_app = Celery(
     'ops_diagnosis',
-    broker=os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0'),
-    backend=os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0'),
-    include=['src.tasks.diagnosis_tasks']
+    broker=settings.celery_broker_url,
+    backend=settings.celery_result_backend,
+    include=[
+        'src.tasks.diagnosis_tasks',
+        'src.tasks.knowledge_tasks',
+        'src.tasks.task_signals',
+        'src.tasks.worker_warmup',
+        'src.tasks.profiling_control',
+    ]
 )
 
 # Celery配置
@@ -25,8 +31,60 @@ celery_app.conf.update(
     worker_prefetch_multiplier=1,
     task_acks_late=True,
     worker_max_tasks_per_child=100,  # 每个worker处理100个任务后重启
+    result_expires=settings.task_result_expires,  # 结果后端中的任务结果到期自动删除
+    # 子进程在 worker_process_init 中预热，默认4秒的存活检测会把预热中的子进程当作卡死杀掉
+    worker_proc_alive_timeout=settings.worker_warmup_timeout + 10,
 )
 
+# 任务队列：按负载类型隔离，每个队列由独立的Worker进程池消费（见 run_celery_worker.py）
+# - llm: 多轮LLM调用的诊断任务
+# - priority: 紧急故障的诊断任务，单独的进程池保证不排在普通诊断之后
+# - retrieval: 只检索知识库、不调用LLM的短任务
+# - maintenance: 会话清理、知识库同步等后台任务
+celery_app.conf.task_queues = (
+    Queue('llm'),
+    Queue('priority'),
+    Queue('retrieval'),
+    Queue('maintenance'),
+)
+celery_app.conf.task_default_queue = 'llm'
+
+# 诊断任务的严重级别 -> 队列与broker优先级（Redis传输中数值越小越先被消费）
+# P0 进入由专用进程池预留消费的 priority 队列；其余级别在 llm 队列内按优先级排序
+SEVERITY_ROUTES = {
+    'P0': {'queue': 'priority', 'priority': 0},
+    'P1': {'queue': 'llm', 'priority': 3},
+    'P2': {'queue': 'llm', 'priority': 6},
+    'P3': {'queue': 'llm', 'priority': 9},
+}
+DEFAULT_SEVERITY = 'P2'
+
+# Redis通过为每个优先级档位建立独立列表来模拟优先级，档位与上面的优先级一一对应
+celery_app.conf.broker_transport_options = {
+    'priority_steps': [0, 3, 6, 9],
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
+# 未指定优先级的任务按普通级别处理（Redis默认0会被当成最高优先级）
+celery_app.conf.task_default_priority = SEVERITY_ROUTES[DEFAULT_SEVERITY]['priority']
+celery_app.conf.task_routes = {
+    'diagnosis.process_diagnosis': {'queue': 'llm'},
+    'diagnosis.process_batch': {'queue': 'llm'},
+    'diagnosis.cleanup_old_sessions': {'queue': 'maintenance'},
+    'knowledge.search_fault_cases': {'queue': 'retrieval'},
+    'knowledge.sync_to_es': {'queue': 'maintenance'},
+}
+
+# 定时任务：增量清理会话（需要单独运行 celery beat，见 run_celery_beat.py）
+celery_app.conf.beat_schedule = {
+    'cleanup-old-sessions': {
+        'task': 'diagnosis.cleanup_old_sessions',
+        'schedule': settings.session_cleanup_interval,
+        # 积压时丢弃过期的清理任务，避免多轮清理排队执行
+        'options': {'expires': settings.session_cleanup_interval},
+    },
+}
+
 # 自动发现任务
 celery_app.autodiscover_tasks()
 
@@ -0,0 +1,208 @@
+"""
+统一配置加载 - 每个进程只读取一次 .env 和环境变量
+"""
+import os
+from functools import lru_cache
+from dotenv import load_dotenv
+
+# 各队列Worker的默认进程池: (pool, concurrency, prefetch_multiplier)
+# - llm: 每个任务占用数十秒，预取为1，避免任务排在忙碌进程后面
+# - priority: 紧急故障专用，保留空闲进程随时可接
+# - retrieval: 检索以等待ES的IO为主，线程池即可，适当预取
+# - maintenance: 清理/同步等后台任务，单进程串行执行
+WORKER_POOL_DEFAULTS = {
+    "llm": ("prefork", 2, 1),
+    "priority": ("prefork", 1, 1),
+    "retrieval": ("threads", 8, 4),
+    "maintenance": ("solo", 1, 1),
+}
+
+
+class Settings:
+    """应用配置（进程启动后首次访问时读取一次）"""
+
+    def __init__(self):
+        load_dotenv()
+
+        # Ollama配置
+        self.ollama_model = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+        self.ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        # 模型在Ollama中保持加载的时长，避免空闲后的首个请求重新加载模型
+        self.ollama_keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+        # Elasticsearch配置
+        self.elasticsearch_host = os.getenv("ELASTICSEARCH_HOST", "localhost")
+        self.elasticsearch_port = os.getenv("ELASTICSEARCH_PORT", "9200")
+        # 检索结果缓存（进程内LRU，相同查询在TTL内不再访问ES）
+        self.retrieval_cache_size = int(os.getenv("RETRIEVAL_CACHE_SIZE", 256))
+        self.retrieval_cache_ttl = int(os.getenv("RETRIEVAL_CACHE_TTL", 300))
+        # 检索查询: multi_match 的字段与权重、模糊匹配（空表示关闭）与最小匹配度（空表示不限制）
+        self.retrieval_fields = [
+            field.strip() for field in os.getenv("RETRIEVAL_FIELDS", "symptoms^3,fault_type^2,root_cause,combined_text").split(",")
+            if field.strip()
+        ]
+        self.retrieval_fuzziness = os.getenv("RETRIEVAL_FUZZINESS", "AUTO") or None
+        self.retrieval_minimum_should_match = os.getenv("RETRIEVAL_MINIMUM_SHOULD_MATCH", "30%") or None
+
+        # Redis配置
+        self.redis_host = os.getenv("REDIS_HOST", "localhost")
+        self.redis_port = int(os.getenv("REDIS_PORT", 6379))
+        self.redis_db = int(os.getenv("REDIS_DB", 0))
+        self.redis_password = os.getenv("REDIS_PASSWORD", None) or None
+
+        # Celery配置
+        self.celery_broker_url = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+        self.celery_result_backend = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+
+        # 会话配置
+        self.session_ttl = int(os.getenv("SESSION_TTL", 3600))
+        # 超过该空闲时长的会话视为废弃，由定时清理归档到冷存储
+        self.session_idle_timeout = int(os.getenv("SESSION_IDLE_TIMEOUT", 2700))
+        # 会话状态上限: 保存的对话消息条数与已确认症状条数（超出时只保留最近的，0表示不限制）
+        self.session_max_messages = int(os.getenv("SESSION_MAX_MESSAGES", 20))
+        self.session_max_symptoms = int(os.getenv("SESSION_MAX_SYMPTOMS", 20))
+        self.session_archive_dir = os.getenv("SESSION_ARCHIVE_DIR", "data/session_archive")
+
+        # 会话增量清理（Celery beat调度）
+        self.session_cleanup_interval = int(os.getenv("SESSION_CLEANUP_INTERVAL", 300))
+        self.session_cleanup_time_budget = float(os.getenv("SESSION_CLEANUP_TIME_BUDGET", 5.0))
+        self.session_cleanup_scan_count = int(os.getenv("SESSION_CLEANUP_SCAN_COUNT", 200))
+
+        # Worker进程池（按队列独立配置，LLM长任务不阻塞轻量任务）
+        # 环境变量: WORKER_<QUEUE>_POOL / WORKER_<QUEUE>_CONCURRENCY / WORKER_<QUEUE>_PREFETCH
+        self.worker_pools = {
+            queue: self._load_worker_pool(queue, *defaults)
+            for queue, defaults in WORKER_POOL_DEFAULTS.items()
+        }
+
+        # Worker进程预热（构建智能体、建立连接、让模型常驻、预热高频故障的ES检索）
+        self.worker_warmup_enabled = os.getenv("WORKER_WARMUP", "true").lower() in ("1", "true", "yes")
+        self.worker_warmup_timeout = int(os.getenv("WORKER_WARMUP_TIMEOUT", 60))
+        self.warmup_top_fault_types = int(os.getenv("WARMUP_TOP_FAULT_TYPES", 5))
+        # 就绪登记的过期秒数（进程存活期间由心跳续期）
+        self.worker_ready_ttl = int(os.getenv("WORKER_READY_TTL", 60))
+
+        # 每个严重级别保留的排队耗时样本数（用于计算p50/p99）
+        self.queue_wait_max_samples = int(os.getenv("QUEUE_WAIT_MAX_SAMPLES", 1000))
+
+        # 诊断执行后端: celery（Worker集群，可横向扩展）| embedded（API进程内执行，单机低延迟）
+        self.execution_backend = os.getenv("EXECUTION_BACKEND", "celery")
+        # 嵌入式执行时同时运行的诊断数
+        self.embedded_max_workers = int(os.getenv("EMBEDDED_MAX_WORKERS", 4))
+
+        # /diagnose/batch 单次请求的最大问题数；去重后每个分片（一个任务）包含的问题数
+        self.batch_max_items = int(os.getenv("BATCH_MAX_ITEMS", 100))
+        self.batch_chunk_size = int(os.getenv("BATCH_CHUNK_SIZE", 8))
+
+        # Idempotency-Key 的保留秒数：该时间内携带相同key的重试请求返回首次提交的任务
+        self.idempotency_ttl = int(os.getenv("IDEMPOTENCY_TTL", 3600))
+
+        # 告警聚类：同类告警在该秒数内持续到达则归入同一聚类（滑动窗口）
+        self.alert_cluster_window = int(os.getenv("ALERT_CLUSTER_WINDOW", 300))
+        # 聚类与告警->聚类映射的保留秒数、每个聚类保留的成员告警ID数、单次接收的最大告警数
+        self.alert_retention = int(os.getenv("ALERT_RETENTION", 86400))
+        self.alert_cluster_max_members = int(os.getenv("ALERT_CLUSTER_MAX_MEMBERS", 1000))
+        self.alert_ingest_max_items = int(os.getenv("ALERT_INGEST_MAX_ITEMS", 1000))
+
+        # 准入控制: 新任务预计排队超过 ADMISSION_MAX_WAIT 秒时拒绝（0表示只估算ETA、不拒绝）
+        self.admission_max_wait = int(os.getenv("ADMISSION_MAX_WAIT", 600))
+        # 还没有历史耗时样本时假设的单次诊断耗时（秒）；保留的诊断耗时样本数；队列容量与耗时估算的缓存秒数
+        self.admission_default_service_time = float(os.getenv("ADMISSION_DEFAULT_SERVICE_TIME", 30))
+        self.admission_max_samples = int(os.getenv("ADMISSION_MAX_SAMPLES", 200))
+        self.admission_refresh_interval = float(os.getenv("ADMISSION_REFRESH_INTERVAL", 5))
+        # 没有任何Worker登记消费该队列时假设的执行槽位数（例如未加载预热信号模块的Worker），0表示返回503
+        self.admission_min_slots = int(os.getenv("ADMISSION_MIN_SLOTS", 0))
+
+        # Prometheus指标（需要安装 prometheus-client）；Worker主进程的指标端口，0表示不启动
+        self.metrics_enabled = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.worker_metrics_port = int(os.getenv("WORKER_METRICS_PORT", 9808))
+
+        # 分布式追踪（需要安装 opentelemetry-sdk）: 导出方式 otlp|file、根span采样率、服务名
+        self.tracing_enabled = os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.tracing_exporter = os.getenv("TRACING_EXPORTER", "otlp")
+        self.tracing_otlp_endpoint = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+        self.tracing_file = os.getenv("TRACING_FILE", "data/traces.jsonl")
+        self.tracing_sample_rate = float(os.getenv("TRACING_SAMPLE_RATE", 1.0))
+        self.tracing_service_name = os.getenv("TRACING_SERVICE_NAME", "ops-diagnosis-assistant")
+
+        # 诊断节点事件: 按会话采样的比例（0表示只在请求头 X-Debug-Trace 指定时输出）、字符串截断长度、列表保留的末尾项数、脱敏字段关键字
+        self.node_event_sample_rate = float(os.getenv("NODE_EVENT_SAMPLE_RATE", 0))
+        self.node_event_max_chars = int(os.getenv("NODE_EVENT_MAX_CHARS", 200))
+        self.node_event_max_items = int(os.getenv("NODE_EVENT_MAX_ITEMS", 3))
+        self.node_event_redact = [
+            key.strip() for key in os.getenv("NODE_EVENT_REDACT", "password,passwd,secret,token,api_key,authorization").split(",")
+            if key.strip()
+        ]
+
+        # 日志: 级别、内存队列容量（满时丢弃）、单条消息的最大字符数、同一调用位置在窗口秒数内的最大条数（0表示不限流）
+        self.log_level = os.getenv("LOG_LEVEL", "INFO")
+        self.log_queue_size = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+        self.log_max_message_chars = int(os.getenv("LOG_MAX_MESSAGE_CHARS", 2000))
+        self.log_rate_limit = int(os.getenv("LOG_RATE_LIMIT", 20))
+        self.log_rate_limit_window = float(os.getenv("LOG_RATE_LIMIT_WINDOW", 60))
+
+        # 按需性能剖析: 开关（默认关闭）、允许剖析的API客户端名称（默认为空，即不允许任何客户端）、
+        # 结果保留秒数、单次CPU采样的最长秒数、默认采样间隔（毫秒）
+        self.profiling_enabled = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.profiling_clients = [
+            name.strip() for name in os.getenv("PROFILING_CLIENTS", "").split(",") if name.strip()
+        ]
+        self.profile_ttl = int(os.getenv("PROFILE_TTL", 3600))
+        self.profile_max_seconds = float(os.getenv("PROFILE_MAX_SECONDS", 60))
+        self.profile_interval_ms = float(os.getenv("PROFILE_INTERVAL_MS", 10))
+
+        # Celery结果后端中任务结果的保留秒数（诊断正文保存在会话中，结果只是引用）
+        self.task_result_expires = int(os.getenv("TASK_RESULT_EXPIRES", 3600))
+
+        # 任务状态长轮询的最大等待秒数
+        self.task_long_poll_max_wait = int(os.getenv("TASK_LONG_POLL_MAX_WAIT", 60))
+
+        # API配置
+        self.api_key = os.getenv("API_KEY", "default_secret_key")
+        # 每个API密钥的限流: 令牌桶（每分钟请求数、突发容量）与每日LLM token配额，0表示不限制
+        self.rate_limit_per_minute = float(os.getenv("RATE_LIMIT_PER_MINUTE", 60))
+        self.rate_limit_burst = int(os.getenv("RATE_LIMIT_BURST", 20))
+        self.daily_token_quota = int(os.getenv("DAILY_TOKEN_QUOTA", 0))
+        # 提交诊断时预占的LLM token数，诊断完成后按实际用量结算
+        self.diagnosis_token_estimate = int(os.getenv("DIAGNOSIS_TOKEN_ESTIMATE", 3000))
+        # API_KEYS="名称:密钥[:每分钟请求数[:突发容量[:每日token配额]]],..."；API_KEY 始终作为 default 客户端可用
+        self.api_clients = self._load_api_clients(os.getenv("API_KEYS", ""))
+        self.api_host = os.getenv("API_HOST", "0.0.0.0")
+        self.api_port = int(os.getenv("API_PORT", 8000))
+
+        # 启动耗时预算（冷启动导入API入口的最大毫秒数）
+        self.import_time_budget_ms = int(os.getenv("IMPORT_TIME_BUDGET_MS", 1500))
+
+    @staticmethod
+    def _load_worker_pool(queue: str, pool: str, concurrency: int, prefetch: int) -> dict:
+        prefix = f"WORKER_{queue.upper()}_"
+        return {
+            "pool": os.getenv(prefix + "POOL", pool),
+            "concurrency": int(os.getenv(prefix + "CONCURRENCY", concurrency)),
+            "prefetch_multiplier": int(os.getenv(prefix + "PREFETCH", prefetch)),
+        }
+
+    def _load_api_clients(self, spec: str) -> dict:
+        """解析 API_KEYS，返回 密钥 -> 客户端名称与限额"""
+        defaults = [self.rate_limit_per_minute, self.rate_limit_burst, self.daily_token_quota]
+        clients = {self.api_key: {"name": "default", "rate_per_minute": defaults[0], "burst": defaults[1], "daily_token_quota": defaults[2]}}
+        for entry in filter(None, (item.strip() for item in spec.split(","))):
+            name, key, *limits = entry.split(":")
+            rate, burst, quota = (limits + [""] * 3)[:3]
+            clients[key] = {
+                "name": name,
+                "rate_per_minute": float(rate) if rate else defaults[0],
+                "burst": int(burst) if burst else defaults[1],
+                "daily_token_quota": int(quota) if quota else defaults[2],
+            }
+        return clients
+
+    @property
+    def elasticsearch_url(self) -> str:
+        return f"http://{self.elasticsearch_host}:{self.elasticsearch_port}"
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """获取全局配置（进程内缓存，只加载一次）"""
+    return Settings()
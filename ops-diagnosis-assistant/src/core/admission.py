@@ -0,0 +1,124 @@
+"""
+准入控制：按排在前面的任务数、可用的执行槽位和历史上各节点的耗时估算新任务的完成时间（ETA），
+预计排队超过 ADMISSION_MAX_WAIT 时拒绝新任务，积压不会超过系统能够按时处理的量
+"""
+import json
+import math
+import time
+import logging
+import threading
+from functools import lru_cache
+from typing import Dict, Any
+
+import redis
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# 最近 N 次诊断的各节点耗时（LIST，每项为 {节点: 毫秒} 的JSON）
+NODE_LATENCY_KEY = "diagnosis_node_latency"
+
+
+class AdmissionController:
+    """
+    排队模型：ahead 个任务由 slots 个执行槽位并行处理，每个任务平均耗时 S
+    （S = 最近诊断中各节点平均耗时之和），新任务的排队时间约为 ahead * S / slots，ETA 再加上自身的执行时间
+    """
+
+    def __init__(self, max_wait: int = None):
+        settings = get_settings()
+        self.redis_client = redis.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db,
+            password=settings.redis_password,
+            decode_responses=True
+        )
+        self.max_wait = settings.admission_max_wait if max_wait is None else max_wait
+        self.default_service_time = settings.admission_default_service_time
+        self.max_samples = settings.admission_max_samples
+        self.refresh_interval = settings.admission_refresh_interval
+        self.min_slots = settings.admission_min_slots
+        # 每次提交都要用到的耗时估算在进程内缓存 refresh_interval 秒
+        self._service_time = (0.0, self.default_service_time)
+        self._lock = threading.Lock()
+
+    def record_run(self, node_ms: Dict[str, float]):
+        """记录一次诊断中各节点的耗时（统计失败不影响任务）"""
+        if not node_ms:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.lpush(NODE_LATENCY_KEY, json.dumps(node_ms))
+            pipe.ltrim(NODE_LATENCY_KEY, 0, self.max_samples - 1)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ 节点耗时记录失败: {e}")
+
+    def get_node_latency(self) -> Dict[str, Any]:
+        """最近样本中平均每次诊断在各节点上花费的时间，以及单次诊断的平均耗时"""
+        runs = [json.loads(run) for run in self.redis_client.lrange(NODE_LATENCY_KEY, 0, -1)]
+        if not runs:
+            return {"samples": 0, "service_ms": round(self.default_service_time * 1000, 1), "nodes": {}}
+        totals: Dict[str, float] = {}
+        for run in runs:
+            for node, elapsed_ms in run.items():
+                totals[node] = totals.get(node, 0.0) + elapsed_ms
+        # 节点在部分诊断中不执行（例如追问轮次没有根因分析），按所有诊断平均即已计入执行概率
+        nodes = {node: round(total / len(runs), 1) for node, total in totals.items()}
+        return {"samples": len(runs), "service_ms": round(sum(totals.values()) / len(runs), 1), "nodes": nodes}
+
+    def service_time(self) -> float:
+        """单次诊断的平均耗时（秒）"""
+        expires_at, value = self._service_time
+        if time.time() < expires_at:
+            return value
+        with self._lock:
+            try:
+                value = self.get_node_latency()["service_ms"] / 1000
+            except Exception as e:
+                logger.warning(f"⚠️ 读取节点耗时失败，使用上次的估算: {e}")
+            self._service_time = (time.time() + self.refresh_interval, value)
+        return value
+
+    def evaluate(self, load: Dict[str, int], diagnoses: int = 1) -> Dict[str, Any]:
+        """
+        估算新提交的 diagnoses 个诊断的ETA并决定是否接收
+
+        Args:
+            load: 执行后端的队列负载 {"ahead": 排在前面的任务数, "slots": 就绪的执行槽位数,
+                  "consumers": 消费该队列的所有登记进程（含降级）的槽位数，缺省时等于 slots}
+            diagnoses: 本次提交的诊断数（批量诊断的各分片由多个槽位并行执行）
+
+        Returns:
+            {"admitted", "status_code", "eta_seconds", "queue_wait_seconds", "retry_after", ...}
+        """
+        ahead, slots = load["ahead"], load["slots"]
+        if slots <= 0 and load.get("consumers", 0) > 0:
+            # 有进程在消费但都还未就绪（例如预热超时的冷启动），无法估算ETA，照常接收
+            return {"admitted": True, "status_code": 200, "ahead": ahead, "slots": 0,
+                    "eta_seconds": None, "queue_wait_seconds": None, "retry_after": 0}
+        if slots <= 0 and self.min_slots > 0:
+            # 没有进程登记（例如Worker未加载预热信号模块），按配置的最少槽位估算
+            slots = self.min_slots
+        if slots <= 0:
+            # 没有任何进程消费该队列，任务只会无限期排队
+            return {"admitted": False, "status_code": 503, "ahead": ahead, "slots": 0,
+                    "eta_seconds": None, "queue_wait_seconds": None, "retry_after": self.refresh_interval}
+
+        service = self.service_time()
+        queue_wait = ahead * service / slots
+        eta = queue_wait + math.ceil(diagnoses / slots) * service
+        decision = {"admitted": True, "status_code": 200, "ahead": ahead, "slots": slots,
+                    "eta_seconds": round(eta, 1), "queue_wait_seconds": round(queue_wait, 1), "retry_after": 0}
+        if self.max_wait and queue_wait > self.max_wait:
+            # 积压消化到阈值以内所需的时间
+            decision.update(admitted=False, status_code=429, retry_after=queue_wait - self.max_wait)
+        return decision
+
+
+@lru_cache(maxsize=1)
+def get_admission_controller() -> AdmissionController:
+    """获取进程内共享的准入控制器"""
+    return AdmissionController()
@@ -1,35 +1,24 @@
 import os
+import sys
+import copy
 import json
-from typing import Annotated, TypedDict, List, Optional
-from dotenv import load_dotenv
-from langchain_ollama import ChatOllama
-from langgraph.graph import StateGraph, START, END
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.output_parsers import PydanticOutputParser
-from pydantic import BaseModel, Field
-from langchain_core.prompts import PromptTemplate
-
-
-class SymptomAnalysis(BaseModel):
-    symptoms: List[str] = Field(description="主要症状（如CPU高、内存不足、磁盘满等）")
-    error_messages: List[str] = Field(description="错误信息或日志内容")
-    time_pattern: str = Field(description="问题发生的时间和频率")
-    impact_scope: str = Field(description="影响的范围")
-    problem_type: str = Field(description="推测的问题类型")
+import time
+import logging
+from typing import Annotated, TypedDict, List, Callable, Optional, Dict, Any, Tuple
 
-class AnalyzeRootCauseNode(BaseModel):
-    affected_components: List[str] = Field(description="受影响组件")
-    verification_steps: List[str] = Field(description="验证步骤")
-    root_cause: str = Field(description="根本原因分析")
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
 
+from src.config import get_settings
+from src.core.knowledge_retriever import KnowledgeRetriever
+from src.core import metrics, tracing
+from src.core.node_events import get_node_event_hook
 
-import sys
-project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-sys.path.insert(0, project_root)
-
-from core.knowledge_retriever import KnowledgeRetriever
+logger = logging.getLogger(__name__)
 
-load_dotenv()
+# 注意：langchain / langgraph / langchain_ollama / pydantic 均为重量级依赖，
+# 只在智能体实例化或节点执行时导入，保证API进程和Celery子进程启动轻量。
 
 class AdvancedDiagnosisState(TypedDict):
     # 对话相关
@@ -47,6 +36,9 @@ class AdvancedDiagnosisState(TypedDict):
     problem_type: str
     root_cause_analysis: str
     retrieved_knowledge: str
+    retrieved_cases: Annotated[List, "检索到的案例摘要（id、故障类型、相关度）"]
+    prefetched_cases: Annotated[Optional[List], "批量诊断时预先检索的案例（有值时知识检索节点不再查询ES）"]
+    trace_node_events: Annotated[bool, "本轮是否输出节点事件（按会话采样或请求头 X-Debug-Trace 指定）"]
     solution_steps: Annotated[List, "解决方案步骤"]
     
     # 对话控制
@@ -58,20 +50,43 @@ class AdvancedDiagnosisState(TypedDict):
 
 
 class AdvancedDiagnosisAgent:
-    def __init__(self, debug_mode=True):
+    """
+    高级诊断智能体
+
+    实例上只保存只读的模型、检索器和编译后的工作流，会话状态由调用方传入并随结果返回，
+    同一个实例可以被多个线程/协程同时用于不同会话的诊断。
+    """
+
+    def __init__(self, debug_mode=False, llm=None, retriever=None):
+        from langchain_core.output_parsers import PydanticOutputParser
+        from src.core.schemas import SymptomAnalysis, AnalyzeRootCauseNode
+
+        settings = get_settings()
+        # 为True时每一轮都输出节点事件（否则按会话采样或由请求指定）
         self.debug_mode = debug_mode
+        # 会话状态上限（每轮都会追加消息和症状，不限制时状态与提示词随轮数无限增长）
+        self.max_messages = settings.session_max_messages
+        self.max_symptoms = settings.session_max_symptoms
         self.output_parser_collect_symptoms_node = PydanticOutputParser(pydantic_object=SymptomAnalysis)
         self.output_parser_analyze_root_cause_node = PydanticOutputParser(pydantic_object=AnalyzeRootCauseNode)
         
-        # 初始化模型
-        self.llm = ChatOllama(
-            model=os.getenv("OLLAMA_MODEL", "llama3.1:8b"),
-            base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
-            temperature=0.1
-        )
+        # 初始化模型（可注入其他ChatModel，例如基准测试中的桩模型）
+        model_name = getattr(llm, "_llm_type", "custom")
+        if llm is None:
+            from langchain_ollama import ChatOllama
+
+            model_name = settings.ollama_model
+            llm = ChatOllama(
+                model=settings.ollama_model,
+                base_url=settings.ollama_base_url,
+                temperature=0.1,
+                keep_alive=settings.ollama_keep_alive
+            )
+        # 挂载token用量与调用耗时的指标回调（模型名为有界标签），以及每次调用的追踪span
+        self.llm = tracing.instrument_llm(metrics.instrument_llm(llm, model_name), model_name)
         
         # 初始化知识检索器
-        self.retriever = KnowledgeRetriever()
+        self.retriever = retriever if retriever is not None else KnowledgeRetriever()
         
         # 构建工作流
         self.graph = self._build_graph()
@@ -85,37 +100,25 @@ class AdvancedDiagnosisAgent:
             "general": ["错误信息", "发生时间", "影响范围", "最近变更"]
         }
 
-    def _debug_print(self, node_name: str, message: str, data=None):
-        """统一的调试信息输出"""
-        if not self.debug_mode:
-            return
-            
-        print(f"\n{'🔍' * 20}")
-        print(f"🔍 [{node_name}] {message}")
-        
-        if data is not None:
-            if isinstance(data, (dict, list)):
-                # 字典和列表使用JSON美化输出
-                print(f"🔍 数据详情: {json.dumps(data, indent=2, ensure_ascii=False, default=str)}")
-            else:
-                # 其他类型直接打印
-                print(f"🔍 数据详情: {data}")
-        
-        print(f"{'🔍' * 20}\n")
+    def _node_event(self, node_name: str, phase: str, state: Dict[str, Any]):
+        """节点进入/退出事件（是否输出在每轮开始时按会话采样决定，未选中时只有一次字典读取）"""
+        if state.get("trace_node_events"):
+            get_node_event_hook().emit(node_name, phase, state)
 
-    
     def _build_graph(self):
         """构建复杂的工作流图"""
+        from langgraph.graph import StateGraph, START, END
+
         workflow = StateGraph(AdvancedDiagnosisState)
         
-        # 添加所有节点
-        workflow.add_node("welcome", self._welcome_node)
-        workflow.add_node("collect_symptoms", self._collect_symptoms_node)
-        workflow.add_node("ask_clarifying_questions", self._ask_clarifying_questions_node)
-        workflow.add_node("retrieve_knowledge", self._retrieve_knowledge_node)
-        workflow.add_node("analyze_root_cause", self._analyze_root_cause_node)
-        workflow.add_node("generate_solution", self._generate_solution_node)
-        workflow.add_node("confirm_resolution", self._confirm_resolution_node)
+        # 添加所有节点（启用追踪时每个节点一个span）
+        workflow.add_node("welcome", tracing.traced_node("welcome", self._welcome_node))
+        workflow.add_node("collect_symptoms", tracing.traced_node("collect_symptoms", self._collect_symptoms_node))
+        workflow.add_node("ask_clarifying_questions", tracing.traced_node("ask_clarifying_questions", self._ask_clarifying_questions_node))
+        workflow.add_node("retrieve_knowledge", tracing.traced_node("retrieve_knowledge", self._retrieve_knowledge_node))
+        workflow.add_node("analyze_root_cause", tracing.traced_node("analyze_root_cause", self._analyze_root_cause_node))
+        workflow.add_node("generate_solution", tracing.traced_node("generate_solution", self._generate_solution_node))
+        workflow.add_node("confirm_resolution", tracing.traced_node("confirm_resolution", self._confirm_resolution_node))
         
         # 设置入口点
         workflow.add_edge(START, "welcome")
@@ -131,7 +134,15 @@ class AdvancedDiagnosisAgent:
             }
         )
         
-        workflow.add_edge("ask_clarifying_questions", "collect_symptoms")
+        # 提出追问后结束本轮，等待用户回答（下一轮从 collect_symptoms 继续）
+        workflow.add_conditional_edges(
+            "ask_clarifying_questions",
+            self._route_after_clarifying_questions,
+            {
+                "wait_for_user": END,
+                "has_enough_info": "retrieve_knowledge"
+            }
+        )
         workflow.add_edge("retrieve_knowledge", "analyze_root_cause")
         workflow.add_edge("analyze_root_cause", "generate_solution")
         workflow.add_edge("generate_solution", "confirm_resolution")
@@ -151,7 +162,9 @@ class AdvancedDiagnosisAgent:
     
     def _welcome_node(self, state: AdvancedDiagnosisState) -> AdvancedDiagnosisState:
         """欢迎节点 - 初始化对话"""
-        self._debug_print(node_name="1_welcome_node", message="进入", data=state)
+        from langchain_core.messages import AIMessage
+
+        self._node_event("welcome", "enter", state)
 
         if not state.get("messages"):
             # 首次对话
@@ -168,12 +181,14 @@ class AdvancedDiagnosisAgent:
             state["diagnosis_stage"] = "greeting" 
             state["final_response"] = welcome_message
             
-        self._debug_print(node_name="1 welcome_node", message="出来", data=state)
+        self._node_event("welcome", "exit", state)
         return state
     
     def _collect_symptoms_node(self, state: AdvancedDiagnosisState) -> AdvancedDiagnosisState:
         """症状收集节点 - 分析用户输入的症状"""
-        self._debug_print(node_name="2_collect_symptoms_node", message="进入", data=state)
+        from langchain_core.prompts import PromptTemplate
+
+        self._node_event("collect_symptoms", "enter", state)
 
         user_input = state.get("current_user_input", "")
         
@@ -210,8 +225,12 @@ class AdvancedDiagnosisAgent:
             analysis = chain.invoke({"user_input": user_input})
             
             # 更新状态
-            new_symptoms = analysis.symptoms
+            # 只追加新出现的症状，并保留最近的 max_symptoms 条（检索查询与根因提示词包含全部症状）
+            known = set(state["confirmed_symptoms"])
+            new_symptoms = [symptom for symptom in dict.fromkeys(analysis.symptoms) if symptom not in known]
             state["confirmed_symptoms"].extend(new_symptoms)
+            if self.max_symptoms:
+                del state["confirmed_symptoms"][:-self.max_symptoms]
             state["collected_info"].update({
                 "error_messages": analysis.error_messages,
                 "time_pattern": analysis.time_pattern,
@@ -227,13 +246,15 @@ class AdvancedDiagnosisAgent:
         
         state["diagnosis_stage"] = "symptom_collection"
 
-        self._debug_print(node_name="2_collect_symptoms_node", message="出来", data=state)
+        self._node_event("collect_symptoms", "exit", state)
 
         return state
     
     def _ask_clarifying_questions_node(self, state: AdvancedDiagnosisState) -> AdvancedDiagnosisState:
         """主动询问节点 - 询问缺失的关键信息"""
-        self._debug_print(node_name="2_1_ask_clarifying_questions_node", message="进入", data=state)
+        from langchain_core.messages import HumanMessage, AIMessage
+
+        self._node_event("ask_clarifying_questions", "enter", state)
 
         problem_type = state.get("problem_type", "general")
         collected_info = state.get("collected_info", {})
@@ -274,12 +295,12 @@ class AdvancedDiagnosisAgent:
 
         state["diagnosis_stage"] = "information_collection"
 
-        self._debug_print(node_name="2_1_ask_clarifying_questions_node", message="出来", data=state)
+        self._node_event("ask_clarifying_questions", "exit", state)
         return state
     
     def _retrieve_knowledge_node(self, state: AdvancedDiagnosisState) -> AdvancedDiagnosisState:
         """知识检索节点 - 基于症状检索相关知识"""
-        self._debug_print(node_name="2_2_ask_clarifying_questions_node", message="进入", data=state)
+        self._node_event("retrieve_knowledge", "enter", state)
 
         symptoms_text = " ".join(state.get("confirmed_symptoms", []))
         user_input = state.get("current_user_input", "")
@@ -287,17 +308,26 @@ class AdvancedDiagnosisAgent:
         # 组合搜索查询
         search_query = f"{symptoms_text} {user_input}"
         
-        retrieved_knowledge = self.retriever.get_related_knowledge(search_query)
+        cases = state.get("prefetched_cases")
+        if cases is None:
+            cases = self.retriever.search_fault_cases(search_query)
+        state["prefetched_cases"] = None
         
-        state["retrieved_knowledge"] = retrieved_knowledge
+        state["retrieved_knowledge"] = self.retriever.format_knowledge(cases)
+        state["retrieved_cases"] = [
+            {"id": case.get("id"), "fault_type": case["fault_type"], "score": round(case["score"], 2)}
+            for case in cases
+        ]
         state["diagnosis_stage"] = "knowledge_retrieval"
 
-        self._debug_print(node_name="2_2_ask_clarifying_questions_node", message="出来", data=state)
+        self._node_event("retrieve_knowledge", "exit", state)
         return state
     
     def _analyze_root_cause_node(self, state: AdvancedDiagnosisState) -> AdvancedDiagnosisState:
         """根本原因分析节点"""
-        self._debug_print(node_name="3_analyze_root_cause_node", message="进入", data=state)
+        from langchain_core.prompts import PromptTemplate
+
+        self._node_event("analyze_root_cause", "enter", state)
 
         symptoms = state.get("confirmed_symptoms", [])
         collected_info = state.get("collected_info", {})
@@ -337,12 +367,14 @@ class AdvancedDiagnosisAgent:
         except Exception as e:
             state["root_cause_analysis"] = "无法确定具体根本原因"
         
-        self._debug_print(node_name="3_analyze_root_cause_node", message="出来", data=state)
+        self._node_event("analyze_root_cause", "exit", state)
         return state
     
     def _generate_solution_node(self, state: AdvancedDiagnosisState) -> AdvancedDiagnosisState:
         """解决方案生成节点"""
-        self._debug_print(node_name="4_generate_solution_node", message="进入", data=state)
+        from langchain_core.messages import HumanMessage
+
+        self._node_event("generate_solution", "enter", state)
 
         root_cause = state.get("root_cause_analysis", "")
         knowledge = state.get("retrieved_knowledge", "")
@@ -378,13 +410,15 @@ class AdvancedDiagnosisAgent:
         except Exception as e:
             state["final_response"] = "无法生成具体的解决方案。"
         
-        self._debug_print(node_name="4_generate_solution_node", message="出来", data=state)
+        self._node_event("generate_solution", "exit", state)
 
         return state
     
     def _confirm_resolution_node(self, state: AdvancedDiagnosisState) -> AdvancedDiagnosisState:
         """确认解决节点"""
-        self._debug_print(node_name="5_confirm_resolution_node", message="进入", data=state)
+        from langchain_core.messages import HumanMessage, AIMessage
+
+        self._node_event("confirm_resolution", "enter", state)
 
         confirmation_prompt = """
         请询问用户问题是否已经解决，或者是否需要进一步的帮助。
@@ -406,13 +440,13 @@ class AdvancedDiagnosisAgent:
         except Exception as e:
             state["final_response"] = "问题是否已经解决？如果需要进一步帮助，请告诉我。"
 
-        self._debug_print(node_name="5_confirm_resolution_node", message="出来", data=state)
+        self._node_event("confirm_resolution", "exit", state)
 
         return state
     
     def _route_after_symptom_collection(self, state: AdvancedDiagnosisState) -> str:
         """症状收集后的路由逻辑"""
-        self._debug_print(node_name="r1_route_after_symptom_collection", message="进入", data=state)
+        self._node_event("route_after_symptom_collection", "enter", state)
 
         symptoms = state.get("confirmed_symptoms", [])
         collected_info = state.get("collected_info", {})
@@ -424,13 +458,17 @@ class AdvancedDiagnosisAgent:
         else:
             decision = "needs_info"
         
-        self._debug_print(node_name="r1_route_after_symptom_collection", message="出来", data=state)
-        print(f"decision {decision}")
+        self._node_event("route_after_symptom_collection", "exit", state)
+        logger.debug("decision %s", decision)
         return decision
     
+    def _route_after_clarifying_questions(self, state: AdvancedDiagnosisState) -> str:
+        """追问后的路由逻辑：已向用户提问则结束本轮"""
+        return "wait_for_user" if state.get("needs_more_info", True) else "has_enough_info"
+
     def _route_after_confirmation(self, state: AdvancedDiagnosisState) -> str:
         """确认后的路由逻辑"""
-        self._debug_print(node_name="r2_route_after_confirmation", message="进入", data=state)
+        self._node_event("route_after_confirmation", "enter", state)
 
         user_input = state.get("current_user_input", "").lower()
         
@@ -441,57 +479,189 @@ class AdvancedDiagnosisAgent:
         else:
             decision = "new_problem"
         
-        self._debug_print(node_name="r2_route_after_confirmation", message="出来", data=state)
-        print(f"decision {decision}")
+        self._node_event("route_after_confirmation", "exit", state)
+        logger.debug("decision %s", decision)
         return decision
     
-    def diagnose(self, user_input: str, session_id: str = "default") -> str:
-        """执行诊断"""
-        print(f"\n{'🚀' * 20}")
-        print(f"🚀 开始高级诊断会话: {session_id}")
-        print(f"🚀 用户输入: {user_input}")
-        print(f"{'🚀' * 20}")
-        
-        # 初始化或更新状态
-        if not hasattr(self, 'session_states'):
-            self.session_states = {}
-        
-        initial_state = None
-        if session_id not in self.session_states:
-            # 新会话
-            initial_state = AdvancedDiagnosisState(
-                messages=[],
-                current_user_input=user_input,
-                session_id=session_id,
-                diagnosis_stage="initial",
-                confirmed_symptoms=[],
-                collected_info={},
-                missing_info=[],
-                problem_type="unknown",
-                root_cause_analysis="",
-                retrieved_knowledge="",
-                solution_steps=[],
-                needs_more_info=True,
-                problem_solved=False,
-                final_response=""
-            )
-        else:
-            # 继续现有会话
-            initial_state = self.session_states[session_id]
-            initial_state["current_user_input"] = user_input
-        
-        # 执行图
-        result = self.graph.invoke(initial_state)
-        
-        # 保存会话状态
-        self.session_states[session_id] = result
-        
-        return result.get("generate_solution", "抱歉，诊断过程中出现了错误。")
+    @staticmethod
+    def _node_artifacts(node_name: str, update: Dict[str, Any]) -> Dict[str, Any]:
+        """提取节点的早期产出（保持精简，只用于进度推送）"""
+        if node_name == "collect_symptoms":
+            return {
+                "problem_type": update.get("problem_type"),
+                "symptoms": update.get("confirmed_symptoms", [])[-5:],
+            }
+        if node_name == "ask_clarifying_questions":
+            return {"question": update.get("final_response", "")}
+        if node_name == "retrieve_knowledge":
+            cases = update.get("retrieved_cases", [])
+            return {
+                "case_ids": [case["id"] for case in cases],
+                "cases": cases,
+            }
+        if node_name == "analyze_root_cause":
+            return {"root_cause": (update.get("root_cause_analysis") or "")[:300]}
+        if node_name == "generate_solution":
+            return {"solution_chars": len(update.get("generate_solution") or "")}
+        return {}
+
+    @staticmethod
+    def new_session_state(session_id: str) -> Dict[str, Any]:
+        """新会话的初始状态"""
+        return AdvancedDiagnosisState(
+            messages=[],
+            current_user_input="",
+            session_id=session_id,
+            diagnosis_stage="initial",
+            confirmed_symptoms=[],
+            collected_info={},
+            missing_info=[],
+            problem_type="unknown",
+            root_cause_analysis="",
+            retrieved_knowledge="",
+            retrieved_cases=[],
+            prefetched_cases=None,
+            trace_node_events=False,
+            solution_steps=[],
+            needs_more_info=True,
+            problem_solved=False,
+            final_response="",
+            generate_solution=""
+        )
+
+    @staticmethod
+    def serialize_state(state: Dict[str, Any]) -> Dict[str, Any]:
+        """转换为可JSON序列化的会话状态（消息对象转为字典，保存到Redis后可完整还原）"""
+        from langchain_core.messages import messages_to_dict
+
+        data = dict(state)
+        data["messages"] = messages_to_dict(state.get("messages", []))
+        return data
+
+    @staticmethod
+    def deserialize_state(data: Dict[str, Any]) -> Dict[str, Any]:
+        """从Redis中的会话数据还原状态"""
+        from langchain_core.messages import AIMessage, messages_from_dict
+
+        state = dict(data)
+        messages = state.get("messages", [])
+        # 旧版本把消息对象直接str()保存，无法还原类型，按助手消息处理
+        state["messages"] = (
+            messages_from_dict([m for m in messages if isinstance(m, dict)])
+            if all(isinstance(m, dict) for m in messages)
+            else [AIMessage(content=str(m)) for m in messages]
+        )
+        return state
+
+    def prefetch_knowledge(self, user_inputs: List[str]) -> List[List[Dict[str, Any]]]:
+        """批量诊断前一次性检索所有输入的相关案例（检索器支持时合并为一次ES _msearch 请求）"""
+        if hasattr(self.retriever, "msearch_fault_cases"):
+            return self.retriever.msearch_fault_cases(user_inputs)
+        return [self.retriever.search_fault_cases(user_input) for user_input in user_inputs]
+
+    def _prepare_state(
+        self,
+        user_input: str,
+        session_id: str,
+        session_state: Optional[Dict[str, Any]],
+        prefetched_cases: Optional[List[Dict[str, Any]]] = None,
+        debug: bool = False
+    ) -> Dict[str, Any]:
+        logger.info("🚀 开始高级诊断会话: %s, 用户输入: %s", session_id, user_input)
+
+        # 节点会原地修改列表/字典，深拷贝保证调用方传入的状态不被修改、并发调用之间不共享对象
+        state = copy.deepcopy(session_state) if session_state else self.new_session_state(session_id)
+        state["session_id"] = session_id
+        state["current_user_input"] = user_input
+        # 本轮的方案重新生成，避免返回上一轮的旧方案
+        state["generate_solution"] = ""
+        state["needs_more_info"] = True
+        state["prefetched_cases"] = prefetched_cases
+        state["trace_node_events"] = debug or self.debug_mode or get_node_event_hook().sampled(session_id)
+        return state
+
+    def _bound_state(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """本轮结束时只保留最近的 max_messages 条消息，保存到Redis的会话大小不随轮数增长"""
+        if self.max_messages and len(state.get("messages", [])) > self.max_messages:
+            state["messages"] = state["messages"][-self.max_messages:]
+        return state
+
+    @staticmethod
+    def _turn_response(result: Dict[str, Any]) -> str:
+        """本轮回复：生成了方案则返回方案，否则返回追问等最终回复"""
+        return result.get("generate_solution") or result.get("final_response") or "抱歉，诊断过程中出现了错误。"
+
+    def diagnose(
+        self,
+        user_input: str,
+        session_id: str = "default",
+        session_state: Optional[Dict[str, Any]] = None,
+        on_node: Optional[Callable[[str, float, Dict[str, Any]], None]] = None,
+        prefetched_cases: Optional[List[Dict[str, Any]]] = None,
+        debug: bool = False
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        执行一轮诊断
+
+        Args:
+            user_input: 用户输入
+            session_id: 会话ID
+            session_state: 上一轮结束时的会话状态（新会话传None），不会被修改
+            on_node: 每个节点执行完成后的回调 (节点名, 节点耗时ms, 节点产出的早期结果)，
+                     用于在最终方案生成前把中间进展推送给用户
+            prefetched_cases: 预先检索的案例（见 prefetch_knowledge），知识检索节点直接使用
+            debug: 本轮输出节点事件（不受采样率限制）
+
+        Returns:
+            (本轮回复, 本轮结束后的会话状态)
+        """
+        initial_state = self._prepare_state(user_input, session_id, session_state, prefetched_cases, debug)
+
+        # 逐节点执行图（stream_mode="updates" 每完成一个节点产出一次该节点的输出）
+        result = dict(initial_state)
+        last_tick = time.perf_counter()
+        for chunk in self.graph.stream(initial_state, stream_mode="updates"):
+            now = time.perf_counter()
+            for node_name, update in chunk.items():
+                if update:
+                    result.update(update)
+                metrics.NODE_DURATION.labels(node=node_name).observe(now - last_tick)
+                if on_node is not None:
+                    on_node(node_name, round((now - last_tick) * 1000, 1), self._node_artifacts(node_name, update or {}))
+            last_tick = now
+
+        return self._turn_response(result), self._bound_state(result)
+
+    async def adiagnose(
+        self,
+        user_input: str,
+        session_id: str = "default",
+        session_state: Optional[Dict[str, Any]] = None,
+        on_node: Optional[Callable[[str, float, Dict[str, Any]], None]] = None,
+        prefetched_cases: Optional[List[Dict[str, Any]]] = None,
+        debug: bool = False
+    ) -> Tuple[str, Dict[str, Any]]:
+        """diagnose 的异步版本（基于 graph.ainvoke / astream），可在一个事件循环中并发执行多个诊断"""
+        initial_state = self._prepare_state(user_input, session_id, session_state, prefetched_cases, debug)
+
+        result = dict(initial_state)
+        last_tick = time.perf_counter()
+        async for chunk in self.graph.astream(initial_state, stream_mode="updates"):
+            now = time.perf_counter()
+            for node_name, update in chunk.items():
+                if update:
+                    result.update(update)
+                metrics.NODE_DURATION.labels(node=node_name).observe(now - last_tick)
+                if on_node is not None:
+                    on_node(node_name, round((now - last_tick) * 1000, 1), self._node_artifacts(node_name, update or {}))
+            last_tick = now
+
+        return self._turn_response(result), self._bound_state(result)
 
 # 测试函数
 def test_advanced_agent_debug():
     """测试带调试信息的高级智能体"""
-    print("🤖🔍 测试带调试信息的高级诊断智能体...")
+    logger.info("🤖🔍 测试带调试信息的高级诊断智能体...")
     
     agent = AdvancedDiagnosisAgent(debug_mode=True)
     
@@ -504,16 +674,16 @@ def test_advanced_agent_debug():
     ]
     
     session_id = "debug_session_001"
+    session_state = None
     
     for i, user_input in enumerate(test_conversation, 1):
-        print(f"\n{'💬' * 30}")
-        print(f"💬 第{i}轮对话 - 用户输入: {user_input}")
-        print(f"{'💬' * 30}")
+        logger.info(f"💬 第{i}轮对话 - 用户输入: {user_input}")
         
-        response = agent.diagnose(user_input, session_id)
-        print(f"\n{'🤖' * 10} 助手回复 {'🤖' * 10}")
-        print(f"🤖 {response}")
-        print(f"{'🤖' * 30}")
+        response, session_state = agent.diagnose(user_input, session_id, session_state)
+        logger.info(f"🤖 助手回复: {response}")
 
 if __name__ == "__main__":
+    from src.core.logging_config import setup_logging
+
+    setup_logging()
     test_advanced_agent_debug()
\ No newline at end of file
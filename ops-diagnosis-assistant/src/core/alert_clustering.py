@@ -0,0 +1,240 @@
+"""
+告警聚类：屏蔽告警文本中的可变部分（IP、主机名、数字等）得到模式签名，
+同一签名在滑动时间窗口内的告警归为一个聚类，每个聚类只诊断一次，诊断结果由所有成员告警共用
+"""
+import re
+import time
+import uuid
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+import redis
+
+from src.config import get_settings
+from src.core.queue_stats import _percentile
+
+logger = logging.getLogger(__name__)
+
+# 按顺序替换：先替换结构化的标识，再替换剩余的数字
+MASK_PATTERNS = [
+    (re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.I), "<UUID>"),
+    (re.compile(r"(?<![\d.])\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?(?![\d.])"), "<IP>"),
+    (re.compile(r"(?<![0-9a-z:])[0-9a-f]{0,4}(?::[0-9a-f]{0,4}){2,7}(?![0-9a-z:])", re.I), "<IP>"),
+    # 至少三段的域名（db-01.prod.example.com）
+    (re.compile(r"(?<![A-Za-z0-9.-])[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+\.[A-Za-z][A-Za-z0-9-]*(?![A-Za-z0-9.-])"), "<HOST>"),
+    # 带编号或随机后缀的实例名（web-01、order-svc-7d9f8b-x2kq）
+    (re.compile(r"(?<![A-Za-z0-9-])[A-Za-z][A-Za-z0-9]*(?:-[A-Za-z0-9]+)*-(?=[A-Za-z]*\d)[A-Za-z0-9]+(?![A-Za-z0-9-])"), "<HOST>"),
+    (re.compile(r"0x[0-9a-f]+|(?<![0-9a-z])(?=[a-f]*\d)[0-9a-f]{8,}(?![0-9a-z])", re.I), "<HEX>"),
+    (re.compile(r"\d+(?:\.\d+)?"), "<NUM>"),
+]
+
+
+def mask_alert(text: str) -> str:
+    """把告警文本中的可变部分替换为占位符，得到告警模式"""
+    text = text.lower()
+    for pattern, placeholder in MASK_PATTERNS:
+        text = pattern.sub(placeholder, text)
+    return " ".join(text.split())
+
+
+def alert_signature(text: str, source: str = "") -> Tuple[str, str]:
+    """返回 (签名, 告警模式)；不同来源的相同模式视为不同的告警"""
+    pattern = mask_alert(text)
+    return hashlib.sha1(f"{source}|{pattern}".encode("utf-8")).hexdigest()[:16], pattern
+
+
+# 关闭诊断提交失败的聚类：KEYS[1] 签名键，KEYS[2] 聚类HASH，KEYS[3] 统计HASH，ARGV[1] 聚类ID
+# 签名仍指向该聚类时才删除（比较并删除）；聚类标记为 submit_failed 并从聚类数中扣除，重复调用不重复扣除
+ABANDON_CLUSTER_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+if redis.call('EXISTS', KEYS[2]) == 1 and redis.call('HGET', KEYS[2], 'status') ~= 'submit_failed' then
+    redis.call('HSET', KEYS[2], 'status', 'submit_failed')
+    redis.call('HINCRBY', KEYS[3], 'clusters', -1)
+    redis.call('HINCRBY', KEYS[3], 'submit_failures', 1)
+    return 1
+end
+return 0
+"""
+
+
+class AlertClusterer:
+    """
+    基于Redis的滑动窗口聚类
+
+    - alert_sig:{签名} -> 当前打开的聚类ID，每收到一条同签名告警就续期 window 秒，窗口内没有新告警时聚类关闭
+    - alert_cluster:{聚类ID} (HASH) 聚类信息与诊断任务（诊断提交失败时 status=submit_failed），alert_cluster_members:{聚类ID} (LIST) 成员告警
+    - alert_member:{告警ID} -> 聚类ID，用于按告警查询诊断结果
+    """
+
+    def __init__(self, window: int = None, retention: int = None, max_members: int = None):
+        settings = get_settings()
+        self.redis_client = redis.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db,
+            password=settings.redis_password,
+            decode_responses=True
+        )
+        self.window = window or settings.alert_cluster_window
+        self.retention = retention or settings.alert_retention
+        self.max_members = max_members or settings.alert_cluster_max_members
+        self.signature_prefix = "alert_sig:"
+        self.cluster_prefix = "alert_cluster:"
+        self.members_prefix = "alert_cluster_members:"
+        self.member_prefix = "alert_member:"
+        # 聚类索引（ZSET: 聚类ID -> 最近一条告警时间），用于统计聚类规模
+        self.index_key = "alert_clusters"
+        self.stats_key = "alert_stats"
+
+    def _open_cluster(self, signature: str) -> Tuple[str, bool]:
+        """取得签名当前打开的聚类（没有则新建），并把窗口续期；返回 (聚类ID, 是否新建)"""
+        key = f"{self.signature_prefix}{signature}"
+        while True:
+            cluster_id = str(uuid.uuid4())
+            if self.redis_client.set(key, cluster_id, nx=True, ex=self.window):
+                return cluster_id, True
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.expire(key, self.window)
+            existing, _ = pipe.execute()
+            # 读取前恰好过期时重新创建
+            if existing:
+                return existing, False
+
+    def ingest(self, signature: str, pattern: str, alerts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        把同一签名的一组告警加入聚类
+
+        Args:
+            signature: 告警签名
+            pattern: 告警模式（屏蔽可变部分后的文本）
+            alerts: [{"alert_id", "message", "severity"}, ...]
+
+        Returns:
+            聚类信息（含 created 表示是否为新聚类，新聚类需要由调用方提交诊断）
+        """
+        cluster_id, created = self._open_cluster(signature)
+        now = time.time()
+        cluster_key = f"{self.cluster_prefix}{cluster_id}"
+        members_key = f"{self.members_prefix}{cluster_id}"
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        if created:
+            pipe.hset(cluster_key, mapping={
+                "cluster_id": cluster_id,
+                "signature": signature,
+                "pattern": pattern,
+                "sample": alerts[0]["message"],
+                "first_seen": now,
+            })
+        pipe.hset(cluster_key, "last_seen", now)
+        pipe.hincrby(cluster_key, "count", len(alerts))
+        pipe.rpush(members_key, *(alert["alert_id"] for alert in alerts))
+        # 只保留最早的 max_members 个成员ID，聚类规模以 count 为准
+        pipe.ltrim(members_key, 0, self.max_members - 1)
+        for alert in alerts:
+            pipe.set(f"{self.member_prefix}{alert['alert_id']}", cluster_id, ex=self.retention)
+        pipe.expire(cluster_key, self.retention)
+        pipe.expire(members_key, self.retention)
+        pipe.zadd(self.index_key, {cluster_id: now})
+        pipe.zremrangebyscore(self.index_key, 0, now - self.retention)
+        pipe.hincrby(self.stats_key, "ingested", len(alerts))
+        if created:
+            pipe.hincrby(self.stats_key, "clusters", 1)
+        pipe.hgetall(cluster_key)
+        cluster = pipe.execute()[-1]
+        return {**self._decode_cluster(cluster), "created": created}
+
+    def abandon(self, signature: str, cluster_id: str):
+        """
+        新聚类的诊断提交失败时关闭该聚类（签名仍指向它时才删除，避免误删之后新建的聚类），
+        同签名的下一条告警会新建聚类并重新提交诊断；已归入该聚类的告警查询时报告提交失败
+        """
+        self.redis_client.eval(
+            ABANDON_CLUSTER_SCRIPT, 3,
+            f"{self.signature_prefix}{signature}", f"{self.cluster_prefix}{cluster_id}", self.stats_key, cluster_id
+        )
+
+    def attach_task(self, cluster_id: str, task_id: str, session_id: str, severity: str):
+        """记录聚类的诊断任务"""
+        self.redis_client.hset(
+            f"{self.cluster_prefix}{cluster_id}",
+            mapping={"task_id": task_id, "session_id": session_id, "severity": severity}
+        )
+
+    @staticmethod
+    def _decode_cluster(cluster: Dict[str, str]) -> Dict[str, Any]:
+        if not cluster:
+            return {}
+        decoded = dict(cluster)
+        decoded["count"] = int(cluster.get("count", 0))
+        for field in ("first_seen", "last_seen"):
+            if field in cluster:
+                decoded[field] = float(cluster[field])
+        return decoded
+
+    def get_cluster(self, cluster_id: str, with_members: bool = False) -> Optional[Dict[str, Any]]:
+        """获取聚类信息（可附带成员告警ID）"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hgetall(f"{self.cluster_prefix}{cluster_id}")
+        if with_members:
+            pipe.lrange(f"{self.members_prefix}{cluster_id}", 0, -1)
+        results = pipe.execute()
+        cluster = self._decode_cluster(results[0])
+        if not cluster:
+            return None
+        if with_members:
+            cluster["members"] = results[1]
+        return cluster
+
+    def get_alert_cluster(self, alert_id: str) -> Optional[Dict[str, Any]]:
+        """按告警ID获取其所属聚类"""
+        cluster_id = self.redis_client.get(f"{self.member_prefix}{alert_id}")
+        return self.get_cluster(cluster_id) if cluster_id else None
+
+    def get_stats(self, top: int = 10, max_clusters: int = 1000) -> Dict[str, Any]:
+        """累计的告警数/聚类数/抑制比例，以及保留期内最近聚类的规模分布"""
+        stats = self.redis_client.hgetall(self.stats_key)
+        ingested = int(stats.get("ingested", 0))
+        clusters = int(stats.get("clusters", 0))
+
+        cluster_ids = self.redis_client.zrevrangebyscore(
+            self.index_key, "+inf", time.time() - self.retention, start=0, num=max_clusters
+        )
+        pipe = self.redis_client.pipeline(transaction=False)
+        for cluster_id in cluster_ids:
+            pipe.hmget(f"{self.cluster_prefix}{cluster_id}", "count", "pattern", "task_id")
+        recent = [
+            {"cluster_id": cluster_id, "count": int(count), "pattern": pattern, "task_id": task_id}
+            for cluster_id, (count, pattern, task_id) in zip(cluster_ids, pipe.execute())
+            if count is not None
+        ]
+        sizes = sorted(cluster["count"] for cluster in recent)
+
+        return {
+            "ingested": ingested,
+            "clusters": clusters,
+            "suppressed": ingested - clusters,
+            # 被合并、无需单独诊断的告警比例
+            "suppression_ratio": round(1 - clusters / ingested, 4) if ingested else 0.0,
+            # 诊断提交失败而关闭的聚类数
+            "submit_failures": int(stats.get("submit_failures", 0)),
+            "cluster_sizes": {
+                "clusters": len(sizes),
+                "mean": round(sum(sizes) / len(sizes), 2),
+                "p50": _percentile(sizes, 50),
+                "p95": _percentile(sizes, 95),
+                "max": sizes[-1],
+            } if sizes else {"clusters": 0},
+            "top_clusters": sorted(recent, key=lambda cluster: cluster["count"], reverse=True)[:top],
+        }
+
+
+@lru_cache(maxsize=1)
+def get_alert_clusterer() -> AlertClusterer:
+    """获取进程内共享的告警聚类器"""
+    return AlertClusterer()
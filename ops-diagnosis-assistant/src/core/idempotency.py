@@ -0,0 +1,88 @@
+"""
+诊断提交的幂等性：客户端为每次提交生成 Idempotency-Key，超时重试时携带相同的key，
+API直接返回第一次提交的任务，不会重复执行整个LLM诊断流程
+"""
+import json
+import hashlib
+import logging
+from functools import lru_cache
+from typing import Dict, Any, Optional
+
+import redis
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyStore:
+    """(客户端, Idempotency-Key) -> 首次提交的任务（SET NX EX），并统计被抑制的重复提交"""
+
+    def __init__(self, ttl: int = None):
+        settings = get_settings()
+        self.redis_client = redis.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db,
+            password=settings.redis_password,
+            decode_responses=True
+        )
+        self.ttl = ttl or settings.idempotency_ttl
+        self.key_prefix = "idempotency:"
+        self.stats_key = "idempotency_stats"
+
+    @staticmethod
+    def fingerprint(payload: Dict[str, Any]) -> str:
+        """请求内容的指纹，用于发现同一个key被用于不同的请求"""
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+    def _redis_key(self, client: str, key: str) -> str:
+        # 按客户端隔离：不同客户端使用相同的key互不影响，也无法读到其他客户端的任务
+        return f"{self.key_prefix}{client}:{key}"
+
+    def reserve(self, client: str, key: str, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        登记客户端的首次请求（record 需包含 fingerprint）
+
+        Returns:
+            None 表示首次请求（调用方继续提交任务）；否则为该key之前登记的记录，
+            其 fingerprint 与本次不同说明同一个key被用于不同的请求
+        """
+        redis_key = self._redis_key(client, key)
+        # MULTI 中的 SET NX + GET 是原子的：要么登记成功，要么读到先到者的记录
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.set(redis_key, json.dumps(record), nx=True, ex=self.ttl)
+        pipe.get(redis_key)
+        created, existing = pipe.execute()
+        if created:
+            self.redis_client.hincrby(self.stats_key, "first", 1)
+            return None
+        existing = json.loads(existing)
+        self.redis_client.hincrby(
+            self.stats_key, "duplicates" if existing["fingerprint"] == record["fingerprint"] else "conflicts", 1
+        )
+        return existing
+
+    def release(self, client: str, key: str):
+        """任务提交失败时删除登记，允许客户端用同一个key重试"""
+        self.redis_client.delete(self._redis_key(client, key))
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.redis_client.hgetall(self.stats_key)
+        first = int(stats.get("first", 0))
+        duplicates = int(stats.get("duplicates", 0))
+        conflicts = int(stats.get("conflicts", 0))
+        total = first + duplicates + conflicts
+        return {
+            "requests_with_key": total,
+            "duplicates_suppressed": duplicates,
+            "conflicts": conflicts,
+            "duplicate_ratio": round(duplicates / total, 4) if total else 0.0,
+            "ttl": self.ttl,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_idempotency_store() -> IdempotencyStore:
+    """获取进程内共享的幂等记录"""
+    return IdempotencyStore()
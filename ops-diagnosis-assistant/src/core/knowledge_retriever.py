@@ -1,23 +1,38 @@
-import os
-from elasticsearch import Elasticsearch
-from dotenv import load_dotenv
+import time
 import logging
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any
 
-load_dotenv()
+from src.config import get_settings
+from src.core import metrics, tracing
+
+logger = logging.getLogger(__name__)
 
 class KnowledgeRetriever:
     def __init__(self):
+        settings = get_settings()
         self.es_config = {
-            "hosts": [f"http://{os.getenv('ELASTICSEARCH_HOST', 'localhost')}:{os.getenv('ELASTICSEARCH_PORT', '9200')}"],
+            "hosts": [settings.elasticsearch_url],
             "verify_certs": False
         }
         self.es_index = "fault_cases"
         self.es_client = None
+        # 检索结果缓存: (规范化查询, top_k) -> (写入时间, 结果)
+        self.cache_size = settings.retrieval_cache_size
+        self.cache_ttl = settings.retrieval_cache_ttl
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.search_fields = settings.retrieval_fields
+        self.fuzziness = settings.retrieval_fuzziness
+        self.minimum_should_match = settings.retrieval_minimum_should_match
         self._connect()
     
     def _connect(self):
         """连接Elasticsearch"""
+        # elasticsearch客户端较重，仅在真正连接时导入
+        from elasticsearch import Elasticsearch
+
         try:
             self.es_client = Elasticsearch(**self.es_config)
             if self.es_client.ping():
@@ -41,45 +56,155 @@ class KnowledgeRetriever:
         if not self.es_client:
             logging.error("Elasticsearch客户端未初始化")
             return []
+
+        cache_key = self._cache_key(query, top_k)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
         
         try:
-            search_body = {
-                "query": {
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["symptoms^3", "fault_type^2", "root_cause", "combined_text"],  # symptoms权重最高
-                        "fuzziness": "AUTO",  # 模糊搜索
-                        "minimum_should_match": "30%"  # 最小匹配度
-                    }
-                },
-                "size": top_k,
-                "_source": ["fault_type", "symptoms", "root_cause", "solution", "severity"]
-            }
-            
-            result = self.es_client.search(index=self.es_index, body=search_body)
+            with tracing.span("es.search", **{"es.index": self.es_index}), \
+                    metrics.timed(metrics.ES_DURATION, operation="search"):
+                result = self.es_client.search(index=self.es_index, body=self._search_body(query, top_k))
             hits = result["hits"]["hits"]
             
             logging.info(f"🔍 知识检索: '{query}' -> 找到 {len(hits)} 条相关记录")
             
-            # 格式化返回结果
-            cases = []
-            for hit in hits:
-                source = hit["_source"]
-                cases.append({
-                    "fault_type": source.get("fault_type", ""),
-                    "symptoms": source.get("symptoms", ""),
-                    "root_cause": source.get("root_cause", ""),
-                    "solution": source.get("solution", ""),
-                    "severity": source.get("severity", ""),
-                    "score": hit["_score"]  # 相关度分数
-                })
-            
+            cases = self._format_hits(hits)
+            self._cache_put(cache_key, cases)
             return cases
             
         except Exception as e:
             logging.error(f"❌ 知识检索失败: {e}")
             return []
+
+    def msearch_fault_cases(self, queries: List[str], top_k: int = 3) -> List[List[Dict[str, Any]]]:
+        """
+        批量搜索故障案例：未命中缓存的查询合并为一次 _msearch 请求
+
+        Args:
+            queries: 搜索查询列表
+            top_k: 每个查询返回最相关的K条记录
+
+        Returns:
+            与 queries 一一对应的故障案例列表
+        """
+        results: List[Any] = [self._cache_get(self._cache_key(query, top_k)) for query in queries]
+        # 相同的查询只检索一次
+        missing = list(dict.fromkeys(self._cache_key(q, top_k) for q, r in zip(queries, results) if r is None))
+        if missing and not self.es_client:
+            logging.error("Elasticsearch客户端未初始化")
+        elif missing:
+            searches = []
+            for query, _ in missing:
+                searches.extend([{}, self._search_body(query, top_k)])
+            try:
+                with tracing.span("es.msearch", **{"es.index": self.es_index, "es.queries": len(missing)}), \
+                        metrics.timed(metrics.ES_DURATION, operation="msearch"):
+                    responses = self.es_client.msearch(index=self.es_index, searches=searches)["responses"]
+                fetched = {}
+                for cache_key, response in zip(missing, responses):
+                    if "error" in response:
+                        logging.error(f"❌ 知识检索失败: '{cache_key[0]}' -> {response['error']}")
+                        continue
+                    fetched[cache_key] = self._format_hits(response["hits"]["hits"])
+                    self._cache_put(cache_key, fetched[cache_key])
+                logging.info(f"🔍 批量知识检索: {len(queries)} 个查询，{len(missing)} 个未命中缓存")
+                results = [
+                    r if r is not None else fetched.get(self._cache_key(q, top_k))
+                    for q, r in zip(queries, results)
+                ]
+            except Exception as e:
+                logging.error(f"❌ 批量知识检索失败: {e}")
+        return [r if r is not None else [] for r in results]
+
+    @staticmethod
+    def _cache_key(query: str, top_k: int) -> tuple:
+        return (" ".join(query.split()), top_k)
+
+    def _search_body(self, query: str, top_k: int) -> Dict[str, Any]:
+        multi_match = {
+            "query": query,
+            "fields": self.search_fields,  # 默认 symptoms 权重最高
+        }
+        if self.fuzziness:
+            multi_match["fuzziness"] = self.fuzziness  # 模糊搜索
+        if self.minimum_should_match:
+            multi_match["minimum_should_match"] = self.minimum_should_match  # 最小匹配度
+        return {
+            "query": {"multi_match": multi_match},
+            "size": top_k,
+            "_source": ["fault_type", "symptoms", "root_cause", "solution", "severity"]
+        }
+
+    @staticmethod
+    def _format_hits(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """格式化ES命中结果"""
+        cases = []
+        for hit in hits:
+            source = hit["_source"]
+            cases.append({
+                "id": hit["_id"],
+                "fault_type": source.get("fault_type", ""),
+                "symptoms": source.get("symptoms", ""),
+                "root_cause": source.get("root_cause", ""),
+                "solution": source.get("solution", ""),
+                "severity": source.get("severity", ""),
+                "score": hit["_score"]  # 相关度分数
+            })
+        return cases
     
+    def _cache_get(self, key: tuple):
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.cache_ttl:
+                del self._cache[key]
+                entry = None
+            if entry is not None:
+                self._cache.move_to_end(key)
+        metrics.CACHE_REQUESTS.labels(result="miss" if entry is None else "hit").inc()
+        return None if entry is None else entry[1]
+
+    def _cache_put(self, key: tuple, cases: List[Dict[str, Any]]):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic(), cases)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def warm_up_top_fault_types(self, limit: int = 5) -> int:
+        """
+        用高频故障类型的症状描述预热ES检索（Worker预热时调用）
+
+        按发生频率（frequent > occasional）取前 limit 个故障案例，用其症状描述执行一次 _msearch，
+        让ES的查询路径与页缓存处于热状态。实际查询由症状与用户输入拼接而成，不会与这些查询相同，
+        因此结果不写入本进程的检索缓存。返回执行的查询数。
+        """
+        if not self.es_client:
+            return 0
+        queries = []
+        for frequency in ("frequent", "occasional"):
+            if len(queries) >= limit:
+                break
+            result = self.es_client.search(
+                index=self.es_index,
+                body={
+                    "query": {"term": {"frequency": frequency}},
+                    "size": limit - len(queries),
+                    "_source": ["symptoms"]
+                }
+            )
+            queries.extend(hit["_source"].get("symptoms", "") for hit in result["hits"]["hits"])
+        queries = [query for query in queries if query]
+        if queries:
+            searches = []
+            for query in queries:
+                searches.extend([{}, self._search_body(query, 3)])
+            self.es_client.msearch(index=self.es_index, searches=searches)
+        return len(queries)
+
     def get_related_knowledge(self, user_input: str) -> str:
         """
         获取相关知识并格式化为字符串
@@ -90,8 +215,11 @@ class KnowledgeRetriever:
         Returns:
             格式化后的相关知识文本
         """
-        cases = self.search_fault_cases(user_input)
-        
+        return self.format_knowledge(self.search_fault_cases(user_input))
+
+    @staticmethod
+    def format_knowledge(cases: List[Dict[str, Any]]) -> str:
+        """把检索到的故障案例格式化为提示词中使用的知识文本"""
         if not cases:
             return "知识库中没有找到相关的故障案例。"
         
@@ -121,9 +249,12 @@ def test_retriever():
     ]
     
     for query in test_queries:
-        print(f"\n🔍 测试查询: {query}")
+        logger.info(f"🔍 测试查询: {query}")
         knowledge = retriever.get_related_knowledge(query)
-        print(f"📚 检索到的知识:\n{knowledge}")
+        logger.info(f"📚 检索到的知识:\n{knowledge}")
 
 if __name__ == "__main__":
+    from src.core.logging_config import setup_logging
+
+    setup_logging()
     test_retriever()
\ No newline at end of file
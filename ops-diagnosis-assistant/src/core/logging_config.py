@@ -0,0 +1,195 @@
+"""
+结构化日志：调用线程只把日志记录放入内存队列，由后台线程格式化为JSON并写出，请求/任务不等待stdout
+
+- 每条记录携带当前的 session_id / task_id（log_context 设置，跨 LangGraph 节点线程传递）
+- 同一调用位置输出的相同消息在 LOG_RATE_LIMIT_WINDOW 秒内最多 LOG_RATE_LIMIT 条（例如ES不可用时每个请求的同一条错误），
+  被抑制的条数附在窗口结束后的下一条上
+- 消息超过 LOG_MAX_MESSAGE_CHARS 时截断（用户输入、诊断方案等长文本）
+- 队列满时丢弃新记录并计数，不阻塞调用方
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from src.config import get_settings
+
+# 当前请求/任务的日志上下文（session_id、task_id 等）
+_log_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("log_context", default={})
+
+# 当前进程的 (pid, QueueListener)；prefork子进程中父进程的后台线程不存在，按pid重新启动
+_state: Dict[str, Any] = {"pid": None, "listener": None, "handler": None}
+_setup_lock = threading.Lock()
+
+# 限流跟踪的消息数上限，超过时清理已过窗口的条目
+MAX_TRACKED_MESSAGES = 4096
+
+# LogRecord 的标准属性，其余属性（extra=...）作为JSON字段输出
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+@contextmanager
+def log_context(**fields):
+    """块内产生的日志记录附带这些字段（嵌套时合并）"""
+    token = _log_context.set({**_log_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """在调用线程中把日志上下文写入记录（后台线程中已经取不到调用方的上下文）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """重复消息限流：同一调用位置的相同消息在窗口内只保留前 limit 条"""
+
+    def __init__(self, limit: int, window: float):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        # (logger, 行号, 消息) -> [窗口开始时间, 窗口内条数, 被抑制条数]
+        self._sites: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        for key in [key for key, site in self._sites.items() if now - site[0] >= self.window]:
+            del self._sites[key]
+        # 窗口内的不同消息太多（消息各不相同，本来就不是重复刷屏），不再跟踪
+        if len(self._sites) >= MAX_TRACKED_MESSAGES:
+            self._sites.clear()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.limit:
+            return True
+        # 合并后的消息缓存在记录上，入队时不再重复格式化
+        record.message = record.getMessage()
+        key = (record.name, record.lineno, record.message)
+        now = time.monotonic()
+        with self._lock:
+            if len(self._sites) >= MAX_TRACKED_MESSAGES:
+                self._prune(now)
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site else 0
+                self._sites[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if site[1] >= self.limit:
+                site[2] += 1
+                return False
+            site[1] += 1
+            return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录一行JSON: ts, level, logger, msg, 以及上下文/extra字段"""
+
+    def __init__(self, max_chars: int):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def _truncate(self, text: str) -> str:
+        if self.max_chars and len(text) > self.max_chars:
+            return f"{text[:self.max_chars]}…(+{len(text) - self.max_chars})"
+        return text
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": self._truncate(record.getMessage()),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """调用线程只合并消息参数（参数对象之后可能被修改）并入队，JSON序列化与写出在后台线程"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        message = record.__dict__.get("message") or record.getMessage()
+        record = logging.makeLogRecord(vars(record))
+        record.msg, record.args = message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level: str = None, stream=None) -> bool:
+    """为当前进程配置根日志（API启动、Worker进程启动时调用；重复调用无副作用）"""
+    with _setup_lock:
+        if _state["pid"] == os.getpid():
+            return False
+        settings = get_settings()
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.log_queue_size))
+        handler.addFilter(RateLimitFilter(settings.log_rate_limit, settings.log_rate_limit_window))
+        handler.addFilter(ContextFilter())
+
+        # Celery会把 sys.stdout 重定向到日志，直接写原始stdout，避免日志写回日志
+        output = logging.StreamHandler(stream or sys.__stdout__)
+        output.setFormatter(JsonFormatter(settings.log_max_message_chars))
+        listener = QueueListener(handler.queue, output, respect_handler_level=True)
+        listener.start()
+
+        root = logging.getLogger()
+        # 替换之前的处理器（包括fork前父进程配置的、没有后台线程的队列处理器）
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        # fork出的子进程沿用父进程已设置的级别
+        if level or _state["pid"] is None:
+            root.setLevel((level or settings.log_level).upper())
+        _state.update(pid=os.getpid(), listener=listener, handler=handler)
+    return True
+
+
+def flush_logging():
+    """写出队列中剩余的日志并停止后台线程（进程退出时）"""
+    listener: Optional[QueueListener] = _state["listener"]
+    if listener is not None and _state["pid"] == os.getpid():
+        listener.stop()
+        _state.update(pid=None, listener=None)
+
+
+def dropped_records() -> int:
+    """因队列满被丢弃的日志条数"""
+    handler = _state["handler"]
+    return handler.dropped if handler is not None else 0
+
+
+atexit.register(flush_logging)
@@ -0,0 +1,217 @@
+"""
+Prometheus指标：诊断各节点耗时、LLM token用量、ES/Redis耗时、检索缓存命中、队列积压与任务结果
+
+prometheus_client 为可选依赖（pip install prometheus-client），未安装或 METRICS_ENABLED=false 时所有指标为空操作。
+所有标签取值来自固定集合（节点名、任务名、队列名、配置的模型名、操作名），不使用会话ID、用户输入等无界取值。
+
+- API进程: GET /metrics
+- Worker: 主进程在 WORKER_METRICS_PORT 上启动独立的HTTP端口；prefork子进程的指标通过
+  PROMETHEUS_MULTIPROC_DIR 汇总（run_celery_worker.py 为每个队列的Worker自动设置）
+"""
+import os
+import time
+import logging
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Optional
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+ENABLED = prometheus_client is not None and get_settings().metrics_enabled
+
+# 诊断节点通常在百毫秒到数十秒之间（LLM生成），ES/Redis操作在毫秒级
+NODE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+IO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+
+class _NoopMetric:
+    """prometheus_client 不可用时的占位指标"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+
+def _metric(kind: str, name: str, documentation: str, labelnames=(), **kwargs):
+    if not ENABLED:
+        return _NoopMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+
+
+NODE_DURATION = _metric(
+    "Histogram", "diagnosis_node_duration_seconds", "诊断工作流各节点的耗时", ["node"], buckets=NODE_BUCKETS
+)
+LLM_TOKENS = _metric("Counter", "llm_tokens_total", "LLM消耗的token数", ["model", "kind"])
+LLM_DURATION = _metric(
+    "Histogram", "llm_request_duration_seconds", "单次LLM调用的耗时", ["model"], buckets=NODE_BUCKETS
+)
+ES_DURATION = _metric(
+    "Histogram", "es_query_duration_seconds", "Elasticsearch查询耗时", ["operation"], buckets=IO_BUCKETS
+)
+REDIS_DURATION = _metric(
+    "Histogram", "redis_operation_duration_seconds", "会话等Redis操作的耗时", ["operation"], buckets=IO_BUCKETS
+)
+CACHE_REQUESTS = _metric("Counter", "retrieval_cache_requests_total", "检索结果缓存的查找次数", ["result"])
+TASKS = _metric("Counter", "diagnosis_tasks_total", "执行结束的任务数", ["task", "outcome"])
+TASK_DURATION = _metric(
+    "Histogram", "diagnosis_task_duration_seconds", "任务执行耗时", ["task"], buckets=NODE_BUCKETS
+)
+QUEUE_WAIT = _metric(
+    "Histogram", "task_queue_wait_seconds", "任务从提交到开始执行的排队时间", ["wait_class"], buckets=NODE_BUCKETS
+)
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """记录代码块的耗时（秒）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+def redis_timed(operation: str):
+    """方法装饰器：记录一次Redis操作（可能包含多条命令的pipeline）的耗时"""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(REDIS_DURATION, operation=operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_llm(llm, model: str):
+    """为聊天模型挂载统计token用量与调用耗时的回调（model 为配置的模型名，作为有界标签）"""
+    # 同一个模型实例被多个智能体共用时只挂载一次
+    if not ENABLED or any(getattr(handler, "is_metrics_handler", False) for handler in llm.callbacks or []):
+        return llm
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMMetricsHandler(BaseCallbackHandler):
+        is_metrics_handler = True
+
+        def __init__(self):
+            self._started: Dict[Any, float] = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._started[run_id] = time.perf_counter()
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._started[run_id] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            start = self._started.pop(run_id, None)
+            if start is not None:
+                LLM_DURATION.labels(model=model).observe(time.perf_counter() - start)
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    LLM_TOKENS.labels(model=model, kind="prompt").inc(usage.get("input_tokens", 0))
+                    LLM_TOKENS.labels(model=model, kind="completion").inc(usage.get("output_tokens", 0))
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._started.pop(run_id, None)
+
+    llm.callbacks = [*(llm.callbacks or []), LLMMetricsHandler()]
+    return llm
+
+
+class QueueDepthCollector:
+    """抓取时读取broker中各队列（含各优先级档位）的积压消息数"""
+
+    def __init__(self, broker_url: str, queues, transport_options: Dict[str, Any]):
+        import redis
+
+        self.broker_client = redis.Redis.from_url(broker_url, decode_responses=True)
+        self.queues = list(queues)
+        self.sep = transport_options.get("sep", ":")
+        self.steps = transport_options.get("priority_steps", [0])
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+
+        gauge = GaugeMetricFamily("celery_queue_depth", "broker中等待执行的任务数", labels=["queue"])
+        try:
+            pipe = self.broker_client.pipeline(transaction=False)
+            for queue in self.queues:
+                for step in self.steps:
+                    pipe.llen(f"{queue}{self.sep}{step}" if step else queue)
+            depths = pipe.execute()
+            for index, queue in enumerate(self.queues):
+                gauge.add_metric([queue], sum(depths[index * len(self.steps):(index + 1) * len(self.steps)]))
+        except Exception as e:
+            logger.warning(f"⚠️ 读取队列积压失败: {e}")
+        yield gauge
+
+
+# 抓取时实时计算的指标（多进程模式下也要注册到汇总用的registry）
+_collectors = []
+
+
+def register_queue_depth_collector():
+    """在API进程中注册队列积压指标（只需一个进程导出，避免重复）"""
+    if not ENABLED or _collectors:
+        return
+    from src.celery_app import celery_app
+
+    collector = QueueDepthCollector(
+        get_settings().celery_broker_url,
+        [queue.name for queue in celery_app.conf.task_queues],
+        celery_app.conf.broker_transport_options
+    )
+    _collectors.append(collector)
+    prometheus_client.REGISTRY.register(collector)
+
+
+def _registry():
+    """多进程模式（设置了 PROMETHEUS_MULTIPROC_DIR）下汇总所有进程写入的指标"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import CollectorRegistry, multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _collectors:
+            registry.register(collector)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def render_latest() -> Optional[tuple]:
+    """返回 (指标文本, Content-Type)；未启用时返回None"""
+    if not ENABLED:
+        return None
+    return prometheus_client.generate_latest(_registry()), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def start_worker_metrics_server(port: int) -> bool:
+    """在Worker主进程中启动指标HTTP端口（sidecar）"""
+    if not ENABLED or not port:
+        return False
+    prometheus_client.start_http_server(port, registry=_registry())
+    logger.info(f"📈 Worker指标端口: {port}")
+    return True
+
+
+def mark_process_dead(pid: int):
+    """prefork子进程退出时清理其多进程指标文件中的实时值"""
+    if ENABLED and os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,97 @@
+"""
+诊断节点事件：节点进入/退出时输出一条结构化日志（替代每个节点打印整份会话状态的调试输出）
+
+- 采样: 按会话ID哈希采样（NODE_EVENT_SAMPLE_RATE），同一会话的所有轮次要么都输出要么都不输出；
+  请求头 X-Debug-Trace 或 debug_mode=True 的智能体强制输出
+- 惰性: 每轮开始时决定一次是否输出，未选中的轮次在节点中只有一次字典读取；选中后也只在日志真正写出时才格式化
+- 脱敏与截断: 字段名包含 NODE_EVENT_REDACT 中任一关键字的值替换为 ***；字符串截断到 NODE_EVENT_MAX_CHARS，
+  列表只保留长度和最后 NODE_EVENT_MAX_ITEMS 项（messages 随对话增长，不会整段输出）
+"""
+import json
+import zlib
+import logging
+from functools import lru_cache
+from typing import Any, Dict
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+REDACTED = "***"
+# 嵌套结构超过该深度时只输出类型
+MAX_DEPTH = 4
+
+
+class _LazyEvent:
+    """日志记录真正被格式化时才生成事件JSON"""
+
+    __slots__ = ("hook", "node", "phase", "state")
+
+    def __init__(self, hook: "NodeEventHook", node: str, phase: str, state: Dict[str, Any]):
+        self.hook, self.node, self.phase, self.state = hook, node, phase, state
+
+    def __str__(self) -> str:
+        return json.dumps(self.hook.build_event(self.node, self.phase, self.state), ensure_ascii=False, default=str)
+
+
+class NodeEventHook:
+    def __init__(self, sample_rate: float = None, max_chars: int = None, max_items: int = None, redact=None):
+        settings = get_settings()
+        self.sample_rate = settings.node_event_sample_rate if sample_rate is None else sample_rate
+        self.max_chars = max_chars or settings.node_event_max_chars
+        self.max_items = max_items or settings.node_event_max_items
+        self.redact = tuple(key.lower() for key in (settings.node_event_redact if redact is None else redact))
+
+    def sampled(self, session_id: str) -> bool:
+        """会话是否被采样（按会话ID的哈希，跨进程、跨轮次结果一致）"""
+        if self.sample_rate <= 0:
+            return False
+        if self.sample_rate >= 1:
+            return True
+        return zlib.crc32(str(session_id).encode("utf-8")) / 0xFFFFFFFF < self.sample_rate
+
+    def _redacted(self, key: Any) -> bool:
+        name = str(key).lower()
+        return any(keyword in name for keyword in self.redact)
+
+    def summarize(self, value: Any, depth: int = 0) -> Any:
+        """脱敏、截断后的可JSON序列化摘要"""
+        if isinstance(value, (bool, int, float)) or value is None:
+            return value
+        if isinstance(value, str):
+            return value if len(value) <= self.max_chars else f"{value[:self.max_chars]}…(+{len(value) - self.max_chars})"
+        if depth >= MAX_DEPTH:
+            return f"<{type(value).__name__}>"
+        if isinstance(value, dict):
+            return {
+                key: REDACTED if self._redacted(key) else self.summarize(item, depth + 1)
+                for key, item in value.items()
+            }
+        if isinstance(value, (list, tuple)):
+            tail = [self.summarize(item, depth + 1) for item in value[-self.max_items:]] if self.max_items else []
+            return tail if len(value) <= self.max_items else {"len": len(value), "tail": tail}
+        content = getattr(value, "content", None)
+        if content is not None:
+            # langchain 消息对象
+            return {"type": getattr(value, "type", type(value).__name__), "content": self.summarize(content, depth + 1)}
+        return self.summarize(str(value), depth + 1)
+
+    def build_event(self, node: str, phase: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "event": "diagnosis_node",
+            "node": node,
+            "phase": phase,
+            "session_id": state.get("session_id"),
+            "state": self.summarize({key: value for key, value in state.items() if key != "trace_node_events"}),
+        }
+
+    def emit(self, node: str, phase: str, state: Dict[str, Any]):
+        """输出一条节点事件（调用方已确认本轮需要输出）"""
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("%s", _LazyEvent(self, node, phase, state))
+
+
+@lru_cache(maxsize=1)
+def get_node_event_hook() -> NodeEventHook:
+    """获取进程内共享的节点事件钩子"""
+    return NodeEventHook()
@@ -0,0 +1,333 @@
+"""
+按需性能剖析：空闲时没有任何开销（不常驻线程，不启用 cProfile / tracemalloc），只在请求时对当前进程剖析
+
+- CPU采样: 后台线程每隔 interval 读取一次所有线程的调用栈（sys._current_frames），持续N秒，导出 speedscope 文件
+- 单次诊断: cProfile（pstats 文件）+ 诊断线程的调用栈采样（speedscope）+ tracemalloc 快照对比，
+  以及各节点的内存分配（节点结束时的净增长与节点执行期间的峰值）
+- 结果保存在Redis（profile:{profile_id}，PROFILE_TTL 秒后过期），由API下载
+- prefork Worker的任务在子进程中执行：主进程收到远程控制命令后把采样请求推送到各子进程的请求列表
+  （profile:requests:{主机名/pid}），子进程中的监听线程阻塞在 BLPOP 上，空闲时不消耗CPU
+
+同一进程同时只运行一个CPU采样和一个诊断剖析；tracemalloc 统计整个进程，诊断剖析期间同进程的其他任务也会计入。
+"""
+import os
+import sys
+import json
+import time
+import base64
+import pstats
+import marshal
+import cProfile
+import socket
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set
+
+import redis
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PREFIX = "profile:"
+REQUEST_PREFIX = "profile:requests:"
+# 监听线程每次 BLPOP 的最长阻塞秒数（超时后重新等待，连接异常能及时暴露）
+REQUEST_WAIT_SECONDS = 30
+# 下载格式 -> (Redis中的字段, 文件扩展名, Content-Type)
+ARTIFACTS = {
+    "speedscope": ("speedscope", "speedscope.json", "application/json"),
+    "pstats": ("pstats", "pstats", "application/octet-stream"),
+    "tracemalloc": ("tracemalloc", "tracemalloc.json", "application/json"),
+}
+# tracemalloc 记录的调用栈深度、快照对比保留的条数
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 30
+
+_cpu_lock = threading.Lock()
+_diagnosis_lock = threading.Lock()
+
+
+def process_name() -> str:
+    """当前进程的标识（主机名/pid），记录在剖析结果中"""
+    return f"{socket.gethostname()}/{os.getpid()}"
+
+
+class ProfileStore:
+    """剖析结果: HASH profile:{id}，meta 为状态与摘要，其余字段为可下载的文件内容"""
+
+    def __init__(self):
+        settings = get_settings()
+        self.redis_client = redis.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db,
+            password=settings.redis_password,
+            decode_responses=True
+        )
+        self.ttl = settings.profile_ttl
+
+    def save(self, profile_id: str, meta: Dict[str, Any], artifacts: Dict[str, str] = None):
+        key = f"{PROFILE_PREFIX}{profile_id}"
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.hset(key, mapping={"meta": json.dumps(meta, ensure_ascii=False, default=str), **(artifacts or {})})
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def push_request(self, process: str, request: Dict[str, Any]):
+        """把CPU采样请求交给指定进程（见 start_request_listener）"""
+        key = f"{REQUEST_PREFIX}{process}"
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.rpush(key, json.dumps(request))
+        # 进程已退出时请求随键过期
+        pipe.expire(key, 60)
+        pipe.execute()
+
+    def get_meta(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        meta = self.redis_client.hget(f"{PROFILE_PREFIX}{profile_id}", "meta")
+        return json.loads(meta) if meta else None
+
+    def get_artifact(self, profile_id: str, fmt: str) -> Optional[bytes]:
+        data = self.redis_client.hget(f"{PROFILE_PREFIX}{profile_id}", ARTIFACTS[fmt][0])
+        if data is None:
+            return None
+        return base64.b64decode(data) if fmt == "pstats" else data.encode("utf-8")
+
+
+@lru_cache(maxsize=1)
+def get_profile_store() -> ProfileStore:
+    """获取进程内共享的剖析结果存储"""
+    return ProfileStore()
+
+
+class StackSampler:
+    """定时采样线程调用栈，按线程汇总为 speedscope 的 sampled 类型profile"""
+
+    def __init__(self, interval: float, thread_ids: Optional[Set[int]] = None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self._frames: List[Dict[str, Any]] = []
+        self._frame_index: Dict[tuple, int] = {}
+        # 线程ID -> (样本调用栈列表, 各样本权重ms)
+        self._samples: Dict[int, tuple] = {}
+        # 线程ID -> 线程名（首次采到时记录，导出时线程可能已经结束）
+        self._thread_names: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = 0.0
+
+    def _frame_id(self, frame) -> int:
+        code = frame.f_code
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self._frames)
+            self._frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return index
+
+    def sample(self, weight_ms: float):
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame))
+                frame = frame.f_back
+            stack.reverse()
+            if thread_id not in self._samples:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                self._thread_names[thread_id] = names.get(thread_id, "thread")
+            samples, weights = self._samples.setdefault(thread_id, ([], []))
+            samples.append(stack)
+            weights.append(weight_ms)
+
+    def _run(self, deadline: float):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval) and time.perf_counter() < deadline:
+            now = time.perf_counter()
+            self.sample(round((now - last) * 1000, 3))
+            last = now
+
+    def run_for(self, seconds: float):
+        """在当前线程中采样 seconds 秒"""
+        self.started_at = time.time()
+        self._run(time.perf_counter() + seconds)
+
+    def start(self):
+        """在后台线程中采样，直到 stop()"""
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, args=(float("inf"),), name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        profiles = []
+        for thread_id, (samples, weights) in self._samples.items():
+            profiles.append({
+                "type": "sampled",
+                "name": f"{self._thread_names[thread_id]} ({thread_id})",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 3),
+                "samples": samples,
+                "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "ops-diagnosis-assistant",
+            "shared": {"frames": self._frames},
+            "profiles": profiles,
+        }
+
+
+def start_cpu_profile(profile_id: str, seconds: float, interval_ms: float, target: str) -> bool:
+    """在当前进程中开始CPU采样（后台线程，结束后写入Redis）；已有采样在运行时返回False"""
+    if not _cpu_lock.acquire(blocking=False):
+        return False
+    meta = {"kind": "cpu", "status": "running", "target": target, "seconds": seconds,
+            "interval_ms": interval_ms, "started_at": time.time()}
+    try:
+        get_profile_store().save(profile_id, meta)
+    except Exception:
+        _cpu_lock.release()
+        raise
+
+    def run():
+        sampler = StackSampler(interval_ms / 1000)
+        try:
+            sampler.run_for(seconds)
+            document = sampler.speedscope(f"{target} cpu {seconds}s")
+            meta.update(status="ready", finished_at=time.time(), threads=len(document["profiles"]),
+                        samples=sum(len(profile["samples"]) for profile in document["profiles"]))
+            get_profile_store().save(profile_id, meta, {"speedscope": json.dumps(document)})
+            logger.info(f"🔬 CPU采样完成: {profile_id} ({meta['samples']} 个样本)")
+        except Exception as e:
+            logger.error(f"❌ CPU采样失败 {profile_id}: {e}")
+            meta.update(status="failed", error=str(e))
+            get_profile_store().save(profile_id, meta)
+        finally:
+            _cpu_lock.release()
+
+    threading.Thread(target=run, name=f"cpu-profile-{profile_id}", daemon=True).start()
+    return True
+
+
+def _listen_for_requests(process: str):
+    store = get_profile_store()
+    while True:
+        try:
+            item = store.redis_client.blpop([f"{REQUEST_PREFIX}{process}"], timeout=REQUEST_WAIT_SECONDS)
+            if item is None:
+                continue
+            request = json.loads(item[1])
+            if not start_cpu_profile(request["profile_id"], request["seconds"], request["interval_ms"], process):
+                logger.warning(f"⚠️ 本进程已有CPU采样在运行，忽略 {request['profile_id']}")
+        except Exception as e:
+            logger.warning(f"⚠️ 剖析请求监听失败: {e}")
+            time.sleep(5)
+
+
+def start_request_listener() -> Optional[str]:
+    """在当前进程启动剖析请求监听线程（prefork Worker子进程启动时调用）；PROFILING_ENABLED=false 时不启动"""
+    if not get_settings().profiling_enabled:
+        return None
+    process = process_name()
+    threading.Thread(target=_listen_for_requests, args=(process,), name="profile-requests", daemon=True).start()
+    return process
+
+
+class DiagnosisProfiler:
+    """剖析单次诊断：on_node 在每个节点结束时调用，统计该节点的内存分配"""
+
+    def __init__(self, profile_id: str, target: str):
+        self.profile_id = profile_id
+        self.target = target
+        self.nodes: Dict[str, Dict[str, int]] = {}
+        self._owns_tracemalloc = False
+        self._profiler = cProfile.Profile()
+        self._sampler = StackSampler(get_settings().profile_interval_ms / 1000, {threading.get_ident()})
+
+    def __enter__(self):
+        self.started_at = time.time()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._owns_tracemalloc = True
+        self._before = tracemalloc.take_snapshot()
+        self._last_current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self._sampler.start()
+        self._profiler.enable()
+        return self
+
+    def on_node(self, node_name: str):
+        current, peak = tracemalloc.get_traced_memory()
+        stats = self.nodes.setdefault(node_name, {"net_bytes": 0, "peak_bytes": 0, "calls": 0})
+        stats["net_bytes"] += current - self._last_current
+        stats["peak_bytes"] = max(stats["peak_bytes"], peak - self._last_current)
+        stats["calls"] += 1
+        self._last_current = current
+        tracemalloc.reset_peak()
+
+    def __exit__(self, exc_type, exc, tb):
+        self._profiler.disable()
+        self._sampler.stop()
+        try:
+            after = tracemalloc.take_snapshot()
+            top = [
+                {"location": str(stat.traceback[0]), "size_diff": stat.size_diff, "count_diff": stat.count_diff,
+                 "size": stat.size}
+                for stat in after.compare_to(self._before, "lineno")[:TOP_ALLOCATIONS]
+            ]
+            stats = pstats.Stats(self._profiler)
+            meta = {
+                "kind": "diagnosis", "status": "failed" if exc else "ready", "target": self.target,
+                "started_at": self.started_at, "finished_at": time.time(), "nodes": self.nodes,
+                "top_allocations": top[:10], "error": str(exc) if exc else None,
+            }
+            get_profile_store().save(self.profile_id, meta, {
+                "pstats": base64.b64encode(marshal.dumps(stats.stats)).decode("ascii"),
+                "speedscope": json.dumps(self._sampler.speedscope(f"diagnosis {self.profile_id}")),
+                "tracemalloc": json.dumps({"nodes": self.nodes, "top_allocations": top}, ensure_ascii=False),
+            })
+            logger.info(f"🔬 诊断剖析完成: {self.profile_id}")
+        except Exception as e:
+            logger.error(f"❌ 诊断剖析结果保存失败 {self.profile_id}: {e}")
+        finally:
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+        return False
+
+
+class _NoopProfiler:
+    """未请求剖析时的占位"""
+
+    def on_node(self, node_name: str):
+        pass
+
+
+@contextmanager
+def profile_diagnosis(profile_id: str, enabled: bool, target: str = None):
+    """enabled 时剖析块内的诊断（同进程已有诊断在剖析时跳过）"""
+    if not enabled:
+        yield _NoopProfiler()
+        return
+    target = target or process_name()
+    if not _diagnosis_lock.acquire(blocking=False):
+        logger.warning(f"⚠️ 本进程已有诊断在剖析，跳过 {profile_id}")
+        get_profile_store().save(profile_id, {"kind": "diagnosis", "status": "skipped", "target": target,
+                                              "error": "同一进程中已有诊断在剖析"})
+        yield _NoopProfiler()
+        return
+    try:
+        with DiagnosisProfiler(profile_id, target) as profiler:
+            yield profiler
+    finally:
+        _diagnosis_lock.release()
@@ -0,0 +1,81 @@
+"""
+任务排队耗时统计：记录任务从提交到开始执行的等待时间，按类别（诊断严重级别/队列名）计算分位数
+"""
+import math
+import logging
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+import redis
+
+from src.config import get_settings
+from src.core import metrics
+
+logger = logging.getLogger(__name__)
+
+QUEUE_WAIT_PREFIX = "queue_wait:"
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """最近秩法计算分位数（sorted_values 需已排序且非空）"""
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+class QueueWaitStats:
+    """每个类别在Redis列表中保留最近 N 个排队耗时样本（毫秒）"""
+
+    def __init__(self, max_samples: int = None):
+        settings = get_settings()
+        self.redis_client = redis.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db,
+            password=settings.redis_password,
+            decode_responses=True
+        )
+        self.max_samples = max_samples or settings.queue_wait_max_samples
+
+    def record(self, wait_class: str, wait_ms: float):
+        """记录一个样本（统计失败不影响任务执行）"""
+        key = f"{QUEUE_WAIT_PREFIX}{wait_class}"
+        metrics.QUEUE_WAIT.labels(wait_class=wait_class).observe(wait_ms / 1000)
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.lpush(key, round(wait_ms, 1))
+            pipe.ltrim(key, 0, self.max_samples - 1)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ 排队耗时记录失败 {wait_class}: {e}")
+
+    def get_stats(self, wait_classes: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """返回各类别的样本数与 p50/p95/p99/max（毫秒）"""
+        if wait_classes is None:
+            wait_classes = sorted(
+                key[len(QUEUE_WAIT_PREFIX):]
+                for key in self.redis_client.scan_iter(match=f"{QUEUE_WAIT_PREFIX}*")
+            )
+        pipe = self.redis_client.pipeline(transaction=False)
+        for wait_class in wait_classes:
+            pipe.lrange(f"{QUEUE_WAIT_PREFIX}{wait_class}", 0, -1)
+
+        stats = {}
+        for wait_class, samples in zip(wait_classes, pipe.execute()):
+            values = sorted(float(v) for v in samples)
+            if not values:
+                stats[wait_class] = {"count": 0}
+                continue
+            stats[wait_class] = {
+                "count": len(values),
+                "p50_ms": _percentile(values, 50),
+                "p95_ms": _percentile(values, 95),
+                "p99_ms": _percentile(values, 99),
+                "max_ms": values[-1],
+            }
+        return stats
+
+
+@lru_cache(maxsize=1)
+def get_queue_wait_stats() -> QueueWaitStats:
+    """获取进程内共享的排队耗时统计器"""
+    return QueueWaitStats()
@@ -1,13 +1,10 @@
-import os
+import logging
 from typing import Annotated, TypedDict
-from dotenv import load_dotenv
-from langchain_ollama import ChatOllama
-from langgraph.graph import StateGraph, START, END
-from langchain_core.messages import HumanMessage, AIMessage
 
+from src.config import get_settings
 from .knowledge_retriever import KnowledgeRetriever
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 # 定义增强的状态结构
 class DiagnosisState(TypedDict):
@@ -19,22 +16,29 @@ class DiagnosisState(TypedDict):
     response: str
 
 class RAGDiagnosisAgent:
-    def __init__(self):
-        # 初始化模型
-        self.llm = ChatOllama(
-            model=os.getenv("OLLAMA_MODEL", "llama3.1:8b"),
-            base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
-            temperature=0.1
-        )
+    def __init__(self, llm=None, retriever=None):
+        # 初始化模型（可注入其他ChatModel，例如基准测试中的桩模型）
+        if llm is None:
+            from langchain_ollama import ChatOllama
+
+            settings = get_settings()
+            llm = ChatOllama(
+                model=settings.ollama_model,
+                base_url=settings.ollama_base_url,
+                temperature=0.1
+            )
+        self.llm = llm
         
         # 初始化知识检索器
-        self.retriever = KnowledgeRetriever()
+        self.retriever = retriever if retriever is not None else KnowledgeRetriever()
         
         # 构建工作流
         self.graph = self._build_graph()
     
     def _build_graph(self):
         """构建RAG增强的工作流图"""
+        from langgraph.graph import StateGraph, START, END
+
         workflow = StateGraph(DiagnosisState)
         
         # 添加节点
@@ -72,13 +76,13 @@ class RAGDiagnosisAgent:
         """知识检索节点"""
         user_input = state.get("user_input", "")
         
-        print(f"🔍 正在从知识库检索相关信息: {user_input}")
+        logger.info(f"🔍 正在从知识库检索相关信息: {user_input}")
         
         # 从Elasticsearch检索相关知识
         retrieved_knowledge = self.retriever.get_related_knowledge(user_input)
         state["retrieved_knowledge"] = retrieved_knowledge
         
-        print(f"📚 检索到 {retrieved_knowledge.count('案例')} 个相关案例")
+        logger.info(f"📚 检索到 {retrieved_knowledge.count('案例')} 个相关案例")
         
         # 如果有高度相关的知识，可以直接提供解决方案
         if "没有找到相关的故障案例" not in retrieved_knowledge:
@@ -90,10 +94,12 @@ class RAGDiagnosisAgent:
     
     def _analyze_problem_node(self, state: DiagnosisState) -> DiagnosisState:
         """问题分析节点 - 使用检索到的知识进行分析"""
+        from langchain_core.messages import HumanMessage
+
         user_input = state.get("user_input", "")
         retrieved_knowledge = state.get("retrieved_knowledge", "")
         
-        print(f"🤔 正在结合知识库分析问题...")
+        logger.info(f"🤔 正在结合知识库分析问题...")
         
         # 使用LLM结合检索到的知识分析问题
         prompt = f"""
@@ -129,21 +135,23 @@ class RAGDiagnosisAgent:
             else:
                 state["problem_type"] = "unknown"
             
-            print(f"✅ 问题分析完成: {state['problem_type']}")
+            logger.info(f"✅ 问题分析完成: {state['problem_type']}")
             
         except Exception as e:
-            print(f"❌ 问题分析失败: {e}")
+            logger.error(f"❌ 问题分析失败: {e}")
             state["problem_type"] = "unknown"
         
         return state
     
     def _provide_solution_node(self, state: DiagnosisState) -> DiagnosisState:
         """解决方案提供节点 - 基于检索的知识生成解决方案"""
+        from langchain_core.messages import HumanMessage
+
         user_input = state.get("user_input", "")
         retrieved_knowledge = state.get("retrieved_knowledge", "")
         problem_type = state.get("problem_type", "unknown")
         
-        print(f"💡 正在基于知识库生成解决方案...")
+        logger.info(f"💡 正在基于知识库生成解决方案...")
         
         # 使用LLM结合检索到的知识生成解决方案
         prompt = f"""
@@ -173,9 +181,9 @@ class RAGDiagnosisAgent:
         try:
             response = self.llm.invoke([HumanMessage(content=prompt)])
             state["response"] = response.content
-            print("✅ 解决方案生成完成")
+            logger.info("✅ 解决方案生成完成")
         except Exception as e:
-            print(f"❌ 解决方案生成失败: {e}")
+            logger.error(f"❌ 解决方案生成失败: {e}")
             state["response"] = "抱歉，生成解决方案时出现错误。"
         
         return state
@@ -195,7 +203,9 @@ class RAGDiagnosisAgent:
     
     def diagnose(self, user_input: str) -> str:
         """执行诊断"""
-        print(f"🎯 开始RAG增强诊断: {user_input}")
+        from langchain_core.messages import HumanMessage
+
+        logger.info(f"🎯 开始RAG增强诊断: {user_input}")
         
         # 初始化状态
         initial_state = DiagnosisState(
@@ -210,13 +220,13 @@ class RAGDiagnosisAgent:
         # 执行图
         result = self.graph.invoke(initial_state)
         
-        print("✅ RAG诊断完成")
+        logger.info("✅ RAG诊断完成")
         return result.get("response", "抱歉，无法提供诊断建议。")
 
 # 测试函数
 def test_rag_agent():
     """测试RAG增强智能体"""
-    print("🤖 测试RAG增强诊断智能体...")
+    logger.info("🤖 测试RAG增强诊断智能体...")
     
     agent = RAGDiagnosisAgent()
     
@@ -230,16 +240,15 @@ def test_rag_agent():
     ]
     
     for i, test_case in enumerate(test_cases, 1):
-        print(f"\n{'='*60}")
-        print(f"测试用例 {i}: {test_case}")
-        print(f"{'='*60}")
+        logger.info(f"测试用例 {i}: {test_case}")
         try:
             response = agent.diagnose(test_case)
-            print(f"💬 助手回复:\n{response}")
+            logger.info(f"💬 助手回复:\n{response}")
         except Exception as e:
-            print(f"❌ 测试失败: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"❌ 测试失败: {e}")
 
 if __name__ == "__main__":
+    from src.core.logging_config import setup_logging
+
+    setup_logging()
     test_rag_agent()
\ No newline at end of file
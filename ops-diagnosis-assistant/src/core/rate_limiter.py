@@ -0,0 +1,153 @@
+"""
+按API密钥限流：令牌桶限制请求速率，每日配额限制LLM token用量，
+判断与扣减在一个Redis Lua脚本中原子完成（多个API副本共享同一份计数）
+"""
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Any
+
+import redis
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1]: 令牌桶 HASH(tokens, ts)    KEYS[2]: 当日LLM token用量
+# ARGV: 每秒补充的令牌数, 桶容量, 本次消耗的令牌数, 当日token配额(0不限), 本次预占的token数, 用量key的过期秒数
+# 返回 {是否通过, 桶内剩余令牌 / 需等待秒数(字符串), 当日已用token}；被拒绝时不扣减任何计数
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local quota = tonumber(ARGV[4])
+local reserve = tonumber(ARGV[5])
+
+local used = tonumber(redis.call('GET', KEYS[2]) or '0')
+if quota > 0 and used + reserve > quota then
+    return {0, '-1', used}
+end
+
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local tokens = burst
+if rate > 0 then
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    if tokens < cost then
+        return {0, tostring((cost - tokens) / rate), used}
+    end
+    tokens = tokens - cost
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+end
+
+if reserve > 0 then
+    used = redis.call('INCRBY', KEYS[2], reserve)
+    redis.call('EXPIRE', KEYS[2], tonumber(ARGV[6]))
+end
+return {1, tostring(tokens), used}
+"""
+
+# 用量key保留两天，跨越UTC零点时前一天的用量仍可查询
+QUOTA_KEY_TTL = 2 * 86400
+
+
+def _seconds_until_utc_midnight() -> float:
+    now = datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (tomorrow - now).total_seconds()
+
+
+class RateLimiter:
+    """令牌桶 + 每日LLM token配额（配额按UTC自然日计算）"""
+
+    def __init__(self):
+        settings = get_settings()
+        self.redis_client = redis.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db,
+            password=settings.redis_password,
+            decode_responses=True
+        )
+        self.bucket_prefix = "ratelimit:"
+        self.quota_prefix = "token_quota:"
+        # register_script 使用 EVALSHA，脚本只在首次调用（或Redis重启后）传输一次
+        self._script = self.redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def _quota_key(self, client_name: str) -> str:
+        return f"{self.quota_prefix}{client_name}:{datetime.now(timezone.utc):%Y%m%d}"
+
+    def acquire(self, client: Dict[str, Any], cost: int = 1, reserve_tokens: int = 0) -> Dict[str, Any]:
+        """
+        检查并扣减一次请求的额度
+
+        Args:
+            client: 客户端配置（settings.api_clients 中的一项）
+            cost: 消耗的令牌数（批量诊断按问题数计）
+            reserve_tokens: 预占的LLM token数，诊断完成后由 settle_tokens 按实际用量结算
+
+        Returns:
+            {"allowed", "retry_after", "reason"}；Redis不可用时放行
+        """
+        rate = client["rate_per_minute"] / 60
+        burst = max(client["burst"], cost)
+        quota = client["daily_token_quota"]
+        try:
+            allowed, value, used = self._script(
+                keys=[f"{self.bucket_prefix}{client['name']}", self._quota_key(client["name"])],
+                args=[rate, burst, cost, quota, reserve_tokens, QUOTA_KEY_TTL]
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ 限流检查失败，放行请求: {e}")
+            return {"allowed": True, "retry_after": 0.0, "reason": None}
+
+        if allowed:
+            return {"allowed": True, "retry_after": 0.0, "reason": None}
+        if value == "-1":
+            return {"allowed": False, "retry_after": _seconds_until_utc_midnight(), "reason": "daily_token_quota"}
+        return {"allowed": False, "retry_after": float(value), "reason": "rate_limit"}
+
+    def charge_tokens(self, client_name: str, tokens: int):
+        """直接计入客户端当日的token用量（不做配额检查，统计失败不影响调用方）"""
+        if not tokens:
+            return
+        try:
+            key = self._quota_key(client_name)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.incrby(key, tokens)
+            pipe.expire(key, QUOTA_KEY_TTL)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ token用量记录失败 {client_name}: {e}")
+
+    def settle_tokens(self, client_name: str, actual_tokens: int, reserved_tokens: int):
+        """诊断完成后按实际LLM用量修正预占的token数"""
+        self.charge_tokens(client_name, actual_tokens - reserved_tokens)
+
+    def get_usage(self, client: Dict[str, Any]) -> Dict[str, Any]:
+        """客户端当前的令牌桶余量与当日token用量"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hmget(f"{self.bucket_prefix}{client['name']}", "tokens", "ts")
+        pipe.get(self._quota_key(client["name"]))
+        (tokens, ts), used = pipe.execute()
+        if tokens is not None and client["rate_per_minute"] > 0:
+            tokens = min(client["burst"], float(tokens) + max(0.0, time.time() - float(ts)) * client["rate_per_minute"] / 60)
+        return {
+            "client": client["name"],
+            "rate_per_minute": client["rate_per_minute"],
+            "burst": client["burst"],
+            "available_requests": round(float(tokens), 2) if tokens is not None else client["burst"],
+            "daily_token_quota": client["daily_token_quota"],
+            "tokens_used_today": int(used or 0),
+        }
+
+
+@lru_cache(maxsize=1)
+def get_rate_limiter() -> RateLimiter:
+    """获取进程内共享的限流器"""
+    return RateLimiter()
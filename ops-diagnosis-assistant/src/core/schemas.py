@@ -0,0 +1,20 @@
+"""
+高级诊断智能体的结构化输出模型
+
+单独成模块，由智能体在初始化时按需导入，避免导入 core 包时就加载 pydantic。
+"""
+from typing import List
+from pydantic import BaseModel, Field
+
+
+class SymptomAnalysis(BaseModel):
+    symptoms: List[str] = Field(description="主要症状（如CPU高、内存不足、磁盘满等）")
+    error_messages: List[str] = Field(description="错误信息或日志内容")
+    time_pattern: str = Field(description="问题发生的时间和频率")
+    impact_scope: str = Field(description="影响的范围")
+    problem_type: str = Field(description="推测的问题类型")
+
+class AnalyzeRootCauseNode(BaseModel):
+    affected_components: List[str] = Field(description="受影响组件")
+    verification_steps: List[str] = Field(description="验证步骤")
+    root_cause: str = Field(description="根本原因分析")
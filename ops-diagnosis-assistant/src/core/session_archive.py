@@ -0,0 +1,68 @@
+import os
+import gzip
+import json
+import time
+import logging
+from functools import lru_cache
+from typing import List
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+class SessionArchive:
+    """会话冷存储：按天追加写入 gzip 压缩的 JSONL 文件"""
+
+    def __init__(self, archive_dir: str = None):
+        self.archive_dir = archive_dir or get_settings().session_archive_dir
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+    def _get_archive_path(self, timestamp: float) -> str:
+        day = time.strftime("%Y%m%d", time.localtime(timestamp))
+        return os.path.join(self.archive_dir, f"sessions-{day}.jsonl.gz")
+
+    def archive_session(self, session_id: str, serialized_data: str, reason: str, idle_seconds: float = None,
+                        turns: List[str] = None) -> bool:
+        """
+        归档单个会话
+
+        Args:
+            session_id: 会话ID
+            serialized_data: Redis中保存的会话JSON字符串
+            reason: 归档原因（idle / orphaned）
+            idle_seconds: 归档时的空闲时长
+            turns: Redis中保存的各轮诊断结果（JSON字符串，按版本号顺序）
+        """
+        now = time.time()
+        try:
+            record = {
+                "session_id": session_id,
+                "archived_at": now,
+                "reason": reason,
+                "idle_seconds": idle_seconds,
+                "data": json.loads(serialized_data),
+                "turns": [json.loads(turn) for turn in turns or []],
+            }
+            # 每次追加都是一个独立的gzip member，整个文件仍可顺序解压
+            with gzip.open(self._get_archive_path(now), "at", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            return True
+        except Exception as e:
+            logger.error(f"❌ 会话归档失败 {session_id}: {e}")
+            return False
+
+    def iter_archived_sessions(self, day: str):
+        """按天读取归档记录（day格式: YYYYMMDD）"""
+        path = os.path.join(self.archive_dir, f"sessions-{day}.jsonl.gz")
+        if not os.path.exists(path):
+            return
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+@lru_cache(maxsize=1)
+def get_session_archive() -> SessionArchive:
+    """获取进程内共享的会话归档器"""
+    return SessionArchive()
@@ -1,48 +1,77 @@
 import json
+import time
+import uuid
 import redis
-import os
-from typing import Optional, Dict, Any
-from dotenv import load_dotenv
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple
 import logging
 
-load_dotenv()
+from src.config import get_settings
+from src.core.metrics import redis_timed
+from src.core.tracing import traced
 
 logger = logging.getLogger(__name__)
 
+# 比较并删除：只释放自己持有的锁（KEYS[1] 锁，ARGV[1] 加锁时的令牌）
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 class RedisSessionManager:
     def __init__(self):
+        settings = get_settings()
         self.redis_client = redis.Redis(
-            host=os.getenv('REDIS_HOST', 'localhost'),
-            port=int(os.getenv('REDIS_PORT', 6379)),
-            db=int(os.getenv('REDIS_DB', 0)),
-            password=os.getenv('REDIS_PASSWORD', None),
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db,
+            password=settings.redis_password,
             decode_responses=True
         )
         self.session_prefix = "diagnosis_session:"
-        self.session_ttl = 3600  # 1小时过期
+        # 每轮诊断结果（LIST，版本号即列表中的序号，从1开始）
+        self.turns_prefix = "diagnosis_turns:"
+        self.session_ttl = settings.session_ttl  # 默认1小时过期
+        # 会话活动索引（ZSET: session_id -> 最近活动时间戳）
+        self.activity_key = "diagnosis_session_activity"
+        # 增量清理的SCAN游标与互斥锁
+        self.cleanup_cursor_key = "diagnosis_cleanup:cursor"
+        self.cleanup_lock_key = "diagnosis_cleanup:lock"
         self.redis_ping()
     
     def redis_ping(self):
         if self.redis_client.ping():
-            print(f"redis 连接成功")
+            logger.info("✅ redis 连接成功")
         else:
             raise ValueError("redis 连接失败")
 
     def _get_session_key(self, session_id: str) -> str:
         return f"{self.session_prefix}{session_id}"
 
+    def _get_turns_key(self, session_id: str) -> str:
+        return f"{self.turns_prefix}{session_id}"
+
+    @traced("session.save")
+    @redis_timed("session_save")
     def save_session(self, session_id: str, session_data: Dict[str, Any]) -> bool:
         """保存会话数据到Redis"""
         try:
             key = self._get_session_key(session_id)
             serialized_data = json.dumps(session_data, default=str)
-            self.redis_client.setex(key, self.session_ttl, serialized_data)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.setex(key, self.session_ttl, serialized_data)
+            pipe.zadd(self.activity_key, {session_id: time.time()})
+            pipe.execute()
             logger.info(f"✅ 会话保存成功: {session_id}")
             return True
         except Exception as e:
             logger.error(f"❌ 会话保存失败 {session_id}: {e}")
             return False
 
+    @traced("session.load")
+    @redis_timed("session_load")
     def load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """从Redis加载会话数据"""
         try:
@@ -50,8 +79,12 @@ class RedisSessionManager:
             data = self.redis_client.get(key)
             if data:
                 session_data = json.loads(data)
-                # 更新TTL
-                self.redis_client.expire(key, self.session_ttl)
+                # 更新TTL和活动时间
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.expire(key, self.session_ttl)
+                pipe.expire(self._get_turns_key(session_id), self.session_ttl)
+                pipe.zadd(self.activity_key, {session_id: time.time()})
+                pipe.execute()
                 logger.info(f"✅ 会话加载成功: {session_id}")
                 return session_data
             else:
@@ -66,12 +99,39 @@ class RedisSessionManager:
         try:
             key = self._get_session_key(session_id)
             result = self.redis_client.delete(key)
+            self.redis_client.delete(self._get_turns_key(session_id))
+            self.redis_client.zrem(self.activity_key, session_id)
             logger.info(f"🗑️ 会话删除: {session_id}, 结果: {result}")
             return result > 0
         except Exception as e:
             logger.error(f"❌ 会话删除失败 {session_id}: {e}")
             return False
 
+    @traced("session.append_turn")
+    @redis_timed("append_turn")
+    def append_turn(self, session_id: str, turn: Dict[str, Any]) -> int:
+        """追加一轮诊断结果（回复正文只在这里保存一份），返回该轮的版本号"""
+        key = self._get_turns_key(session_id)
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.rpush(key, json.dumps(turn, ensure_ascii=False, default=str))
+        pipe.expire(key, self.session_ttl)
+        version, _ = pipe.execute()
+        return version
+
+    @traced("session.get_turns")
+    @redis_timed("get_turns")
+    def get_turns(self, session_id: str, since: int = 0) -> Tuple[int, List[Dict[str, Any]]]:
+        """返回 (当前版本号, 版本号大于since的各轮结果)，只传输客户端尚未见过的部分"""
+        key = self._get_turns_key(session_id)
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.llen(key)
+        pipe.lrange(key, since, -1)
+        version, items = pipe.execute()
+        turns = []
+        for offset, item in enumerate(items, start=since + 1):
+            turns.append({"version": offset, **json.loads(item)})
+        return version, turns
+
     def session_exists(self, session_id: str) -> bool:
         """检查会话是否存在"""
         try:
@@ -82,17 +142,154 @@ class RedisSessionManager:
             return False
 
     def get_all_sessions(self) -> Dict[str, Dict[str, Any]]:
-        """获取所有会话（仅用于调试）"""
+        """获取所有会话（仅用于调试，只读不刷新TTL和活动时间）"""
         try:
             pattern = f"{self.session_prefix}*"
-            keys = self.redis_client.keys(pattern)
+            keys = list(self.redis_client.scan_iter(match=pattern, count=500))
             sessions = {}
-            for key in keys:
-                session_id = key.replace(self.session_prefix, "")
-                session_data = self.load_session(session_id)
-                if session_data:
-                    sessions[session_id] = session_data
+            for key, data in zip(keys, self.redis_client.mget(keys) if keys else []):
+                if data:
+                    sessions[key[len(self.session_prefix):]] = json.loads(data)
             return sessions
         except Exception as e:
             logger.error(f"❌ 获取所有会话失败: {e}")
-            return {}
\ No newline at end of file
+            return {}
+
+    def get_last_activity(self, session_ids) -> Dict[str, Optional[float]]:
+        """批量获取会话最近活动时间"""
+        session_ids = list(session_ids)
+        if not session_ids:
+            return {}
+        try:
+            scores = self.redis_client.zmscore(self.activity_key, session_ids)
+            return dict(zip(session_ids, scores))
+        except Exception as e:
+            logger.error(f"❌ 获取会话活动时间失败: {e}")
+            return {}
+
+    def cleanup_sessions(
+        self,
+        archive,
+        idle_timeout: float,
+        time_budget: float = 5.0,
+        scan_count: int = 200
+    ) -> Dict[str, Any]:
+        """
+        增量清理会话：归档废弃会话并修剪活动索引
+
+        使用 SCAN 分批遍历会话键，游标保存在Redis中，下次运行从断点继续；
+        单次运行超过 time_budget 秒即停止，避免长时间阻塞Redis或Worker。
+
+        Args:
+            archive: 冷存储归档器（需提供 archive_session 方法）
+            idle_timeout: 空闲超过该秒数的会话视为废弃
+            time_budget: 单次运行的时间预算（秒）
+            scan_count: 每次SCAN的建议批大小
+
+        Returns:
+            本次清理的统计信息
+        """
+        stats = {
+            "scanned": 0,
+            "archived": 0,
+            "archive_failed": 0,
+            "pruned_index": 0,
+            "cycle_completed": False,
+            "skipped": False,
+        }
+
+        # 防止上一轮还未结束时重复执行；锁的值为本次运行的令牌，超时后被他人取得的锁不会被误删
+        lock_ttl = max(int(time_budget * 2), 10)
+        lock_token = str(uuid.uuid4())
+        if not self.redis_client.set(self.cleanup_lock_key, lock_token, nx=True, ex=lock_ttl):
+            stats["skipped"] = True
+            return stats
+
+        start = time.monotonic()
+        try:
+            cursor = int(self.redis_client.get(self.cleanup_cursor_key) or 0)
+            while True:
+                cursor, keys = self.redis_client.scan(
+                    cursor=cursor,
+                    match=f"{self.session_prefix}*",
+                    count=scan_count
+                )
+                if keys:
+                    stats["scanned"] += len(keys)
+                    self._archive_idle_sessions(keys, archive, idle_timeout, stats)
+
+                if cursor == 0:
+                    stats["cycle_completed"] = True
+                    break
+                if time.monotonic() - start >= time_budget:
+                    break
+
+            self.redis_client.set(self.cleanup_cursor_key, cursor)
+
+            # 最近活动早于TTL的索引项对应的会话必然已被Redis过期删除
+            stats["pruned_index"] = self.redis_client.zremrangebyscore(
+                self.activity_key, 0, time.time() - self.session_ttl
+            )
+        finally:
+            self._release_cleanup_lock(lock_token)
+
+        stats["elapsed_ms"] = round((time.monotonic() - start) * 1000, 1)
+        return stats
+
+    def _release_cleanup_lock(self, lock_token: str) -> bool:
+        """释放清理锁（锁仍属于本次运行时才删除）"""
+        return bool(self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, self.cleanup_lock_key, lock_token))
+
+    def _archive_idle_sessions(self, keys, archive, idle_timeout: float, stats: Dict[str, Any]):
+        """检查一批会话键的空闲时长，归档并删除废弃会话"""
+        now = time.time()
+        session_ids = [key[len(self.session_prefix):] for key in keys]
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zmscore(self.activity_key, session_ids)
+        for key in keys:
+            pipe.ttl(key)
+        last_activities, *ttls = pipe.execute()
+
+        for key, session_id, last_activity, ttl in zip(keys, session_ids, last_activities, ttls):
+            if last_activity is not None:
+                idle_seconds = now - last_activity
+                reason = "idle"
+            elif ttl >= 0:
+                # 没有活动记录时，根据剩余TTL推算空闲时长
+                idle_seconds = self.session_ttl - ttl
+                reason = "idle"
+            else:
+                # 既没有活动记录也没有过期时间的遗留会话
+                idle_seconds = None
+                reason = "orphaned"
+
+            if idle_seconds is not None and idle_seconds < idle_timeout:
+                continue
+
+            # 在一个事务中读取并删除会话与各轮结果，归档与删除之间不会丢失并发写入
+            turns_key = self._get_turns_key(session_id)
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.get(key)
+            pipe.lrange(turns_key, 0, -1)
+            pipe.delete(key, turns_key)
+            data, turns, _ = pipe.execute()
+            if data is None:
+                continue
+            if archive.archive_session(session_id, data, reason=reason, idle_seconds=idle_seconds, turns=turns):
+                self.redis_client.zrem(self.activity_key, session_id)
+                stats["archived"] += 1
+            else:
+                # 归档失败时放回Redis，等待下一轮重试
+                pipe = self.redis_client.pipeline(transaction=True)
+                pipe.setex(key, self.session_ttl, data)
+                if turns:
+                    pipe.rpush(turns_key, *turns)
+                    pipe.expire(turns_key, self.session_ttl)
+                pipe.execute()
+                stats["archive_failed"] += 1
+
+@lru_cache(maxsize=1)
+def get_session_manager() -> RedisSessionManager:
+    """获取进程内共享的会话管理器（首次使用时才连接Redis）"""
+    return RedisSessionManager()
@@ -1,12 +1,9 @@
-import os
+import logging
 from typing import Annotated, TypedDict
-from dotenv import load_dotenv
-from langchain_ollama import ChatOllama
-from langgraph.graph import StateGraph, START, END
-from langchain_core.messages import HumanMessage, AIMessage
 
-# 加载环境变量
-load_dotenv()
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
 
 # 定义状态结构 - 使用新版TypedDict
 class DiagnosisState(TypedDict):
@@ -16,19 +13,26 @@ class DiagnosisState(TypedDict):
     response: str
 
 class SimpleDiagnosisAgent:
-    def __init__(self):
-        # 初始化模型
-        self.llm = ChatOllama(
-            model=os.getenv("OLLAMA_MODEL", "llama3.1:8b"),
-            base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
-            temperature=0.1  # 降低随机性，更适合诊断场景
-        )
+    def __init__(self, llm=None):
+        # 初始化模型（可注入其他ChatModel，例如基准测试中的桩模型）
+        if llm is None:
+            from langchain_ollama import ChatOllama
+
+            settings = get_settings()
+            llm = ChatOllama(
+                model=settings.ollama_model,
+                base_url=settings.ollama_base_url,
+                temperature=0.1  # 降低随机性，更适合诊断场景
+            )
+        self.llm = llm
         
         # 构建工作流
         self.graph = self._build_graph()
     
     def _build_graph(self):
         """构建工作流图 - 新版API"""
+        from langgraph.graph import StateGraph, START, END
+
         workflow = StateGraph(DiagnosisState)
         
         # 添加节点
@@ -58,7 +62,7 @@ class SimpleDiagnosisAgent:
         user_message = state["messages"][-1] if state["messages"] else None
         user_input = user_message.content if user_message else ""
         
-        print(f"🔍 正在识别问题: {user_input}")
+        logger.info(f"🔍 正在识别问题: {user_input}")
         
         # 扩展关键词识别
         cpu_keywords = ["cpu", "CPU", "cpu高", "cpu使用率", "负载高", "卡顿", "响应慢"]
@@ -92,9 +96,11 @@ class SimpleDiagnosisAgent:
     
     def _provide_solution_node(self, state: DiagnosisState) -> DiagnosisState:
         """解决方案提供节点"""
+        from langchain_core.messages import HumanMessage
+
         problem_type = state.get("problem_type", "unknown")
         
-        print(f"💡 正在为 {problem_type} 问题提供解决方案")
+        logger.info(f"💡 正在为 {problem_type} 问题提供解决方案")
         
         # 扩展解决方案模板
         solution_templates = {
@@ -158,7 +164,7 @@ class SimpleDiagnosisAgent:
             response = self.llm.invoke([HumanMessage(content=prompt)])
             state["response"] = response.content
         except Exception as e:
-            print(f"❌ LLM调用失败: {e}")
+            logger.error(f"❌ LLM调用失败: {e}")
             state["response"] = f"基于{problem_type}问题的建议：{template}"
         
         return state
@@ -169,7 +175,9 @@ class SimpleDiagnosisAgent:
     
     def diagnose(self, user_input: str) -> str:
         """执行诊断"""
-        print(f"🎯 开始诊断用户输入: {user_input}")
+        from langchain_core.messages import HumanMessage
+
+        logger.info(f"🎯 开始诊断用户输入: {user_input}")
         
         # 初始化状态 - 新版状态管理
         initial_state = DiagnosisState(
@@ -182,5 +190,5 @@ class SimpleDiagnosisAgent:
         # 执行图
         result = self.graph.invoke(initial_state)
         
-        print("✅ 诊断完成")
+        logger.info("✅ 诊断完成")
         return result.get("response", "抱歉，无法提供诊断建议。")
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""
+任务事件推送：Worker 通过 Redis pub/sub 发布任务进度/完成事件，API 进程订阅后推送给客户端
+
+频道: task_events:{task_id}
+事件: {"task_id", "type": started|progress|success|failure, "ts", ...}
+"""
+import json
+import time
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Dict, Any, Optional, Set
+
+import redis
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+TASK_CHANNEL_PREFIX = "task_events:"
+
+# 事件类型与Celery任务状态的对应关系
+EVENT_STATUS = {
+    "started": "STARTED",
+    "progress": "PROGRESS",
+    "success": "SUCCESS",
+    "failure": "FAILURE",
+}
+TERMINAL_EVENTS = {"success", "failure"}
+
+
+def get_task_channel(task_id: str) -> str:
+    return f"{TASK_CHANNEL_PREFIX}{task_id}"
+
+
+def _redis_kwargs() -> Dict[str, Any]:
+    settings = get_settings()
+    return {
+        "host": settings.redis_host,
+        "port": settings.redis_port,
+        "db": settings.redis_db,
+        "password": settings.redis_password,
+        "decode_responses": True,
+    }
+
+
+class TaskEventPublisher:
+    """Worker端：向任务专属频道发布事件（发布失败不影响任务本身）"""
+
+    def __init__(self):
+        self.redis_client = redis.Redis(**_redis_kwargs())
+
+    def publish(self, task_id: str, event_type: str, **payload) -> Optional[Dict[str, Any]]:
+        if not task_id:
+            return None
+        event = {"task_id": task_id, "type": event_type, "ts": time.time(), **payload}
+        try:
+            self.redis_client.publish(
+                get_task_channel(task_id),
+                json.dumps(event, ensure_ascii=False, default=str)
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ 任务事件发布失败 {task_id}: {e}")
+        return event
+
+
+@lru_cache(maxsize=1)
+def get_task_event_publisher() -> TaskEventPublisher:
+    """获取进程内共享的事件发布器"""
+    return TaskEventPublisher()
+
+
+class TaskSubscription:
+    """单个客户端对某个任务事件的订阅"""
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.last_progress: Optional[Dict[str, Any]] = None
+
+    async def next_event(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """等待下一条事件，超时返回None"""
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event.get("type") == "progress":
+            self.last_progress = event
+        return event
+
+    async def wait_for_terminal(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """等待任务完成/失败事件，超时返回None"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            event = await self.next_event(remaining)
+            if event is None or event.get("type") in TERMINAL_EVENTS:
+                return event
+
+
+class TaskEventHub:
+    """
+    API端：单个 pub/sub 连接模式订阅所有任务频道，再按 task_id 分发给等待中的订阅
+
+    无论有多少个长轮询/WebSocket客户端，每个API进程只占用一条Redis订阅连接。
+    嵌入式执行时任务在API进程内运行，事件直接通过 dispatch() 分发，不订阅Redis（listen_redis=False）。
+    """
+
+    def __init__(self, listen_redis: bool = True):
+        self.listen_redis = listen_redis
+        self._subscriptions: Dict[str, Set[TaskSubscription]] = {}
+        self._reader: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Event] = None
+
+    def _ensure_started(self):
+        if not self.listen_redis:
+            if self._ready is None:
+                self._ready = asyncio.Event()
+                self._ready.set()
+            return
+        if self._reader is None or self._reader.done():
+            self._ready = asyncio.Event()
+            self._reader = asyncio.get_running_loop().create_task(self._run())
+
+    def dispatch(self, event: Dict[str, Any]):
+        """把事件分发给该任务的所有订阅（需在事件循环线程中调用）"""
+        for subscription in list(self._subscriptions.get(event.get("task_id"), ())):
+            subscription.queue.put_nowait(event)
+
+    async def _run(self):
+        """持续读取事件并分发；连接断开时退避重连"""
+        import redis.asyncio as aioredis
+
+        backoff = 0.5
+        while True:
+            client = aioredis.Redis(**_redis_kwargs())
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(f"{TASK_CHANNEL_PREFIX}*")
+                self._ready.set()
+                backoff = 0.5
+                async for message in pubsub.listen():
+                    if message.get("type") != "pmessage":
+                        continue
+                    task_id = message["channel"][len(TASK_CHANNEL_PREFIX):]
+                    if task_id not in self._subscriptions:
+                        continue
+                    try:
+                        event = json.loads(message["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    self.dispatch({**event, "task_id": task_id})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._ready.clear()
+                logger.warning(f"⚠️ 任务事件订阅中断，{backoff:.1f}s后重连: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10)
+            finally:
+                try:
+                    await pubsub.aclose()
+                    await client.aclose()
+                except Exception:
+                    pass
+
+    async def subscribe(self, task_id: str, ready_timeout: float = 1.0) -> TaskSubscription:
+        """注册订阅；必须在读取任务当前状态之前调用，避免错过事件"""
+        self._ensure_started()
+        subscription = TaskSubscription(task_id)
+        self._subscriptions.setdefault(task_id, set()).add(subscription)
+        if not self._ready.is_set():
+            # 首次使用时等待订阅连接建立；Redis不可用时降级为超时后再读一次状态
+            try:
+                await asyncio.wait_for(self._ready.wait(), ready_timeout)
+            except asyncio.TimeoutError:
+                pass
+        return subscription
+
+    def unsubscribe(self, subscription: TaskSubscription):
+        subscriptions = self._subscriptions.get(subscription.task_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            self._subscriptions.pop(subscription.task_id, None)
+
+
+@lru_cache(maxsize=1)
+def get_task_event_hub() -> TaskEventHub:
+    """获取API进程内共享的事件分发中心"""
+    return TaskEventHub(listen_redis=get_settings().execution_backend == "celery")
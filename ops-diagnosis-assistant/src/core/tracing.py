@@ -0,0 +1,230 @@
+"""
+分布式追踪：API请求 -> broker排队 -> Celery任务 -> 诊断各节点 -> LLM / Elasticsearch / Redis 调用串成一条trace
+
+OpenTelemetry 为可选依赖（pip install opentelemetry-sdk opentelemetry-exporter-otlp-proto-http），
+未安装或 TRACING_ENABLED=false 时所有span为空操作，且不导入 opentelemetry（不影响冷启动耗时）。
+
+- 导出: TRACING_EXPORTER=otlp 发送到本地collector（TRACING_OTLP_ENDPOINT），=file 每行写入一个span的JSON（测试用）
+- 采样: 根span按 TRACING_SAMPLE_RATE 采样，下游（Worker、节点、LLM调用）跟随上游的采样决定
+- 传播: 提交任务时把 W3C traceparent 写入Celery消息头部，Worker开始执行时恢复为父上下文
+- 安装了 opentelemetry-instrumentation-redis 时，每条Redis命令额外生成一个span
+"""
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Optional
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+ENABLED = False
+if get_settings().tracing_enabled:
+    try:
+        from opentelemetry import context as otel_context, propagate, trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+        from opentelemetry.trace import Status, StatusCode
+        ENABLED = True
+    except ImportError:
+        logger.warning("⚠️ TRACING_ENABLED=true 但未安装 opentelemetry-sdk，追踪已关闭")
+
+# 当前进程的 (pid, TracerProvider, Tracer)；prefork子进程继承的是父进程的导出线程，按pid重新初始化
+_state: Dict[str, Any] = {"pid": None, "provider": None, "tracer": None}
+_init_lock = threading.Lock()
+
+
+def _build_exporter(settings):
+    if settings.tracing_exporter == "file":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter, SimpleSpanProcessor
+
+        os.makedirs(os.path.dirname(settings.tracing_file) or ".", exist_ok=True)
+        out = open(settings.tracing_file, "a", encoding="utf-8")
+        # 同步写入，测试读取文件时span已经落盘
+        return SimpleSpanProcessor(ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n"))
+
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    return BatchSpanProcessor(OTLPSpanExporter(endpoint=settings.tracing_otlp_endpoint))
+
+
+def _instrument_redis(provider):
+    try:
+        from opentelemetry.instrumentation.redis import RedisInstrumentor
+    except ImportError:
+        return
+    instrumentor = RedisInstrumentor()
+    if instrumentor.is_instrumented_by_opentelemetry:
+        instrumentor.uninstrument()
+    instrumentor.instrument(tracer_provider=provider)
+
+
+def init_tracing(service_name: str = None) -> bool:
+    """在当前进程初始化追踪（API启动、Worker进程启动时调用；未调用时首次产生span前按默认服务名初始化）"""
+    if not ENABLED:
+        return False
+    with _init_lock:
+        if _state["pid"] == os.getpid():
+            return True
+        settings = get_settings()
+        # 不设置全局provider：fork后的子进程需要用自己的导出线程重新初始化
+        provider = TracerProvider(
+            resource=Resource.create({"service.name": service_name or settings.tracing_service_name}),
+            sampler=ParentBased(TraceIdRatioBased(settings.tracing_sample_rate))
+        )
+        provider.add_span_processor(_build_exporter(settings))
+        _instrument_redis(provider)
+        _state.update(pid=os.getpid(), provider=provider, tracer=provider.get_tracer("ops-diagnosis-assistant"))
+        logger.info(f"🔭 分布式追踪已启用: {settings.tracing_exporter}, 采样率 {settings.tracing_sample_rate}")
+    return True
+
+
+def shutdown_tracing():
+    """导出剩余的span（Worker子进程退出时调用）"""
+    if ENABLED and _state["pid"] == os.getpid():
+        _state["provider"].shutdown()
+        _state["pid"] = None
+
+
+def _tracer():
+    if _state["pid"] != os.getpid():
+        init_tracing()
+    return _state["tracer"]
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """在当前上下文下创建子span（异常记录在span上后照常抛出）"""
+    if not ENABLED:
+        yield None
+        return
+    with _tracer().start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+def traced(name: str, **attributes):
+    """函数装饰器：每次调用生成一个span"""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def inject_headers() -> Dict[str, str]:
+    """当前trace上下文的传播头部（traceparent），写入Celery消息头部或HTTP请求头部"""
+    carrier: Dict[str, str] = {}
+    if ENABLED:
+        propagate.inject(carrier)
+    return carrier
+
+
+def start_server_span(name: str, headers, **attributes) -> Optional[tuple]:
+    """开始一个入口span（HTTP请求或执行任务）并设为当前上下文；headers 中有上游的traceparent时作为其子span"""
+    if not ENABLED:
+        return None
+    parent = propagate.extract(headers or {})
+    current = _tracer().start_span(name, context=parent, kind=trace.SpanKind.SERVER, attributes=attributes)
+    token = otel_context.attach(trace.set_span_in_context(current, parent))
+    return current, token
+
+
+def end_server_span(handle: Optional[tuple], error: BaseException = None, name: str = None, **attributes):
+    """结束 start_server_span 开始的span并恢复之前的上下文（name 非空时更新span名）"""
+    if handle is None:
+        return
+    current, token = handle
+    if name:
+        current.update_name(name)
+    for key, value in attributes.items():
+        if value is not None:
+            current.set_attribute(key, value)
+    if error is not None:
+        current.record_exception(error)
+        current.set_status(Status(StatusCode.ERROR, str(error)))
+    current.end()
+    otel_context.detach(token)
+
+
+def record_queue_wait(name: str, enqueued_at: Optional[float], **attributes):
+    """在当前任务span下补记一个从提交到开始执行的排队span（时间取自提交时写入的 enqueued_at）"""
+    if not ENABLED or enqueued_at is None:
+        return
+    _tracer().start_span(name, start_time=int(enqueued_at * 1e9), attributes=attributes).end()
+
+
+@contextmanager
+def task_span(task_name: str, task_id: str, headers: Dict[str, str], enqueued_at: float = None):
+    """执行一个任务：恢复提交时的trace上下文，记录排队时间，任务执行期间的span都是其子span"""
+    handle = start_server_span(f"task {task_name}", headers, **{"task.name": task_name, "task.id": task_id})
+    record_queue_wait("queue.wait", enqueued_at, **{"task.name": task_name})
+    try:
+        yield
+    except BaseException as e:
+        end_server_span(handle, error=e)
+        raise
+    end_server_span(handle)
+
+
+def instrument_llm(llm, model: str):
+    """为聊天模型挂载回调：每次LLM调用生成一个 llm.invoke span（父span为调用时所在的诊断节点）"""
+    if not ENABLED or any(getattr(handler, "is_tracing_handler", False) for handler in llm.callbacks or []):
+        return llm
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMTracingHandler(BaseCallbackHandler):
+        is_tracing_handler = True
+
+        def __init__(self):
+            self._spans: Dict[Any, Any] = {}
+
+        def _start(self, run_id):
+            self._spans[run_id] = _tracer().start_span("llm.invoke", attributes={"llm.model": model})
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._start(run_id)
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._start(run_id)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            current = self._spans.pop(run_id, None)
+            if current is None:
+                return
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    current.set_attribute("llm.input_tokens", usage.get("input_tokens", 0))
+                    current.set_attribute("llm.output_tokens", usage.get("output_tokens", 0))
+            current.end()
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            current = self._spans.pop(run_id, None)
+            if current is not None:
+                current.record_exception(error)
+                current.set_status(Status(StatusCode.ERROR, str(error)))
+                current.end()
+
+    llm.callbacks = [*(llm.callbacks or []), LLMTracingHandler()]
+    return llm
+
+
+def traced_node(node_name: str, func):
+    """包装LangGraph节点函数：节点内的LLM/ES/Redis调用都挂在 node.{节点名} span下"""
+    if not ENABLED:
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(f"node.{node_name}", **{"graph.node": node_name}):
+            return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,80 @@
+"""
+Worker就绪登记：每个执行任务的进程预热结束后在Redis中登记，存活期间由心跳续期，退出时注销
+
+键: worker_ready:{hostname}:{pid} -> {"queues", "pool", "slots", "status", "ready_at", "warmup_ms", "steps"}
+status 为 ready（预热成功）或 degraded（预热超时或有步骤失败，仍接收任务但不计入可用槽位）
+"""
+import os
+import json
+import time
+import socket
+import logging
+import threading
+from functools import lru_cache
+from typing import Dict, Any, List
+
+import redis
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+WORKER_READY_PREFIX = "worker_ready:"
+
+
+class WorkerRegistry:
+    def __init__(self):
+        settings = get_settings()
+        self.redis_client = redis.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db,
+            password=settings.redis_password,
+            decode_responses=True
+        )
+        self.ready_ttl = settings.worker_ready_ttl
+        self._heartbeat = None
+
+    def _get_process_key(self) -> str:
+        return f"{WORKER_READY_PREFIX}{socket.gethostname()}:{os.getpid()}"
+
+    def register(self, report: Dict[str, Any]):
+        """登记当前进程的预热结果（report["status"]），并启动心跳线程续期；可重复调用以更新状态"""
+        key = self._get_process_key()
+        self.redis_client.set(key, json.dumps({**report, "ready_at": time.time()}, ensure_ascii=False), ex=self.ready_ttl)
+        if self._heartbeat is None:
+            self._heartbeat = threading.Thread(target=self._run_heartbeat, args=(key,), daemon=True)
+            self._heartbeat.start()
+
+    def _run_heartbeat(self, key: str):
+        while True:
+            time.sleep(max(self.ready_ttl / 3, 1))
+            try:
+                self.redis_client.expire(key, self.ready_ttl)
+            except Exception as e:
+                logger.warning(f"⚠️ Worker就绪心跳失败: {e}")
+
+    def unregister(self):
+        try:
+            self.redis_client.delete(self._get_process_key())
+        except Exception as e:
+            logger.warning(f"⚠️ Worker注销失败: {e}")
+
+    def get_workers(self) -> List[Dict[str, Any]]:
+        """列出所有已登记的Worker进程（含降级的进程）"""
+        keys = list(self.redis_client.scan_iter(match=f"{WORKER_READY_PREFIX}*", count=200))
+        workers = []
+        for key, data in zip(keys, self.redis_client.mget(keys) if keys else []):
+            if data:
+                workers.append({"process": key[len(WORKER_READY_PREFIX):], **json.loads(data)})
+        return workers
+
+    def get_ready_workers(self) -> List[Dict[str, Any]]:
+        """列出预热成功的Worker进程（准入控制只统计它们的槽位）"""
+        return [worker for worker in self.get_workers() if worker.get("status", "ready") == "ready"]
+
+
+@lru_cache(maxsize=1)
+def get_worker_registry() -> WorkerRegistry:
+    """获取进程内共享的Worker就绪登记器"""
+    return WorkerRegistry()
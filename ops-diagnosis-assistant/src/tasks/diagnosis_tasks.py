@@ -1,131 +1,233 @@
-import os
 import time
-from celery import current_task
-from src.celery_app import celery_app
-from src.core.advanced_agent import AdvancedDiagnosisAgent
-from src.core.session_manager import RedisSessionManager
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Optional
+from src.celery_app import celery_app, SEVERITY_ROUTES, DEFAULT_SEVERITY
+from src.config import get_settings
+from src.core.session_manager import get_session_manager
+from src.core.session_archive import get_session_archive
+from src.core.task_events import get_task_event_publisher
+from src.core.admission import get_admission_controller
+from src.core import tracing
+from src.core.logging_config import log_context
+from src.core.profiling import profile_diagnosis
 import logging
 
 logger = logging.getLogger(__name__)
 
-# 初始化组件
-session_manager = RedisSessionManager()
-diagnosis_agent = AdvancedDiagnosisAgent(debug_mode=True)
+
+@lru_cache(maxsize=1)
+def get_diagnosis_agent():
+    """获取进程内共享的诊断智能体（首次执行任务时才加载LLM/ES等重量级依赖）"""
+    from src.core.advanced_agent import AdvancedDiagnosisAgent
+
+    return AdvancedDiagnosisAgent(debug_mode=False)
+
+
+@contextmanager
+def _metered(client: Optional[str], reserved_tokens: int):
+    """统计块内LLM调用的实际token用量，结束后修正提交时为客户端预占的每日配额"""
+    if not client:
+        yield
+        return
+    from langchain_core.callbacks import get_usage_metadata_callback
+    from src.core.rate_limiter import get_rate_limiter
+
+    with get_usage_metadata_callback() as usage_callback:
+        try:
+            yield
+        finally:
+            used = sum(usage.get("total_tokens", 0) for usage in usage_callback.usage_metadata.values())
+            get_rate_limiter().settle_tokens(client, used, reserved_tokens)
+
+
+def _save_turn(task_id: str, session_id: str, user_input: str, response: str, session_state: dict) -> dict:
+    """保存会话，回复正文只作为该会话的一轮结果保存一份；返回指向该轮结果的引用"""
+    session_manager = get_session_manager()
+    session_data = get_diagnosis_agent().serialize_state(session_state)
+    session_manager.save_session(session_id, session_data)
+    diagnosis_stage = session_data.get('diagnosis_stage', 'unknown')
+    version = session_manager.append_turn(session_id, {
+        'task_id': task_id,
+        'user_input': user_input,
+        'response': response,
+        'diagnosis_stage': diagnosis_stage,
+        'ts': time.time()
+    })
+    return {
+        'status': 'SUCCESS',
+        'session_id': session_id,
+        'version': version,
+        'diagnosis_stage': diagnosis_stage
+    }
+
+
+def run_diagnosis(task_id: str, user_input: str, session_id: str, publish, client: str = None, debug: bool = False,
+                  profile: bool = False) -> dict:
+    """
+    执行一轮诊断并保存会话（Celery任务与API嵌入式执行共用）
+
+    Args:
+        task_id: 任务ID
+        user_input: 用户输入
+        session_id: 会话ID
+        publish: 事件推送函数 publish(event_type, **payload)
+        client: 提交任务的API客户端名称（用于结算每日token配额）
+        debug: 输出本轮各节点的事件（请求头 X-Debug-Trace）
+        profile: 剖析本轮诊断，结果以任务ID保存（请求头 X-Profile）
+    """
+    # 本任务产生的日志（包括各节点中的日志）都带上任务ID与会话ID
+    with log_context(task_id=task_id, session_id=session_id), profile_diagnosis(task_id, profile) as profiler:
+        return _run_diagnosis(task_id, user_input, session_id, publish, client, debug, profiler)
+
+
+def _run_diagnosis(task_id: str, user_input: str, session_id: str, publish, client: str, debug: bool, profiler) -> dict:
+    logger.info(f"🎯 开始处理诊断任务: {session_id}")
+    session_manager = get_session_manager()
+    diagnosis_agent = get_diagnosis_agent()
+
+    node_ms = {}
+
+    def on_node(node_name: str, elapsed_ms: float, artifacts: dict):
+        # 每个节点完成后推送一条精简的进度事件（只走事件通道，不写结果后端）
+        node_ms[node_name] = node_ms.get(node_name, 0) + elapsed_ms
+        profiler.on_node(node_name)
+        publish("progress", node=node_name, elapsed_ms=elapsed_ms, session_id=session_id, **artifacts)
+
+    # 执行诊断：会话状态保存在Redis中，任何Worker进程/线程都可以继续同一个会话
+    current_session_id = session_id or "new_session"
+    stored_state = session_manager.load_session(current_session_id)
+    session_state = diagnosis_agent.deserialize_state(stored_state) if stored_state else None
+    with _metered(client, get_settings().diagnosis_token_estimate):
+        response, session_state = diagnosis_agent.diagnose(
+            user_input, current_session_id, session_state, on_node=on_node, debug=debug
+        )
+    # 各节点耗时用于准入控制估算排队任务的ETA
+    get_admission_controller().record_run(node_ms)
+
+    logger.debug("🎯 诊断结果: %s", response)
+
+    # 精简结果：只返回指向会话中该轮结果的引用，正文通过 /sessions/{session_id}/turns?since= 获取
+    result = _save_turn(task_id, current_session_id, user_input, response, session_state)
+    logger.info(f"✅ 诊断任务完成: {current_session_id} (版本 {result['version']})")
+    return result
+
+
+def run_batch_diagnosis(task_id: str, items: list, publish, client: str = None) -> dict:
+    """
+    批量诊断一组（已去重的）问题：先用一次 _msearch 取回全部知识，再逐条诊断，每条使用独立的新会话
+
+    Args:
+        task_id: 任务ID
+        items: [{"message": 问题, "session_id": 会话ID}, ...]
+        publish: 事件推送函数 publish(event_type, **payload)
+        client: 提交任务的API客户端名称（用于结算每日token配额）
+    """
+    logger.info(f"📦 开始批量诊断: {len(items)} 条")
+    diagnosis_agent = get_diagnosis_agent()
+    knowledge = diagnosis_agent.prefetch_knowledge([item['message'] for item in items])
+
+    results = []
+    with _metered(client, get_settings().diagnosis_token_estimate * len(items)):
+        for index, (item, cases) in enumerate(zip(items, knowledge)):
+            session_id = item['session_id']
+            node_ms = {}
+
+            def on_node(node_name: str, elapsed_ms: float, artifacts: dict):
+                node_ms[node_name] = node_ms.get(node_name, 0) + elapsed_ms
+                publish("progress", node=node_name, elapsed_ms=elapsed_ms, session_id=session_id, **artifacts)
+
+            try:
+                with log_context(task_id=task_id, session_id=session_id):
+                    response, session_state = diagnosis_agent.diagnose(
+                        item['message'], session_id, prefetched_cases=cases, on_node=on_node
+                    )
+                    get_admission_controller().record_run(node_ms)
+                    results.append(_save_turn(task_id, session_id, item['message'], response, session_state))
+            except Exception as e:
+                # 单条失败不影响同批次的其他问题
+                logger.error(f"❌ 批量诊断中的问题失败 {session_id}: {e}")
+                results.append({'status': 'FAILURE', 'session_id': session_id, 'error': str(e)})
+            publish("progress", node="batch", completed=index + 1, total=len(items))
+
+    logger.info(f"✅ 批量诊断完成: {len(items)} 条")
+    return {'status': 'SUCCESS', 'results': results}
+
 
 @celery_app.task(bind=True, name='diagnosis.process_diagnosis')
-def process_diagnosis_task(self, user_input: str, session_id: str = None):
-    """处理诊断任务的Celery任务"""
+def process_diagnosis_task(self, user_input: str, session_id: str = None, client: str = None, debug: bool = False,
+                           profile: bool = False):
+    """处理诊断任务的Celery任务（开始/完成/失败事件由 task_signals 推送）"""
+    task_id = self.request.id
+    publisher = get_task_event_publisher()
     try:
-        logger.info(f"🎯 开始处理诊断任务: {session_id}")
-        
-        # 更新任务状态
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': 1,
-                'total': 5,
-                'status': '正在初始化诊断会话...',
-                'session_id': session_id
-            }
-        )
-        
-        # 从Redis加载或创建会话
-        if session_id and session_manager.session_exists(session_id):
-            session_data = session_manager.load_session(session_id)
-        else:
-            session_data = None
-
-        # 更新任务状态 - 症状收集
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': 2,
-                'total': 5,
-                'status': '正在分析症状信息...',
-                'session_id': session_id
-            }
-        )
-        
-        # 执行诊断
-        response = diagnosis_agent.diagnose(user_input, session_id or "new_session")
-
-        logger.info(f"🎯 wx 诊断的结果response为 : {response}")
-        
-        # 更新任务状态 - 知识检索
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': 3,
-                'total': 5,
-                'status': '正在检索相关知识库...',
-                'session_id': session_id
-            }
+        return run_diagnosis(
+            task_id, user_input, session_id,
+            lambda event_type, **payload: publisher.publish(task_id, event_type, **payload),
+            client, debug, profile
         )
-        
-        # 获取当前会话状态并保存
-        current_session_id = session_id or list(diagnosis_agent.session_states.keys())[-1]
-        session_data = diagnosis_agent.session_states.get(current_session_id, {})
-        
-        # 更新任务状态 - 根因分析
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': 4,
-                'total': 5,
-                'status': '正在分析根本原因...',
-                'session_id': current_session_id
-            }
-        )
-        
-        # 保存会话到Redis
-        session_manager.save_session(current_session_id, session_data)
-        
-        # 更新任务状态 - 完成
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'current': 5,
-                'total': 5,
-                'status': '生成最终解决方案...',
-                'session_id': current_session_id
-            }
-        )
-        
-        logger.info(f"✅ 诊断任务完成: {current_session_id}")
-        
-        return {
-            'status': 'SUCCESS',
-            'result': {
-                'response': response,
-                'session_id': current_session_id,
-                'diagnosis_stage': session_data.get('diagnosis_stage', 'unknown')
-            },
-            'session_id': current_session_id
-        }
-        
     except Exception as e:
+        # 失败状态由Celery记录（手动写入FAILURE会破坏结果后端中的异常信息），并通过信号推送失败事件
         logger.error(f"❌ 诊断任务失败: {e}")
-        self.update_state(
-            state='FAILURE',
-            meta={
-                'current': 5,
-                'total': 5,
-                'status': f'任务失败: {str(e)}',
-                'session_id': session_id
-            }
-        )
         raise
 
+@celery_app.task(bind=True, name='diagnosis.process_batch')
+def process_batch_diagnosis_task(self, items: list, client: str = None):
+    """批量诊断的Celery任务（每个任务处理一个分片，分片之间由多个Worker并行执行）"""
+    task_id = self.request.id
+    publisher = get_task_event_publisher()
+    return run_batch_diagnosis(
+        task_id, items,
+        lambda event_type, **payload: publisher.publish(task_id, event_type, **payload),
+        client
+    )
+
+def _apply_with_severity(task, args: list, severity: str = None, task_id: str = None, kwargs: dict = None):
+    """按严重级别提交任务：P0进入专用priority队列，其余级别在llm队列内按broker优先级排序"""
+    severity = severity or DEFAULT_SEVERITY
+    route = SEVERITY_ROUTES[severity]
+    return task.apply_async(
+        args=args,
+        kwargs=kwargs,
+        task_id=task_id,
+        queue=route['queue'],
+        priority=route['priority'],
+        # 自定义头部在Worker端可通过 task.request 读取，用于统计各级别的排队耗时；traceparent 把Worker端的span接到提交请求的trace上
+        headers={'severity': severity, 'enqueued_at': time.time(), **tracing.inject_headers()}
+    )
+
+def submit_diagnosis(user_input: str, session_id: str, severity: str = None, task_id: str = None, client: str = None,
+                     debug: bool = False, profile: bool = False):
+    """按严重级别提交诊断任务"""
+    return _apply_with_severity(
+        process_diagnosis_task, [user_input, session_id], severity, task_id,
+        {'client': client, 'debug': debug, 'profile': profile}
+    )
+
+def submit_batch_diagnosis(items: list, severity: str = None, task_id: str = None, client: str = None):
+    """按严重级别提交一个批量诊断分片"""
+    return _apply_with_severity(process_batch_diagnosis_task, [items], severity, task_id, {'client': client})
+
 @celery_app.task(name='diagnosis.cleanup_old_sessions')
 def cleanup_old_sessions_task():
-    """清理过期会话的定时任务"""
+    """增量清理过期/废弃会话的定时任务（由Celery beat周期调度）"""
     try:
-        logger.info("🧹 开始清理过期会话...")
-        # Redis会自动清理过期的会话，这里可以添加额外的清理逻辑
-        session_manager = RedisSessionManager()
-        # 可以添加特定的清理逻辑，比如清理特定模式的会话
-        logger.info("✅ 会话清理完成")
-        return {'status': 'SUCCESS', 'cleaned_count': 0}
+        settings = get_settings()
+        logger.info("🧹 开始增量清理会话...")
+        stats = get_session_manager().cleanup_sessions(
+            archive=get_session_archive(),
+            idle_timeout=settings.session_idle_timeout,
+            time_budget=settings.session_cleanup_time_budget,
+            scan_count=settings.session_cleanup_scan_count
+        )
+        if stats["skipped"]:
+            logger.info("⏭️ 上一轮会话清理尚未结束，本轮跳过")
+        else:
+            logger.info(
+                f"✅ 会话清理完成: 扫描 {stats['scanned']}，归档 {stats['archived']}，"
+                f"修剪索引 {stats['pruned_index']}，耗时 {stats['elapsed_ms']}ms"
+            )
+        return {'status': 'SUCCESS', 'cleaned_count': stats['archived'], **stats}
     except Exception as e:
         logger.error(f"❌ 会话清理失败: {e}")
-        return {'status': 'FAILURE', 'error': str(e)}
\ No newline at end of file
+        return {'status': 'FAILURE', 'error': str(e)}
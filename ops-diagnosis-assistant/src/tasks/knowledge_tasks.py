@@ -0,0 +1,32 @@
+from functools import lru_cache
+from src.celery_app import celery_app
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def get_knowledge_retriever():
+    """获取进程内共享的知识检索器（复用ES连接）"""
+    from src.core.knowledge_retriever import KnowledgeRetriever
+
+    return KnowledgeRetriever()
+
+
+@celery_app.task(name='knowledge.search_fault_cases')
+def search_fault_cases_task(query: str, top_k: int = 3):
+    """只检索知识库、不调用LLM的轻量任务（路由到retrieval队列）"""
+    cases = get_knowledge_retriever().search_fault_cases(query, top_k=top_k)
+    return {'status': 'SUCCESS', 'query': query, 'cases': cases}
+
+
+@celery_app.task(name='knowledge.sync_to_es')
+def sync_knowledge_to_es_task():
+    """把PostgreSQL中的故障案例同步到Elasticsearch（路由到maintenance队列）"""
+    # 同步脚本依赖psycopg2，只在维护Worker执行该任务时导入
+    from data.es_sync import KnowledgeBaseSync
+
+    logger.info("🔄 开始同步知识库到Elasticsearch...")
+    if KnowledgeBaseSync().sync_data_to_es():
+        return {'status': 'SUCCESS'}
+    return {'status': 'FAILURE', 'error': '知识库同步失败，详见Worker日志'}
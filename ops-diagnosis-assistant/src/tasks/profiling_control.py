@@ -0,0 +1,50 @@
+"""
+按需CPU采样的远程控制命令：API通过 celery_app.control.broadcast("profile_cpu", destination=[节点名]) 发给指定Worker
+
+solo/threads 进程池在Worker主进程中执行任务，直接在主进程中采样；prefork 在子进程中执行任务，
+主进程把请求转给每个子进程（各子进程生成一份独立的profile）
+"""
+import socket
+import logging
+
+from celery.signals import worker_process_init
+from celery.worker.control import control_command
+
+from src.config import get_settings
+from src.core.profiling import get_profile_store, start_cpu_profile, start_request_listener
+
+logger = logging.getLogger(__name__)
+
+
+@control_command(
+    args=[('profile_id', str), ('seconds', float), ('interval_ms', float)],
+    signature='<profile_id> <seconds> <interval_ms>',
+)
+def profile_cpu(state, profile_id, seconds, interval_ms, **kwargs):
+    """对执行任务的进程进行CPU采样，返回各进程的profile ID"""
+    if not get_settings().profiling_enabled:
+        return {'error': '该Worker未启用性能剖析（PROFILING_ENABLED=false）'}
+    children = state.consumer.pool.info.get('processes') or []
+    if not children:
+        if not start_cpu_profile(profile_id, seconds, interval_ms, state.hostname):
+            return {'error': '该Worker已有CPU采样在运行'}
+        return {'ok': 'started', 'profiles': [profile_id]}
+
+    host = socket.gethostname()
+    profiles = []
+    store = get_profile_store()
+    for pid in children:
+        child_profile_id = f"{profile_id}-{pid}"
+        store.push_request(f"{host}/{pid}", {
+            'profile_id': child_profile_id, 'seconds': seconds, 'interval_ms': interval_ms
+        })
+        profiles.append(child_profile_id)
+    logger.info(f"🔬 CPU采样请求已转给 {len(children)} 个子进程: {profile_id}")
+    return {'ok': 'started', 'profiles': profiles}
+
+
+@worker_process_init.connect
+def listen_for_profile_requests(**kwargs):
+    # prefork子进程：等待主进程转来的采样请求（未启用剖析时不常驻监听线程）
+    if get_settings().profiling_enabled:
+        start_request_listener()
@@ -0,0 +1,123 @@
+"""
+Celery信号处理：任务开始/完成/失败时向任务频道推送事件，客户端无需轮询结果后端；同时统计任务结果与耗时指标，
+并把任务执行接到提交请求的trace上
+"""
+import os
+import time
+import logging
+
+from celery.signals import (
+    task_prerun, task_postrun, task_success, task_failure, task_revoked,
+    worker_init, worker_process_init, worker_process_shutdown, setup_logging
+)
+
+from src.config import get_settings
+from src.core import metrics, tracing
+from src.core.task_events import get_task_event_publisher
+from src.core import logging_config
+from src.core.queue_stats import get_queue_wait_stats
+
+logger = logging.getLogger(__name__)
+
+# 任务ID -> 开始执行的时间（同一进程内 prerun/postrun 成对触发）
+_task_started = {}
+# 任务ID -> 执行中的任务span（最先连接，任务开始事件等Redis操作也在该span下）
+_task_spans = {}
+
+
+@task_prerun.connect
+def start_task_span(task_id=None, task=None, **kwargs):
+    if not tracing.ENABLED:
+        return
+    headers = {key: task.request.get(key) for key in ("traceparent", "tracestate") if task.request.get(key)}
+    handle = tracing.start_server_span(f"task {task.name}", headers, **{"task.name": task.name, "task.id": task_id})
+    # broker中的排队时间（提交 -> 开始执行）
+    tracing.record_queue_wait("queue.wait", task.request.get("enqueued_at"), **{
+        "task.name": task.name, "messaging.destination": (task.request.delivery_info or {}).get("routing_key", "")
+    })
+    _task_spans[task_id] = handle
+
+
+@task_prerun.connect
+def publish_task_started(task_id=None, task=None, **kwargs):
+    get_task_event_publisher().publish(task_id, "started")
+
+
+@task_prerun.connect
+def record_queue_wait(task=None, **kwargs):
+    # 提交时写入的 enqueued_at 头部 -> 开始执行的等待时间；诊断任务按严重级别统计，其余按队列统计
+    enqueued_at = task.request.get("enqueued_at")
+    if enqueued_at is None:
+        return
+    wait_class = task.request.get("severity") or (task.request.delivery_info or {}).get("routing_key", "unknown")
+    get_queue_wait_stats().record(wait_class, max(0.0, (time.time() - enqueued_at) * 1000))
+
+
+@task_success.connect
+def publish_task_success(sender=None, result=None, **kwargs):
+    # task_success 在结果写入结果后端之后触发，订阅者收到事件后读取后端也能拿到结果
+    get_task_event_publisher().publish(sender.request.id, "success", result=result)
+
+
+@task_failure.connect
+def publish_task_failure(task_id=None, exception=None, **kwargs):
+    get_task_event_publisher().publish(task_id, "failure", error=str(exception))
+
+
+@task_prerun.connect
+def record_task_start(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def record_task_duration(task_id=None, task=None, state=None, **kwargs):
+    start = _task_started.pop(task_id, None)
+    if start is not None:
+        metrics.TASK_DURATION.labels(task=task.name).observe(time.perf_counter() - start)
+    # 任务名来自已注册的任务，结果状态（success/failure/retry）为固定集合，标签取值有界
+    metrics.TASKS.labels(task=task.name, outcome=(state or "unknown").lower()).inc()
+
+
+@task_postrun.connect
+def end_task_span(task_id=None, state=None, **kwargs):
+    tracing.end_server_span(_task_spans.pop(task_id, None), **{"task.state": state})
+
+
+@task_revoked.connect
+def record_task_revoked(sender=None, **kwargs):
+    metrics.TASKS.labels(task=getattr(sender, "name", "unknown"), outcome="revoked").inc()
+
+
+@setup_logging.connect
+def configure_worker_logging(loglevel=None, **kwargs):
+    # 连接该信号后Celery不再配置根日志，由队列化的JSON日志接管（日志级别仍取命令行 --loglevel）
+    logging_config.setup_logging(logging.getLevelName(loglevel) if isinstance(loglevel, int) else loglevel)
+
+
+@worker_process_init.connect
+def restart_process_logging(**kwargs):
+    # prefork子进程中没有父进程的日志后台线程，重新启动
+    logging_config.setup_logging()
+
+
+@worker_init.connect
+@worker_process_init.connect
+def init_worker_tracing(**kwargs):
+    # solo/threads 进程池在Worker主进程中执行任务，prefork 在子进程中执行（各自初始化导出线程）
+    tracing.init_tracing(f"{get_settings().tracing_service_name}-worker")
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    # Worker主进程的指标端口（多进程模式下汇总所有子进程的指标）
+    try:
+        metrics.start_worker_metrics_server(get_settings().worker_metrics_port)
+    except OSError as e:
+        logger.warning(f"⚠️ Worker指标端口启动失败: {e}")
+
+
+@worker_process_shutdown.connect
+def cleanup_process_metrics(pid=None, **kwargs):
+    metrics.mark_process_dead(pid or os.getpid())
+    tracing.shutdown_tracing()
+    logging_config.flush_logging()
@@ -0,0 +1,158 @@
+"""
+Worker进程预热：执行任务的进程在开始接收任务前构建诊断智能体、建立连接、让模型常驻并预热ES检索，
+接收任务必需的步骤（Redis、智能体、LLM）都成功后才在Redis中登记为就绪（/health 中可见，准入控制只统计就绪进程的槽位），
+超时或必需步骤失败时登记为降级，超时的预热在后台完成后按最终结果重新登记；ES检索预热失败只记为警告
+"""
+import time
+import logging
+import threading
+from typing import Dict, Any, List
+
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, worker_shutdown
+
+from src.celery_app import celery_app
+from src.config import get_settings
+from src.core.session_manager import get_session_manager
+from src.core.task_events import get_task_event_publisher
+from src.core.worker_registry import get_worker_registry
+from src.tasks.diagnosis_tasks import get_diagnosis_agent
+from src.tasks.knowledge_tasks import get_knowledge_retriever
+
+logger = logging.getLogger(__name__)
+
+# 需要加载诊断智能体的队列
+LLM_QUEUES = {"llm", "priority"}
+# 这些进程池不会触发 worker_process_init，需要在主进程开始消费前预热
+THREAD_POOLS = {"threads", "thread", "gevent", "eventlet"}
+# 失败时只记为警告的步骤：ES不可用或知识库尚未同步时检索返回空结果，诊断仍可进行
+OPTIONAL_STEPS = {"retrieval"}
+
+_pool_name = "prefork"
+# 本进程同时执行的任务数：prefork子进程各自登记为1，线程池进程登记为其并发数
+_slots = 1
+
+
+def _consumed_queues() -> List[str]:
+    return sorted(celery_app.amqp.queues.consume_from)
+
+
+def _ping_redis():
+    get_session_manager().redis_client.ping()
+    get_task_event_publisher().redis_client.ping()
+
+
+def _build_agent():
+    # 编译LangGraph工作流，创建ChatOllama与ES客户端
+    get_diagnosis_agent()
+
+
+def _warm_up_llm(llm):
+    """生成1个token：让Ollama把模型加载进内存（之后由keep_alive保持常驻），同时建立HTTP连接"""
+    llm.invoke("ping", options={"num_predict": 1})
+
+
+def warm_up_worker(queues: List[str]) -> Dict[str, Any]:
+    """按本进程消费的队列执行各预热步骤，单个步骤失败不影响其他步骤"""
+    settings = get_settings()
+    steps = {}
+
+    def run_step(name, func):
+        start = time.perf_counter()
+        try:
+            detail = func()
+            steps[name] = {"ok": True, "ms": round((time.perf_counter() - start) * 1000, 1)}
+            if detail is not None:
+                steps[name]["detail"] = detail
+        except Exception as e:
+            steps[name] = {"ok": False, "ms": round((time.perf_counter() - start) * 1000, 1), "error": str(e)}
+            logger.warning(f"⚠️ 预热步骤 {name} 失败: {e}")
+
+    run_step("redis", _ping_redis)
+    if LLM_QUEUES & set(queues):
+        run_step("agent", _build_agent)
+        run_step("llm", lambda: _warm_up_llm(get_diagnosis_agent().llm))
+        run_step("retrieval", lambda: get_diagnosis_agent().retriever.warm_up_top_fault_types(settings.warmup_top_fault_types))
+    elif "retrieval" in queues:
+        run_step("retrieval", lambda: get_knowledge_retriever().warm_up_top_fault_types(settings.warmup_top_fault_types))
+    return steps
+
+
+def _register(report: Dict[str, Any], start: float):
+    """按预热结果登记：未超时且必需步骤都成功为 ready，否则为 degraded（不计入可用槽位）；可选步骤失败记入 warnings"""
+    steps = report["steps"]
+    healthy = not report["timed_out"] and all(step["ok"] for name, step in steps.items() if name not in OPTIONAL_STEPS)
+    report["status"] = "ready" if healthy else "degraded"
+    report["warnings"] = [name for name, step in steps.items() if name in OPTIONAL_STEPS and not step["ok"]]
+    report["warmup_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    try:
+        get_worker_registry().register(report)
+    except Exception as e:
+        logger.warning(f"⚠️ Worker就绪登记失败: {e}")
+
+
+def run_warmup():
+    """在预热超时预算内执行预热，然后按结果登记就绪或降级"""
+    settings = get_settings()
+    queues = _consumed_queues()
+    report = {"queues": queues, "pool": _pool_name, "slots": _slots, "steps": {}, "timed_out": False}
+    start = time.perf_counter()
+
+    if not settings.worker_warmup_enabled:
+        _register(report, start)
+    else:
+        logger.info(f"🔥 Worker进程预热中: 队列 {queues}")
+        # 预热线程与本线程的登记互斥，保证最后一次登记反映最终结果
+        lock = threading.Lock()
+        finished = threading.Event()
+
+        def warm_up():
+            steps = warm_up_worker(queues)
+            with lock:
+                late = report["timed_out"]
+                report.update(steps=steps, timed_out=False)
+                finished.set()
+                if late:
+                    # 超时后才完成：按最终结果重新登记
+                    _register(report, start)
+                    logger.info(f"🔥 超时的Worker预热已在后台完成: {report['status']}")
+
+        # 在线程中执行以限制总耗时（例如Ollama无响应），超时后进程照常接收任务，未完成的步骤在后台继续
+        thread = threading.Thread(target=warm_up, daemon=True)
+        thread.start()
+        thread.join(settings.worker_warmup_timeout)
+        with lock:
+            report["timed_out"] = not finished.is_set()
+            _register(report, start)
+            report = dict(report)
+
+    if report["timed_out"]:
+        logger.warning(f"⚠️ Worker预热超时（{settings.worker_warmup_timeout}s），登记为降级，预热在后台继续")
+    elif report["status"] != "ready":
+        failed = [name for name, step in report["steps"].items() if not step["ok"] and name not in OPTIONAL_STEPS]
+        logger.warning(f"⚠️ Worker预热步骤失败 {failed}，登记为降级: {report['warmup_ms']}ms")
+    elif report["warnings"]:
+        logger.warning(f"⚠️ Worker预热完成，可选步骤失败 {report['warnings']}: {report['warmup_ms']}ms")
+    else:
+        logger.info(f"✅ Worker进程预热完成: {report['warmup_ms']}ms")
+
+
+@worker_init.connect
+def detect_pool(sender=None, **kwargs):
+    global _pool_name, _slots
+    pool = sender.pool_cls
+    _pool_name = pool if isinstance(pool, str) else pool.__module__.rsplit(".", 1)[-1]
+    if _pool_name in THREAD_POOLS:
+        _slots = sender.concurrency
+        run_warmup()
+
+
+@worker_process_init.connect
+def warm_up_process(**kwargs):
+    # prefork子进程（fork之后）与solo池在开始接收任务前触发；连接必须在子进程内建立，不能从父进程继承
+    run_warmup()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def unregister_worker(**kwargs):
+    get_worker_registry().unregister()
@@ -0,0 +1,92 @@
+"""
+测试替身：内存Redis（fakeredis，含Lua脚本支持）与使用嵌入式执行后端、桩智能体的API客户端，
+测试无需启动Redis、Celery、Ollama或Elasticsearch
+
+依赖 pyproject.toml 中的 test 可选依赖（pip install -e ".[test]"）。
+"""
+import os
+import sys
+import contextlib
+from typing import Dict
+
+import redis
+import redis.asyncio
+import fakeredis
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+API_KEY = "test-key"
+
+
+def reset_singletons():
+    """清空 src 中 @lru_cache 的单例（配置、Redis客户端、执行后端等），之后按当前环境变量重新创建"""
+    for name, module in list(sys.modules.items()):
+        if name == "src" or name.startswith("src."):
+            for value in list(vars(module).values()):
+                if callable(getattr(value, "cache_clear", None)) and getattr(value, "__module__", None) == name:
+                    value.cache_clear()
+
+
+@contextlib.contextmanager
+def environ(**env: str):
+    """临时设置环境变量并重建单例，退出时恢复"""
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    reset_singletons()
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        reset_singletons()
+
+
+@contextlib.contextmanager
+def fake_redis():
+    """上下文内新建的Redis客户端（同步与asyncio）都连接到同一个空的内存Redis，返回其中一个客户端"""
+    originals = redis.Redis, redis.asyncio.Redis
+    redis.Redis, redis.asyncio.Redis = fakeredis.FakeRedis, fakeredis.FakeAsyncRedis
+    reset_singletons()
+    from src.config import get_settings
+
+    settings = get_settings()
+    client = fakeredis.FakeRedis(host=settings.redis_host, port=settings.redis_port, db=settings.redis_db, decode_responses=True)
+    client.flushall()
+    try:
+        yield client
+    finally:
+        redis.Redis, redis.asyncio.Redis = originals
+        reset_singletons()
+
+
+@contextlib.contextmanager
+def embedded_api(env: Dict[str, str] = None):
+    """
+    进程内执行诊断的API测试客户端：内存Redis + 嵌入式执行后端 + 桩智能体（无延迟）
+
+    Yields:
+        (TestClient, 内存Redis客户端)，请求需带 X-API-Key: API_KEY
+    """
+    from fastapi.testclient import TestClient
+
+    env = {"EXECUTION_BACKEND": "embedded", "WORKER_WARMUP": "false", "API_KEY": API_KEY,
+           "RATE_LIMIT_PER_MINUTE": "0", "ADMISSION_MAX_WAIT": "0", **(env or {})}
+    with environ(**env), fake_redis() as redis_client:
+        from benchmarks.concurrency import build_agent
+        from src.tasks import diagnosis_tasks
+        from src.api.advanced_main import app
+        from src.api.backends import get_execution_backend
+
+        agent = build_agent(0, 0)
+        original_agent = diagnosis_tasks.get_diagnosis_agent
+        diagnosis_tasks.get_diagnosis_agent = lambda: agent
+        try:
+            with TestClient(app) as client:
+                yield client, redis_client
+        finally:
+            # 等正在执行的诊断结束，之后再恢复真实的智能体
+            get_execution_backend().executor.shutdown(wait=True)
+            diagnosis_tasks.get_diagnosis_agent = original_agent
@@ -0,0 +1,52 @@
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from src.core.admission import AdmissionController
+
+
+def _controller(max_wait: int, service_time: float, min_slots: int = 0) -> AdmissionController:
+    controller = AdmissionController(max_wait=max_wait)
+    controller.min_slots = min_slots
+    # 固定单次诊断耗时，不读取Redis中的历史样本
+    controller._service_time = (time.time() + 3600, service_time)
+    return controller
+
+
+def test_eta_from_queue_depth():
+    """排队时间 = 前面的任务数 × 单次耗时 / 槽位数，ETA再加上自身的执行时间"""
+    decision = _controller(600, 20).evaluate({"ahead": 6, "slots": 2})
+    assert decision["admitted"]
+    assert decision["queue_wait_seconds"] == 60
+    assert decision["eta_seconds"] == 80
+
+    # 批量提交的诊断由多个槽位并行执行
+    assert _controller(600, 20).evaluate({"ahead": 0, "slots": 2}, diagnoses=3)["eta_seconds"] == 40
+
+
+def test_shed_load():
+    """排队超过阈值返回429，没有执行槽位返回503，阈值为0时只估算不拒绝"""
+    decision = _controller(60, 20).evaluate({"ahead": 10, "slots": 2})
+    assert not decision["admitted"]
+    assert decision["status_code"] == 429
+    assert decision["retry_after"] == 40
+
+    assert _controller(60, 20).evaluate({"ahead": 0, "slots": 0})["status_code"] == 503
+    assert _controller(0, 20).evaluate({"ahead": 1000, "slots": 1})["admitted"]
+
+
+def test_no_ready_slots():
+    """有Worker消费但都未就绪时照常接收（不估算ETA）；没有Worker登记时按最少槽位估算，未配置时返回503"""
+    decision = _controller(60, 20).evaluate({"ahead": 10, "slots": 0, "consumers": 2})
+    assert (decision["admitted"], decision["eta_seconds"]) == (True, None)
+
+    decision = _controller(600, 20, min_slots=2).evaluate({"ahead": 6, "slots": 0, "consumers": 0})
+    assert (decision["admitted"], decision["slots"], decision["eta_seconds"]) == (True, 2, 80)
+    assert _controller(600, 20).evaluate({"ahead": 0, "slots": 0, "consumers": 0})["status_code"] == 503
+
+
+if __name__ == "__main__":
+    test_eta_from_queue_depth()
+    test_shed_load()
+    test_no_ready_slots()
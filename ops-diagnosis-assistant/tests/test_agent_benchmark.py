@@ -0,0 +1,27 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from benchmarks.agents import run_agent
+from benchmarks.stubs import LatencyDistribution
+
+
+def test_latency_distribution_is_reproducible():
+    """相同种子产生相同的延迟序列，spec 可以原样写回JSON"""
+    first = LatencyDistribution.parse("lognormal:0.2:0.5", seed=7)
+    second = LatencyDistribution.parse("lognormal:0.2:0.5", seed=7)
+    assert [first.sample() for _ in range(20)] == [second.sample() for _ in range(20)]
+    assert str(first) == "lognormal:0.2:0.5"
+    assert LatencyDistribution.parse("0.05").sample() == 0.05
+
+
+def test_run_agent_counts_llm_calls_per_turn():
+    """每轮LLM调用次数：simple/rag 各1次，advanced 的完整一轮为4次"""
+    config = {"turns": 4, "warmup": 0, "concurrency": [1, 2], "llm_latency": "0", "retrieval_latency": "0", "seed": 1}
+    calls = {name: run_agent(name, config)["runs"][1]["llm_calls_per_turn"] for name in ("simple", "rag", "advanced")}
+    assert calls == {"simple": 1.0, "rag": 1.0, "advanced": 4.0}
+
+
+if __name__ == "__main__":
+    test_latency_distribution_is_reproducible()
+    test_run_agent_counts_llm_calls_per_turn()
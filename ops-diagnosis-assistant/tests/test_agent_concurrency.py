@@ -0,0 +1,50 @@
+import sys
+import os
+import copy
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stubs import StubChatModel, StubRetriever
+from src.core.advanced_agent import AdvancedDiagnosisAgent
+
+
+def _build_agent():
+    return AdvancedDiagnosisAgent(
+        debug_mode=False,
+        llm=StubChatModel(latency=0.02),
+        retriever=StubRetriever(latency=0.005),
+    )
+
+
+def test_concurrent_diagnoses_do_not_share_state():
+    """同一个智能体实例被多个线程并发调用时，各会话的状态互不影响"""
+    agent = _build_agent()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda i: agent.diagnose(f"会话{i}: CPU很高", f"s{i}"), range(8)))
+
+    assert not hasattr(agent, "session_states")
+    for i, (response, state) in enumerate(results):
+        assert state["session_id"] == f"s{i}"
+        assert state["current_user_input"] == "解决" or state["current_user_input"].startswith(f"会话{i}")
+        assert response
+    # 每个会话持有自己的列表对象
+    assert len({id(state["confirmed_symptoms"]) for _, state in results}) == 8
+
+
+def test_session_state_round_trip_is_not_mutated():
+    """传入的会话状态不会被修改，序列化后可以继续下一轮"""
+    agent = _build_agent()
+    _, state = agent.diagnose("CPU很高", "s1")
+    stored = agent.serialize_state(state)
+    snapshot = copy.deepcopy(stored)
+
+    _, next_state = agent.diagnose("还是很高", "s1", agent.deserialize_state(stored))
+
+    assert stored == snapshot
+    assert len(next_state["messages"]) > len(state["messages"])
+
+
+if __name__ == "__main__":
+    test_concurrent_diagnoses_do_not_share_state()
+    test_session_state_round_trip_is_not_mutated()
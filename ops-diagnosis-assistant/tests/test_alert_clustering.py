@@ -0,0 +1,74 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+from src.core.alert_clustering import mask_alert, alert_signature
+
+
+def test_mask_variable_tokens():
+    """IP、主机名、UUID、十六进制ID和数字被替换为占位符"""
+    assert mask_alert("主机10.0.3.17:8080 CPU使用率95.5%") == "主机<IP> cpu使用率<NUM>%"
+    assert mask_alert("web-01.prod.example.com disk full") == "<HOST> disk full"
+    assert mask_alert("Pod order-svc-7d9f8b-x2kq OOMKilled") == "pod <HOST> oomkilled"
+    assert mask_alert("trace 3f2a9c8e1b7d request 550e8400-e29b-41d4-a716-446655440000") == "trace <HEX> request <UUID>"
+    # 不带编号的服务名保持不变
+    assert mask_alert("order-service latency high") == "order-service latency high"
+
+
+def test_same_pattern_same_signature():
+    """只有可变部分不同的告警签名相同，不同来源或不同模式的告警签名不同"""
+    first, _ = alert_signature("主机10.0.3.17 CPU使用率95%", "node-exporter")
+    second, _ = alert_signature("主机10.0.9.2  CPU使用率97%", "node-exporter")
+    other_source, _ = alert_signature("主机10.0.3.17 CPU使用率95%", "zabbix")
+    other_pattern, _ = alert_signature("主机10.0.3.17 内存使用率95%", "node-exporter")
+
+    assert first == second
+    assert first != other_source
+    assert first != other_pattern
+
+
+def _alert(alert_id: str, message: str) -> dict:
+    return {"alert_id": alert_id, "source": "node-exporter", "message": message}
+
+
+def test_failed_submit_reopens_cluster():
+    """诊断提交失败时已提交的聚类照常登记任务，失败的聚类被关闭，重推的告警新建聚类并提交诊断"""
+    pytest.importorskip("fakeredis")
+    from fakes import API_KEY, embedded_api
+    from src.api.backends import get_execution_backend
+
+    headers = {"X-API-Key": API_KEY}
+    alerts = [_alert("A1", "主机10.0.3.17 CPU使用率95%"), _alert("B1", "主机10.0.3.17 磁盘写满")]
+    with embedded_api() as (client, redis_client):
+        backend = get_execution_backend()
+        submit = backend.submit
+
+        def flaky_submit(message, *args):
+            if "磁盘" in message:
+                raise ConnectionError("broker down")
+            return submit(message, *args)
+
+        backend.submit = flaky_submit
+        response = client.post("/alerts/ingest", json={"alerts": alerts}, headers=headers)
+        assert response.status_code == 500
+        assert client.get("/alerts/A1", headers=headers).json()["task_id"]
+        failed = client.get("/alerts/B1", headers=headers).json()
+        assert (failed["task_id"], failed["status"]) == (None, "SUBMIT_FAILED")
+
+        backend.submit = submit
+        retried = client.post("/alerts/ingest", json={"alerts": alerts}, headers=headers).json()
+        assert retried["diagnoses_submitted"] == 1
+        assert [cluster["created"] for cluster in retried["clusters"]] == [False, True]
+        assert client.get("/alerts/B1", headers=headers).json()["task_id"]
+        # 关闭的聚类不计入聚类数：4条告警实际诊断2次
+        stats = client.get("/stats/alerts", headers=headers).json()["alerts"]
+        assert (stats["ingested"], stats["clusters"], stats["submit_failures"]) == (4, 2, 1)
+        assert stats["suppression_ratio"] == 0.5
+
+
+if __name__ == "__main__":
+    test_mask_variable_tokens()
+    test_same_pattern_same_signature()
+    test_failed_submit_reopens_cluster()
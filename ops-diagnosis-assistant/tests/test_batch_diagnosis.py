@@ -0,0 +1,100 @@
+import sys
+import os
+import json
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+import run_bulk_diagnosis
+
+HEADERS = {"X-API-Key": "test-key"}
+
+
+def test_batch_dedupes_and_chunks():
+    """相同的问题只诊断一次（duplicate_of 指向首次出现的序号），去重后的问题按分片提交，每个分片一个任务"""
+    pytest.importorskip("fakeredis")
+    from fakes import embedded_api
+
+    messages = ["订单服务CPU 95%", "磁盘写满", "  订单服务CPU   95% ", "内存泄漏", "连接池耗尽"]
+    with embedded_api({"BATCH_CHUNK_SIZE": "2"}) as (client, _):
+        response = client.post("/diagnose/batch", json={"items": [{"message": m} for m in messages]}, headers=HEADERS)
+        assert response.status_code == 200
+        batch = response.json()
+        assert (batch["batch_size"], batch["unique"], len(batch["task_ids"])) == (5, 4, 2)
+
+        items = batch["items"]
+        assert [item["duplicate_of"] for item in items] == [None, None, 0, None, None]
+        assert items[2]["session_id"] == items[0]["session_id"]
+        assert items[2]["task_id"] == items[0]["task_id"]
+        # 去重后的问题按顺序分片：[0, 1] [3, 4]
+        assert [item["task_id"] for item in items] == [batch["task_ids"][i] for i in (0, 0, 0, 1, 1)]
+
+        for task_id in batch["task_ids"]:
+            assert client.get(f"/tasks/{task_id}?wait=10", headers=HEADERS).json()["status"] == "SUCCESS"
+        turns = client.get(f"/sessions/{items[2]['session_id']}/turns", headers=HEADERS).json()["turns"]
+        assert len(turns) == 1
+
+
+def test_batch_submit_failure_refunds_unsubmitted_tokens():
+    """分片提交失败时返回500，并退回尚未提交的问题预占的token"""
+    pytest.importorskip("fakeredis")
+    from fakes import embedded_api
+    from src.api.backends import get_execution_backend
+
+    env = {"BATCH_CHUNK_SIZE": "2", "API_KEYS": "quota:quota-key:0:10:1000000", "DIAGNOSIS_TOKEN_ESTIMATE": "1000"}
+    with embedded_api(env) as (client, _):
+        calls = []
+
+        def submit_batch(items, severity, task_id, client_name=None):
+            calls.append(items)
+            if len(calls) > 1:
+                raise ConnectionError("broker down")
+            return task_id
+
+        get_execution_backend().submit_batch = submit_batch
+        headers = {"X-API-Key": "quota-key"}
+        items = [{"message": f"问题{i}"} for i in range(4)]
+        response = client.post("/diagnose/batch", json={"items": items}, headers=headers)
+        assert response.status_code == 500
+        assert "2/4" in response.json()["detail"]
+        # 只有第一个分片（2个问题）保留预占
+        assert client.get("/stats/usage", headers=headers).json()["usage"]["tokens_used_today"] == 2000
+
+
+def test_checkpoint_truncates_partial_line_and_resumes():
+    """断点文件的半行被截断，失败的工单重试，已完成的工单跳过，相同问题复用结果"""
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path, output_path = os.path.join(tmp, "incidents.jsonl"), os.path.join(tmp, "results.jsonl")
+        with open(input_path, "w", encoding="utf-8") as f:
+            for incident_id, message in [("1", "订单服务CPU 95%"), ("2", "磁盘写满"), ("3", "订单服务CPU  95%")]:
+                f.write(json.dumps({"id": incident_id, "message": message}, ensure_ascii=False) + "\n")
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"id": "1", "message": "订单服务CPU 95%", "response": "扩容"}, ensure_ascii=False) + "\n")
+            f.write(json.dumps({"id": "2", "message": "磁盘写满", "error": "timeout"}, ensure_ascii=False) + "\n")
+            f.write('{"id": "3", "message": "订单')
+
+        done_ids, results_by_text = run_bulk_diagnosis.load_checkpoint(output_path)
+        assert done_ids == {"1"}
+        assert list(results_by_text) == ["订单服务CPU 95%"]
+        with open(output_path, encoding="utf-8") as f:
+            assert f.read().endswith("}\n")
+
+        argv = sys.argv
+        sys.argv = ["run_bulk_diagnosis.py", input_path, "-o", output_path, "--pool", "thread", "--workers", "1", "--stub"]
+        try:
+            run_bulk_diagnosis.main()
+        finally:
+            sys.argv = argv
+
+        with open(output_path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        assert [record["id"] for record in records] == ["1", "2", "3", "2"]
+        assert records[2]["duplicate_of"] == "1" and records[2]["response"] == "扩容"
+        assert "error" not in records[3]
+
+
+if __name__ == "__main__":
+    test_batch_dedupes_and_chunks()
+    test_batch_submit_failure_refunds_unsubmitted_tokens()
+    test_checkpoint_truncates_partial_line_and_resumes()
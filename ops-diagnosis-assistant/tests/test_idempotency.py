@@ -0,0 +1,78 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+pytest.importorskip("fakeredis")
+from fakes import API_KEY, embedded_api, fake_redis
+from src.core.idempotency import IdempotencyStore
+
+HEADERS = {"X-API-Key": API_KEY}
+
+
+def test_keys_are_scoped_by_client():
+    """不同客户端使用相同的Idempotency-Key互不影响"""
+    with fake_redis() as redis_client:
+        store = IdempotencyStore(ttl=60)
+        record = {"task_id": "t1", "session_id": "s1", "severity": "P2", "fingerprint": "f"}
+        assert store.reserve("alice", "k", record) is None
+        assert store.reserve("bob", "k", {**record, "task_id": "t2"}) is None
+        assert store.reserve("alice", "k", {**record, "task_id": "t3"})["task_id"] == "t1"
+        assert redis_client.exists("idempotency:alice:k", "idempotency:bob:k") == 2
+        store.release("alice", "k")
+        assert not redis_client.exists("idempotency:alice:k")
+
+
+def test_replay_and_conflict():
+    """首次请求提交任务，相同请求重放返回同一个任务，内容不同的请求返回409"""
+    with embedded_api() as (client, redis_client):
+        headers = {**HEADERS, "Idempotency-Key": "retry-1"}
+        first = client.post("/diagnose/async", json={"message": "订单服务CPU 95%"}, headers=headers)
+        assert first.status_code == 200
+        assert "Idempotent-Replayed" not in first.headers
+        assert redis_client.exists("idempotency:default:retry-1")
+
+        replay = client.post("/diagnose/async", json={"message": "订单服务CPU 95%"}, headers=headers)
+        assert replay.status_code == 200
+        assert replay.headers["Idempotent-Replayed"] == "true"
+        assert replay.json()["task_id"] == first.json()["task_id"]
+        assert replay.json()["session_id"] == first.json()["session_id"]
+
+        conflict = client.post("/diagnose/async", json={"message": "内存泄漏"}, headers=headers)
+        assert conflict.status_code == 409
+
+        stats = client.get("/stats/idempotency", headers=HEADERS).json()["idempotency"]
+        assert (stats["duplicates_suppressed"], stats["conflicts"]) == (1, 1)
+
+
+def test_release_on_reject():
+    """被限流拒绝的请求释放幂等键，客户端稍后可用同一个key重试"""
+    with embedded_api({"API_KEYS": "tight:tight-key:60:1"}) as (client, redis_client):
+        headers = {"X-API-Key": "tight-key"}
+        assert client.post("/diagnose/async", json={"message": "磁盘写满"}, headers=headers).status_code == 200
+
+        rejected = client.post("/diagnose/async", json={"message": "磁盘写满"}, headers={**headers, "Idempotency-Key": "k"})
+        assert rejected.status_code == 429
+        assert not redis_client.exists("idempotency:tight:k")
+
+
+def test_redis_error_is_handled():
+    """登记幂等键时Redis出错返回500，而不是未处理的异常"""
+    with embedded_api() as (client, redis_client):
+        from src.core.idempotency import get_idempotency_store
+
+        def broken(*args):
+            raise ConnectionError("redis down")
+
+        get_idempotency_store().reserve = broken
+        response = client.post("/diagnose/async", json={"message": "CPU高"}, headers={**HEADERS, "Idempotency-Key": "k"})
+        assert response.status_code == 500
+        assert "诊断任务提交失败" in response.json()["detail"]
+
+
+if __name__ == "__main__":
+    test_keys_are_scoped_by_client()
+    test_replay_and_conflict()
+    test_release_on_reject()
+    test_redis_error_is_handled()
@@ -0,0 +1,31 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from src.config import get_settings
+from benchmarks.import_time import measure_import_time
+
+API_ENTRY = "src.api.advanced_main"
+
+
+def test_api_cold_import_within_budget():
+    """API入口的冷导入耗时不应超过配置的预算（IMPORT_TIME_BUDGET_MS）"""
+    budget_ms = get_settings().import_time_budget_ms
+    report = measure_import_time(API_ENTRY)
+
+    assert report["cumulative_ms"] <= budget_ms, (
+        f"{API_ENTRY} 冷导入耗时 {report['cumulative_ms']:.1f} ms 超出预算 {budget_ms} ms，"
+        f"最慢模块: {report['slowest'][:5]}"
+    )
+
+
+def test_entry_points_do_not_load_heavy_dependencies():
+    """API与Worker入口在导入时不应加载langchain/langgraph/elasticsearch"""
+    for module in [API_ENTRY, "src.tasks.diagnosis_tasks"]:
+        report = measure_import_time(module, repeat=1)
+        assert not report["heavy_modules"], f"{module} 导入时加载了重量级依赖: {report['heavy_modules']}"
+
+
+if __name__ == "__main__":
+    test_api_cold_import_within_budget()
+    test_entry_points_do_not_load_heavy_dependencies()
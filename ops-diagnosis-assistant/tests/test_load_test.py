@@ -0,0 +1,46 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from benchmarks.es_server import InMemoryIndex
+from benchmarks.load_test import arrival_times, find_knee, parse_stages
+
+
+def test_arrivals_are_seeded_and_follow_stage_rates():
+    """同一种子得到相同的到达时间，各阶段的请求数接近 到达率×时长"""
+    stages = parse_stages(["5:20", "20:20"])
+    arrivals = arrival_times(stages, seed=7)
+    assert arrivals == arrival_times(stages, seed=7)
+    counts = [sum(1 for _, stage in arrivals if stage == index) for index in range(2)]
+    assert 70 < counts[0] < 130 and 320 < counts[1] < 480
+    assert all(20 <= t < 40 for t, stage in arrivals if stage == 1)
+
+
+def test_knee_is_first_saturated_stage():
+    """吞吐跟不上到达率或p95明显升高的第一个阶段即为拐点"""
+    reports = [
+        {"stage": 0, "rate": 1, "goodput_per_s": 1.0, "error_rate": 0.0, "p95_ms": 100},
+        {"stage": 1, "rate": 2, "goodput_per_s": 2.0, "error_rate": 0.0, "p95_ms": 400},
+        {"stage": 2, "rate": 4, "goodput_per_s": 2.5, "error_rate": 0.2, "p95_ms": 900},
+    ]
+    assert find_knee(reports) == {"stage": 1, "rate": 2, "reasons": ["latency"]}
+    assert find_knee(reports[:1]) is None
+
+
+def test_es_stand_in_ranks_by_boosted_fields():
+    """multi_match 按字段权重打分，minimum_should_match 过滤命中词过少的文档"""
+    index = InMemoryIndex([
+        {"id": "cpu", "fault_type": "CPU过高", "symptoms": "内存正常，CPU 持续95%"},
+        {"id": "oom", "fault_type": "内存泄漏", "symptoms": "频繁OOM，堆内存持续增长"},
+    ])
+    body = {"query": {"multi_match": {"query": "内存OOM", "fields": ["fault_type^2", "symptoms^3"]}}, "size": 1}
+    assert index.search(body)["hits"]["hits"][0]["_id"] == "oom"
+    strict = {"query": {"multi_match": {"query": "CPU OOM", "fields": ["symptoms"], "minimum_should_match": "100%"}}}
+    assert index.search(strict)["hits"]["total"]["value"] == 0
+    assert len(index.search({"size": 5})["hits"]["hits"]) == 2
+
+
+if __name__ == "__main__":
+    test_arrivals_are_seeded_and_follow_stage_rates()
+    test_knee_is_first_saturated_stage()
+    test_es_stand_in_ranks_by_boosted_fields()
@@ -0,0 +1,48 @@
+import sys
+import os
+import io
+import json
+import logging
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from src.core.logging_config import ContextFilter, JsonFormatter, RateLimitFilter, log_context
+
+
+def _capture(*filters, max_chars: int = 0):
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter(max_chars))
+    for log_filter in filters:
+        handler.addFilter(log_filter)
+    logger = logging.getLogger(f"test_logging_config.{id(stream)}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    return logger, lambda: [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_carry_context_and_are_truncated():
+    """日志记录附带当前任务/会话ID，过长的消息被截断"""
+    logger, records = _capture(ContextFilter(), max_chars=10)
+    with log_context(task_id="t-1", session_id="s-1"):
+        logger.info("用户输入: %s", "x" * 100)
+    logger.info("无上下文")
+    first, second = records()
+    assert first["task_id"] == "t-1" and first["session_id"] == "s-1"
+    assert first["msg"].startswith("用户输入: xxxx") and "+" in first["msg"]
+    assert "task_id" not in second
+
+
+def test_repeated_messages_are_rate_limited():
+    """相同的消息在窗口内只保留前N条，不同的消息不受影响"""
+    logger, records = _capture(RateLimitFilter(limit=3, window=60))
+    for _ in range(10):
+        logger.error("❌ 知识检索失败: ConnectionError")
+    for i in range(5):
+        logger.info("收到请求 %d", i)
+    assert len(records()) == 3 + 5
+
+
+if __name__ == "__main__":
+    test_records_carry_context_and_are_truncated()
+    test_repeated_messages_are_rate_limited()
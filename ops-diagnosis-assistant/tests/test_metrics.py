@@ -0,0 +1,89 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+pytest.importorskip("fakeredis")
+pytest.importorskip("prometheus_client")
+from prometheus_client.parser import text_string_to_metric_families
+
+from fakes import API_KEY, embedded_api, fake_redis
+from src.core import metrics
+
+pytestmark = pytest.mark.skipif(not metrics.ENABLED, reason="METRICS_ENABLED=false")
+
+HEADERS = {"X-API-Key": API_KEY}
+NODES = {"welcome", "collect_symptoms", "ask_clarifying_questions", "retrieve_knowledge",
+         "analyze_root_cause", "generate_solution", "confirm_resolution"}
+
+
+def _samples(text: str) -> dict:
+    """指标名 -> [(标签, 值)]"""
+    samples = {}
+    for family in text_string_to_metric_families(text):
+        for sample in family.samples:
+            samples.setdefault(sample.name, []).append((sample.labels, sample.value))
+    return samples
+
+
+def _value(samples: dict, name: str, **labels) -> float:
+    return sum(value for sample_labels, value in samples.get(name, []) if labels.items() <= sample_labels.items())
+
+
+def test_queue_depth_sums_priority_lanes():
+    """队列积压按队列汇总各优先级档位的消息数；读取broker失败时返回空指标而不是抓取失败"""
+    import redis
+    from src.config import get_settings
+
+    with fake_redis():
+        broker_url = get_settings().celery_broker_url
+        broker = redis.Redis.from_url(broker_url)
+        for queue, depth in [("llm", 1), ("llm:3", 2), ("llm:9", 3), ("retrieval", 4)]:
+            broker.rpush(queue, *["message"] * depth)
+
+        collector = metrics.QueueDepthCollector(
+            broker_url, ["llm", "priority", "retrieval"], {"sep": ":", "priority_steps": [0, 3, 6, 9]}
+        )
+        [gauge] = list(collector.collect())
+        assert {sample.labels["queue"]: sample.value for sample in gauge.samples} == {
+            "llm": 6, "priority": 0, "retrieval": 4
+        }
+
+        def broken(*args, **kwargs):
+            raise ConnectionError("broker down")
+
+        collector.broker_client.pipeline = broken
+        [gauge] = list(collector.collect())
+        assert gauge.samples == []
+
+
+def test_metrics_endpoint_after_diagnosis():
+    """一次诊断后 /metrics 包含任务结果、节点耗时、LLM token与排队耗时，标签只取固定集合中的值"""
+    with embedded_api() as (client, _):
+        before = _samples(client.get("/metrics").text)
+        response = client.post("/diagnose/async", json={"message": "订单服务CPU 95%"}, headers=HEADERS).json()
+        assert client.get(f"/tasks/{response['task_id']}?wait=10", headers=HEADERS).json()["status"] == "SUCCESS"
+
+        scraped = client.get("/metrics")
+        assert scraped.status_code == 200 and scraped.headers["content-type"].startswith("text/plain")
+        after = _samples(scraped.text)
+
+        outcome = {"task": "diagnosis.process_diagnosis", "outcome": "success"}
+        assert _value(after, "diagnosis_tasks_total", **outcome) == _value(before, "diagnosis_tasks_total", **outcome) + 1
+        assert _value(after, "task_queue_wait_seconds_count", wait_class="P2") > _value(
+            before, "task_queue_wait_seconds_count", wait_class="P2"
+        )
+        assert {labels["node"] for labels, _ in after["diagnosis_node_duration_seconds_count"]} <= NODES
+        assert {labels["kind"] for labels, _ in after["llm_tokens_total"]} == {"prompt", "completion"}
+        assert _value(after, "llm_tokens_total", kind="prompt") > _value(before, "llm_tokens_total", kind="prompt")
+        assert {labels["queue"] for labels, _ in after["celery_queue_depth"]} == {"llm", "priority", "retrieval", "maintenance"}
+
+        # 会话ID、任务ID等无界取值不会出现在任何标签中
+        label_values = {value for samples in after.values() for labels, _ in samples for value in labels.values()}
+        assert response["session_id"] not in label_values and response["task_id"] not in label_values
+
+
+if __name__ == "__main__":
+    test_queue_depth_sums_priority_lanes()
+    test_metrics_endpoint_after_diagnosis()
@@ -0,0 +1,57 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from src.core.node_events import NodeEventHook, REDACTED
+
+
+def test_event_is_redacted_and_capped():
+    """按字段名脱敏，长字符串截断，长列表只保留长度与末尾几项"""
+    hook = NodeEventHook(sample_rate=0, max_chars=10, max_items=2, redact=["password"])
+    state = {
+        "session_id": "s1",
+        "collected_info": {"db_password": "hunter2", "host": "db-01"},
+        "retrieved_knowledge": "x" * 50,
+        "confirmed_symptoms": ["a", "b", "c", "d"],
+    }
+    event = hook.build_event("collect_symptoms", "exit", state)["state"]
+    assert event["collected_info"] == {"db_password": REDACTED, "host": "db-01"}
+    assert event["retrieved_knowledge"].startswith("x" * 10) and "+40" in event["retrieved_knowledge"]
+    assert event["confirmed_symptoms"] == {"len": 4, "tail": ["c", "d"]}
+
+
+def test_sampling_is_per_session():
+    """同一会话的采样结果稳定，采样率接近配置值"""
+    hook = NodeEventHook(sample_rate=0.2)
+    sessions = [f"session-{i}" for i in range(2000)]
+    sampled = [hook.sampled(session_id) for session_id in sessions]
+    assert sampled == [hook.sampled(session_id) for session_id in sessions]
+    assert 0.15 < sum(sampled) / len(sessions) < 0.25
+    assert not NodeEventHook(sample_rate=0).sampled("session-1")
+
+
+def test_events_use_graph_node_names():
+    """节点事件使用工作流中的节点名，每个节点的 enter 与 exit 成对出现"""
+    from benchmarks.concurrency import build_agent
+
+    agent = build_agent(0, 0)
+    events, session_state = [], None
+    original = NodeEventHook.emit
+    NodeEventHook.emit = lambda self, node, phase, state: events.append((node, phase))
+    try:
+        for message in ["订单服务CPU持续95%，接口超时", "最近没有发布，GC频繁"]:
+            _, session_state = agent.diagnose(message, "s1", session_state=session_state, debug=True)
+    finally:
+        NodeEventHook.emit = original
+
+    graph_nodes = set(agent.graph.get_graph().nodes) - {"__start__", "__end__"}
+    routers = {"route_after_symptom_collection", "route_after_confirmation"}
+    assert {node for node, _ in events} <= graph_nodes | routers
+    assert "welcome" in {node for node, _ in events}
+    assert [node for node, phase in events if phase == "enter"] == [node for node, phase in events if phase == "exit"]
+
+
+if __name__ == "__main__":
+    test_event_is_redacted_and_capped()
+    test_sampling_is_per_session()
+    test_events_use_graph_node_names()
@@ -0,0 +1,47 @@
+import sys
+import os
+import json
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from fastapi.testclient import TestClient
+
+from benchmarks.ollama_server import OllamaStandIn, create_app
+from benchmarks.stubs import LatencyDistribution
+
+
+def _client(**kwargs) -> TestClient:
+    stand_in = OllamaStandIn("stub-model", LatencyDistribution.parse("0"), tokens_per_sec=0, **kwargs)
+    return TestClient(create_app(stand_in))
+
+
+def test_streaming_chat_is_deterministic():
+    """流式回复按token分片，拼接后与非流式回复相同，最后一片带有token统计"""
+    client = _client()
+    body = {"model": "stub-model", "messages": [{"role": "user", "content": "请生成具体的解决方案"}]}
+    lines = [json.loads(line) for line in client.post("/api/chat", json=body).text.splitlines()]
+    streamed = "".join(line["message"]["content"] for line in lines)
+    single = client.post("/api/chat", json={**body, "stream": False}).json()
+    assert streamed == single["message"]["content"]
+    assert lines[-1]["done"] and lines[-1]["eval_count"] == len(lines) - 1
+
+
+def test_json_format_and_num_predict():
+    """format 为JSON Schema时回复符合schema，num_predict 截断输出"""
+    client = _client()
+    schema = {"type": "object", "properties": {"root_cause": {"type": "string"}, "steps": {"type": "array"}}}
+    reply = client.post("/api/generate", json={"prompt": "hello", "format": schema, "stream": False}).json()
+    assert set(json.loads(reply["response"])) == {"root_cause", "steps"}
+    reply = client.post("/api/generate", json={"prompt": "ping", "stream": False, "options": {"num_predict": 1}}).json()
+    assert reply["eval_count"] == 1 and reply["done_reason"] == "length"
+
+
+def test_injected_errors():
+    """error_rate=1 时每个请求都返回500"""
+    response = _client(error_rate=1.0).post("/api/generate", json={"prompt": "hi"})
+    assert response.status_code == 500 and "error" in response.json()
+
+
+if __name__ == "__main__":
+    test_streaming_chat_is_deterministic()
+    test_json_format_and_num_predict()
+    test_injected_errors()
@@ -0,0 +1,123 @@
+import sys
+import os
+import time
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+pytest.importorskip("fakeredis")
+from celery.app.task import Context
+
+from fakes import API_KEY, embedded_api, fake_redis
+from src.tasks import diagnosis_tasks
+
+HEADERS = {"X-API-Key": API_KEY}
+
+
+def test_severity_maps_to_queue_and_priority():
+    """P0进入专用priority队列，其余级别在llm队列内使用不同的broker优先级，头部带上严重级别与提交时间"""
+    calls = []
+    original = diagnosis_tasks.process_diagnosis_task.apply_async
+    diagnosis_tasks.process_diagnosis_task.apply_async = lambda **options: calls.append(options)
+    try:
+        for severity in ("P0", "P1", "P2", "P3", None):
+            diagnosis_tasks.submit_diagnosis("CPU高", "s1", severity, task_id=f"t-{severity}")
+    finally:
+        diagnosis_tasks.process_diagnosis_task.apply_async = original
+
+    assert [(call["queue"], call["priority"]) for call in calls] == [
+        ("priority", 0), ("llm", 3), ("llm", 6), ("llm", 9), ("llm", 6)
+    ]
+    assert [call["headers"]["severity"] for call in calls] == ["P0", "P1", "P2", "P3", "P2"]
+    assert all(time.time() - call["headers"]["enqueued_at"] < 5 for call in calls)
+
+
+def test_queue_load_counts_only_higher_priority_lanes():
+    """新任务前面的积压只计算同队列中优先级不低于它的档位，执行槽位来自就绪Worker"""
+    import redis
+    from src.api.backends import CeleryBackend
+    from src.config import get_settings
+    from src.core.worker_registry import get_worker_registry
+
+    with fake_redis():
+        broker = redis.Redis.from_url(get_settings().celery_broker_url)
+        for queue, depth in [("priority", 1), ("llm", 2), ("llm:3", 3), ("llm:6", 4), ("llm:9", 5)]:
+            broker.rpush(queue, *["message"] * depth)
+        get_worker_registry().register({"status": "ready", "queues": ["priority", "llm"], "slots": 2})
+
+        backend = CeleryBackend()
+        assert backend.queue_load("P0") == {"ahead": 1, "slots": 2, "consumers": 2}
+        assert [backend.queue_load(severity)["ahead"] for severity in ("P1", "P2", "P3")] == [5, 9, 14]
+        assert backend.queue_load()["ahead"] == 9
+
+
+def test_degraded_workers_are_consumers():
+    """只有降级的Worker时没有就绪槽位，但仍计为消费者，准入控制照常接收"""
+    from src.api.backends import CeleryBackend
+    from src.core.admission import AdmissionController
+    from src.core.worker_registry import get_worker_registry
+
+    with fake_redis():
+        get_worker_registry().register({"status": "degraded", "queues": ["priority", "llm"], "slots": 2, "timed_out": True})
+        load = CeleryBackend().queue_load("P2")
+        assert (load["slots"], load["consumers"]) == (0, 2)
+        assert AdmissionController().evaluate(load)["admitted"]
+
+
+def test_queue_wait_percentiles():
+    """每个类别只保留最近 N 个样本，按最近秩法计算分位数"""
+    from src.core.queue_stats import QueueWaitStats
+
+    with fake_redis():
+        stats = QueueWaitStats(max_samples=50)
+        for wait_ms in range(1, 101):
+            stats.record("P0", wait_ms)
+        stats.record("P3", 2500)
+
+        result = stats.get_stats()
+        assert list(result) == ["P0", "P3"]
+        assert result["P0"] == {"count": 50, "p50_ms": 75.0, "p95_ms": 98.0, "p99_ms": 100.0, "max_ms": 100.0}
+        assert result["P3"]["p99_ms"] == 2500.0
+        assert stats.get_stats(["P1"]) == {"P1": {"count": 0}}
+
+
+def test_prerun_signal_records_wait_by_severity():
+    """任务开始执行时按提交头部记录排队耗时：诊断任务按严重级别，其余任务按队列"""
+    from src.tasks.task_signals import record_queue_wait
+    from src.core.queue_stats import get_queue_wait_stats
+
+    with fake_redis():
+        enqueued_at = time.time() - 0.2
+        record_queue_wait(task=SimpleNamespace(request=Context(severity="P0", enqueued_at=enqueued_at)))
+        record_queue_wait(task=SimpleNamespace(request=Context(
+            enqueued_at=enqueued_at, delivery_info={"routing_key": "retrieval"}
+        )))
+        # 没有提交时间头部的任务（例如定时任务）不记录
+        record_queue_wait(task=SimpleNamespace(request=Context(severity="P1")))
+
+        stats = get_queue_wait_stats().get_stats()
+        assert sorted(stats) == ["P0", "retrieval"]
+        assert stats["P0"]["count"] == 1 and stats["P0"]["max_ms"] >= 200
+
+
+def test_api_accepts_severity():
+    """/diagnose/async 接受可选的严重级别（默认P2），未知级别返回422；排队统计总是包含所有级别"""
+    with embedded_api() as (client, _):
+        response = client.post("/diagnose/async", json={"message": "生产环境宕机", "severity": "P0"}, headers=HEADERS)
+        assert response.status_code == 200 and response.json()["severity"] == "P0"
+        response = client.post("/diagnose/async", json={"message": "清理/var/log"}, headers=HEADERS)
+        assert response.json()["severity"] == "P2"
+        assert client.post("/diagnose/async", json={"message": "x", "severity": "P9"}, headers=HEADERS).status_code == 422
+
+        stats = client.get("/stats/queue-wait", headers=HEADERS).json()["queue_wait"]
+        assert {"P0", "P1", "P2", "P3"} <= set(stats)
+
+
+if __name__ == "__main__":
+    test_severity_maps_to_queue_and_priority()
+    test_queue_load_counts_only_higher_priority_lanes()
+    test_degraded_workers_are_consumers()
+    test_queue_wait_percentiles()
+    test_prerun_signal_records_wait_by_severity()
+    test_api_accepts_severity()
@@ -0,0 +1,62 @@
+import sys
+import os
+import time
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+from src.core.profiling import StackSampler, profile_diagnosis, start_request_listener
+
+
+def _busy(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+def test_sampler_exports_speedscope():
+    """只采样指定线程，样本按帧表索引，总权重约等于采样时长"""
+    worker = threading.Thread(target=_busy, args=(0.3,), name="busy-worker")
+    worker.start()
+    sampler = StackSampler(0.005, {worker.ident})
+    sampler.start()
+    worker.join()
+    sampler.stop()
+
+    document = sampler.speedscope("test")
+    assert [profile["name"].split(" ")[0] for profile in document["profiles"]] == ["busy-worker"]
+    profile = document["profiles"][0]
+    assert len(profile["samples"]) == len(profile["weights"]) > 10
+    frames = document["shared"]["frames"]
+    assert any(frames[index]["name"] == "_busy" for index in profile["samples"][0])
+    assert 200 < profile["endValue"] < 2000
+
+
+def test_disabled_profile_is_noop():
+    """未请求剖析时不启用 tracemalloc，也不写入Redis"""
+    import tracemalloc
+
+    with profile_diagnosis("task-1", False) as profiler:
+        profiler.on_node("collect_symptoms")
+        assert not tracemalloc.is_tracing()
+
+
+def test_profiling_off_by_default():
+    """默认不启用剖析：接口返回404、不启动监听线程；启用后只对 PROFILING_CLIENTS 中的客户端开放"""
+    pytest.importorskip("fakeredis")
+    from fakes import API_KEY, embedded_api
+
+    headers = {"X-API-Key": API_KEY}
+    with embedded_api() as (client, _):
+        assert client.post("/debug/profile/cpu?seconds=1", headers=headers).status_code == 404
+        assert start_request_listener() is None
+
+    with embedded_api({"PROFILING_ENABLED": "true"}) as (client, _):
+        assert client.post("/debug/profile/cpu?seconds=1", headers=headers).status_code == 403
+
+
+if __name__ == "__main__":
+    test_sampler_exports_speedscope()
+    test_disabled_profile_is_noop()
+    test_profiling_off_by_default()
@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+import run_celery_worker
+from src.celery_app import celery_app
+from src.tasks import diagnosis_tasks, knowledge_tasks
+
+
+def _routed_queue(task_name: str) -> str:
+    return celery_app.amqp.router.route({}, task_name)["queue"].name
+
+
+def test_tasks_routed_to_dedicated_queues():
+    """LLM诊断进入llm队列，纯检索进入retrieval队列，清理与同步进入maintenance队列，未声明的任务使用默认的llm队列"""
+    assert [queue.name for queue in celery_app.conf.task_queues] == ["llm", "priority", "retrieval", "maintenance"]
+    assert _routed_queue(diagnosis_tasks.process_diagnosis_task.name) == "llm"
+    assert _routed_queue(diagnosis_tasks.process_batch_diagnosis_task.name) == "llm"
+    assert _routed_queue(knowledge_tasks.search_fault_cases_task.name) == "retrieval"
+    assert _routed_queue(knowledge_tasks.sync_knowledge_to_es_task.name) == "maintenance"
+    assert _routed_queue(diagnosis_tasks.cleanup_old_sessions_task.name) == "maintenance"
+    assert _routed_queue("unknown.task") == "llm"
+
+
+def test_worker_pools_from_env():
+    """每个队列的Worker按各自的进程池、并发数与预取数启动，可由环境变量单独覆盖"""
+    pytest.importorskip("fakeredis")
+    from fakes import environ
+    from src.config import get_settings
+
+    with environ(WORKER_RETRIEVAL_POOL="prefork", WORKER_RETRIEVAL_CONCURRENCY="16", WORKER_RETRIEVAL_PREFETCH="8"):
+        pools = get_settings().worker_pools
+        assert set(pools) == {"llm", "priority", "retrieval", "maintenance"}
+        command = run_celery_worker.build_worker_command("retrieval", pools["retrieval"])
+        assert command[command.index("-Q") + 1] == "retrieval"
+        assert {"--pool=prefork", "--concurrency=16", "--prefetch-multiplier=8"} <= set(command)
+        # 长时间的LLM任务每个进程只预取一个，避免短任务排在别的进程已预取的长任务后面
+        assert pools["llm"]["prefetch_multiplier"] == 1
+
+        # llm进程池空闲时也消费priority队列
+        command = run_celery_worker.build_worker_command("llm", pools["llm"])
+        assert command[command.index("-Q") + 1] == "priority,llm"
+
+
+def test_retrieval_task_runs_without_llm():
+    """检索任务只调用知识检索器，不构建智能体"""
+    class FakeRetriever:
+        def search_fault_cases(self, query, top_k=3):
+            return [{"fault_type": "CPU高", "query": query}][:top_k]
+
+    original = knowledge_tasks.get_knowledge_retriever
+    knowledge_tasks.get_knowledge_retriever = lambda: FakeRetriever()
+    try:
+        result = knowledge_tasks.search_fault_cases_task.apply(args=["CPU 95%"], kwargs={"top_k": 1}).get()
+    finally:
+        knowledge_tasks.get_knowledge_retriever = original
+    assert result == {"status": "SUCCESS", "query": "CPU 95%", "cases": [{"fault_type": "CPU高", "query": "CPU 95%"}]}
+
+
+if __name__ == "__main__":
+    test_tasks_routed_to_dedicated_queues()
+    test_worker_pools_from_env()
+    test_retrieval_task_runs_without_llm()
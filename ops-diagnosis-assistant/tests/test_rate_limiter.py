@@ -0,0 +1,99 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+pytest.importorskip("fakeredis")
+from fakes import embedded_api, fake_redis
+from src.core.rate_limiter import RateLimiter
+
+
+def _client(name: str, rate: float = 60, burst: int = 2, quota: int = 0) -> dict:
+    return {"name": name, "rate_per_minute": rate, "burst": burst, "daily_token_quota": quota}
+
+
+def test_buckets_are_per_key():
+    """每个客户端独立的令牌桶：一个客户端用完突发额度不影响其他客户端"""
+    with fake_redis():
+        limiter = RateLimiter()
+        alice, bob = _client("alice"), _client("bob")
+        assert [limiter.acquire(alice)["allowed"] for _ in range(2)] == [True, True]
+
+        rejected = limiter.acquire(alice)
+        assert (rejected["allowed"], rejected["reason"]) == (False, "rate_limit")
+        # 每秒补充1个令牌，最多等待1秒
+        assert 0 < rejected["retry_after"] <= 1
+        assert limiter.acquire(bob)["allowed"]
+
+        # 批量请求按问题数消耗令牌，超过桶容量的批量在桶满时也能通过
+        assert limiter.acquire(_client("batch"), cost=5)["allowed"]
+        assert not limiter.acquire(_client("batch"), cost=1)["allowed"]
+
+
+def test_daily_token_quota():
+    """预占的token超过当日配额时拒绝，被拒绝的请求不扣减令牌与用量；结算按实际用量修正"""
+    with fake_redis():
+        limiter = RateLimiter()
+        client = _client("quota", burst=10, quota=1000)
+        assert limiter.acquire(client, reserve_tokens=600)["allowed"]
+
+        rejected = limiter.acquire(client, reserve_tokens=600)
+        assert (rejected["allowed"], rejected["reason"]) == (False, "daily_token_quota")
+        assert 0 < rejected["retry_after"] <= 86400
+        usage = limiter.get_usage(client)
+        assert usage["tokens_used_today"] == 600
+        assert usage["available_requests"] == pytest.approx(9, abs=0.1)
+
+        # 实际只用了200 token，退回400后可以再次预占
+        limiter.settle_tokens("quota", 200, 600)
+        assert limiter.get_usage(client)["tokens_used_today"] == 200
+        assert limiter.acquire(client, reserve_tokens=600)["allowed"]
+        assert limiter.get_usage(client)["tokens_used_today"] == 800
+
+
+def test_rate_limit_disabled_and_redis_down():
+    """速率为0时只检查配额；Redis不可用时放行"""
+    with fake_redis():
+        limiter = RateLimiter()
+        unlimited = _client("unlimited", rate=0, burst=1)
+        assert all(limiter.acquire(unlimited)["allowed"] for _ in range(5))
+
+        def broken(**kwargs):
+            raise ConnectionError("redis down")
+
+        limiter._script = broken
+        assert limiter.acquire(_client("alice", burst=0))["allowed"]
+
+
+def test_api_returns_429_with_retry_after():
+    """超限的密钥返回429与Retry-After，其他密钥不受影响；诊断结束后预占的token按实际用量结算"""
+    env = {"API_KEYS": "script:script-key:6:1:1000000,ops:ops-key:60:5:1000",
+           "DIAGNOSIS_TOKEN_ESTIMATE": "600"}
+    with embedded_api(env) as (client, _):
+        script, ops = {"X-API-Key": "script-key"}, {"X-API-Key": "ops-key"}
+        assert client.post("/diagnose/async", json={"message": "磁盘写满"}, headers=script).status_code == 200
+
+        rejected = client.post("/diagnose/async", json={"message": "磁盘写满"}, headers=script)
+        assert rejected.status_code == 429
+        assert 1 <= int(rejected.headers["Retry-After"]) <= 10
+
+        accepted = client.post("/diagnose/async", json={"message": "CPU高"}, headers=ops)
+        assert accepted.status_code == 200
+        assert client.get(f"/tasks/{accepted.json()['task_id']}?wait=10", headers=ops).json()["status"] == "SUCCESS"
+        # 预占的600 token按桩模型报告的实际用量结算，超出了当日配额
+        usage = client.get("/stats/usage", headers=ops).json()["usage"]
+        assert (usage["client"], usage["daily_token_quota"]) == ("ops", 1000)
+        assert usage["tokens_used_today"] > 1000
+
+        over_quota = client.post("/diagnose/async", json={"message": "内存泄漏"}, headers=ops)
+        assert over_quota.status_code == 429
+        assert "配额" in over_quota.json()["detail"]
+        assert client.get("/stats/usage", headers={"X-API-Key": "wrong"}).status_code == 401
+
+
+if __name__ == "__main__":
+    test_buckets_are_per_key()
+    test_daily_token_quota()
+    test_rate_limit_disabled_and_redis_down()
+    test_api_returns_429_with_retry_after()
@@ -0,0 +1,119 @@
+import sys
+import os
+import json
+import time
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+pytest.importorskip("fakeredis")
+from fakes import API_KEY, embedded_api, fake_redis
+from src.core.session_manager import RedisSessionManager
+from src.core.session_archive import SessionArchive
+
+
+class FailingArchive:
+    def archive_session(self, *args, **kwargs):
+        return False
+
+
+def _idle_session(manager: RedisSessionManager, session_id: str, idle_seconds: float, turns: int = 0):
+    manager.save_session(session_id, {"session_id": session_id, "diagnosis_stage": "completed"})
+    for turn in range(turns):
+        manager.append_turn(session_id, {"response": f"第{turn + 1}轮诊断"})
+    manager.redis_client.zadd(manager.activity_key, {session_id: time.time() - idle_seconds})
+
+
+def test_archive_includes_turns():
+    """废弃会话与其各轮诊断结果一起归档并从Redis删除，活跃会话保留"""
+    with fake_redis() as redis_client, tempfile.TemporaryDirectory() as archive_dir:
+        manager = RedisSessionManager()
+        archive = SessionArchive(archive_dir)
+        _idle_session(manager, "idle", 3600, turns=2)
+        _idle_session(manager, "active", 10, turns=1)
+
+        stats = manager.cleanup_sessions(archive, idle_timeout=1800)
+        assert (stats["archived"], stats["cycle_completed"]) == (1, True)
+        assert not redis_client.exists("diagnosis_session:idle", "diagnosis_turns:idle")
+        assert redis_client.exists("diagnosis_session:active", "diagnosis_turns:active") == 2
+
+        [record] = archive.iter_archived_sessions(time.strftime("%Y%m%d"))
+        assert record["session_id"] == "idle"
+        assert [turn["response"] for turn in record["turns"]] == ["第1轮诊断", "第2轮诊断"]
+
+
+def test_archive_failure_restores_session_and_turns():
+    """归档失败时会话与各轮结果都放回Redis，等待下一轮重试"""
+    with fake_redis() as redis_client:
+        manager = RedisSessionManager()
+        _idle_session(manager, "idle", 3600, turns=2)
+
+        stats = manager.cleanup_sessions(FailingArchive(), idle_timeout=1800)
+        assert stats["archive_failed"] == 1
+        assert json.loads(redis_client.get("diagnosis_session:idle"))["session_id"] == "idle"
+        assert manager.get_turns("idle")[0] == 2
+
+
+def test_scan_cursor_resumes_across_runs():
+    """超过时间预算时停止并保存SCAN游标，之后的运行从断点继续直到遍历完一轮"""
+    with fake_redis() as redis_client, tempfile.TemporaryDirectory() as archive_dir:
+        manager = RedisSessionManager()
+        archive = SessionArchive(archive_dir)
+        for index in range(30):
+            _idle_session(manager, f"s{index}", 60)
+
+        first = manager.cleanup_sessions(archive, idle_timeout=1800, time_budget=0, scan_count=5)
+        assert not first["cycle_completed"]
+        assert 0 < first["scanned"] < 30
+        assert int(redis_client.get(manager.cleanup_cursor_key)) != 0
+
+        runs = [first]
+        while not runs[-1]["cycle_completed"]:
+            runs.append(manager.cleanup_sessions(archive, idle_timeout=1800, time_budget=0, scan_count=5))
+        assert len(runs) > 1
+        assert sum(run["scanned"] for run in runs) == 30
+        assert redis_client.get(manager.cleanup_cursor_key) == "0"
+
+        # 时间预算足够时一次遍历完
+        assert manager.cleanup_sessions(archive, idle_timeout=1800, scan_count=5)["scanned"] == 30
+
+
+def test_cleanup_lock_is_token_guarded():
+    """持有清理锁时跳过本轮；释放锁时只删除自己的令牌"""
+    with fake_redis() as redis_client, tempfile.TemporaryDirectory() as archive_dir:
+        manager = RedisSessionManager()
+        redis_client.set(manager.cleanup_lock_key, "other-run", ex=60)
+        assert manager.cleanup_sessions(SessionArchive(archive_dir), idle_timeout=1800)["skipped"]
+
+        assert not manager._release_cleanup_lock("this-run")
+        assert redis_client.get(manager.cleanup_lock_key) == "other-run"
+        assert manager._release_cleanup_lock("other-run")
+
+        # 正常运行结束后释放自己的锁
+        manager.cleanup_sessions(SessionArchive(archive_dir), idle_timeout=1800)
+        assert not redis_client.exists(manager.cleanup_lock_key)
+
+
+def test_session_endpoints_on_embedded_backend():
+    """会话接口与手动清理在嵌入式后端上可用：清理任务在执行线程中运行，删除后的会话返回404"""
+    headers = {"X-API-Key": API_KEY}
+    with embedded_api() as (client, _):
+        submitted = client.post("/diagnose/async", json={"message": "磁盘写满"}, headers=headers).json()
+        session_id = submitted["session_id"]
+        assert client.get(f"/tasks/{submitted['task_id']}?wait=10", headers=headers).json()["status"] == "SUCCESS"
+        task_id = client.post("/cleanup/sessions", headers=headers).json()["task_id"]
+        assert client.get(f"/tasks/{task_id}?wait=10", headers=headers).json()["status"] == "SUCCESS"
+
+        assert session_id in [session["session_id"] for session in client.get("/sessions", headers=headers).json()["sessions"]]
+        assert client.get(f"/sessions/{session_id}", headers=headers).status_code == 200
+        assert client.delete(f"/sessions/{session_id}", headers=headers).status_code == 200
+        assert client.get(f"/sessions/{session_id}", headers=headers).status_code == 404
+
+
+if __name__ == "__main__":
+    test_archive_includes_turns()
+    test_archive_failure_restores_session_and_turns()
+    test_scan_cursor_resumes_across_runs()
+    test_cleanup_lock_is_token_guarded()
+    test_session_endpoints_on_embedded_backend()
@@ -0,0 +1,32 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from benchmarks.agents import _usage_counter
+from benchmarks.session_growth import DEFAULT_SCRIPT, growth_exponent, run_conversation, summarize
+from benchmarks.stubs import StubChatModel, StubRetriever
+from src.core.advanced_agent import AdvancedDiagnosisAgent
+
+
+def test_growth_exponent():
+    """每轮开销恒定时指数约为1，随轮数线性增长时约为2"""
+    assert abs(growth_exponent([5.0] * 100) - 1) < 0.01
+    assert abs(growth_exponent([float(t) for t in range(1, 101)]) - 2) < 0.1
+
+
+def test_long_conversation_cost_is_linear():
+    """100轮对话中会话状态大小与每轮发送给LLM的token数不随轮数增长"""
+    counter = _usage_counter()
+    agent = AdvancedDiagnosisAgent(llm=StubChatModel(latency=0, callbacks=[counter]), retriever=StubRetriever(latency=0))
+    run = run_conversation(agent, counter, 100, DEFAULT_SCRIPT, "growth-test")
+    summary = summarize(100, run)
+
+    assert summary["bytes_exponent"] < 1.2
+    assert summary["tokens_exponent"] < 1.05
+    assert summary["max_messages"] <= agent.max_messages
+    assert summary["max_symptoms"] <= agent.max_symptoms
+
+
+if __name__ == "__main__":
+    test_growth_exponent()
+    test_long_conversation_cost_is_linear()
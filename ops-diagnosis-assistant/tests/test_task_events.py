@@ -0,0 +1,69 @@
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+pytest.importorskip("fakeredis")
+from fakes import API_KEY, embedded_api, fake_redis
+from src.core.task_events import TaskEventHub, TaskEventPublisher
+
+HEADERS = {"X-API-Key": API_KEY}
+
+
+def test_hub_dispatches_redis_events_to_subscribers():
+    """一条pub/sub连接接收所有任务频道的事件，只分发给订阅了该任务的客户端"""
+    async def run():
+        hub = TaskEventHub(listen_redis=True)
+        first, second = await hub.subscribe("t1"), await hub.subscribe("t1")
+        other = await hub.subscribe("t2")
+        try:
+            publisher = TaskEventPublisher()
+            publisher.publish("t1", "progress", stage="retrieve_knowledge")
+            publisher.publish("t3", "success", result={})
+            publisher.publish("t1", "success", result={"status": "SUCCESS"})
+
+            events = [await first.wait_for_terminal(5), await second.wait_for_terminal(5)]
+            assert [event["result"] for event in events] == [{"status": "SUCCESS"}] * 2
+            assert first.last_progress["stage"] == "retrieve_knowledge"
+            assert await other.next_event(0.2) is None
+        finally:
+            for subscription in (first, second, other):
+                hub.unsubscribe(subscription)
+            hub._reader.cancel()
+        assert hub._subscriptions == {}
+
+    with fake_redis():
+        asyncio.run(run())
+
+
+def test_websocket_streams_until_terminal():
+    """WebSocket先推送状态快照，之后推送事件直到任务结束；无效密钥的连接被关闭"""
+    from starlette.websockets import WebSocketDisconnect
+
+    with embedded_api() as (client, _):
+        task_id = client.post("/diagnose/async", json={"message": "订单服务CPU 95%"}, headers=HEADERS).json()["task_id"]
+        with client.websocket_connect(f"/ws/tasks/{task_id}?api_key={API_KEY}") as websocket:
+            messages = [websocket.receive_json()]
+            while messages[-1].get("status") != "SUCCESS" and messages[-1]["type"] not in ("success", "failure"):
+                messages.append(websocket.receive_json())
+        assert messages[0]["type"] == "snapshot"
+        assert messages[-1].get("status") == "SUCCESS" or messages[-1]["type"] == "success"
+
+        with pytest.raises(WebSocketDisconnect) as disconnected:
+            with client.websocket_connect(f"/ws/tasks/{task_id}?api_key=wrong") as websocket:
+                websocket.receive_json()
+        assert disconnected.value.code == 1008
+
+
+def test_long_poll_times_out_with_current_status():
+    """长轮询在超时后返回任务的当前状态（未知任务为PENDING）"""
+    with embedded_api({"TASK_LONG_POLL_MAX_WAIT": "1"}) as (client, _):
+        assert client.get("/tasks/unknown?wait=30", headers=HEADERS).json()["status"] == "PENDING"
+
+
+if __name__ == "__main__":
+    test_hub_dispatches_redis_events_to_subscribers()
+    test_websocket_streams_until_terminal()
+    test_long_poll_times_out_with_current_status()
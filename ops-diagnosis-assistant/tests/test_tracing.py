@@ -0,0 +1,55 @@
+import sys
+import os
+import json
+import tempfile
+import subprocess
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 追踪开关在模块导入时读取，在独立进程中启用文件导出
+SCRIPT = """
+from src.core import tracing
+
+with tracing.span("POST /diagnose/async"):
+    headers = tracing.inject_headers()
+# Worker端: 从消息头部恢复上下文，任务内的节点与LLM调用都是任务span的后代
+with tracing.task_span("diagnosis.process_diagnosis", "task-1", headers, enqueued_at=None):
+    with tracing.span("node.generate_solution"):
+        with tracing.span("llm.invoke"):
+            pass
+"""
+
+
+def _run(sample_rate: str):
+    pytest.importorskip("opentelemetry.sdk")
+    trace_file = os.path.join(tempfile.mkdtemp(), "traces.jsonl")
+    env = dict(os.environ, PYTHONPATH=ROOT, TRACING_ENABLED="true", TRACING_EXPORTER="file",
+               TRACING_FILE=trace_file, TRACING_SAMPLE_RATE=sample_rate)
+    subprocess.run([sys.executable, "-c", SCRIPT], env=env, cwd=ROOT, check=True)
+    if not os.path.exists(trace_file):
+        return []
+    with open(trace_file, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_context_propagates_through_task_headers():
+    """提交请求、任务、节点、LLM调用属于同一条trace，父子关系沿调用链传递"""
+    spans = _run("1.0")
+    by_name = {span["name"]: span for span in spans}
+    assert len({span["context"]["trace_id"] for span in spans}) == 1
+    assert by_name["task diagnosis.process_diagnosis"]["parent_id"] == by_name["POST /diagnose/async"]["context"]["span_id"]
+    assert by_name["node.generate_solution"]["parent_id"] == by_name["task diagnosis.process_diagnosis"]["context"]["span_id"]
+    assert by_name["llm.invoke"]["parent_id"] == by_name["node.generate_solution"]["context"]["span_id"]
+
+
+def test_downstream_follows_root_sampling():
+    """根span未被采样时，Worker端的span也不导出"""
+    assert _run("0") == []
+
+
+if __name__ == "__main__":
+    test_context_propagates_through_task_headers()
+    test_downstream_follows_root_sampling()
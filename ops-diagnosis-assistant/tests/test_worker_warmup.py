@@ -0,0 +1,90 @@
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import pytest
+
+pytest.importorskip("fakeredis")
+from fakes import environ, fake_redis
+from src.tasks import worker_warmup
+from src.core.worker_registry import get_worker_registry
+
+
+def _run_warmup(steps, delay: float = 0):
+    """用给定的步骤结果代替真实预热执行 run_warmup"""
+    def warm_up(queues):
+        time.sleep(delay)
+        return steps
+
+    originals = worker_warmup.warm_up_worker, worker_warmup._consumed_queues
+    worker_warmup.warm_up_worker, worker_warmup._consumed_queues = warm_up, lambda: ["llm"]
+    try:
+        worker_warmup.run_warmup()
+    finally:
+        worker_warmup.warm_up_worker, worker_warmup._consumed_queues = originals
+
+
+def test_failed_step_registers_degraded():
+    """有预热步骤失败时登记为降级，不计入就绪进程"""
+    with environ(WORKER_WARMUP="true"), fake_redis():
+        _run_warmup({"redis": {"ok": True, "ms": 1}, "llm": {"ok": False, "ms": 5, "error": "connection refused"}})
+        [worker] = get_worker_registry().get_workers()
+        assert worker["status"] == "degraded"
+        assert get_worker_registry().get_ready_workers() == []
+
+        _run_warmup({"redis": {"ok": True, "ms": 1}, "llm": {"ok": True, "ms": 5}})
+        assert [worker["status"] for worker in get_worker_registry().get_ready_workers()] == ["ready"]
+
+
+def test_retrieval_failure_is_only_a_warning():
+    """ES检索预热失败（ES不可用或知识库未同步）仍登记为就绪，失败记入 warnings"""
+    with environ(WORKER_WARMUP="true"), fake_redis():
+        _run_warmup({
+            "redis": {"ok": True, "ms": 1}, "agent": {"ok": True, "ms": 3}, "llm": {"ok": True, "ms": 5},
+            "retrieval": {"ok": False, "ms": 2, "error": "index_not_found_exception"}
+        })
+        [worker] = get_worker_registry().get_ready_workers()
+        assert (worker["status"], worker["warnings"]) == ("ready", ["retrieval"])
+
+
+def test_timed_out_warmup_registers_ready_when_finished():
+    """预热超时先登记为降级，后台完成后按最终结果重新登记为就绪"""
+    with environ(WORKER_WARMUP="true", WORKER_WARMUP_TIMEOUT="1"), fake_redis():
+        _run_warmup({"redis": {"ok": True, "ms": 1}}, delay=1.5)
+        [worker] = get_worker_registry().get_workers()
+        assert (worker["status"], worker["timed_out"]) == ("degraded", True)
+
+        time.sleep(1)
+        [worker] = get_worker_registry().get_ready_workers()
+        assert (worker["status"], worker["timed_out"]) == ("ready", False)
+
+
+def test_retrieval_warm_up_bypasses_cache():
+    """ES检索预热一次 _msearch 执行高频故障的查询，结果不写入检索缓存"""
+    from src.core.knowledge_retriever import KnowledgeRetriever
+
+    class FakeES:
+        def __init__(self):
+            self.msearches = []
+
+        def search(self, index, body):
+            symptoms = ["CPU持续95%", "堆内存持续增长"] if body["query"]["term"]["frequency"] == "frequent" else []
+            return {"hits": {"hits": [{"_source": {"symptoms": text}} for text in symptoms]}}
+
+        def msearch(self, index, searches):
+            self.msearches.append(searches)
+
+    retriever = KnowledgeRetriever()
+    retriever.es_client = FakeES()
+    assert retriever.warm_up_top_fault_types(5) == 2
+    [searches] = retriever.es_client.msearches
+    assert [body["query"]["multi_match"]["query"] for body in searches[1::2]] == ["CPU持续95%", "堆内存持续增长"]
+    assert len(retriever._cache) == 0
+
+
+if __name__ == "__main__":
+    test_failed_step_registers_degraded()
+    test_retrieval_failure_is_only_a_warning()
+    test_timed_out_warmup_registers_ready_when_finished()
+    test_retrieval_warm_up_bypasses_cache()